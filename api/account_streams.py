@@ -0,0 +1,124 @@
+"""
+AccountStreams - Account stream (WS) của account ENV, giữ position / order / balance local
+
+- Lighter: account stream (perpsdex/lighter/core/account_stream.py) -> LighterAccountMirror
+  (collateral, balance, positions) + OpenOrderBook.
+- Aster: user data stream (perpsdex/aster/core/user_stream.py).
+- /api/orders/positions, /api/orders/open, /api/balance, close position, risk / PnL sync đọc
+  bản local khi stream của account đó live, không thì gọi REST như cũ.
+- Trạng thái lệnh từ stream được đẩy vào FillDispatcher (api/fills.py): wait_for_fill
+  resolve ngay khi có event, poller chung nghỉ khi stream live.
+
+Mỗi worker giữ 1 stream riêng (bảng local là in-memory của worker).
+
+ENV:
+    - ACCOUNT_STREAMS (default: 1)
+    - LIGHTER_WS_URL / LIGHTER_ACCOUNT_STREAM_RESYNC: xem account_stream.py
+    - ASTER_WS_URL / ASTER_LISTEN_KEY_KEEPALIVE / ASTER_USER_STREAM_RESYNC: xem user_stream.py
+"""
+
+import os
+from typing import Dict, Optional
+
+
+def account_streams_enabled() -> bool:
+    return os.getenv("ACCOUNT_STREAMS", "1").strip().lower() in ("1", "true", "yes", "on")
+
+
+class AccountStreams:
+    """
+    Methods:
+        - start(): Mở stream cho sàn đã cấu hình key ENV
+        - stop()
+        - status()
+    """
+
+    def __init__(self):
+        self.lighter = None
+        self.aster = None
+        self.errors: Dict[str, Optional[str]] = {"lighter": None, "aster": None}
+
+    async def _start_aster(self):
+        from api.fills import aster_fill, get_fill_dispatcher
+        from api.utils import get_keys_or_env, initialize_aster_client
+
+        keys = get_keys_or_env(None, "aster")
+        if not keys.get("api_key") or not keys.get("secret_key"):
+            return
+        from perpsdex.aster.core.user_stream import AsterUserStream
+
+        stream = AsterUserStream(await initialize_aster_client(keys))
+        dispatcher = get_fill_dispatcher()
+
+        def on_event(event: dict):
+            if event.get("e") != "ORDER_TRADE_UPDATE":
+                return
+            o = event.get("o") or {}
+            order_id, fill = aster_fill({
+                "orderId": o.get("i"), "status": o.get("X"), "executedQty": o.get("z"), "avgPrice": o.get("ap"),
+            })
+            if order_id is not None:
+                dispatcher.publish("aster", stream.api_key, order_id, fill)
+
+        stream.add_listener(on_event)
+        dispatcher.register_stream("aster", stream.api_key, lambda: stream.live)
+        stream.start()
+        self.aster = stream
+        print("📡 [Streams] Aster user data stream started")
+
+    async def _start_lighter(self):
+        from api.fills import get_fill_dispatcher, lighter_fill
+        from api.utils import get_keys_or_env, initialize_lighter_client
+
+        keys = get_keys_or_env(None, "lighter")
+        if not keys.get("private_key"):
+            return
+        from perpsdex.lighter.core.account_stream import LighterAccountStream
+
+        account_index = int(keys.get("account_index", 0))
+        stream = LighterAccountStream(await initialize_lighter_client(keys), account_index)
+        dispatcher = get_fill_dispatcher()
+
+        def on_order(order):
+            client_index, fill = lighter_fill(order)
+            if client_index is not None:
+                dispatcher.publish("lighter", account_index, client_index, fill)
+
+        stream.add_listener(on_order)
+        dispatcher.register_stream("lighter", account_index, lambda: stream.live)
+        stream.start()
+        self.lighter = stream
+        print(f"📡 [Streams] Lighter account stream started (account {account_index})")
+
+    async def start(self):
+        for name, start in (("lighter", self._start_lighter), ("aster", self._start_aster)):
+            try:
+                await start()
+            except Exception as e:
+                self.errors[name] = str(getattr(e, "detail", e))
+                print(f"⚠️  [Streams] {name} stream lỗi: {self.errors[name]}")
+
+    async def stop(self):
+        for stream in (self.lighter, self.aster):
+            if stream is not None:
+                await stream.stop()
+        self.lighter = None
+        self.aster = None
+
+    def status(self) -> dict:
+        return {
+            "enabled": account_streams_enabled(),
+            "lighter": self.lighter.status() if self.lighter is not None else None,
+            "aster": self.aster.status() if self.aster is not None else None,
+            "errors": self.errors,
+        }
+
+
+_streams: Optional[AccountStreams] = None
+
+
+def get_account_streams() -> AccountStreams:
+    global _streams
+    if _streams is None:
+        _streams = AccountStreams()
+    return _streams
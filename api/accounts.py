@@ -0,0 +1,392 @@
+"""
+AccountRegistry - Nhiều sub-account có tên cho mỗi sàn
+
+- Account 'default' = keys ENV như cũ (LIGHTER_PRIVATE_KEY / ACCOUNT_INDEX, ASTER_API_KEY ...).
+- Account khác khai báo bằng JSON (ACCOUNTS_FILE hoặc ACCOUNTS_JSON), giá trị string được
+  expand biến môi trường ("${SUB1_KEY}") để không phải để secret trong file:
+    {
+      "lighter": {"sub1": {"private_key": "${SUB1_KEY}", "account_index": 123, "api_key_index": 2}},
+      "aster":   {"sub1": {"api_key": "...", "secret_key": "...", "api_url": "https://fapi.asterdex.com"}}
+    }
+- ClientPool: client dùng chung theo (sàn, account, api key) cho mọi request đặt lệnh / đóng lệnh /
+  ladder / TWAP và GET theo account (tạo lazy, đóng khi shutdown). Lighter: 1 SignerClient -> 1
+  nonce manager cho mỗi api key, SDK khoá api key lúc ký + gửi -> lệnh song song trên nhiều market
+  của cùng account không ký trùng nonce (trước đây mỗi request dựng SignerClient riêng, mỗi cái tự
+  fetch nextNonce).
+- Mỗi account có:
+    - client lấy từ ClientPool
+    - rate budget riêng (token bucket ACCOUNT_RATE_PER_SECOND) -> account này không ăn quota account khác
+    - state cache (positions / balance / open orders) TTL ACCOUNT_STATE_TTL giây, request đồng thời
+      cùng key chờ chung 1 lần gọi sàn
+- Request chọn account bằng field / query `account` (tên), GET positions / balance / open orders
+  nhận `accounts` = 'all' hoặc 'a,b' và gọi song song từng account.
+
+ENV:
+    - ACCOUNTS_FILE / ACCOUNTS_JSON
+    - ACCOUNT_RATE_PER_SECOND (default: 10 call / giây / account)
+    - ACCOUNT_STATE_TTL (default: 2 giây, 0 = không cache)
+    - ACCOUNT_CLIENT_CLOSE_GRACE (default: 30 giây): client bị bỏ khỏi pool do lỗi kết nối được
+      đóng sau khoảng này (request đang dùng nó vẫn chạy nốt)
+"""
+
+import asyncio
+import json
+import os
+import time
+from typing import Awaitable, Callable, Dict, List, Optional, Tuple
+
+from fastapi import HTTPException
+
+from api.open_orders import AUTH_TOKEN_TTL_SECONDS
+from perpsdex.common.deadline import DeadlineExceeded
+
+DEFAULT_ACCOUNT = "default"
+EXCHANGES = ("lighter", "aster")
+
+
+def is_transport_error(error: BaseException) -> bool:
+    """Lỗi kết nối / timeout (client có thể hỏng), khác lỗi nghiệp vụ / HTTPException"""
+    # DeadlineExceeded (asyncio.TimeoutError = OSError): request hết budget, client vẫn khoẻ
+    if isinstance(error, (HTTPException, DeadlineExceeded)):
+        return False
+    import aiohttp
+
+    return isinstance(error, (aiohttp.ClientError, asyncio.TimeoutError, ConnectionError, OSError))
+
+
+def _pool_key(exchange: str, keys: dict) -> tuple:
+    if exchange == "lighter":
+        return (
+            exchange,
+            int(keys.get("account_index") or 0),
+            int(keys.get("api_key_index") or 0),
+            keys.get("private_key"),
+        )
+    return (exchange, keys.get("api_key"), keys.get("secret_key"), keys.get("api_url"))
+
+
+class ClientPool:
+    """
+    Methods:
+        - get(exchange, keys): Client dùng chung (tạo lần đầu, request đồng thời chờ chung)
+        - drop(exchange, keys): Bỏ client khỏi pool (lỗi kết nối), đóng sau grace period
+        - close(), status()
+    """
+
+    def __init__(self):
+        self._clients: Dict[tuple, object] = {}
+        self._locks: Dict[tuple, asyncio.Lock] = {}
+        # (task đóng client sau grace, client) của client đã bị bỏ
+        self._retired: List[Tuple[asyncio.Task, object]] = []
+        self.created = 0
+        self.drops = 0
+
+    def has(self, exchange: str, keys: dict) -> bool:
+        return _pool_key(exchange, keys) in self._clients
+
+    async def get(self, exchange: str, keys: dict):
+        key = _pool_key(exchange, keys)
+        client = self._clients.get(key)
+        if client is not None:
+            return client
+        lock = self._locks.setdefault(key, asyncio.Lock())
+        async with lock:
+            client = self._clients.get(key)
+            if client is None:
+                from api.utils import initialize_aster_client, initialize_lighter_client
+
+                init = initialize_lighter_client if exchange == "lighter" else initialize_aster_client
+                client = self._clients[key] = await init(keys)
+                self.created += 1
+        return client
+
+    async def _close_later(self, client, delay: float):
+        await asyncio.sleep(delay)
+        try:
+            await client.close()
+        except Exception:
+            pass
+
+    def drop(self, exchange: str, keys: dict):
+        """
+        Request sau dựng client mới. Client cũ có thể đang được request khác dùng
+        -> không đóng ngay, chỉ đóng sau ACCOUNT_CLIENT_CLOSE_GRACE giây.
+        """
+        client = self._clients.pop(_pool_key(exchange, keys), None)
+        if client is None:
+            return
+        self.drops += 1
+        grace = float(os.getenv("ACCOUNT_CLIENT_CLOSE_GRACE", 30))
+        self._retired = [(t, c) for t, c in self._retired if not t.done()]
+        task = asyncio.create_task(self._close_later(client, grace), name=f"client-pool-{exchange}-close")
+        self._retired.append((task, client))
+
+    async def close(self):
+        # Shutdown: đóng luôn client đang chờ grace
+        for task, client in self._retired:
+            if not task.done():
+                task.cancel()
+                await self._close_later(client, 0)
+        self._retired = []
+        clients, self._clients = list(self._clients.values()), {}
+        for client in clients:
+            await self._close_later(client, 0)
+
+    def status(self) -> dict:
+        return {
+            "clients": {ex: sum(1 for key in self._clients if key[0] == ex) for ex in EXCHANGES},
+            "created": self.created,
+            "drops": self.drops,
+        }
+
+
+_pool: Optional[ClientPool] = None
+
+
+def get_client_pool() -> ClientPool:
+    global _pool
+    if _pool is None:
+        _pool = ClientPool()
+    return _pool
+
+
+async def get_pooled_client(exchange: str, keys: dict):
+    """Client dùng chung cho keys (thay cho initialize_*_client mỗi request, KHÔNG close)"""
+    return await get_client_pool().get(exchange, keys)
+
+
+class RateBudget:
+    """Token bucket: tối đa `rate` call / giây, burst = rate"""
+
+    def __init__(self, rate: float):
+        self.rate = max(rate, 0.1)
+        self.tokens = self.rate
+        self.updated = time.monotonic()
+        self.waits = 0
+
+    async def acquire(self):
+        while True:
+            now = time.monotonic()
+            self.tokens = min(self.rate, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+            if self.tokens >= 1:
+                self.tokens -= 1
+                return
+            self.waits += 1
+            await asyncio.sleep((1 - self.tokens) / self.rate)
+
+
+class Account:
+    """
+    1 account có tên trên 1 sàn
+
+    Methods:
+        - client(): Client từ ClientPool
+        - lighter_auth(): Auth token Lighter (tạo lại trước khi hết hạn)
+        - cached(kind, loader): State cache TTL + single-flight, loader chạy sau khi lấy rate budget
+        - drop_client(): Bỏ client khỏi pool (lỗi kết nối)
+    """
+
+    def __init__(self, name: str, exchange: str, keys: dict, rate: float, state_ttl: float):
+        self.name = name
+        self.exchange = exchange
+        self.keys = keys
+        self.budget = RateBudget(rate)
+        self.state_ttl = state_ttl
+        self._auth: Optional[str] = None
+        self._auth_created_at = 0.0
+        self._cache: Dict[str, Tuple[float, object]] = {}
+        self._inflight: Dict[str, asyncio.Future] = {}
+        self.hits = 0
+        self.loads = 0
+
+    @property
+    def account_index(self) -> int:
+        return int(self.keys.get("account_index", 0))
+
+    async def client(self):
+        return await get_client_pool().get(self.exchange, self.keys)
+
+    async def lighter_auth(self) -> str:
+        if self._auth is None or time.time() - self._auth_created_at > AUTH_TOKEN_TTL_SECONDS:
+            client = await self.client()
+            auth, error = await client.get_signer_client().create_auth_token(client.api_key_index)
+            if error:
+                raise RuntimeError(f"auth token: {error}")
+            self._auth, self._auth_created_at = auth, time.time()
+        return self._auth
+
+    async def cached(self, kind: str, loader: Callable[[], Awaitable]):
+        entry = self._cache.get(kind)
+        if entry is not None and time.monotonic() - entry[0] < self.state_ttl:
+            self.hits += 1
+            return entry[1]
+
+        inflight = self._inflight.get(kind)
+        if inflight is not None:
+            self.hits += 1
+            return await asyncio.shield(inflight)
+
+        future = asyncio.get_running_loop().create_future()
+        self._inflight[kind] = future
+        try:
+            await self.budget.acquire()
+            self.loads += 1
+            value = await loader()
+            if self.state_ttl > 0:
+                self._cache[kind] = (time.monotonic(), value)
+            future.set_result(value)
+            return value
+        except asyncio.CancelledError:
+            future.cancel()
+            raise
+        except Exception as e:
+            future.set_exception(e)
+            # Không để "Future exception was never retrieved" khi không ai chờ chung
+            future.exception()
+            raise
+        finally:
+            self._inflight.pop(kind, None)
+
+    def invalidate(self, kind: Optional[str] = None):
+        if kind is None:
+            self._cache.clear()
+        else:
+            self._cache.pop(kind, None)
+
+    def drop_client(self):
+        get_client_pool().drop(self.exchange, self.keys)
+        self._auth = None
+
+    def status(self) -> dict:
+        return {
+            "name": self.name,
+            "exchange": self.exchange,
+            "account_index": self.account_index if self.exchange == "lighter" else None,
+            "client_open": get_client_pool().has(self.exchange, self.keys),
+            "rate_per_second": self.budget.rate,
+            "rate_waits": self.budget.waits,
+            "cache_hits": self.hits,
+            "loads": self.loads,
+        }
+
+
+def _expand(value):
+    if isinstance(value, str):
+        return os.path.expandvars(value)
+    if isinstance(value, dict):
+        return {k: _expand(v) for k, v in value.items()}
+    return value
+
+
+class AccountRegistry:
+    """
+    Methods:
+        - find(exchange, name): Account hoặc None
+        - get(exchange, name): Account (raise 400 nếu không có)
+        - keys(exchange, name): keys đã chuẩn hoá (cùng format get_keys_or_env)
+        - select(exchange, accounts): List[Account] theo 'all' / 'a,b' / None (= default)
+        - close(), status()
+    """
+
+    def __init__(self):
+        self.rate = float(os.getenv("ACCOUNT_RATE_PER_SECOND", 10))
+        self.state_ttl = float(os.getenv("ACCOUNT_STATE_TTL", 2.0))
+        self._accounts: Dict[str, Dict[str, Account]] = {ex: {} for ex in EXCHANGES}
+        self._load()
+
+    def _config(self) -> dict:
+        path = os.getenv("ACCOUNTS_FILE")
+        if path:
+            with open(path) as f:
+                return json.load(f)
+        raw = os.getenv("ACCOUNTS_JSON")
+        return json.loads(raw) if raw else {}
+
+    def _load(self):
+        from api.utils import get_keys_or_env
+
+        for exchange in EXCHANGES:
+            keys = get_keys_or_env(None, exchange)
+            if keys.get("private_key") if exchange == "lighter" else keys.get("api_key"):
+                self._add(DEFAULT_ACCOUNT, exchange, keys)
+
+        for exchange, accounts in self._config().items():
+            if exchange not in EXCHANGES:
+                print(f"⚠️  [Accounts] Bỏ qua sàn không hỗ trợ: {exchange}")
+                continue
+            for name, raw in (accounts or {}).items():
+                raw = _expand(raw)
+                if exchange == "lighter":
+                    keys = {
+                        "private_key": raw.get("private_key"),
+                        "account_index": int(raw.get("account_index", 0)),
+                        "api_key_index": int(raw.get("api_key_index", 0)),
+                    }
+                else:
+                    keys = {
+                        "api_key": raw.get("api_key"),
+                        "secret_key": raw.get("secret_key"),
+                        "api_url": raw.get("api_url") or os.getenv("ASTER_API_URL", "https://fapi.asterdex.com"),
+                    }
+                self._add(name, exchange, keys)
+
+        summary = ", ".join(f"{ex}={len(self._accounts[ex])}" for ex in EXCHANGES)
+        print(f"👥 [Accounts] Loaded accounts ({summary})")
+
+    def _add(self, name: str, exchange: str, keys: dict):
+        self._accounts[exchange][name] = Account(name, exchange, keys, self.rate, self.state_ttl)
+
+    def names(self, exchange: str) -> List[str]:
+        return list(self._accounts.get(exchange, {}))
+
+    def find(self, exchange: str, name: Optional[str] = None) -> Optional[Account]:
+        return self._accounts.get(exchange, {}).get(name or DEFAULT_ACCOUNT)
+
+    def get(self, exchange: str, name: Optional[str] = None) -> Account:
+        account = self.find(exchange, name)
+        if account is None:
+            raise HTTPException(
+                status_code=400,
+                detail=f"{exchange.capitalize()}: account '{name or DEFAULT_ACCOUNT}' chưa được cấu hình",
+            )
+        return account
+
+    def keys(self, exchange: str, name: str) -> dict:
+        return dict(self.get(exchange, name).keys)
+
+    def select(self, exchange: str, accounts: Optional[str] = None) -> List[Account]:
+        if accounts is None:
+            account = self._accounts[exchange].get(DEFAULT_ACCOUNT)
+            return [account] if account is not None else []
+        if accounts.strip().lower() == "all":
+            return list(self._accounts[exchange].values())
+        names = [n.strip() for n in accounts.split(",") if n.strip()]
+        # Tên không có trên sàn này thì bỏ qua (account có thể chỉ tồn tại trên 1 sàn)
+        return [self._accounts[exchange][n] for n in names if n in self._accounts[exchange]]
+
+    async def close(self):
+        await get_client_pool().close()
+
+    def status(self) -> dict:
+        return dict(
+            {ex: [a.status() for a in accounts.values()] for ex, accounts in self._accounts.items()},
+            pool=get_client_pool().status(),
+        )
+
+
+_registry: Optional[AccountRegistry] = None
+
+
+def get_account_registry() -> AccountRegistry:
+    global _registry
+    if _registry is None:
+        _registry = AccountRegistry()
+    return _registry
+
+
+def invalidate_account_state(exchange: str, name: Optional[str] = None):
+    """Xoá state cache sau khi đặt / đóng lệnh (account chưa cấu hình thì bỏ qua)"""
+    account = get_account_registry().find(exchange, name)
+    if account is not None:
+        account.invalidate()
@@ -2,17 +2,17 @@
 Helper functions để lấy balance từ SDK
 """
 
-from typing import Dict, Optional
+from typing import Dict, Optional, TYPE_CHECKING
 
-from perpsdex.lighter.core.client import LighterClient
-from perpsdex.lighter.core.market import MarketData as LighterMarketData
-from perpsdex.aster.core.client import AsterClient
-from perpsdex.aster.core.market import MarketData as AsterMarketData
+# Exchange stack được import lazy trong từng hàm (xem api/startup.py)
+if TYPE_CHECKING:
+    from perpsdex.lighter.core.client import LighterClient
+    from perpsdex.aster.core.client import AsterClient
 
 from api.utils import initialize_lighter_client, initialize_aster_client, get_keys_or_env
 
 
-async def get_lighter_balance(client: LighterClient, account_index: int) -> Dict:
+async def get_lighter_balance(client: "LighterClient", account_index: int) -> Dict:
     """
     Lấy balance từ Lighter
     
@@ -26,6 +26,20 @@ async def get_lighter_balance(client: LighterClient, account_index: int) -> Dict
             'error': str (nếu có)
         }
     """
+    from perpsdex.lighter.core.market import MarketData as LighterMarketData
+    from perpsdex.lighter.utils.account_mirror import get_live_account_mirror
+
+    # Account stream live -> balance từ mirror local (không gọi account_api.account)
+    mirror = get_live_account_mirror(account_index)
+    if mirror is not None:
+        return {
+            'exchange': 'lighter',
+            'available': mirror.available,
+            'collateral': mirror.collateral,
+            'total': mirror.total,
+            'success': True
+        }
+
     try:
         market = LighterMarketData(
             client.get_order_api(),
@@ -65,7 +79,7 @@ async def get_lighter_balance(client: LighterClient, account_index: int) -> Dict
         }
 
 
-async def get_aster_balance(client: AsterClient) -> Dict:
+async def get_aster_balance(client: "AsterClient") -> Dict:
     """
     Lấy balance từ Aster
     
@@ -79,6 +93,8 @@ async def get_aster_balance(client: AsterClient) -> Dict:
             'error': str (nếu có)
         }
     """
+    from perpsdex.aster.core.market import MarketData as AsterMarketData
+
     try:
         market = AsterMarketData(client)
         result = await market.get_balance(asset='USDT')
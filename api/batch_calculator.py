@@ -0,0 +1,407 @@
+"""
+BatchCalculator - Tính size / TP / SL / R:R cho hàng trăm bracket trong 1 lần (NumPy)
+
+Cùng công thức với Calculator (calculate_position_size, calculate_sl_from_percent,
+calculate_tp_sl_from_rr_ratio, validate_sl_price, scale_to_int) nhưng chạy trên mảng,
+và áp precision của từng sàn từ MarketRegistry:
+
+    - Lighter: size_decimals / price_decimals / min_base_amount
+    - Aster: step_size / tick_size / min_qty / min_notional
+      (registry chưa có filter -> heuristic precision giống OrderExecutor.place_market_order)
+"""
+
+import math
+from decimal import Decimal
+from typing import Dict, List, Optional
+
+import numpy as np
+
+from perpsdex.lighter.utils.market_registry import get_market_registry as get_lighter_registry
+from perpsdex.aster.utils.market_registry import get_market_registry as get_aster_registry
+
+
+# Aster fallback khi registry chưa có tick_size: giữ 5 chữ số có nghĩa cho giá
+ASTER_FALLBACK_PRICE_DIGITS = 5
+
+
+def _decimals_of(step: float) -> int:
+    """0.001 -> 3, 0.5 -> 1, 10 -> 0"""
+    exponent = Decimal(str(step)).normalize().as_tuple().exponent
+    return max(0, -exponent)
+
+
+class BatchCalculator:
+    """
+    Vectorized calculator cho batch bracket
+
+    Tất cả methods là static - input là list/array cùng độ dài N, output là dict các np.ndarray
+    """
+
+    @staticmethod
+    def broadcast(columns: Dict[str, object]) -> Dict[str, list]:
+        """
+        Broadcast các cột về cùng độ dài N (giá trị đơn -> lặp lại N lần)
+
+        Input:
+            - columns: {'symbol': ['BTC', 'ETH'], 'side': 'long', ...}
+
+        Output:
+            dict: {'symbol': ['BTC', 'ETH'], 'side': ['long', 'long'], ...}
+
+        Raises:
+            ValueError: Nếu các mảng có độ dài khác nhau
+        """
+        lengths = {len(v) for v in columns.values() if isinstance(v, list)}
+        if len(lengths) > 1:
+            raise ValueError(f"Các mảng input phải cùng độ dài, nhận được: {sorted(lengths)}")
+        n = lengths.pop() if lengths else 1
+
+        return {
+            key: value if isinstance(value, list) else [value] * n
+            for key, value in columns.items()
+        }
+
+    @staticmethod
+    def _lighter_precision(symbol: str) -> Optional[dict]:
+        registry = get_lighter_registry()
+        market = registry.get(symbol)
+        if market is None:
+            return None
+
+        precision = registry.get_precision(market['market_id'])
+        if precision is None:
+            return {'symbol': market['symbol'], 'market': market['market_id'], 'missing': True}
+
+        return {
+            'symbol': market['symbol'],
+            'market': market['market_id'],
+            'size_step': 10.0 ** -precision['size_decimals'],
+            'price_step': 10.0 ** -precision['price_decimals'],
+            'min_size': precision['min_base_amount'],
+            'min_notional': 0.0,
+        }
+
+    @staticmethod
+    def _aster_precision(symbol: str) -> Optional[dict]:
+        registry = get_aster_registry()
+        market = registry.get(symbol)
+        if market is None:
+            if len(registry) > 0:
+                return None
+            # Registry rỗng: giữ quy ước <BASE>USDT giống normalize_symbol
+            base = symbol.strip().upper().split('-')[0]
+            market = {'symbol': base, 'symbol_api': f"{base}USDT"}
+
+        step_size = market.get('step_size')
+        tick_size = market.get('tick_size')
+        return {
+            'symbol': market['symbol'],
+            'market': market['symbol_api'],
+            'size_step': step_size or np.nan,
+            'price_step': tick_size or np.nan,
+            'min_size': market.get('min_qty') or 0.0,
+            'min_notional': market.get('min_notional') or 0.0,
+        }
+
+    @staticmethod
+    def resolve_precision(exchanges: List[str], symbols: List[str]) -> dict:
+        """
+        Lookup precision cho từng dòng (mỗi cặp (exchange, symbol) chỉ lookup 1 lần)
+
+        Output:
+            dict: {
+                'symbol': list, 'market': list (market_id / symbol_api), 'error': list,
+                'size_step', 'price_step', 'min_size', 'min_notional': np.ndarray
+            }
+            step = NaN nghĩa là chưa có precision (Aster dùng heuristic trong calculate)
+        """
+        cache: Dict[tuple, Optional[dict]] = {}
+        n = len(symbols)
+        out = {
+            'symbol': [None] * n,
+            'market': [None] * n,
+            'error': [None] * n,
+            'size_step': np.full(n, np.nan),
+            'price_step': np.full(n, np.nan),
+            'min_size': np.zeros(n),
+            'min_notional': np.zeros(n),
+        }
+
+        for i, (exchange, symbol) in enumerate(zip(exchanges, symbols)):
+            key = (exchange, symbol.strip().upper())
+            if key not in cache:
+                if exchange == 'lighter':
+                    cache[key] = BatchCalculator._lighter_precision(symbol)
+                else:
+                    cache[key] = BatchCalculator._aster_precision(symbol)
+
+            info = cache[key]
+            if info is None:
+                out['error'][i] = f"Symbol {symbol} không được hỗ trợ trên {exchange}"
+                continue
+            out['symbol'][i] = info['symbol']
+            out['market'][i] = info['market']
+            if info.get('missing'):
+                out['error'][i] = f"Chưa có precision cho {symbol} trên {exchange}"
+                continue
+            out['size_step'][i] = info['size_step']
+            out['price_step'][i] = info['price_step']
+            out['min_size'][i] = info['min_size'] or 0.0
+            out['min_notional'][i] = info['min_notional'] or 0.0
+
+        return out
+
+    @staticmethod
+    def calculate(
+        exchange: List[str],
+        symbol: List[str],
+        side: List[str],
+        entry_price: List[float],
+        size_usd: List[float],
+        leverage: List[float],
+        sl_percent: List[float],
+        rr: List[float],
+        max_sl_percent: float = 5.0
+    ) -> dict:
+        """
+        Tính toàn bộ batch bằng NumPy
+
+        Input (mỗi list dài N):
+            - exchange: 'lighter' | 'aster'
+            - symbol: Base symbol (BTC, ETH, ...)
+            - side: 'long' | 'short'
+            - entry_price, size_usd, leverage
+            - sl_percent: % khoảng cách SL (VD: 3 = 3%)
+            - rr: Reward / risk (VD: 2 = 1:2)
+            - max_sl_percent: SL xa hơn mức này bị kéo về (giống validate_sl_price)
+
+        Output:
+            dict các np.ndarray dài N: position_size, size_int, entry/tp/sl price + int,
+            risk_usd, reward_usd, rr_ratio, sl_adjusted, valid, error, ...
+
+        Example:
+            >>> BatchCalculator.calculate(['lighter'], ['BTC'], ['long'], [65000], [100], [5], [3], [2])
+            {'position_size': array([0.00153]), 'tp_price': array([68900.]), ...}
+        """
+        precision = BatchCalculator.resolve_precision(exchange, symbol)
+
+        entry = np.asarray(entry_price, dtype=float)
+        usd = np.asarray(size_usd, dtype=float)
+        lev = np.asarray(leverage, dtype=float)
+        sl_pct = np.abs(np.asarray(sl_percent, dtype=float))
+        reward_multiple = np.asarray(rr, dtype=float)
+        direction = np.where(np.char.lower(np.asarray(side, dtype=str)) == 'long', 1.0, -1.0)
+        is_aster = np.asarray(exchange, dtype=str) == 'aster'
+
+        valid_entry = np.isfinite(entry) & (entry > 0)
+        safe_entry = np.where(valid_entry, entry, np.nan)
+        raw_size = usd / safe_entry
+
+        # Aster chưa có filter -> heuristic precision theo quantity (giống place_market_order)
+        size_step = precision['size_step'].copy()
+        price_step = precision['price_step'].copy()
+        heuristic_size = np.select(
+            [raw_size < 0.1, raw_size < 10, raw_size < 1000],
+            [1e-3, 1e-2, 1e-1],
+            default=1.0,
+        )
+        heuristic_price = 10.0 ** (
+            np.floor(np.log10(np.where(valid_entry, entry, 1.0))) - (ASTER_FALLBACK_PRICE_DIGITS - 1)
+        )
+        size_step = np.where(is_aster & np.isnan(size_step), heuristic_size, size_step)
+        price_step = np.where(is_aster & np.isnan(price_step), heuristic_price, price_step)
+
+        # Position size: floor theo step để không vượt size_usd
+        size_int = np.floor(raw_size / size_step + 1e-9)
+        position_size = size_int * size_step
+
+        # SL từ %, kéo về max_sl_percent nếu quá xa (validate_sl_price)
+        sl_adjusted = sl_pct > max_sl_percent
+        effective_sl_pct = np.minimum(sl_pct, max_sl_percent)
+        sl_raw = entry * (1 - direction * effective_sl_pct / 100)
+
+        # TP từ R:R (calculate_tp_sl_from_rr_ratio)
+        risk_distance = direction * (entry - sl_raw)
+        tp_raw = entry + direction * risk_distance * reward_multiple
+
+        # Làm tròn giá theo tick
+        entry_price_int = np.rint(entry / price_step)
+        tp_price_int = np.rint(tp_raw / price_step)
+        sl_price_int = np.rint(sl_raw / price_step)
+        entry_rounded = entry_price_int * price_step
+        tp_price = tp_price_int * price_step
+        sl_price = sl_price_int * price_step
+
+        # Risk / reward thực tế sau khi làm tròn
+        risk_usd = np.abs(entry_rounded - sl_price) * position_size
+        reward_usd = np.abs(tp_price - entry_rounded) * position_size
+        with np.errstate(divide='ignore', invalid='ignore'):
+            rr_ratio = np.where(risk_usd > 0, reward_usd / risk_usd, 0.0)
+
+        # Validate từng dòng
+        errors = list(precision['error'])
+        notional = position_size * entry_rounded
+        checks = [
+            (~valid_entry, "entry_price không hợp lệ"),
+            (~(usd > 0), "size_usd phải > 0"),
+            (~(lev >= 1), "leverage phải >= 1"),
+            (~(reward_multiple > 0), "rr phải > 0"),
+            (position_size <= 0, "position size = 0 sau khi làm tròn theo step"),
+            (position_size < precision['min_size'], "position size < min size của sàn"),
+            (notional < precision['min_notional'], "notional < min notional của sàn"),
+            (direction * (entry_rounded - sl_price) <= 0, "SL trùng entry sau khi làm tròn theo tick"),
+        ]
+        for mask, message in checks:
+            for i in np.flatnonzero(mask):
+                if errors[i] is None:
+                    errors[i] = message
+        valid = np.array([e is None for e in errors], dtype=bool)
+
+        # Decimals để format / scale int (Lighter: từ registry, Aster: từ step)
+        size_decimals = np.array([_decimals_of(s) if np.isfinite(s) else 0 for s in size_step], dtype=int)
+        price_decimals = np.array([_decimals_of(s) if np.isfinite(s) else 0 for s in price_step], dtype=int)
+
+        return {
+            'exchange': list(exchange),
+            'symbol': [s or sym.upper() for s, sym in zip(precision['symbol'], symbol)],
+            'market': precision['market'],
+            'side': [s.lower() for s in side],
+            'entry_price': entry_rounded,
+            'entry_price_int': entry_price_int,
+            'position_size': position_size,
+            'size_int': size_int,
+            'size_decimals': size_decimals,
+            'price_decimals': price_decimals,
+            'position_size_usd': usd,
+            'position_value_with_leverage': usd * lev,
+            'leverage': lev,
+            'tp_price': tp_price,
+            'tp_price_int': tp_price_int,
+            'sl_price': sl_price,
+            'sl_price_int': sl_price_int,
+            'sl_adjusted': sl_adjusted,
+            'risk_amount': risk_usd,
+            'reward_amount': reward_usd,
+            'rr_ratio': rr_ratio,
+            'valid': valid,
+            'error': errors,
+        }
+
+    @staticmethod
+    def to_columns(result: dict) -> Dict[str, list]:
+        """
+        Chuyển output của calculate() sang list JSON-safe
+
+        - Giá / size làm tròn theo decimals của từng dòng (bỏ nhiễu float)
+        - *_int -> int, NaN -> None, dòng invalid -> None cho các field số
+        """
+        valid = result['valid']
+        size_decimals = result['size_decimals']
+        price_decimals = result['price_decimals']
+
+        def _floats(values, decimals=None):
+            out = []
+            for i, value in enumerate(values):
+                if not valid[i] or not math.isfinite(value):
+                    out.append(None)
+                elif decimals is not None:
+                    out.append(round(float(value), int(decimals[i])))
+                else:
+                    out.append(float(value))
+            return out
+
+        def _ints(values):
+            return [int(v) if valid[i] and math.isfinite(v) else None for i, v in enumerate(values)]
+
+        return {
+            'exchange': result['exchange'],
+            'symbol': result['symbol'],
+            'market': result['market'],
+            'side': result['side'],
+            'entry_price': _floats(result['entry_price'], price_decimals),
+            'entry_price_int': _ints(result['entry_price_int']),
+            'position_size': _floats(result['position_size'], size_decimals),
+            'size_int': _ints(result['size_int']),
+            'size_decimals': size_decimals.tolist(),
+            'price_decimals': price_decimals.tolist(),
+            'position_size_usd': result['position_size_usd'].tolist(),
+            'position_value_with_leverage': result['position_value_with_leverage'].tolist(),
+            'leverage': result['leverage'].tolist(),
+            'tp_price': _floats(result['tp_price'], price_decimals),
+            'tp_price_int': _ints(result['tp_price_int']),
+            'sl_price': _floats(result['sl_price'], price_decimals),
+            'sl_price_int': _ints(result['sl_price_int']),
+            'sl_adjusted': result['sl_adjusted'].tolist(),
+            'risk_amount': _floats(np.round(result['risk_amount'], 6)),
+            'reward_amount': _floats(np.round(result['reward_amount'], 6)),
+            'rr_ratio': _floats(np.round(result['rr_ratio'], 4)),
+            'valid': valid.tolist(),
+            'error': result['error'],
+        }
+
+
+async def fetch_quotes(exchange: str, symbols: List[str]) -> Dict[str, dict]:
+    """
+    Lấy bid/ask cho các symbol (mỗi symbol 1 request, chạy song song)
+
+    Dùng client public (không cần keys) giống refresh_market_registries.
+
+    Output:
+        dict: {symbol: {'success', 'bid', 'ask', 'mid'}}
+    """
+    import asyncio
+    from api.startup import ensure_stack_loaded
+    from api.shared_quotes import read_shared_quote
+
+    # Multi-worker: quote từ shared memory, chỉ gọi exchange cho symbol không có / đã cũ
+    shared = {s: read_shared_quote(exchange, s.strip().upper().split('-')[0]) for s in symbols}
+    symbols = [s for s in symbols if shared[s] is None]
+    if not symbols:
+        return shared
+
+    if not await asyncio.to_thread(ensure_stack_loaded, exchange):
+        shared.update({s: {'success': False, 'error': f'{exchange} stack không available'} for s in symbols})
+        return shared
+
+    if exchange == 'lighter':
+        from lighter import ApiClient, Configuration, OrderApi
+        from perpsdex.lighter.core.client import LighterClient
+        from perpsdex.lighter.core.market import MarketData as LighterMarketData
+
+        registry = get_lighter_registry()
+        api_client = ApiClient(configuration=Configuration(host=LighterClient.DEFAULT_URL))
+        try:
+            market = LighterMarketData(OrderApi(api_client), None)
+
+            async def _quote(symbol):
+                market_id = registry.get_market_id(symbol)
+                if market_id is None:
+                    return {'success': False, 'error': f'Symbol {symbol} không được hỗ trợ'}
+                return await market.get_price(market_id, symbol)
+
+            quotes = await asyncio.gather(*(_quote(s) for s in symbols))
+        finally:
+            await api_client.close()
+    else:
+        from perpsdex.aster.core.client import AsterClient
+        from perpsdex.aster.core.market import MarketData as AsterMarketData
+        from api.utils import get_keys_or_env
+
+        keys = get_keys_or_env(None, "aster")
+        client = AsterClient(
+            api_url=keys["api_url"],
+            api_key=keys.get("api_key") or "",
+            secret_key=keys.get("secret_key") or "",
+        )
+        try:
+            registry = get_aster_registry()
+            market = AsterMarketData(client)
+            quotes = await asyncio.gather(*(
+                market.get_price(registry.get_symbol_api(s) or f"{s.strip().upper().split('-')[0]}USDT")
+                for s in symbols
+            ))
+        finally:
+            await client.close()
+
+    shared.update(zip(symbols, quotes))
+    return shared
@@ -0,0 +1,280 @@
+"""
+Circuit breaker + bulkhead theo (sàn, loại endpoint)
+
+Sàn đang lỗi / chậm không được kéo theo sàn còn lại:
+- CircuitBreaker: closed -> open khi tỉ lệ lỗi hoặc tỉ lệ call chậm trong cửa sổ gần nhất vượt
+  ngưỡng; open thì fail fast (503) tới hết cooldown; half-open cho vài call thử, thành công thì
+  closed, lỗi thì open lại.
+- Bulkhead: giới hạn số call đồng thời tới 1 sàn / loại endpoint; hết slot thì chỉ chờ tối đa
+  CIRCUIT_BULKHEAD_MAX_WAIT rồi fail fast -> sàn khoẻ giữ nguyên capacity.
+
+Loại endpoint:
+    - read: positions / balance / open orders
+    - trade: đặt lệnh (/api/order, /api/orders/ladder). Đóng position không đi qua breaker (giảm rủi ro luôn được thử)
+
+Dùng:
+    async with exchange_guard("aster", "read") as call:
+        ...
+        if not result.get("success"):
+            call.fail(result.get("error"))
+
+Lỗi tính cho breaker: exception, call.fail(), HTTPException >= 500 và ExchangeError (sàn / SDK
+reject hoặc timeout, vẫn trả 400 cho client). HTTPException < 500 khác là lỗi input -> không tính.
+
+ENV:
+    - CIRCUIT_BREAKER (default: 1)
+    - CIRCUIT_WINDOW (default: 60 giây)
+    - CIRCUIT_MIN_CALLS (default: 5 call trong cửa sổ mới xét mở)
+    - CIRCUIT_ERROR_RATE (default: 0.5)
+    - CIRCUIT_SLOW_SECONDS (default: 5) / CIRCUIT_SLOW_RATE (default: 0.8)
+    - CIRCUIT_OPEN_SECONDS (default: 30 giây cooldown)
+    - CIRCUIT_HALF_OPEN_CALLS (default: 2 call thử)
+    - CIRCUIT_BULKHEAD_READ (default: 8) / CIRCUIT_BULKHEAD_TRADE (default: 16) call đồng thời
+    - CIRCUIT_BULKHEAD_MAX_WAIT (default: 1 giây)
+"""
+
+import asyncio
+import os
+import time
+from collections import deque
+from contextlib import asynccontextmanager
+from typing import Dict, Optional, Tuple
+
+from fastapi import HTTPException
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+
+
+def circuit_breaker_enabled() -> bool:
+    return os.getenv("CIRCUIT_BREAKER", "1").strip().lower() in ("1", "true", "yes", "on")
+
+
+class CircuitBreaker:
+    """
+    Breaker của 1 (sàn, loại endpoint)
+
+    Methods:
+        - allow(): Có cho call đi không (chuyển open -> half_open khi hết cooldown)
+        - record(ok, latency): Ghi kết quả, tự chuyển trạng thái
+        - to_dict(): Trạng thái + thống kê cửa sổ hiện tại
+    """
+
+    def __init__(self, name: str):
+        self.name = name
+        self.window = float(os.getenv("CIRCUIT_WINDOW", 60))
+        self.min_calls = int(os.getenv("CIRCUIT_MIN_CALLS", 5))
+        self.error_rate = float(os.getenv("CIRCUIT_ERROR_RATE", 0.5))
+        self.slow_seconds = float(os.getenv("CIRCUIT_SLOW_SECONDS", 5))
+        self.slow_rate = float(os.getenv("CIRCUIT_SLOW_RATE", 0.8))
+        self.open_seconds = float(os.getenv("CIRCUIT_OPEN_SECONDS", 30))
+        self.half_open_calls = int(os.getenv("CIRCUIT_HALF_OPEN_CALLS", 2))
+
+        self.state = CLOSED
+        self.opened_at: Optional[float] = None
+        self.last_error: Optional[str] = None
+        self.rejected = 0
+        self._calls = deque()  # (timestamp, ok, slow)
+        self._probes_in_flight = 0
+        self._probe_successes = 0
+
+    def _trim(self, now: float):
+        while self._calls and now - self._calls[0][0] > self.window:
+            self._calls.popleft()
+
+    def _open(self, now: float):
+        self.state = OPEN
+        self.opened_at = now
+        self._probes_in_flight = 0
+        self._probe_successes = 0
+        print(f"🔌 [Circuit] {self.name} OPEN ({self.last_error})")
+
+    def retry_after(self) -> float:
+        if self.state != OPEN or self.opened_at is None:
+            return 0.0
+        return max(0.0, self.opened_at + self.open_seconds - time.monotonic())
+
+    def allow(self) -> bool:
+        now = time.monotonic()
+        if self.state == OPEN:
+            if now - self.opened_at < self.open_seconds:
+                self.rejected += 1
+                return False
+            self.state = HALF_OPEN
+            self._probes_in_flight = 0
+            self._probe_successes = 0
+        if self.state == HALF_OPEN:
+            if self._probes_in_flight >= self.half_open_calls:
+                self.rejected += 1
+                return False
+            self._probes_in_flight += 1
+        return True
+
+    def release_probe(self):
+        """Call half-open không tới được sàn (bulkhead đầy / bị huỷ) -> trả lại lượt thử"""
+        if self.state == HALF_OPEN:
+            self._probes_in_flight = max(0, self._probes_in_flight - 1)
+
+    def record(self, ok: bool, latency: float, error: Optional[str] = None):
+        now = time.monotonic()
+        slow = latency > self.slow_seconds
+        if not ok:
+            self.last_error = error
+        elif slow:
+            self.last_error = f"chậm {latency:.1f}s"
+
+        if self.state == HALF_OPEN:
+            self._probes_in_flight = max(0, self._probes_in_flight - 1)
+            if not ok or slow:
+                self._open(now)
+                return
+            self._probe_successes += 1
+            if self._probe_successes >= self.half_open_calls:
+                self.state = CLOSED
+                self._calls.clear()
+                print(f"✅ [Circuit] {self.name} CLOSED")
+            return
+
+        self._calls.append((now, ok, slow))
+        self._trim(now)
+        total = len(self._calls)
+        if self.state == CLOSED and total >= self.min_calls:
+            errors = sum(1 for _, call_ok, _ in self._calls if not call_ok)
+            slows = sum(1 for _, _, call_slow in self._calls if call_slow)
+            if errors / total >= self.error_rate or slows / total >= self.slow_rate:
+                self._open(now)
+
+    def to_dict(self) -> dict:
+        self._trim(time.monotonic())
+        total = len(self._calls)
+        return {
+            "state": self.state,
+            "calls": total,
+            "error_rate": round(sum(1 for _, ok, _ in self._calls if not ok) / total, 3) if total else 0.0,
+            "slow_rate": round(sum(1 for _, _, slow in self._calls if slow) / total, 3) if total else 0.0,
+            "retry_after": round(self.retry_after(), 1),
+            "rejected": self.rejected,
+            "last_error": self.last_error,
+        }
+
+
+class Bulkhead:
+    """Giới hạn call đồng thời; chờ slot tối đa max_wait giây"""
+
+    def __init__(self, limit: int, max_wait: float):
+        self.limit = limit
+        self.max_wait = max_wait
+        self.active = 0
+        self.rejected = 0
+        self._semaphore = asyncio.Semaphore(limit)
+
+    async def acquire(self) -> bool:
+        try:
+            await asyncio.wait_for(self._semaphore.acquire(), timeout=self.max_wait)
+        except asyncio.TimeoutError:
+            self.rejected += 1
+            return False
+        self.active += 1
+        return True
+
+    def release(self):
+        self.active -= 1
+        self._semaphore.release()
+
+    def to_dict(self) -> dict:
+        return {"limit": self.limit, "active": self.active, "rejected": self.rejected}
+
+
+class ExchangeError(HTTPException):
+    """Sàn / SDK từ chối lệnh hoặc lỗi (trả 400 như cũ) - khác lỗi input, breaker tính là lỗi"""
+
+    def __init__(self, detail, status_code: int = 400):
+        super().__init__(status_code=status_code, detail=detail)
+
+
+class GuardedCall:
+    """Handle trong exchange_guard: call.fail() khi sàn trả lỗi mà không raise"""
+
+    def __init__(self):
+        self.error: Optional[str] = None
+
+    def fail(self, error=None):
+        self.error = str(error) if error is not None else "failed"
+
+
+_breakers: Dict[Tuple[str, str], CircuitBreaker] = {}
+_bulkheads: Dict[Tuple[str, str], Bulkhead] = {}
+
+
+def get_breaker(exchange: str, endpoint_class: str) -> CircuitBreaker:
+    key = (exchange, endpoint_class)
+    breaker = _breakers.get(key)
+    if breaker is None:
+        breaker = _breakers[key] = CircuitBreaker(f"{exchange}/{endpoint_class}")
+    return breaker
+
+
+def get_bulkhead(exchange: str, endpoint_class: str) -> Bulkhead:
+    key = (exchange, endpoint_class)
+    bulkhead = _bulkheads.get(key)
+    if bulkhead is None:
+        limit = int(os.getenv(f"CIRCUIT_BULKHEAD_{endpoint_class.upper()}", 8 if endpoint_class == "read" else 16))
+        bulkhead = _bulkheads[key] = Bulkhead(limit, float(os.getenv("CIRCUIT_BULKHEAD_MAX_WAIT", 1.0)))
+    return bulkhead
+
+
+@asynccontextmanager
+async def exchange_guard(exchange: str, endpoint_class: str):
+    """
+    Bọc 1 lượt gọi sàn: breaker open / bulkhead đầy -> HTTPException 503 ngay.
+
+    Lỗi tính cho breaker: exception (trừ HTTPException < 500 - lỗi input, ExchangeError vẫn tính)
+    hoặc call.fail().
+    """
+    call = GuardedCall()
+    if not circuit_breaker_enabled():
+        yield call
+        return
+
+    breaker = get_breaker(exchange, endpoint_class)
+    if not breaker.allow():
+        raise HTTPException(
+            status_code=503,
+            detail=f"{exchange} đang lỗi ({breaker.last_error}), circuit open - thử lại sau {breaker.retry_after():.0f}s",
+        )
+
+    bulkhead = get_bulkhead(exchange, endpoint_class)
+    if not await bulkhead.acquire():
+        # Không gọi sàn -> không tính là lỗi của sàn
+        breaker.release_probe()
+        raise HTTPException(
+            status_code=503,
+            detail=f"{exchange}: quá {bulkhead.limit} request {endpoint_class} đồng thời, thử lại sau",
+        )
+
+    started = time.monotonic()
+    try:
+        yield call
+    except asyncio.CancelledError:
+        breaker.release_probe()
+        raise
+    except HTTPException as e:
+        ok = e.status_code < 500 and not isinstance(e, ExchangeError)
+        breaker.record(ok, time.monotonic() - started, str(e.detail))
+        raise
+    except Exception as e:
+        breaker.record(False, time.monotonic() - started, str(e))
+        raise
+    else:
+        breaker.record(call.error is None, time.monotonic() - started, call.error)
+    finally:
+        bulkhead.release()
+
+
+def circuit_status() -> Dict[str, dict]:
+    """{'lighter/read': {...breaker, 'bulkhead': {...}}, ...} cho /api/status"""
+    return {
+        breaker.name: dict(breaker.to_dict(), bulkhead=_bulkheads[key].to_dict() if key in _bulkheads else None)
+        for key, breaker in _breakers.items()
+    }
@@ -0,0 +1,571 @@
+"""
+ExecutionScheduler - TWAP / slice execution cho lệnh market lớn
+
+Thay vì gửi cả size_usd trong 1 lệnh (walk book), parent order được chia thành nhiều child order:
+    - mode "time":  chia đều size_usd thành N slice, mỗi slice cách nhau interval giây
+    - mode "depth": mỗi lần chỉ lấy 1 phần (depth_fraction) của depth đang hiển thị
+                    trong band max_slippage_percent quanh best price, lặp tới khi đủ size
+
+Mọi parent chạy chung 1 event loop (1 asyncio.Task / parent). Fill + VWAP được track in-memory,
+kết quả cuối được ghi lại vào bảng orders (nếu DB available).
+
+Các parent cùng account dùng chung 1 client từ ClientPool (api/accounts.py) - cũng là client của
+handler đặt lệnh / đóng lệnh / ladder -> Lighter: chung nonce manager, child được gửi tuần tự.
+"""
+
+import asyncio
+import time
+from typing import Dict, List, Optional
+
+from api.startup import get_db
+from perpsdex.common.deadline import clear_deadline
+from api.accounts import get_pooled_client
+
+TERMINAL_STATUSES = ("completed", "cancelled", "expired", "failed")
+
+DEFAULT_TIME_SLICES = 10
+DEFAULT_SLICE_SLIPPAGE_PERCENT = 0.5
+BOOK_DEPTH_LEVELS = 20
+MAX_CONSECUTIVE_FAILURES = 3
+HISTORY_LIMIT = 200
+
+
+def _book_levels(book: dict, is_buy: bool) -> list:
+    """Side bị khớp: BUY ăn asks, SELL ăn bids"""
+    return book["asks"] if is_buy else book["bids"]
+
+
+def _visible_usd(levels: list, limit_price: float, is_buy: bool) -> float:
+    """Tổng notional (USD) của các level nằm trong limit_price"""
+    total = 0.0
+    for price, size in levels:
+        if (is_buy and price > limit_price) or (not is_buy and price < limit_price):
+            break
+        total += price * size
+    return total
+
+
+def _estimate_fill(levels: list, size: float, limit_price: float, is_buy: bool) -> Optional[float]:
+    """
+    Ước lượng giá khớp trung bình khi ăn `size` base token qua book (dừng tại limit_price)
+
+    Output:
+        float | None: VWAP ước lượng (None nếu book rỗng)
+    """
+    remaining = size
+    notional = 0.0
+    for price, level_size in levels:
+        if remaining <= 0:
+            break
+        if (is_buy and price > limit_price) or (not is_buy and price < limit_price):
+            break
+        take = min(remaining, level_size)
+        notional += take * price
+        remaining -= take
+
+    filled = size - remaining
+    if filled <= 0:
+        return None
+    # Phần chưa thấy trên book coi như khớp tại limit_price (worst case)
+    return (notional + remaining * limit_price) / size
+
+
+class _LighterVenue:
+    """Adapter Lighter: order book + child order qua OrderExecutor.place_order"""
+
+    exchange = "lighter"
+
+    def __init__(self, client):
+        from perpsdex.lighter.core.market import MarketData as LighterMarketData
+        from perpsdex.lighter.core.order import OrderExecutor as LighterOrderExecutor
+
+        self.client = client
+        self.market = LighterMarketData(client.get_order_api(), client.get_account_api())
+        self.executor = LighterOrderExecutor(client.get_signer_client(), client.get_order_api())
+        # 1 SignerClient / account -> child phải gửi tuần tự để nonce không bị lệch
+        self.submit_lock = asyncio.Lock()
+
+    async def get_book(self, norm: dict) -> dict:
+        # Snapshot cũng cập nhật DepthBook -> place_order tính limit sát worst price, không gọi REST thêm
+        result = await self.market.get_order_book(norm["market_id"], limit=BOOK_DEPTH_LEVELS)
+        if not result.get("success"):
+            return {"bids": [], "asks": []}
+        return {"bids": result["bids"], "asks": result["asks"]}
+
+    async def place_child(self, norm: dict, side: str, size_usd: float, ref_price: float,
+                          leverage: float, max_slippage_percent: float, margin_mode: Optional[str] = None) -> dict:
+        async with self.submit_lock:
+            result = await self.executor.place_order(
+                side=side,
+                entry_price=ref_price,
+                position_size_usd=size_usd,
+                market_id=norm["market_id"],
+                symbol=norm["base_symbol"],
+                leverage=leverage,
+                max_slippage_percent=max_slippage_percent,
+                margin_mode=margin_mode,
+            )
+        if not result.get("success"):
+            return result
+        # Lighter không trả giá khớp -> scheduler dùng giá ước lượng từ book
+        return {
+            "success": True,
+            "order_id": result.get("order_id"),
+            "tx_hash": result.get("tx_hash"),
+            "size": float(result.get("position_size") or 0),
+            "price": None,
+        }
+
+
+
+class _AsterVenue:
+    """Adapter Aster: /fapi/v1/depth + MARKET child order"""
+
+    exchange = "aster"
+
+    def __init__(self, client):
+        from perpsdex.aster.core.market import MarketData as AsterMarketData
+        from perpsdex.aster.core.order import OrderExecutor as AsterOrderExecutor
+
+        self.client = client
+        self.market = AsterMarketData(client)
+        self.executor = AsterOrderExecutor(client)
+
+    async def get_book(self, norm: dict) -> dict:
+        result = await self.market.get_order_book(norm["symbol_pair"], limit=BOOK_DEPTH_LEVELS)
+        if not result.get("success"):
+            return {"bids": [], "asks": []}
+        return {"bids": result["bids"], "asks": result["asks"]}
+
+    async def place_child(self, norm: dict, side: str, size_usd: float, ref_price: float,
+                          leverage: float, max_slippage_percent: float, margin_mode: Optional[str] = None) -> dict:
+        result = await self.executor.place_market_order(
+            symbol=norm["symbol_api"],
+            side="BUY" if side == "long" else "SELL",
+            size=size_usd,
+            leverage=leverage,
+            margin_mode=margin_mode,
+        )
+        if not result.get("success"):
+            return result
+        filled_price = float(result.get("filled_price") or 0)
+        return {
+            "success": True,
+            "order_id": result.get("order_id"),
+            "size": float(result.get("filled_size") or 0),
+            # avgPrice = 0 khi response chỉ là ACK -> để scheduler dùng giá ước lượng
+            "price": filled_price if filled_price > 0 else None,
+        }
+
+
+
+class ParentOrder:
+    """
+    1 parent order TWAP / depth-slice và trạng thái fill in-memory
+
+    Status: pending -> running -> completed | cancelled | expired | failed
+    """
+
+    def __init__(
+        self,
+        parent_id: str,
+        exchange: str,
+        norm: dict,
+        side: str,
+        size_usd: float,
+        leverage: float,
+        margin_mode: Optional[str] = None,
+        mode: str = "time",
+        slices: Optional[int] = None,
+        interval_seconds: float = 30.0,
+        depth_fraction: float = 0.5,
+        max_slippage_percent: Optional[float] = None,
+        min_slice_usd: float = 10.0,
+        max_duration_seconds: Optional[float] = None,
+        client_order_id: Optional[str] = None,
+        tag: Optional[str] = None,
+        db_order_id: Optional[int] = None,
+    ):
+        self.parent_id = parent_id
+        self.exchange = exchange
+        self.norm = norm
+        self.symbol = norm["base_symbol"]
+        self.side = side
+        self.size_usd = size_usd
+        self.leverage = leverage
+        self.margin_mode = margin_mode
+        self.mode = mode
+        self.slices = slices or (DEFAULT_TIME_SLICES if mode == "time" else None)
+        self.interval_seconds = interval_seconds
+        self.depth_fraction = depth_fraction
+        self.max_slippage_percent = (
+            max_slippage_percent if max_slippage_percent is not None else DEFAULT_SLICE_SLIPPAGE_PERCENT
+        )
+        self.min_slice_usd = min_slice_usd
+        self.max_duration_seconds = max_duration_seconds
+        self.client_order_id = client_order_id
+        self.tag = tag
+        self.db_order_id = db_order_id
+        self.risk_reservation = None
+
+        self.status = "pending"
+        self.error: Optional[str] = None
+        self.created_at = time.time()
+        self.started_at: Optional[float] = None
+        self.finished_at: Optional[float] = None
+        self.arrival_price: Optional[float] = None
+
+        self.children: List[dict] = []
+        self.filled_size = 0.0
+        self.filled_usd = 0.0
+        self.cancel_event = asyncio.Event()
+
+    @property
+    def is_buy(self) -> bool:
+        return self.side == "long"
+
+    @property
+    def remaining_usd(self) -> float:
+        return max(self.size_usd - self.filled_usd, 0.0)
+
+    @property
+    def vwap(self) -> Optional[float]:
+        return self.filled_usd / self.filled_size if self.filled_size > 0 else None
+
+    @property
+    def is_done(self) -> bool:
+        return self.status in TERMINAL_STATUSES
+
+    def record_fill(self, child: dict):
+        """Cộng fill của 1 child vào tổng (size, notional)"""
+        self.children.append(child)
+        if child["status"] == "filled":
+            self.filled_size += child["size"]
+            self.filled_usd += child["size"] * child["price"]
+
+    def to_dict(self, include_children: bool = True) -> dict:
+        vwap = self.vwap
+        slippage_bps = None
+        if vwap is not None and self.arrival_price:
+            direction = 1 if self.is_buy else -1
+            slippage_bps = round((vwap - self.arrival_price) / self.arrival_price * 10000 * direction, 2)
+
+        data = {
+            "parent_id": self.parent_id,
+            "exchange": self.exchange,
+            "symbol": self.symbol,
+            "side": self.side,
+            "status": self.status,
+            "mode": self.mode,
+            "size_usd": self.size_usd,
+            "leverage": self.leverage,
+            "slices": self.slices,
+            "interval_seconds": self.interval_seconds,
+            "depth_fraction": self.depth_fraction if self.mode == "depth" else None,
+            "max_slippage_percent": self.max_slippage_percent,
+            "filled_size": self.filled_size,
+            "filled_usd": round(self.filled_usd, 6),
+            "remaining_usd": round(self.remaining_usd, 6),
+            "progress_percent": round(min(self.filled_usd / self.size_usd, 1.0) * 100, 2),
+            "vwap": vwap,
+            "arrival_price": self.arrival_price,
+            "slippage_bps": slippage_bps,
+            "child_count": len(self.children),
+            "client_order_id": self.client_order_id,
+            "tag": self.tag,
+            "db_order_id": self.db_order_id,
+            "created_at": self.created_at,
+            "started_at": self.started_at,
+            "finished_at": self.finished_at,
+            "error": self.error,
+        }
+        if include_children:
+            data["children"] = list(self.children)
+        return data
+
+
+class ExecutionScheduler:
+    """
+    Chạy nhiều ParentOrder đồng thời trên 1 event loop
+
+    Methods:
+        - start(parent, keys): Tạo task cho parent, trả về ngay
+        - get(parent_id) / list(status): Snapshot in-memory
+        - cancel(parent_id): Dừng parent (child đang gửi dở vẫn được ghi nhận)
+        - shutdown(): Cancel mọi parent đang chạy (lifespan shutdown)
+    """
+
+    def __init__(self, history_limit: int = HISTORY_LIMIT):
+        self.history_limit = history_limit
+        self._parents: Dict[str, ParentOrder] = {}
+        self._tasks: Dict[str, asyncio.Task] = {}
+        self._venues: Dict[tuple, dict] = {}  # account key -> {'venue', 'refs'}
+        self._venues_lock = asyncio.Lock()
+
+    # ------------------------------------------------------------------ venues
+
+    @staticmethod
+    def _account_key(exchange: str, keys: dict) -> tuple:
+        if exchange == "lighter":
+            return ("lighter", keys.get("account_index"), keys.get("api_key_index"))
+        return ("aster", keys.get("api_key"), keys.get("api_url"))
+
+    async def _acquire_venue(self, exchange: str, keys: dict):
+        key = self._account_key(exchange, keys)
+        async with self._venues_lock:
+            entry = self._venues.get(key)
+            if entry is None:
+                if exchange == "lighter":
+                    venue = _LighterVenue(await get_pooled_client("lighter", keys))
+                else:
+                    venue = _AsterVenue(await get_pooled_client("aster", keys))
+                entry = self._venues[key] = {"venue": venue, "refs": 0}
+            entry["refs"] += 1
+            return key, entry["venue"]
+
+    async def _release_venue(self, key: tuple):
+        async with self._venues_lock:
+            entry = self._venues.get(key)
+            if entry is None:
+                return
+            entry["refs"] -= 1
+            if entry["refs"] <= 0:
+                # Client thuộc ClientPool -> không close ở đây
+                del self._venues[key]
+
+    # ------------------------------------------------------------------ public API
+
+    def start(self, parent: ParentOrder, keys: dict) -> dict:
+        """Đăng ký parent và chạy nền, trả về snapshot ban đầu"""
+        self._prune_history()
+        self._parents[parent.parent_id] = parent
+        task = asyncio.create_task(self._run(parent, keys), name=f"twap-{parent.parent_id}")
+        self._tasks[parent.parent_id] = task
+        task.add_done_callback(lambda _t, pid=parent.parent_id: self._tasks.pop(pid, None))
+        return parent.to_dict(include_children=False)
+
+    def get(self, parent_id: str) -> Optional[ParentOrder]:
+        return self._parents.get(parent_id)
+
+    def list(self, status: Optional[str] = None) -> List[dict]:
+        parents = sorted(self._parents.values(), key=lambda p: p.created_at, reverse=True)
+        if status == "active":
+            parents = [p for p in parents if not p.is_done]
+        elif status:
+            parents = [p for p in parents if p.status == status]
+        return [p.to_dict(include_children=False) for p in parents]
+
+    async def cancel(self, parent_id: str, timeout: float = 10.0) -> Optional[dict]:
+        """
+        Dừng parent: không gửi thêm child. Chờ child đang in-flight xong (tối đa timeout giây).
+
+        Output:
+            dict snapshot | None nếu không tìm thấy parent_id
+        """
+        parent = self._parents.get(parent_id)
+        if parent is None:
+            return None
+        if not parent.is_done:
+            parent.cancel_event.set()
+            task = self._tasks.get(parent_id)
+            if task is not None:
+                await asyncio.wait({task}, timeout=timeout)
+        return parent.to_dict()
+
+    async def shutdown(self):
+        """Cancel mọi parent còn chạy (gọi trong lifespan shutdown)"""
+        for parent in self._parents.values():
+            if not parent.is_done:
+                parent.cancel_event.set()
+        tasks = list(self._tasks.values())
+        if tasks:
+            print(f"🛑 [TWAP] Dừng {len(tasks)} parent order đang chạy...")
+            await asyncio.wait(tasks, timeout=15)
+
+    def _prune_history(self):
+        finished = [p for p in self._parents.values() if p.is_done]
+        overflow = len(self._parents) - self.history_limit + 1
+        if overflow <= 0:
+            return
+        for parent in sorted(finished, key=lambda p: p.finished_at or 0)[:overflow]:
+            del self._parents[parent.parent_id]
+
+    # ------------------------------------------------------------------ execution
+
+    def _plan_child_usd(self, parent: ParentOrder, visible_usd: float) -> float:
+        """Size (USD) của child kế tiếp; 0 = chờ tick sau"""
+        remaining = parent.remaining_usd
+
+        if parent.mode == "time":
+            placed = sum(1 for c in parent.children if c["status"] == "filled")
+            return remaining / max(parent.slices - placed, 1)
+
+        child_usd = min(remaining, visible_usd * parent.depth_fraction)
+        # Phần còn lại quá nhỏ -> gộp vào child này nếu book đủ depth
+        if remaining - child_usd < parent.min_slice_usd and remaining <= visible_usd:
+            child_usd = remaining
+        # Book quá mỏng -> chờ depth refill
+        if child_usd < parent.min_slice_usd and child_usd < remaining:
+            return 0.0
+        return child_usd
+
+    async def _sleep_or_cancel(self, parent: ParentOrder, seconds: float) -> bool:
+        """Chờ interval; return True nếu bị cancel trong lúc chờ"""
+        try:
+            await asyncio.wait_for(parent.cancel_event.wait(), timeout=seconds)
+            return True
+        except asyncio.TimeoutError:
+            return False
+
+    async def _run_child(self, parent: ParentOrder, venue) -> Optional[dict]:
+        """Lấy book, tính size và gửi 1 child. Return None nếu tick này không gửi gì."""
+        book = await venue.get_book(parent.norm)
+        levels = _book_levels(book, parent.is_buy)
+        if not levels:
+            raise RuntimeError("order book rỗng")
+
+        ref_price = levels[0][0]
+        if parent.arrival_price is None:
+            parent.arrival_price = ref_price
+
+        slippage_factor = 1 + parent.max_slippage_percent / 100.0
+        limit_price = ref_price * slippage_factor if parent.is_buy else ref_price / slippage_factor
+
+        child_usd = self._plan_child_usd(parent, _visible_usd(levels, limit_price, parent.is_buy))
+        if child_usd <= 0:
+            return None
+
+        index = len(parent.children) + 1
+        print(f"🔹 [TWAP {parent.parent_id}] Child #{index}: ${child_usd:,.2f} @ ~{ref_price}")
+        started = time.time()
+        result = await venue.place_child(
+            parent.norm, parent.side, child_usd, ref_price, parent.leverage, parent.max_slippage_percent,
+            parent.margin_mode,
+        )
+
+        child = {
+            "index": index,
+            "size_usd": round(child_usd, 6),
+            "ref_price": ref_price,
+            "submitted_at": started,
+            "latency_ms": round((time.time() - started) * 1000, 1),
+        }
+        if not result.get("success"):
+            child.update({"status": "failed", "size": 0.0, "price": None, "error": result.get("error")})
+            return child
+
+        size = result["size"]
+        price = result.get("price")
+        estimated = price is None
+        if estimated:
+            price = _estimate_fill(levels, size, limit_price, parent.is_buy) or ref_price
+
+        child.update({
+            "status": "filled" if size > 0 else "failed",
+            "order_id": result.get("order_id"),
+            "tx_hash": result.get("tx_hash"),
+            "size": size,
+            "price": price,
+            "price_estimated": estimated,
+            "error": None if size > 0 else "filled size = 0",
+        })
+        return child
+
+    async def _run(self, parent: ParentOrder, keys: dict):
+        # Task tạo trong request /api/order -> không mang deadline của request đó
+        clear_deadline()
+        parent.status = "running"
+        parent.started_at = time.time()
+        print(
+            f"\n🕒 [TWAP {parent.parent_id}] Start {parent.exchange.upper()} {parent.side.upper()} "
+            f"{parent.symbol} ${parent.size_usd} mode={parent.mode}"
+        )
+
+        venue_key = None
+        failures = 0
+        try:
+            venue_key, venue = await self._acquire_venue(parent.exchange, keys)
+
+            while not parent.cancel_event.is_set():
+                if parent.remaining_usd < parent.min_slice_usd and parent.children:
+                    break
+                if parent.mode == "time" and sum(1 for c in parent.children if c["status"] == "filled") >= parent.slices:
+                    break
+                if parent.max_duration_seconds and time.time() - parent.started_at > parent.max_duration_seconds:
+                    parent.status = "expired"
+                    break
+
+                child = await self._run_child(parent, venue)
+                if child is not None:
+                    parent.record_fill(child)
+                    if child["status"] == "filled":
+                        failures = 0
+                    else:
+                        failures += 1
+                        print(f"⚠️  [TWAP {parent.parent_id}] Child #{child['index']} lỗi: {child['error']}")
+                        if failures >= MAX_CONSECUTIVE_FAILURES:
+                            parent.status = "failed"
+                            parent.error = f"{failures} child liên tiếp thất bại: {child['error']}"
+                            break
+
+                    if parent.remaining_usd < parent.min_slice_usd:
+                        break
+
+                if await self._sleep_or_cancel(parent, parent.interval_seconds):
+                    break
+
+            if parent.cancel_event.is_set():
+                parent.status = "cancelled"
+            elif parent.status == "running":
+                parent.status = "completed"
+
+        except asyncio.CancelledError:
+            parent.status = "cancelled"
+            raise
+        except Exception as e:
+            parent.status = "failed"
+            parent.error = str(e)
+            print(f"❌ [TWAP {parent.parent_id}] {e}")
+        finally:
+            parent.finished_at = time.time()
+            from api.risk import get_risk_engine
+            get_risk_engine().commit(parent.risk_reservation, parent.filled_usd)
+            if venue_key is not None:
+                await self._release_venue(venue_key)
+            print(
+                f"🏁 [TWAP {parent.parent_id}] {parent.status}: filled ${parent.filled_usd:,.2f}"
+                f"/{parent.size_usd} in {len(parent.children)} child, VWAP={parent.vwap}"
+            )
+            await asyncio.to_thread(_journal_parent_result, parent)
+
+
+def _journal_parent_result(parent: ParentOrder):
+    """Cập nhật kết quả cuối của parent vào bảng orders"""
+    if parent.db_order_id is None:
+        return
+    db = get_db()
+    if db is None:
+        return
+    try:
+        db.update_order_after_result(
+            db_order_id=parent.db_order_id,
+            status=parent.status,
+            exchange_order_id=parent.parent_id,
+            entry_price_requested=parent.arrival_price,
+            entry_price_filled=parent.vwap,
+            position_size_asset=parent.filled_size,
+            raw_response=parent.to_dict(),
+        )
+    except Exception as e:
+        print(f"[DB] Warning: lỗi khi update TWAP parent {parent.parent_id}: {e}")
+
+
+_scheduler: Optional[ExecutionScheduler] = None
+
+
+def get_execution_scheduler() -> ExecutionScheduler:
+    """Lấy scheduler singleton"""
+    global _scheduler
+    if _scheduler is None:
+        _scheduler = ExecutionScheduler()
+    return _scheduler
@@ -0,0 +1,374 @@
+"""
+FillDispatcher - Chờ lệnh khớp thật (wait_for_fill) qua 1 nguồn event chung
+
+- /api/order với wait_for_fill=true: sau khi lệnh vào sàn, request chờ 1 future theo
+  (sàn, account, order key) thay vì trả về ngay với giá requested.
+    - Lighter: order key = client_order_index (order_id trả về từ place_order)
+    - Aster: order key = orderId
+- Event đến từ publish(): account stream (WS) hoặc poller chung. Poller chạy 1 task cho
+  mỗi (sàn, account) và CHỈ khi đang có lệnh chờ, mọi request chờ dùng chung 1 lượt gọi sàn:
+    - Lighter: account_inactive_orders (mới nhất) + account_active_orders, 2 request / vòng
+    - Aster: allOrders theo từng symbol đang chờ (orderId >= orderId nhỏ nhất đang chờ)
+- Account đã có stream live (register_stream) -> poller nghỉ, chỉ chờ event từ stream.
+- Fill đến trước khi request kịp đăng ký chờ được giữ lại FILL_RECENT_TTL giây.
+- Hết timeout: trả trạng thái mới nhất đã thấy (timed_out=true), lệnh vẫn nằm trên sàn.
+
+Fill (dict): status (filled | partially_filled | cancelled | rejected | open), filled_size (coin),
+avg_price, filled_usd, exchange_order_id, final (bool), source (poll | stream), received_at.
+
+ENV:
+    - FILL_POLL_INTERVAL (default: 0.5 giây)
+    - WAIT_FOR_FILL_TIMEOUT (default: 10 giây, max timeout 1 request được chờ: 60 giây)
+    - FILL_RECENT_TTL (default: 60 giây)
+"""
+
+import asyncio
+import os
+import time
+from collections import OrderedDict
+from typing import Callable, Dict, List, Optional, Tuple
+
+from api.open_orders import AUTH_TOKEN_TTL_SECONDS
+from perpsdex.common.deadline import clear_deadline
+
+MAX_WAIT_SECONDS = 60.0
+RECENT_MAX = 2000
+LIGHTER_INACTIVE_LIMIT = 50
+
+
+def _float(value) -> Optional[float]:
+    try:
+        return float(value) if value is not None and value != "" else None
+    except (TypeError, ValueError):
+        return None
+
+
+def _fill(status: str, filled_size, filled_usd, avg_price=None, exchange_order_id=None) -> dict:
+    """Chuẩn hoá trạng thái lệnh của 2 sàn về cùng 1 dạng"""
+    status = (status or "open").lower()
+    filled_size = _float(filled_size) or 0.0
+    filled_usd = _float(filled_usd) or 0.0
+    avg_price = _float(avg_price) or (filled_usd / filled_size if filled_size and filled_usd else None)
+    if not filled_usd and avg_price and filled_size:
+        filled_usd = avg_price * filled_size
+
+    if status.startswith("filled"):
+        normalized = "filled"
+    elif status.startswith(("cancel", "expired")):
+        normalized = "cancelled"
+    elif status.startswith("rejected"):
+        normalized = "rejected"
+    elif filled_size > 0:
+        normalized = "partially_filled"
+    else:
+        normalized = "open"
+    return {
+        "status": normalized,
+        "filled_size": filled_size,
+        "avg_price": avg_price,
+        "filled_usd": filled_usd,
+        "exchange_order_id": str(exchange_order_id) if exchange_order_id is not None else None,
+        "final": normalized in ("filled", "cancelled", "rejected"),
+    }
+
+
+def lighter_fill(order) -> Tuple[Optional[int], dict]:
+    """lighter.models.Order (hoặc dict cùng field) -> (client_order_index, fill)"""
+    get = order.get if isinstance(order, dict) else lambda key, default=None: getattr(order, key, default)
+    client_index = get("client_order_index")
+    if client_index is None or int(client_index) == 0:
+        client_index = get("order_index")
+    return (
+        int(client_index) if client_index is not None else None,
+        _fill(get("status"), get("filled_base_amount"), get("filled_quote_amount"),
+              exchange_order_id=get("order_index")),
+    )
+
+
+def aster_fill(order: dict) -> Tuple[Optional[int], dict]:
+    """Order Aster (GET /fapi/v1/order, allOrders) -> (orderId, fill)"""
+    order_id = order.get("orderId")
+    return (
+        int(order_id) if order_id is not None else None,
+        _fill(order.get("status"), order.get("executedQty"), order.get("cumQuote"),
+              avg_price=order.get("avgPrice"), exchange_order_id=order_id),
+    )
+
+
+class _Source:
+    """1 account trên 1 sàn: lệnh đang chờ + poller + client dùng lại"""
+
+    def __init__(self, exchange: str, account: str, keys: dict):
+        self.exchange = exchange
+        self.account = account
+        self.keys = keys
+        # order key -> symbol (Aster cần symbol để query)
+        self.pending: Dict[int, Optional[str]] = {}
+        self.task: Optional[asyncio.Task] = None
+        self.client = None
+        self.auth: Optional[str] = None
+        self.auth_created_at = 0.0
+        self.polls = 0
+        self.error: Optional[str] = None
+
+    async def close_client(self):
+        if self.client is not None:
+            try:
+                await self.client.close()
+            except Exception:
+                pass
+        self.client = None
+        self.auth = None
+
+
+class FillDispatcher:
+    """
+    Methods:
+        - wait(exchange, order_key, keys, symbol, timeout): Chờ lệnh khớp / kết thúc
+        - publish(exchange, account, order_key, fill, source): Đẩy trạng thái lệnh (stream / poller)
+        - register_stream(exchange, account, is_live): Account stream thay poller khi live
+        - stop(): Dừng mọi poller + đóng client
+        - status(): waiters / pollers / thống kê
+    """
+
+    def __init__(self):
+        self.poll_interval = float(os.getenv("FILL_POLL_INTERVAL", 0.5))
+        self.default_timeout = float(os.getenv("WAIT_FOR_FILL_TIMEOUT", 10.0))
+        self.recent_ttl = float(os.getenv("FILL_RECENT_TTL", 60.0))
+        self._waiters: Dict[Tuple[str, str, int], List[asyncio.Future]] = {}
+        self._latest: Dict[Tuple[str, str, int], dict] = {}
+        self._recent: "OrderedDict[Tuple[str, str, int], dict]" = OrderedDict()
+        self._sources: Dict[Tuple[str, str], _Source] = {}
+        # (sàn, account) -> callable: stream đang live thì poller của account đó nghỉ
+        self._streams: Dict[Tuple[str, str], Callable[[], bool]] = {}
+        self.resolved = 0
+        self.timeouts = 0
+        self.published = 0
+
+    @staticmethod
+    def account_of(exchange: str, keys: dict) -> str:
+        return str(keys.get("account_index", 0)) if exchange == "lighter" else str(keys.get("api_key") or "")
+
+    # ------------------------------------------------------------------ events
+
+    def publish(self, exchange: str, account, order_key, fill: dict, source: str = "stream") -> int:
+        """
+        Trạng thái mới của 1 lệnh. Lệnh đã kết thúc (final) -> resolve mọi request đang chờ.
+
+        Output:
+            int: số request được resolve
+        """
+        key = (exchange, str(account), int(order_key))
+        fill = dict(fill, source=source, received_at=time.time())
+        self.published += 1
+        if not fill.get("final"):
+            if key in self._waiters:
+                self._latest[key] = fill
+            return 0
+
+        self._recent[key] = fill
+        self._recent.move_to_end(key)
+        while len(self._recent) > RECENT_MAX:
+            self._recent.popitem(last=False)
+
+        futures = self._waiters.pop(key, [])
+        self._latest.pop(key, None)
+        source_state = self._sources.get((exchange, str(account)))
+        if source_state is not None:
+            source_state.pending.pop(int(order_key), None)
+        for future in futures:
+            if not future.done():
+                future.set_result(fill)
+        self.resolved += len(futures)
+        return len(futures)
+
+    def register_stream(self, exchange: str, account, is_live: Callable[[], bool]):
+        """Account stream đẩy trạng thái lệnh qua publish() -> poller chỉ chạy khi stream không live"""
+        self._streams[(exchange, str(account))] = is_live
+
+    def _stream_live(self, exchange: str, account: str) -> bool:
+        is_live = self._streams.get((exchange, account))
+        return bool(is_live and is_live())
+
+    def _recent_fill(self, key) -> Optional[dict]:
+        fill = self._recent.get(key)
+        if fill is not None and time.time() - fill["received_at"] > self.recent_ttl:
+            self._recent.pop(key, None)
+            return None
+        return fill
+
+    # ------------------------------------------------------------------ wait
+
+    async def wait(self, exchange: str, order_key, keys: dict, symbol: Optional[str] = None,
+                   timeout: Optional[float] = None) -> dict:
+        """
+        Input:
+            - order_key: client_order_index (Lighter) / orderId (Aster)
+            - symbol: base symbol (Aster dùng để query allOrders)
+            - timeout: giây (default WAIT_FOR_FILL_TIMEOUT, tối đa MAX_WAIT_SECONDS)
+
+        Output:
+            dict: fill + {'timed_out': bool, 'wait_ms'}
+        """
+        started = time.perf_counter()
+        account = self.account_of(exchange, keys)
+        key = (exchange, account, int(order_key))
+        timeout = min(timeout if timeout is not None else self.default_timeout, MAX_WAIT_SECONDS)
+
+        fill = self._recent_fill(key)
+        if fill is None:
+            future = asyncio.get_running_loop().create_future()
+            self._waiters.setdefault(key, []).append(future)
+            self._watch(exchange, account, keys, int(order_key), symbol)
+            try:
+                fill = await asyncio.wait_for(asyncio.shield(future), timeout=timeout)
+            except asyncio.TimeoutError:
+                self.timeouts += 1
+                fill = self._latest.get(key) or _fill("open", 0, 0)
+                fill = dict(fill, timed_out=True)
+            finally:
+                self._unwatch(key, future)
+
+        return dict(fill, timed_out=fill.get("timed_out", False),
+                    wait_ms=round((time.perf_counter() - started) * 1000, 1))
+
+    def _watch(self, exchange: str, account: str, keys: dict, order_key: int, symbol: Optional[str]):
+        source = self._sources.get((exchange, account))
+        if source is None:
+            source = self._sources[(exchange, account)] = _Source(exchange, account, keys)
+        source.pending[order_key] = symbol.upper() if symbol else None
+        if source.task is None or source.task.done():
+            source.task = asyncio.create_task(self._poll_loop(source), name=f"fills-{exchange}-poller")
+
+    def _unwatch(self, key, future: asyncio.Future):
+        futures = self._waiters.get(key)
+        if futures and future in futures:
+            futures.remove(future)
+        if futures is not None and not futures:
+            self._waiters.pop(key, None)
+            self._latest.pop(key, None)
+            source = self._sources.get(key[:2])
+            if source is not None:
+                source.pending.pop(key[2], None)
+
+    # ------------------------------------------------------------------ poller
+
+    async def _poll_loop(self, source: _Source):
+        """Chạy khi còn lệnh chờ, hết lệnh chờ thì thoát (client giữ lại cho lần sau)"""
+        # Poller dùng chung cho nhiều request, không theo deadline của request đã tạo nó
+        clear_deadline()
+        while source.pending:
+            started = time.perf_counter()
+            if self._stream_live(source.exchange, source.account):
+                await asyncio.sleep(self.poll_interval)
+                continue
+            try:
+                if source.exchange == "lighter":
+                    await self._poll_lighter(source)
+                else:
+                    await self._poll_aster(source)
+                source.error = None
+            except Exception as e:
+                source.error = str(getattr(e, "detail", e))
+                await source.close_client()
+                print(f"⚠️  [Fills] {source.exchange} poll lỗi: {source.error}")
+            source.polls += 1
+            await asyncio.sleep(max(self.poll_interval - (time.perf_counter() - started), 0.05))
+
+    async def _poll_lighter(self, source: _Source):
+        if source.client is None:
+            from api.utils import initialize_lighter_client
+            source.client = await initialize_lighter_client(source.keys)
+            source.auth = None
+        if source.auth is None or time.time() - source.auth_created_at > AUTH_TOKEN_TTL_SECONDS:
+            signer = source.client.get_signer_client()
+            auth, error = await signer.create_auth_token(source.client.api_key_index)
+            if error:
+                raise RuntimeError(f"auth token: {error}")
+            source.auth, source.auth_created_at = auth, time.time()
+
+        order_api = source.client.get_order_api()
+        account_index = int(source.account)
+        inactive, active = await asyncio.gather(
+            order_api.account_inactive_orders(
+                authorization=source.auth, account_index=account_index, limit=LIGHTER_INACTIVE_LIMIT
+            ),
+            order_api.account_active_orders(authorization=source.auth, account_index=account_index),
+        )
+        for order in list(inactive.orders or []) + list(active.orders or []):
+            client_index, fill = lighter_fill(order)
+            if client_index in source.pending:
+                self.publish("lighter", source.account, client_index, fill, source="poll")
+
+    async def _poll_aster(self, source: _Source):
+        if source.client is None:
+            from api.utils import initialize_aster_client
+            source.client = await initialize_aster_client(source.keys)
+
+        from api.utils import normalize_symbol
+
+        by_symbol: Dict[str, List[int]] = {}
+        for order_id, symbol in list(source.pending.items()):
+            if symbol:
+                by_symbol.setdefault(symbol, []).append(order_id)
+
+        async def _poll_symbol(symbol: str, order_ids: List[int]):
+            result = await source.client._request(
+                "GET", "/fapi/v1/allOrders",
+                params={"symbol": normalize_symbol("aster", symbol)["symbol_api"],
+                        "orderId": min(order_ids), "limit": 100},
+                signed=True,
+            )
+            if not result.get("success"):
+                raise RuntimeError(result.get("error") or "allOrders lỗi")
+            for order in result.get("data") or []:
+                order_id, fill = aster_fill(order)
+                if order_id in source.pending:
+                    self.publish("aster", source.account, order_id, fill, source="poll")
+
+        await asyncio.gather(*(_poll_symbol(s, ids) for s, ids in by_symbol.items()))
+
+    # ------------------------------------------------------------------ lifecycle
+
+    async def stop(self):
+        for source in self._sources.values():
+            if source.task is not None and not source.task.done():
+                source.task.cancel()
+                try:
+                    await source.task
+                except asyncio.CancelledError:
+                    pass
+            await source.close_client()
+        for futures in self._waiters.values():
+            for future in futures:
+                if not future.done():
+                    future.cancel()
+        self._waiters.clear()
+
+    def status(self) -> dict:
+        return {
+            "waiting": sum(len(f) for f in self._waiters.values()),
+            "orders": len(self._waiters),
+            "pollers": {
+                f"{exchange}:{account[:8]}": {
+                    "running": source.task is not None and not source.task.done(),
+                    "pending": len(source.pending),
+                    "polls": source.polls,
+                    "error": source.error,
+                }
+                for (exchange, account), source in self._sources.items()
+            },
+            "resolved": self.resolved,
+            "timeouts": self.timeouts,
+            "published": self.published,
+        }
+
+
+_dispatcher: Optional[FillDispatcher] = None
+
+
+def get_fill_dispatcher() -> FillDispatcher:
+    global _dispatcher
+    if _dispatcher is None:
+        _dispatcher = FillDispatcher()
+    return _dispatcher
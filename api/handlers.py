@@ -2,20 +2,18 @@
 Order handlers for Lighter and Aster exchanges
 """
 
+import asyncio
 from typing import Optional
 from fastapi import HTTPException
 
-from perpsdex.lighter.core.market import MarketData as LighterMarketData
-from perpsdex.lighter.core.order import OrderExecutor as LighterOrderExecutor
-from perpsdex.lighter.core.risk import RiskManager as LighterRiskManager
-from perpsdex.aster.core.market import MarketData as AsterMarketData
-from perpsdex.aster.core.order import OrderExecutor as AsterOrderExecutor
-from perpsdex.aster.core.risk import RiskManager as AsterRiskManager
-
-from api.models import UnifiedOrderRequest
+from api.accounts import get_pooled_client
+from api.circuit_breaker import ExchangeError
+from api.models import UnifiedOrderRequest, LadderOrderRequest
+from api.startup import get_db
+from api.shared_quotes import read_shared_quote
+from perpsdex.common.deadline import hedged_read
+from perpsdex.common.order_ids import next_client_order_index
 from api.utils import (
-    initialize_lighter_client,
-    initialize_aster_client,
     normalize_symbol,
     validate_tp_sl,
 )
@@ -23,19 +21,31 @@ from api.utils import (
 
 async def handle_lighter_order(order: UnifiedOrderRequest, keys: dict) -> dict:
     """Xử lý lệnh cho Lighter (market/limit, long/short, TP/SL theo giá)"""
-    client = await initialize_lighter_client(keys)
+    client = await get_pooled_client("lighter", keys)
+    # Lighter stack đã được load khi tạo client (lazy import)
+    from perpsdex.lighter.core.market import MarketData as LighterMarketData
+    from perpsdex.lighter.core.order import OrderExecutor as LighterOrderExecutor
+    from perpsdex.lighter.core.risk import RiskManager as LighterRiskManager
+
     norm = normalize_symbol("lighter", order.symbol)
     market_id = norm["market_id"]
     symbol = norm["base_symbol"]
 
     market = LighterMarketData(client.get_order_api(), client.get_account_api())
 
-    # Lấy entry_price
+    # Lấy entry_price (ưu tiên quote từ shared memory nếu chạy multi-worker)
     if order.order_type == "market":
-        price_result = await market.get_price(market_id, symbol)
+        price_result = read_shared_quote("lighter", symbol)
+        if price_result:
+            from perpsdex.lighter.utils.depth_book import get_depth_book
+
+            get_depth_book(market_id).apply_snapshot(
+                price_result["bids"], price_result["asks"], updated_at=price_result["updated_at"]
+            )
+        else:
+            price_result = await market.get_price(market_id, symbol)
         if not price_result.get("success"):
-            raise HTTPException(
-                status_code=400,
+            raise ExchangeError(
                 detail=f"Lighter: không lấy được giá thị trường cho {symbol}",
             )
         entry_price = price_result["ask"] if order.side == "long" else price_result["bid"]
@@ -61,6 +71,7 @@ async def handle_lighter_order(order: UnifiedOrderRequest, keys: dict) -> dict:
             symbol=symbol,
             leverage=order.leverage,
             max_slippage_percent=order.max_slippage_percent,
+            margin_mode=order.margin_mode,
         )
     else:
         result = await executor.place_limit_order(
@@ -70,11 +81,11 @@ async def handle_lighter_order(order: UnifiedOrderRequest, keys: dict) -> dict:
             market_id=market_id,
             symbol=symbol,
             leverage=order.leverage,
+            margin_mode=order.margin_mode,
         )
 
     if not result or not result.get("success"):
-        raise HTTPException(
-            status_code=400,
+        raise ExchangeError(
             detail=result.get("error", "Lighter: đặt lệnh thất bại")
             if result
             else "Lighter: không nhận được phản hồi từ place_order",
@@ -125,19 +136,23 @@ async def handle_lighter_order(order: UnifiedOrderRequest, keys: dict) -> dict:
 
 async def handle_aster_order(order: UnifiedOrderRequest, keys: dict) -> dict:
     """Xử lý lệnh cho Aster (market/limit, long/short, TP/SL theo giá)"""
-    client = await initialize_aster_client(keys)
+    client = await get_pooled_client("aster", keys)
+    # Aster stack đã được load khi tạo client (lazy import)
+    from perpsdex.aster.core.market import MarketData as AsterMarketData
+    from perpsdex.aster.core.order import OrderExecutor as AsterOrderExecutor
+    from perpsdex.aster.core.risk import RiskManager as AsterRiskManager
+
     norm = normalize_symbol("aster", order.symbol)
     symbol_pair = norm["symbol_pair"]
     symbol_api = norm["symbol_api"]
 
     market = AsterMarketData(client)
 
-    # Lấy entry_price
+    # Lấy entry_price (ưu tiên quote từ shared memory nếu chạy multi-worker)
     if order.order_type == "market":
-        price_result = await market.get_price(symbol_pair)
+        price_result = read_shared_quote("aster", norm["base_symbol"]) or await market.get_price(symbol_pair)
         if not price_result.get("success"):
-            raise HTTPException(
-                status_code=400,
+            raise ExchangeError(
                 detail=f"Aster: không lấy được giá thị trường cho {symbol_pair}",
             )
         entry_price = price_result["ask"] if order.side == "long" else price_result["bid"]
@@ -161,10 +176,10 @@ async def handle_aster_order(order: UnifiedOrderRequest, keys: dict) -> dict:
             side=side_str,
             size=order.size_usd,
             leverage=order.leverage,
+            margin_mode=order.margin_mode,
         )
         if not result or not result.get("success"):
-            raise HTTPException(
-                status_code=400,
+            raise ExchangeError(
                 detail=result.get("error", "Aster: đặt lệnh MARKET thất bại")
                 if result
                 else "Aster: không nhận được phản hồi từ place_market_order",
@@ -178,10 +193,10 @@ async def handle_aster_order(order: UnifiedOrderRequest, keys: dict) -> dict:
             size=order.size_usd,
             price=order.limit_price,
             leverage=order.leverage,
+            margin_mode=order.margin_mode,
         )
         if not result or not result.get("success"):
-            raise HTTPException(
-                status_code=400,
+            raise ExchangeError(
                 detail=result.get("error", "Aster: đặt lệnh LIMIT thất bại")
                 if result
                 else "Aster: không nhận được phản hồi từ place_limit_order",
@@ -235,63 +250,56 @@ async def handle_lighter_close_position(
 ) -> dict:
     """Đóng position trên Lighter"""
     from perpsdex.lighter.utils.calculator import Calculator
-    import time as time_module
     
-    client = await initialize_lighter_client(keys)
+    client = await get_pooled_client("lighter", keys)
+    from perpsdex.lighter.core.market import MarketData as LighterMarketData
     norm = normalize_symbol("lighter", symbol)
     market_id = norm["market_id"]
     symbol_base = norm["base_symbol"]
     
-    # Lấy position hiện tại
-    account_api = client.get_account_api()
+    # Lấy position hiện tại (mirror của account stream, stream chưa live thì account_api.account)
+    from perpsdex.lighter.utils.account_mirror import get_account_mirror, get_live_account_mirror
+
     account_index = keys.get("account_index", 0)
-    accounts_data = await account_api.account(by='index', value=str(account_index))
-    
-    if not accounts_data or not accounts_data.accounts:
-        raise HTTPException(status_code=404, detail=f"No account found for Lighter")
-    
-    account = accounts_data.accounts[0]
-    positions = account.positions or []
-    
-    # Tìm position cho market_id này
-    # Nếu có position_id, entry_price, hoặc side -> match chính xác
-    # Nếu không -> lấy position đầu tiên có size != 0
+    mirror = get_live_account_mirror(account_index)
+    if mirror is None:
+        account_api = client.get_account_api()
+        accounts_data = await hedged_read(
+            "lighter.account", lambda: account_api.account(by='index', value=str(account_index))
+        )
+        if not accounts_data or not accounts_data.accounts:
+            raise HTTPException(status_code=404, detail=f"No account found for Lighter")
+        mirror = get_account_mirror(account_index)
+        mirror.load_account(accounts_data.accounts[0])
+
+    # Match chính xác nếu có position_id, entry_price, hoặc side
+    # (Lighter chỉ có 1 position / market)
     position = None
-    for pos in positions:
-        if pos.market_id == market_id:
-            position_str = getattr(pos, 'position', '0')
-            try:
-                position_size = float(position_str) if position_str else 0.0
-            except (ValueError, TypeError):
-                position_size = 0.0
-            
-            if position_size != 0:
-                pos_side = 'long' if position_size > 0 else 'short'
-                pos_entry_price = float(getattr(pos, 'avg_entry_price', 0))
-                
-                # Match với criteria nếu có
-                if position_id:
-                    # Check position_id format: lighter_{market_id}_{entry_price}_{side}
-                    expected_id = f"lighter_{market_id}_{pos_entry_price}_{pos_side}"
-                    if position_id != expected_id:
-                        continue
-                
-                if entry_price is not None:
-                    # Match entry_price với tolerance 0.01%
-                    if abs(pos_entry_price - entry_price) / entry_price > 0.0001:
-                        continue
-                
-                if side is not None:
-                    if pos_side != side.lower():
-                        continue
-                
-                position = {
-                    'market_id': market_id,
-                    'size': position_size,
-                    'side': pos_side,
-                    'avg_entry_price': pos_entry_price
-                }
-                break
+    pos = mirror.position(market_id)
+    if pos is not None and pos.size != 0:
+        pos_side = pos.side
+        pos_entry_price = pos.entry_price
+        matched = True
+
+        if position_id:
+            # Check position_id format: lighter_{market_id}_{entry_price}_{side}
+            expected_id = f"lighter_{market_id}_{pos_entry_price}_{pos_side}"
+            matched = position_id == expected_id
+
+        if matched and entry_price is not None:
+            # Match entry_price với tolerance 0.01%
+            matched = abs(pos_entry_price - entry_price) / entry_price <= 0.0001
+
+        if matched and side is not None:
+            matched = pos_side == side.lower()
+
+        if matched:
+            position = {
+                'market_id': market_id,
+                'size': abs(pos.size),
+                'side': pos_side,
+                'avg_entry_price': pos_entry_price
+            }
     
     if not position:
         raise HTTPException(status_code=404, detail=f"No open position found for {symbol} on Lighter")
@@ -303,14 +311,14 @@ async def handle_lighter_close_position(
     market = LighterMarketData(client.get_order_api(), client.get_account_api())
     price_result = await market.get_price(market_id, symbol_base)
     if not price_result.get('success'):
-        raise HTTPException(status_code=400, detail="Failed to get current price")
+        raise ExchangeError("Failed to get current price")
     
     current_price = price_result.get('mid', price_result.get('ask', price_result.get('bid')))
     
     # Lấy market metadata
     metadata_result = await market.get_market_metadata(market_id)
     if not metadata_result.get('success'):
-        raise HTTPException(status_code=400, detail=f"Failed to get market metadata: {metadata_result.get('error')}")
+        raise ExchangeError(f"Failed to get market metadata: {metadata_result.get('error')}")
     
     size_decimals = metadata_result['size_decimals']
     price_decimals = metadata_result['price_decimals']
@@ -330,7 +338,7 @@ async def handle_lighter_close_position(
     price_int = Calculator.scale_to_int(close_price, price_decimals)
     
     # Generate order index
-    client_order_index = int(time_module.time() * 1000)
+    client_order_index = next_client_order_index()
     
     # Place close order với reduce_only=True
     order, response, error = await client.get_signer_client().create_order(
@@ -348,7 +356,7 @@ async def handle_lighter_close_position(
     
     if error is not None or response is None:
         error_msg = str(error) if error else "Unknown error"
-        raise HTTPException(status_code=400, detail=f"Failed to close position: {error_msg}")
+        raise ExchangeError(f"Failed to close position: {error_msg}")
     
     # Tính PnL
     entry_price = position['avg_entry_price']
@@ -384,7 +392,10 @@ async def handle_aster_close_position(
     side: Optional[str] = None
 ) -> dict:
     """Đóng position trên Aster"""
-    client = await initialize_aster_client(keys)
+    client = await get_pooled_client("aster", keys)
+    from perpsdex.aster.core.market import MarketData as AsterMarketData
+    from perpsdex.aster.core.order import OrderExecutor as AsterOrderExecutor
+
     norm = normalize_symbol("aster", symbol)
     symbol_pair = norm["symbol_pair"]
     symbol_api = norm["symbol_api"]
@@ -394,7 +405,7 @@ async def handle_aster_close_position(
     position_result = await market_data.get_positions()
     
     if not position_result.get('success'):
-        raise HTTPException(status_code=400, detail="Failed to get positions")
+        raise ExchangeError("Failed to get positions")
     
     positions = position_result.get('positions', [])
     
@@ -503,7 +514,7 @@ async def handle_aster_close_position(
     
     if not result.get('success'):
         error_msg = result.get('error', 'Unknown error')
-        raise HTTPException(status_code=400, detail=f"Failed to close position: {error_msg}")
+        raise ExchangeError(f"Failed to close position: {error_msg}")
     
     # Tính PnL từ unRealizedProfit trong position
     pnl_usd = float(position.get('pnl', 0))
@@ -535,3 +546,283 @@ async def handle_aster_close_position(
         "close_price": current_price,
         "pnl_percent": pnl_percent
     }
+
+
+def _journal_ladder_levels(request: LadderOrderRequest, ladder_id: str, symbol_pair: str, levels: list) -> dict:
+    """
+    Ghi từng level của ladder vào bảng orders (status = pending)
+
+    Returns:
+        dict: {level: db_order_id} (rỗng nếu DB không available)
+    """
+    db = get_db()
+    if db is None:
+        return {}
+
+    db_ids = {}
+    for level in levels:
+        if level.get("skip"):
+            continue
+        db_ids[level["level"]] = db.log_order_request(
+            exchange=request.exchange,
+            symbol_base=request.symbol.upper(),
+            symbol_pair=symbol_pair,
+            side=request.side,
+            order_type="limit",
+            size_usd=level["size_usd"],
+            leverage=request.leverage,
+            limit_price=level["price"],
+            tp_price=None,
+            sl_price=None,
+            max_slippage_percent=None,
+            client_order_id=f"{ladder_id}-L{level['level']}",
+            tag=request.tag,
+            raw_request={
+                "ladder_id": ladder_id,
+                "level": level["level"],
+                "levels": request.levels,
+                "price_from": request.price_from,
+                "price_to": request.price_to,
+                "distribution": request.distribution,
+            },
+        )
+    return db_ids
+
+
+def _journal_ladder_results(db_ids: dict, levels: list):
+    """Cập nhật kết quả từng level (submitted / failed) vào bảng orders"""
+    db = get_db()
+    if db is None:
+        return
+
+    for level in levels:
+        db_order_id = db_ids.get(level["level"])
+        if db_order_id is None:
+            continue
+        exchange_order_id = level.get("order_id") or level.get("client_order_index")
+        db.update_order_after_result(
+            db_order_id=db_order_id,
+            status="submitted" if level.get("status") == "submitted" else "error",
+            exchange_order_id=str(exchange_order_id) if exchange_order_id is not None else None,
+            entry_price_requested=level["price"],
+            entry_price_filled=None,
+            position_size_asset=level["size"],
+            raw_response={key: level.get(key) for key in ("status", "tx_hash", "order_id", "client_order_id", "error")},
+        )
+
+
+async def handle_ladder_order(request: LadderOrderRequest, keys: dict) -> dict:
+    """
+    Grid / ladder LIMIT cho Lighter (sendTxBatch) hoặc Aster (batchOrders).
+
+    Flow: tính level (1 lần metadata) -> journal pending -> gửi theo batch -> journal kết quả.
+    """
+    ladder_id = request.client_order_id or f"ladder-{next_client_order_index()}"
+    norm = normalize_symbol(request.exchange, request.symbol)
+
+    if request.exchange == "lighter":
+        client = await get_pooled_client("lighter", keys)
+        from perpsdex.lighter.core.order import OrderExecutor as LighterOrderExecutor
+
+        executor = LighterOrderExecutor(client.get_signer_client(), client.get_order_api())
+        market_id = norm["market_id"]
+    else:
+        client = await get_pooled_client("aster", keys)
+        from perpsdex.aster.core.order import OrderExecutor as AsterOrderExecutor
+
+        executor = AsterOrderExecutor(client)
+
+    if request.exchange == "lighter":
+        ladder = await executor.build_ladder(
+            side=request.side,
+            price_from=request.price_from,
+            price_to=request.price_to,
+            levels=request.levels,
+            total_usd=request.size_usd,
+            market_id=market_id,
+            distribution=request.distribution,
+            geometric_ratio=request.geometric_ratio,
+        )
+    else:
+        ladder = await executor.build_ladder(
+            symbol=norm["symbol_pair"],
+            side=request.side,
+            price_from=request.price_from,
+            price_to=request.price_to,
+            levels=request.levels,
+            total_usd=request.size_usd,
+            distribution=request.distribution,
+            geometric_ratio=request.geometric_ratio,
+        )
+
+    if not ladder.get("success"):
+        raise HTTPException(
+            status_code=400,
+            detail=f"{request.exchange.capitalize()}: ladder không hợp lệ: {ladder.get('error')}",
+        )
+
+    # Leverage / margin mode chỉ set khi request có gửi (default 1.0 không ghi đè setting của account)
+    if "leverage" in request.model_fields_set or request.margin_mode:
+        if request.exchange == "lighter":
+            leverage_result = await executor.ensure_leverage(market_id, request.leverage, request.margin_mode)
+        else:
+            leverage_result = await executor.ensure_leverage(norm["symbol_api"], request.leverage, request.margin_mode)
+        if not leverage_result["success"]:
+            raise ExchangeError(f"{request.exchange.capitalize()}: {leverage_result['error']}")
+
+    symbol_pair = norm.get("symbol_pair") or norm.get("pair")
+    db_ids = await asyncio.to_thread(_journal_ladder_levels, request, ladder_id, symbol_pair, ladder["levels"])
+
+    if request.exchange == "lighter":
+        result = await executor.submit_ladder(
+            side=request.side,
+            levels=ladder["levels"],
+            market_id=market_id,
+            symbol=norm["base_symbol"],
+            max_concurrency=request.max_concurrency,
+        )
+    else:
+        result = await executor.submit_ladder(
+            symbol=norm["symbol_pair"],
+            side=request.side,
+            ladder=ladder,
+            max_concurrency=request.max_concurrency,
+            client_order_id_prefix=ladder_id,
+        )
+
+    await asyncio.to_thread(_journal_ladder_results, db_ids, result["levels"])
+
+    if not result.get("success"):
+        raise ExchangeError(
+            detail=f"{request.exchange.capitalize()}: không level nào được đặt: "
+            f"{next((l.get('error') for l in result['levels'] if l.get('error')), 'unknown error')}",
+        )
+
+    return {
+        "success": True,
+        "exchange": request.exchange,
+        "symbol": norm["base_symbol"],
+        "side": request.side,
+        "ladder_id": ladder_id,
+        "levels": [
+            {
+                "level": level["level"],
+                "price": level["price"],
+                "size": level["size"],
+                "size_usd": level["size_usd"],
+                "status": level.get("status"),
+                "order_id": level.get("order_id") or level.get("client_order_index"),
+                "tx_hash": level.get("tx_hash"),
+                "db_order_id": db_ids.get(level["level"]),
+                "error": level.get("error") or level.get("reason"),
+            }
+            for level in result["levels"]
+        ],
+        "submitted": result["submitted"],
+        "failed": result["failed"],
+        "skipped": result["skipped"],
+        "batches": result["batches"],
+        "total_size": ladder["total_size"],
+        "total_usd": ladder["total_usd"],
+        "leverage": request.leverage,
+    }
+
+
+async def handle_twap_order(
+    order: UnifiedOrderRequest, keys: dict, db_order_id: Optional[int] = None, risk_reservation=None
+) -> dict:
+    """
+    order_type = 'twap': chia parent order thành nhiều child market order (theo thời gian hoặc depth).
+    risk_reservation (pre-trade risk) được scheduler commit theo phần đã khớp khi parent kết thúc.
+
+    Trả về ngay sau khi parent được đưa vào ExecutionScheduler; theo dõi qua
+    GET /api/orders/twap/{parent_id}, dừng bằng POST /api/orders/twap/{parent_id}/cancel.
+    """
+    from api.execution import ParentOrder, get_execution_scheduler
+
+    if order.tp_price or order.sl_price:
+        raise HTTPException(
+            status_code=400,
+            detail="tp_price / sl_price chưa hỗ trợ cho order_type = 'twap' (đặt TP/SL sau khi parent completed)",
+        )
+    if order.size_usd < order.twap_min_slice_usd:
+        raise HTTPException(
+            status_code=400,
+            detail=f"size_usd ({order.size_usd}) nhỏ hơn twap_min_slice_usd ({order.twap_min_slice_usd})",
+        )
+    if order.twap_mode == "time" and order.twap_slices:
+        if order.size_usd / order.twap_slices < order.twap_min_slice_usd:
+            raise HTTPException(
+                status_code=400,
+                detail=f"Mỗi slice ${order.size_usd / order.twap_slices:.2f} < twap_min_slice_usd "
+                f"({order.twap_min_slice_usd}), giảm twap_slices",
+            )
+
+    norm = normalize_symbol(order.exchange, order.symbol)
+    parent_id = order.client_order_id or f"twap-{next_client_order_index()}"
+    scheduler = get_execution_scheduler()
+    if scheduler.get(parent_id) is not None:
+        raise HTTPException(status_code=409, detail=f"TWAP parent {parent_id} đã tồn tại")
+
+    slices = order.twap_slices
+    if order.twap_mode == "time" and not slices:
+        from api.execution import DEFAULT_TIME_SLICES
+
+        # Không để slice mặc định nhỏ hơn twap_min_slice_usd
+        slices = max(min(DEFAULT_TIME_SLICES, int(order.size_usd // order.twap_min_slice_usd)), 1)
+
+    parent = ParentOrder(
+        parent_id=parent_id,
+        exchange=order.exchange,
+        norm=norm,
+        side=order.side,
+        size_usd=order.size_usd,
+        leverage=order.leverage,
+        margin_mode=order.margin_mode,
+        mode=order.twap_mode,
+        slices=slices,
+        interval_seconds=order.twap_interval_seconds,
+        depth_fraction=order.twap_depth_fraction,
+        max_slippage_percent=order.max_slippage_percent,
+        min_slice_usd=order.twap_min_slice_usd,
+        max_duration_seconds=order.twap_max_duration_seconds,
+        client_order_id=order.client_order_id,
+        tag=order.tag,
+        db_order_id=db_order_id,
+    )
+    parent.risk_reservation = risk_reservation
+
+    # Đánh dấu 'submitted' trước khi chạy -> kết quả cuối do scheduler ghi đè
+    db = get_db()
+    if db is not None and db_order_id is not None:
+        try:
+            await asyncio.to_thread(
+                db.update_order_after_result,
+                db_order_id=db_order_id,
+                status="submitted",
+                exchange_order_id=parent_id,
+                entry_price_requested=None,
+                entry_price_filled=None,
+                position_size_asset=None,
+                raw_response={"parent_id": parent_id, "mode": order.twap_mode},
+            )
+        except Exception as db_err:
+            print(f"[DB] Warning: lỗi khi update TWAP parent {parent_id}: {db_err}")
+
+    snapshot = scheduler.start(parent, keys)
+    return {
+        "success": True,
+        "exchange": order.exchange,
+        "symbol": norm["base_symbol"],
+        "side": order.side,
+        "order_type": order.order_type,
+        "order_id": parent_id,
+        "entry_price": None,
+        "position_size": None,
+        "size_usd": order.size_usd,
+        "leverage": order.leverage,
+        "tp_price": None,
+        "sl_price": None,
+        "tp_sl": None,
+        "twap": snapshot,
+    }
@@ -0,0 +1,436 @@
+"""
+HistorySync - Đồng bộ order / fill history của Lighter + Aster vào DB (incremental)
+
+- Lighter: account_inactive_orders + trades (mới nhất trước, phân trang theo next_cursor)
+  đến khi gặp dữ liệu cũ hơn cursor đã lưu (epoch ms); account_active_orders mỗi vòng
+  để cập nhật lệnh đang mở / khớp 1 phần.
+- Aster: theo từng symbol, allOrders?orderId=<cursor> (cursor = orderId nhỏ nhất còn mở,
+  hoặc orderId lớn nhất + 1) và userTrades?fromId=<trade id kế tiếp>.
+- Cursor lưu ở bảng sync_cursors -> restart không phải tải lại toàn bộ.
+- Ghi DB theo lô: 1 SELECT + executemany INSERT / UPDATE, chỉ dòng mới hoặc thay đổi.
+
+GET /api/orders/history/exchange và /api/orders/history/fills đọc từ bảng exchange_orders /
+exchange_trades, không gọi exchange.
+
+ENV:
+    - HISTORY_SYNC_ENABLED (default: 1, cần DB)
+    - HISTORY_SYNC_INTERVAL (default: 60 giây)
+    - HISTORY_SYNC_MAX_PAGES (default: 20 trang / stream / vòng)
+    - HISTORY_SYNC_ASTER_SYMBOLS (symbol Aster luôn sync, VD: BTC,ETH; ngoài ra lấy từ bảng orders + position)
+"""
+
+import asyncio
+import datetime as dt
+import json
+import os
+import time
+from typing import Dict, List, Optional
+
+LIGHTER_PAGE_LIMIT = 100
+ASTER_PAGE_LIMIT = 1000
+ASTER_OPEN_STATUSES = ("NEW", "PARTIALLY_FILLED")
+# Lùi cursor Lighter 1 phút để không sót dòng cùng timestamp / ghi trễ (dòng trùng bị upsert bỏ qua)
+LIGHTER_CURSOR_OVERLAP_MS = 60_000
+
+
+def history_sync_enabled() -> bool:
+    return os.getenv("HISTORY_SYNC_ENABLED", "1").strip().lower() in ("1", "true", "yes", "on")
+
+
+def _to_datetime(value) -> Optional[dt.datetime]:
+    """Epoch giây hoặc ms -> datetime UTC (naive, giống cột created_at của bảng orders)"""
+    if not value:
+        return None
+    value = float(value)
+    if value > 1e12:
+        value /= 1000
+    return dt.datetime.utcfromtimestamp(value)
+
+
+def _to_ms(value) -> int:
+    if not value:
+        return 0
+    value = int(value)
+    return value if value > 1e12 else value * 1000
+
+
+def _float(value) -> Optional[float]:
+    try:
+        return float(value) if value is not None and value != "" else None
+    except (TypeError, ValueError):
+        return None
+
+
+def _lighter_order_row(order, registry) -> dict:
+    return {
+        "exchange_order_id": str(order.order_index),
+        "client_order_id": str(order.client_order_index) if order.client_order_index is not None else None,
+        "symbol_base": registry.get_symbol(order.market_index),
+        "side": "short" if order.is_ask else "long",
+        "order_type": order.type,
+        "status": order.status,
+        "price": _float(order.price),
+        "size_asset": _float(order.initial_base_amount),
+        "filled_asset": _float(order.filled_base_amount),
+        "filled_usd": _float(order.filled_quote_amount),
+        "reduce_only": bool(order.reduce_only),
+        "exchange_created_at": _to_datetime(order.created_at or order.timestamp),
+        "exchange_updated_at": _to_datetime(order.updated_at or order.timestamp),
+        "raw": json.dumps(order.to_dict(), default=str),
+    }
+
+
+def _lighter_trade_row(trade, account_index: int, registry) -> dict:
+    is_ask = trade.ask_account_id == account_index
+    return {
+        "trade_id": str(trade.trade_id),
+        "exchange_order_id": str(trade.ask_id if is_ask else trade.bid_id),
+        "symbol_base": registry.get_symbol(trade.market_id),
+        "side": "short" if is_ask else "long",
+        "price": _float(trade.price),
+        "size_asset": _float(trade.size),
+        "size_usd": _float(trade.usd_amount),
+        # Fee Lighter là số nguyên theo tick riêng của sàn -> giữ trong raw
+        "fee": None,
+        "realized_pnl": _float(trade.ask_account_pnl if is_ask else trade.bid_account_pnl),
+        "is_maker": bool(trade.is_maker_ask) == is_ask,
+        "executed_at": _to_datetime(trade.timestamp),
+        "raw": json.dumps(trade.to_dict(), default=str),
+    }
+
+
+def _aster_base_symbol(symbol_api: str, registry) -> str:
+    return registry.get_base_symbol(symbol_api) or symbol_api.removesuffix("USDT")
+
+
+def _aster_order_row(order: dict, registry) -> dict:
+    return {
+        "exchange_order_id": str(order.get("orderId")),
+        "client_order_id": order.get("clientOrderId"),
+        "symbol_base": _aster_base_symbol(order.get("symbol", ""), registry),
+        "side": "long" if order.get("side") == "BUY" else "short",
+        "order_type": (order.get("type") or "").lower(),
+        "status": (order.get("status") or "").lower(),
+        "price": _float(order.get("avgPrice")) or _float(order.get("price")),
+        "size_asset": _float(order.get("origQty")),
+        "filled_asset": _float(order.get("executedQty")),
+        "filled_usd": _float(order.get("cumQuote")),
+        "reduce_only": bool(order.get("reduceOnly")),
+        "exchange_created_at": _to_datetime(order.get("time")),
+        "exchange_updated_at": _to_datetime(order.get("updateTime") or order.get("time")),
+        "raw": json.dumps(order, default=str),
+    }
+
+
+def _aster_trade_row(trade: dict, registry) -> dict:
+    return {
+        "trade_id": str(trade.get("id")),
+        "exchange_order_id": str(trade.get("orderId")),
+        "symbol_base": _aster_base_symbol(trade.get("symbol", ""), registry),
+        "side": "long" if trade.get("side") == "BUY" else "short",
+        "price": _float(trade.get("price")),
+        "size_asset": _float(trade.get("qty")),
+        "size_usd": _float(trade.get("quoteQty")),
+        "fee": _float(trade.get("commission")),
+        "realized_pnl": _float(trade.get("realizedPnl")),
+        "is_maker": bool(trade.get("maker")),
+        "executed_at": _to_datetime(trade.get("time")),
+        "raw": json.dumps(trade, default=str),
+    }
+
+
+class HistorySync:
+    """
+    Background job sync order / fill history 2 sàn vào DB
+
+    Methods:
+        - start() / stop()
+        - sync_once(): 1 vòng sync cả 2 sàn (dùng cho POST /api/orders/history/sync)
+        - status(): Kết quả vòng gần nhất
+    """
+
+    EXCHANGES = ("lighter", "aster")
+
+    def __init__(self):
+        self.interval = float(os.getenv("HISTORY_SYNC_INTERVAL", 60))
+        self.max_pages = int(os.getenv("HISTORY_SYNC_MAX_PAGES", 20))
+        self.results: Dict[str, dict] = {}
+        self._sync_lock = asyncio.Lock()
+        self._task: Optional[asyncio.Task] = None
+        self._lock_file = None
+
+    # ------------------------------------------------------------------ lighter
+
+    async def _lighter_pages(self, fetch, items_attr: str, watermark_ms: int) -> List:
+        """Đọc từ mới -> cũ theo next_cursor, dừng ở trang đầu tiên có dòng cũ hơn watermark"""
+        items, cursor = [], None
+        floor_ms = watermark_ms - LIGHTER_CURSOR_OVERLAP_MS if watermark_ms else 0
+        for _ in range(self.max_pages):
+            response = await fetch(cursor)
+            page = getattr(response, items_attr, None) or []
+            fresh = [item for item in page if _to_ms(getattr(item, "updated_at", None) or item.timestamp) > floor_ms]
+            items.extend(fresh)
+            cursor = getattr(response, "next_cursor", None)
+            if not cursor or len(fresh) < len(page) or len(page) < LIGHTER_PAGE_LIMIT:
+                break
+        return items
+
+    async def _sync_lighter(self, db, keys: dict) -> dict:
+        from api.utils import initialize_lighter_client
+        from perpsdex.lighter.utils.market_registry import get_market_registry
+
+        registry = get_market_registry()
+        account_index = int(keys.get("account_index", 0))
+        account = str(account_index)
+        cursors = await asyncio.to_thread(db.get_sync_cursors, "lighter", account)
+
+        client = await initialize_lighter_client(keys)
+        try:
+            auth, error = await client.get_signer_client().create_auth_token(client.api_key_index)
+            if error:
+                return {"success": False, "error": f"auth token: {error}"}
+            order_api = client.get_order_api()
+
+            orders_mark = int(cursors.get("orders") or 0)
+            inactive = await self._lighter_pages(
+                lambda cursor: order_api.account_inactive_orders(
+                    authorization=auth, account_index=account_index, limit=LIGHTER_PAGE_LIMIT, cursor=cursor
+                ),
+                "orders", orders_mark,
+            )
+            active = await order_api.account_active_orders(authorization=auth, account_index=account_index)
+            orders = inactive + list(active.orders or [])
+
+            trades_mark = int(cursors.get("trades") or 0)
+            trades = await self._lighter_pages(
+                lambda cursor: order_api.trades(
+                    sort_by="timestamp", sort_dir="desc", limit=LIGHTER_PAGE_LIMIT,
+                    authorization=auth, account_index=account_index, cursor=cursor,
+                ),
+                "trades", trades_mark,
+            )
+        finally:
+            await client.close()
+
+        order_stats = await asyncio.to_thread(
+            db.upsert_exchange_orders, "lighter", account, [_lighter_order_row(o, registry) for o in orders]
+        )
+        trade_stats = await asyncio.to_thread(
+            db.insert_exchange_trades, "lighter", account,
+            [_lighter_trade_row(t, account_index, registry) for t in trades],
+        )
+
+        # Cursor chỉ tiến khi ghi DB thành công
+        if inactive and "error" not in order_stats:
+            newest = max(_to_ms(o.updated_at or o.timestamp) for o in inactive)
+            await asyncio.to_thread(db.set_sync_cursor, "lighter", account, "orders", str(max(newest, orders_mark)))
+        if trades and "error" not in trade_stats:
+            newest = max(_to_ms(t.timestamp) for t in trades)
+            await asyncio.to_thread(db.set_sync_cursor, "lighter", account, "trades", str(max(newest, trades_mark)))
+
+        return {"success": True, "orders": order_stats, "trades": trade_stats}
+
+    # ------------------------------------------------------------------ aster
+
+    def _aster_symbols(self, db, cursors: Dict[str, str]) -> List[str]:
+        """Symbol cần sync: ENV + đã từng đặt qua API + đang có position + đã có cursor"""
+        from fastapi import HTTPException
+        from api.pnl import get_pnl_engine
+        from api.utils import normalize_symbol
+
+        bases = {s.strip().upper() for s in os.getenv("HISTORY_SYNC_ASTER_SYMBOLS", "").split(",") if s.strip()}
+        bases.update(o["symbol_base"] for o in db.query_orders(exchange="aster", limit=500) if o.get("symbol_base"))
+        bases.update(get_pnl_engine().books["aster"].held_symbols())
+
+        symbols = {stream.split(":", 1)[1] for stream in cursors if ":" in stream}
+        for base in bases:
+            try:
+                symbols.add(normalize_symbol("aster", base)["symbol_api"])
+            except HTTPException:
+                continue
+        return sorted(symbols)
+
+    async def _aster_pages(self, client, endpoint: str, params: dict, id_param: str, id_field: str) -> List[dict]:
+        rows = []
+        for _ in range(self.max_pages):
+            result = await client._request("GET", endpoint, params=dict(params), signed=True)
+            if not result.get("success"):
+                raise RuntimeError(f"{endpoint}: {result.get('error')}")
+            page = result.get("data") or []
+            rows.extend(page)
+            if len(page) < ASTER_PAGE_LIMIT:
+                break
+            params[id_param] = max(int(row[id_field]) for row in page) + 1
+        return rows
+
+    async def _sync_aster(self, db, keys: dict) -> dict:
+        from api.utils import initialize_aster_client
+        from perpsdex.aster.utils.market_registry import get_market_registry
+
+        registry = get_market_registry()
+        account = keys.get("api_key", "")[:16]
+        cursors = await asyncio.to_thread(db.get_sync_cursors, "aster", account)
+        symbols = await asyncio.to_thread(self._aster_symbols, db, cursors)
+
+        totals = {"symbols": len(symbols), "orders": {}, "trades": {}, "errors": {}}
+        client = await initialize_aster_client(keys)
+        try:
+            for symbol in symbols:
+                try:
+                    order_cursor = cursors.get(f"orders:{symbol}")
+                    params = {"symbol": symbol, "limit": ASTER_PAGE_LIMIT}
+                    if order_cursor:
+                        params["orderId"] = order_cursor
+                    orders = await self._aster_pages(client, "/fapi/v1/allOrders", params, "orderId", "orderId")
+
+                    trade_cursor = cursors.get(f"trades:{symbol}")
+                    params = {"symbol": symbol, "limit": ASTER_PAGE_LIMIT}
+                    if trade_cursor:
+                        params["fromId"] = trade_cursor
+                    trades = await self._aster_pages(client, "/fapi/v1/userTrades", params, "fromId", "id")
+                except Exception as e:
+                    totals["errors"][symbol] = str(e)
+                    continue
+
+                order_stats = await asyncio.to_thread(
+                    db.upsert_exchange_orders, "aster", account, [_aster_order_row(o, registry) for o in orders]
+                )
+                trade_stats = await asyncio.to_thread(
+                    db.insert_exchange_trades, "aster", account, [_aster_trade_row(t, registry) for t in trades]
+                )
+                for bucket, stats in (("orders", order_stats), ("trades", trade_stats)):
+                    for key, value in stats.items():
+                        if isinstance(value, int):
+                            totals[bucket][key] = totals[bucket].get(key, 0) + value
+
+                # orderId cursor = lệnh nhỏ nhất còn mở (để lần sau thấy status mới), không có thì max + 1
+                if orders and "error" not in order_stats:
+                    open_ids = [int(o["orderId"]) for o in orders if o.get("status") in ASTER_OPEN_STATUSES]
+                    next_id = min(open_ids) if open_ids else max(int(o["orderId"]) for o in orders) + 1
+                    await asyncio.to_thread(db.set_sync_cursor, "aster", account, f"orders:{symbol}", str(next_id))
+                if trades and "error" not in trade_stats:
+                    next_id = max(int(t["id"]) for t in trades) + 1
+                    await asyncio.to_thread(db.set_sync_cursor, "aster", account, f"trades:{symbol}", str(next_id))
+        finally:
+            await client.close()
+
+        totals["success"] = not totals["errors"]
+        return totals
+
+    async def fetch_aster_orders(self, symbol_orders: List[tuple], throttle=None) -> Dict[str, dict]:
+        """
+        Lấy từng order Aster (GET /fapi/v1/order) và upsert vào exchange_orders.
+        Dùng cho order chưa nằm trong cửa sổ allOrders đã sync (reconciler).
+
+        Input:
+            symbol_orders: [(symbol_api, order_id)]
+            throttle: coroutine function gọi trước mỗi request (rate limit của caller)
+
+        Output:
+            {order_id: row} của order lấy được
+        """
+        from api.startup import get_db
+        from api.utils import get_keys_or_env, initialize_aster_client
+        from perpsdex.aster.utils.market_registry import get_market_registry
+
+        keys = get_keys_or_env(None, "aster")
+        db = await asyncio.to_thread(get_db)
+        if not symbol_orders or not keys.get("api_key") or db is None:
+            return {}
+
+        registry = get_market_registry()
+        rows: Dict[str, dict] = {}
+        client = await initialize_aster_client(keys)
+        try:
+            for symbol, order_id in symbol_orders:
+                if throttle is not None:
+                    await throttle()
+                result = await client._request(
+                    "GET", "/fapi/v1/order", params={"symbol": symbol, "orderId": order_id}, signed=True
+                )
+                if result.get("success") and result.get("data"):
+                    rows[str(order_id)] = _aster_order_row(result["data"], registry)
+        finally:
+            await client.close()
+
+        if rows:
+            await asyncio.to_thread(db.upsert_exchange_orders, "aster", keys.get("api_key", "")[:16], list(rows.values()))
+        return rows
+
+    # ------------------------------------------------------------------ loop
+
+    async def sync_once(self) -> Dict[str, dict]:
+        """1 vòng sync cả 2 sàn (bỏ qua sàn chưa cấu hình key)"""
+        from api.startup import get_db
+        from api.utils import get_keys_or_env
+
+        db = await asyncio.to_thread(get_db)
+        if db is None or not db.DB_URL:
+            return {"error": "DB chưa cấu hình"}
+
+        async with self._sync_lock:
+            for exchange in self.EXCHANGES:
+                keys = get_keys_or_env(None, exchange)
+                if not (keys.get("private_key") if exchange == "lighter" else keys.get("api_key")):
+                    continue
+                started = time.time()
+                try:
+                    if exchange == "lighter":
+                        result = await self._sync_lighter(db, keys)
+                    else:
+                        result = await self._sync_aster(db, keys)
+                except Exception as e:
+                    result = {"success": False, "error": str(getattr(e, "detail", e))}
+                result["synced_at"] = time.time()
+                result["duration_ms"] = round((time.time() - started) * 1000, 1)
+                self.results[exchange] = result
+                if not result.get("success"):
+                    print(f"⚠️  [HistorySync] {exchange}: {result.get('error') or result.get('errors')}")
+        return self.results
+
+    async def _run(self):
+        while True:
+            await self.sync_once()
+            await asyncio.sleep(self.interval)
+
+    def start(self) -> bool:
+        from api.startup import acquire_worker_lock
+
+        if self._task is not None and not self._task.done():
+            return True
+        if self._lock_file is None:
+            self._lock_file = acquire_worker_lock("history-sync")
+        if self._lock_file is None:
+            print("ℹ️  [HistorySync] Đang chạy ở process khác, worker này chỉ đọc DB")
+            return False
+        self._task = asyncio.create_task(self._run(), name="history-sync")
+        print(f"🔄 [HistorySync] Started (mỗi {self.interval}s)")
+        return True
+
+    async def stop(self):
+        if self._task is not None and not self._task.done():
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+        if self._lock_file is not None:
+            self._lock_file.close()
+            self._lock_file = None
+
+    @property
+    def running(self) -> bool:
+        return self._task is not None and not self._task.done()
+
+    def status(self) -> dict:
+        return {"running": self.running, "interval": self.interval, "exchanges": self.results}
+
+
+_history_sync: Optional[HistorySync] = None
+
+
+def get_history_sync() -> HistorySync:
+    global _history_sync
+    if _history_sync is None:
+        _history_sync = HistorySync()
+    return _history_sync
@@ -0,0 +1,88 @@
+"""
+EventLoopLagMonitor - Đo độ trễ event loop của worker
+
+Task nền sleep LOOP_LAG_INTERVAL giây rồi đo thời gian thực tế: phần vượt quá interval là
+thời gian loop bị chặn (code đồng bộ: ký tx, parse JSON lớn ...). Giữ các mẫu gần nhất để
+tính p50 / p99 / max, hiển thị ở /api/status cùng số liệu của Lighter signer thread.
+
+ENV:
+    - LOOP_LAG_INTERVAL (default: 0.5 giây)
+    - LOOP_LAG_WARN_MS (default: 250, lag lớn hơn thì log cảnh báo)
+"""
+
+import asyncio
+import os
+import time
+from collections import deque
+from typing import Optional
+
+# ~5 phút mẫu với interval mặc định
+LAG_SAMPLES = 600
+
+
+class EventLoopLagMonitor:
+    """
+    Methods:
+        - start() / stop()
+        - status(): {'last_ms', 'p50_ms', 'p99_ms', 'max_ms', 'samples', 'slow'}
+    """
+
+    def __init__(self):
+        self.interval = float(os.getenv("LOOP_LAG_INTERVAL", 0.5))
+        self.warn_ms = float(os.getenv("LOOP_LAG_WARN_MS", 250))
+        self._samples = deque(maxlen=LAG_SAMPLES)
+        self.max_ms = 0.0
+        self.slow = 0
+        self._task: Optional[asyncio.Task] = None
+
+    async def _run(self):
+        while True:
+            started = time.perf_counter()
+            await asyncio.sleep(self.interval)
+            lag_ms = max(0.0, (time.perf_counter() - started - self.interval) * 1000)
+            self._samples.append(lag_ms)
+            self.max_ms = max(self.max_ms, lag_ms)
+            if lag_ms > self.warn_ms:
+                self.slow += 1
+                print(f"🐢 [LoopLag] Event loop bị chặn {lag_ms:.0f}ms")
+
+    def start(self) -> bool:
+        if self._task is not None and not self._task.done():
+            return True
+        self._task = asyncio.create_task(self._run(), name="loop-lag-monitor")
+        return True
+
+    async def stop(self):
+        if self._task is not None and not self._task.done():
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+
+    def _percentile(self, ordered: list, q: float) -> Optional[float]:
+        if not ordered:
+            return None
+        return round(ordered[min(len(ordered) - 1, int(q * len(ordered)))], 2)
+
+    def status(self) -> dict:
+        ordered = sorted(self._samples)
+        return {
+            "interval": self.interval,
+            "last_ms": round(self._samples[-1], 2) if self._samples else None,
+            "p50_ms": self._percentile(ordered, 0.50),
+            "p99_ms": self._percentile(ordered, 0.99),
+            "max_ms": round(self.max_ms, 2),
+            "samples": len(ordered),
+            "slow": self.slow,
+        }
+
+
+_monitor: Optional[EventLoopLagMonitor] = None
+
+
+def get_loop_lag_monitor() -> EventLoopLagMonitor:
+    global _monitor
+    if _monitor is None:
+        _monitor = EventLoopLagMonitor()
+    return _monitor
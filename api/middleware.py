@@ -0,0 +1,288 @@
+"""
+ASGI middleware cho unified API: ETag / If-None-Match và nén response (gzip / brotli)
+
+- ETagMiddleware: hash body JSON của các endpoint đọc, trả 304 nếu client đã có snapshot đó.
+  ETag là weak (W/"..."): hash body gốc trước khi nén, nên br / gzip / identity cùng 1 ETag
+  (strong ETag bắt buộc khác nhau theo encoding).
+- CompressionMiddleware: nén body >= minimum_size, ưu tiên brotli (nếu cài) rồi tới gzip.
+- DeadlineMiddleware: deadline budget cho mỗi request, truyền xuống mọi call đọc tới sàn.
+
+ETag và compression chỉ buffer response 1 chunk (JSON thường); response streaming được
+pass-through nguyên vẹn. DeadlineMiddleware không đụng tới body.
+"""
+
+import gzip
+import hashlib
+import os
+from typing import Iterable, Optional
+
+from starlette.datastructures import Headers, MutableHeaders
+
+# Optional: brotli (pip install brotli)
+try:
+    import brotli
+except Exception:
+    brotli = None  # type: ignore
+
+# Optional: orjson (pip install orjson)
+try:
+    import orjson
+except Exception:
+    orjson = None  # type: ignore
+
+
+def _env_flag(name: str, default: bool) -> bool:
+    value = os.getenv(name)
+    if value is None:
+        return default
+    return value.strip().lower() in ("1", "true", "yes", "on")
+
+
+def get_default_response_class():
+    """
+    Response class mặc định cho FastAPI app.
+
+    Bật fast path bằng API_FAST_JSON=1 (cần orjson); nếu không thì dùng JSONResponse mặc định.
+    """
+    from fastapi.responses import JSONResponse, ORJSONResponse
+
+    if _env_flag("API_FAST_JSON", False):
+        if orjson is not None:
+            print("⚡ [API] Fast JSON: ORJSONResponse")
+            return ORJSONResponse
+        print("⚠️  [API] API_FAST_JSON=1 nhưng orjson chưa được cài, dùng JSONResponse")
+    return JSONResponse
+
+
+def _etag_matches(if_none_match: str, etag: str) -> bool:
+    """So khớp If-None-Match (hỗ trợ list, W/ prefix và *)"""
+    if if_none_match.strip() == "*":
+        return True
+    opaque = etag[2:] if etag.startswith("W/") else etag
+    for candidate in if_none_match.split(","):
+        candidate = candidate.strip()
+        if candidate.startswith("W/"):
+            candidate = candidate[2:]
+        if candidate == opaque:
+            return True
+    return False
+
+
+class ETagMiddleware:
+    """
+    Gắn ETag cho response 200 của các endpoint GET chỉ định, trả 304 khi If-None-Match khớp.
+
+    Input:
+        - app: ASGI app
+        - paths: Danh sách path áp dụng (None = tất cả GET)
+    """
+
+    def __init__(self, app, paths: Optional[Iterable[str]] = None):
+        self.app = app
+        self.paths = frozenset(paths) if paths is not None else None
+
+    async def __call__(self, scope, receive, send):
+        if (
+            scope["type"] != "http"
+            or scope["method"] not in ("GET", "HEAD")
+            or (self.paths is not None and scope["path"] not in self.paths)
+        ):
+            await self.app(scope, receive, send)
+            return
+
+        if_none_match = Headers(scope=scope).get("if-none-match")
+        start_message = None
+        passthrough = False
+
+        async def send_with_etag(message):
+            nonlocal start_message, passthrough
+
+            if passthrough:
+                await send(message)
+                return
+
+            if message["type"] == "http.response.start":
+                start_message = message
+                if message["status"] != 200:
+                    passthrough = True
+                    await send(message)
+                return
+
+            if message["type"] != "http.response.body":
+                await send(message)
+                return
+
+            body = message.get("body", b"")
+            if message.get("more_body", False):
+                # Streaming response -> không tính ETag
+                passthrough = True
+                await send(start_message)
+                await send(message)
+                return
+
+            etag = 'W/"' + hashlib.blake2b(body, digest_size=16).hexdigest() + '"'
+            headers = MutableHeaders(raw=start_message["headers"])
+            headers["ETag"] = etag
+
+            if if_none_match and _etag_matches(if_none_match, etag):
+                del headers["Content-Length"]
+                del headers["Content-Type"]
+                start_message["status"] = 304
+                await send(start_message)
+                await send({"type": "http.response.body", "body": b""})
+                return
+
+            await send(start_message)
+            await send(message)
+
+        await self.app(scope, receive, send_with_etag)
+
+
+class CompressionMiddleware:
+    """
+    Nén response bằng brotli (nếu client hỗ trợ + có lib) hoặc gzip.
+
+    Input:
+        - app: ASGI app
+        - minimum_size: Chỉ nén body >= số bytes này (default: 1024)
+        - gzip_level: Mức nén gzip (default: 6)
+        - brotli_quality: Quality brotli (default: 4 - nhanh, đủ nhỏ cho JSON)
+    """
+
+    def __init__(self, app, minimum_size: int = 1024, gzip_level: int = 6, brotli_quality: int = 4):
+        self.app = app
+        self.minimum_size = minimum_size
+        self.gzip_level = gzip_level
+        self.brotli_quality = brotli_quality
+
+    def _pick_encoding(self, accept_encoding: str) -> Optional[str]:
+        accepted = {part.split(";")[0].strip().lower() for part in accept_encoding.split(",")}
+        if brotli is not None and "br" in accepted:
+            return "br"
+        if "gzip" in accepted:
+            return "gzip"
+        return None
+
+    def _compress(self, encoding: str, body: bytes) -> bytes:
+        if encoding == "br":
+            return brotli.compress(body, quality=self.brotli_quality)
+        return gzip.compress(body, compresslevel=self.gzip_level)
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        encoding = self._pick_encoding(Headers(scope=scope).get("accept-encoding", ""))
+        if encoding is None:
+            await self.app(scope, receive, send)
+            return
+
+        start_message = None
+        passthrough = False
+
+        async def send_compressed(message):
+            nonlocal start_message, passthrough
+
+            if passthrough:
+                await send(message)
+                return
+
+            if message["type"] == "http.response.start":
+                start_message = message
+                return
+
+            if message["type"] != "http.response.body":
+                await send(message)
+                return
+
+            body = message.get("body", b"")
+            headers = MutableHeaders(raw=start_message["headers"])
+
+            if (
+                message.get("more_body", False)
+                or len(body) < self.minimum_size
+                or "content-encoding" in headers
+            ):
+                passthrough = True
+                await send(start_message)
+                await send(message)
+                return
+
+            compressed = self._compress(encoding, body)
+            headers["Content-Encoding"] = encoding
+            headers["Content-Length"] = str(len(compressed))
+            headers.add_vary_header("Accept-Encoding")
+
+            await send(start_message)
+            await send({"type": "http.response.body", "body": compressed})
+
+        await self.app(scope, receive, send_compressed)
+
+
+class DeadlineMiddleware:
+    """
+    Đặt deadline end-to-end cho mỗi HTTP request (perpsdex/common/deadline.py).
+
+    Call đọc tới sàn bên dưới (giá, metadata, account, position, balance) không chờ quá thời
+    gian còn lại. Client có thể rút ngắn bằng header X-Request-Timeout (giây), không kéo dài được.
+
+    Input:
+        - app: ASGI app
+        - seconds: Deadline mặc định
+    """
+
+    def __init__(self, app, seconds: float):
+        self.app = app
+        self.seconds = seconds
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        from perpsdex.common.deadline import deadline_scope
+
+        seconds = self.seconds
+        requested = Headers(scope=scope).get("x-request-timeout")
+        if requested:
+            try:
+                seconds = min(seconds, max(float(requested), 0.0))
+            except ValueError:
+                pass
+
+        with deadline_scope(seconds):
+            await self.app(scope, receive, send)
+
+
+def setup_deadline_middleware(app):
+    """
+    ENV:
+        - API_REQUEST_DEADLINE (default: 20 giây, 0 = tắt)
+    """
+    seconds = float(os.getenv("API_REQUEST_DEADLINE", 20))
+    if seconds > 0:
+        app.add_middleware(DeadlineMiddleware, seconds=seconds)
+
+
+def setup_response_middleware(app, etag_paths: Iterable[str]):
+    """
+    Đăng ký ETag + compression cho app (cấu hình qua ENV).
+
+    ENV:
+        - API_ETAG (default: 1)
+        - API_COMPRESSION (default: 1)
+        - API_COMPRESSION_MIN_SIZE (default: 1024 bytes)
+
+    Thứ tự: ETag nằm trong (hash body gốc), compression nằm ngoài cùng.
+    """
+    if _env_flag("API_ETAG", True):
+        app.add_middleware(ETagMiddleware, paths=list(etag_paths))
+
+    if _env_flag("API_COMPRESSION", True):
+        minimum_size = int(os.getenv("API_COMPRESSION_MIN_SIZE", 1024))
+        app.add_middleware(CompressionMiddleware, minimum_size=minimum_size)
+        print(
+            f"🗜️  [API] Compression: {'brotli+gzip' if brotli is not None else 'gzip'} "
+            f"(>= {minimum_size} bytes)"
+        )
@@ -3,7 +3,7 @@ Pydantic models for API requests/responses
 """
 
 from pydantic import BaseModel, Field
-from typing import Optional, Literal
+from typing import List, Optional, Literal, Union
 
 
 class KeysConfig(BaseModel):
@@ -44,6 +44,7 @@ class LimitOrderRequest(BaseModel):
 class ClosePositionRequest(BaseModel):
     """Close position request"""
     keys: Optional[KeysConfig] = Field(None, description="API keys (optional if configured in ENV)")
+    account: Optional[str] = Field(None, description="Named account (see /api/accounts), default: ENV account")
     exchange: Literal["lighter", "aster"] = Field(..., description="lighter or aster")
     symbol: str = Field(..., description="BTC, ETH, SOL, etc")
     percentage: Optional[float] = Field(100, ge=0, le=100, description="Percentage to close (0-100, default: 100)")
@@ -60,16 +61,93 @@ class UnifiedOrderRequest(BaseModel):
     keys: Optional[KeysConfig] = Field(
         None, description="API keys (optional, nếu không gửi sẽ dùng ENV trên server)"
     )
+    account: Optional[str] = Field(None, description="Tên account (xem /api/accounts), không gửi = account ENV")
     exchange: Literal["lighter", "aster"] = Field(..., description="lighter hoặc aster")
     symbol: str = Field(..., description="Base token, ví dụ: BTC, ETH, SOL")
     side: Literal["long", "short"] = Field(..., description="Hướng lệnh: long hoặc short")
-    order_type: Literal["market", "limit"] = Field(..., description="Loại lệnh: market hoặc limit")
+    order_type: Literal["market", "limit", "twap"] = Field(
+        ..., description="Loại lệnh: market, limit hoặc twap (chia nhỏ lệnh market theo thời gian / depth)"
+    )
     size_usd: float = Field(..., gt=0, description="Khối lượng vị thế theo USD (chưa nhân leverage)")
-    leverage: float = Field(..., ge=1, description="Đòn bẩy (>=1)")
+    leverage: float = Field(..., ge=1, description="Đòn bẩy (>=1), set lên sàn khi khác giá trị đã set (làm tròn số nguyên)")
+    margin_mode: Optional[Literal["cross", "isolated"]] = Field(
+        None, description="Margin mode của symbol (optional, không gửi = giữ mode hiện tại)"
+    )
     limit_price: Optional[float] = Field(None, gt=0, description="Giá limit (bắt buộc nếu order_type = 'limit')")
     tp_price: Optional[float] = Field(None, gt=0, description="Giá Take Profit (optional)")
     sl_price: Optional[float] = Field(None, gt=0, description="Giá Stop Loss (optional)")
     max_slippage_percent: Optional[float] = Field(None, ge=0, description="Trượt giá tối đa cho lệnh market (%, optional)")
     client_order_id: Optional[str] = Field(None, description="ID phía client để idempotent/tracking (optional)")
     tag: Optional[str] = Field(None, description="Nhãn chiến lược / nguồn lệnh (optional)")
+    wait_for_fill: bool = Field(
+        False, description="True: chờ lệnh market/limit khớp (hoặc kết thúc) rồi mới trả về, entry_price = giá khớp thật"
+    )
+    wait_for_fill_timeout: Optional[float] = Field(
+        None, gt=0, le=60, description="Thời gian chờ khớp tối đa (giây, default: WAIT_FOR_FILL_TIMEOUT)"
+    )
+    # TWAP / slice execution (chỉ dùng khi order_type = 'twap')
+    twap_mode: Literal["time", "depth"] = Field(
+        "time", description="time: chia đều theo thời gian | depth: mỗi child lấy 1 phần depth đang hiển thị"
+    )
+    twap_slices: Optional[int] = Field(None, ge=1, le=500, description="Số child order (mode time, default: 10)")
+    twap_interval_seconds: float = Field(30.0, ge=0.2, le=3600, description="Khoảng cách giữa 2 child (giây)")
+    twap_depth_fraction: float = Field(
+        0.5, gt=0, le=1, description="Mode depth: tỉ lệ depth trong band max_slippage_percent mà 1 child được lấy"
+    )
+    twap_min_slice_usd: float = Field(10.0, gt=0, description="Child nhỏ nhất (USD)")
+    twap_max_duration_seconds: Optional[float] = Field(
+        None, gt=0, description="Hết thời gian thì dừng (status = expired), giữ phần đã khớp"
+    )
+
+
+
+class BatchCalculateRequest(BaseModel):
+    """
+    Batch calculator (không place order) - input dạng cột.
+
+    Mỗi field là 1 giá trị (áp cho mọi dòng) hoặc 1 mảng cùng độ dài N.
+    """
+    exchange: Union[Literal["lighter", "aster"], List[Literal["lighter", "aster"]]] = Field(
+        ..., description="lighter / aster, hoặc mảng theo từng dòng"
+    )
+    symbol: Union[str, List[str]] = Field(..., description="Base token, ví dụ: BTC hoặc ['BTC', 'ETH']")
+    side: Union[Literal["long", "short"], List[Literal["long", "short"]]] = Field(..., description="long / short")
+    size_usd: Union[float, List[float]] = Field(..., description="Khối lượng theo USD (chưa nhân leverage)")
+    leverage: Union[float, List[float]] = Field(1.0, description="Đòn bẩy")
+    sl_percent: Union[float, List[float]] = Field(3.0, description="% khoảng cách SL so với entry")
+    rr: Union[float, List[float]] = Field(2.0, description="Reward / risk, ví dụ 2 = 1:2")
+    entry_price: Optional[Union[float, List[Optional[float]]]] = Field(
+        None, description="Giá entry; dòng nào để trống sẽ lấy giá thị trường (ask cho long, bid cho short)"
+    )
+    max_sl_percent: float = Field(5.0, gt=0, description="SL xa hơn mức này bị kéo về (giống validate_sl_price)")
+    as_rows: bool = Field(False, description="True: trả list từng dòng thay vì dạng cột")
+
+
+class LadderOrderRequest(BaseModel):
+    """
+    Grid / ladder LIMIT order: chia [price_from, price_to] thành `levels` lệnh.
 
+    Tổng size_usd được phân bổ theo `distribution`, giá / size làm tròn theo tick / step của sàn.
+    """
+    keys: Optional[KeysConfig] = Field(
+        None, description="API keys (optional, nếu không gửi sẽ dùng ENV trên server)"
+    )
+    account: Optional[str] = Field(None, description="Tên account (xem /api/accounts), không gửi = account ENV")
+    exchange: Literal["lighter", "aster"] = Field(..., description="lighter hoặc aster")
+    symbol: str = Field(..., description="Base token, ví dụ: BTC, ETH, SOL")
+    side: Literal["long", "short"] = Field(..., description="Hướng lệnh: long hoặc short")
+    price_from: float = Field(..., gt=0, description="Giá level đầu tiên")
+    price_to: float = Field(..., gt=0, description="Giá level cuối cùng")
+    levels: int = Field(..., ge=1, le=200, description="Số level (lệnh)")
+    size_usd: float = Field(..., gt=0, description="Tổng khối lượng ladder theo USD (chưa nhân leverage)")
+    leverage: float = Field(1.0, ge=1, description="Đòn bẩy (>=1), chỉ set lên sàn khi được gửi")
+    margin_mode: Optional[Literal["cross", "isolated"]] = Field(
+        None, description="Margin mode của symbol (optional, không gửi = giữ mode hiện tại)"
+    )
+    distribution: Union[Literal["flat", "linear", "geometric"], List[float]] = Field(
+        "flat", description="flat | linear | geometric | list weights (1 weight / level)"
+    )
+    geometric_ratio: float = Field(1.5, gt=0, description="Tỉ lệ giữa 2 level liên tiếp khi distribution = geometric")
+    max_concurrency: int = Field(2, ge=1, le=8, description="Số batch gửi song song")
+    client_order_id: Optional[str] = Field(None, description="ID ladder phía client (optional)")
+    tag: Optional[str] = Field(None, description="Nhãn chiến lược / nguồn lệnh (optional)")
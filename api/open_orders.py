@@ -0,0 +1,159 @@
+"""
+LighterOpenOrderTracker - Giữ OpenOrderBook (perpsdex/lighter/utils/open_orders.py) khớp với sàn
+
+- Placement / cancel được OrderExecutor / RiskManager ghi thẳng vào book (incremental).
+- Loop nền gọi account_active_orders mỗi LIGHTER_OPEN_ORDERS_INTERVAL giây để áp fill
+  và xoá lệnh đã khớp hết / bị huỷ ngoài API này (1 request cho mọi market).
+- Account stream (perpsdex/lighter/core/account_stream.py) live: order đến qua stream, loop chỉ
+  full sync khi book cũ hơn LIGHTER_OPEN_ORDERS_MAX_AGE.
+- /api/orders/open đọc book in-memory, chỉ gọi sàn khi book chưa sync lần nào hoặc quá cũ.
+
+ENV:
+    - LIGHTER_OPEN_ORDERS_TRACKER (default: 1)
+    - LIGHTER_OPEN_ORDERS_INTERVAL (default: 5 giây)
+    - LIGHTER_OPEN_ORDERS_MAX_AGE (default: 30 giây, book cũ hơn thì /api/orders/open sync lại)
+"""
+
+import asyncio
+import os
+import time
+from typing import Optional
+
+# Auth token Lighter hết hạn sau 10 phút -> tạo lại trước khi hết hạn
+AUTH_TOKEN_TTL_SECONDS = 540
+
+
+def open_order_tracker_enabled() -> bool:
+    return os.getenv("LIGHTER_OPEN_ORDERS_TRACKER", "1").strip().lower() in ("1", "true", "yes", "on")
+
+
+class LighterOpenOrderTracker:
+    """
+    Sync OpenOrderBook của account Lighter (ENV keys) với active orders trên sàn
+
+    Methods:
+        - refresh(): 1 lần account_active_orders -> book.sync()
+        - ensure_synced(max_age): refresh nếu book chưa sync / quá cũ
+        - start() / stop(): Loop nền
+        - book(): OpenOrderBook của account
+    """
+
+    def __init__(self):
+        self.interval = float(os.getenv("LIGHTER_OPEN_ORDERS_INTERVAL", 5.0))
+        self.max_age = float(os.getenv("LIGHTER_OPEN_ORDERS_MAX_AGE", 30.0))
+        self.error: Optional[str] = None
+        self.last_result: Optional[dict] = None
+        self._keys: Optional[dict] = None
+        self._client = None
+        self._auth: Optional[str] = None
+        self._auth_created_at = 0.0
+        self._refresh_lock = asyncio.Lock()
+        self._task: Optional[asyncio.Task] = None
+
+    def _get_keys(self) -> dict:
+        if self._keys is None:
+            from api.utils import get_keys_or_env
+            self._keys = get_keys_or_env(None, "lighter")
+        return self._keys
+
+    def configured(self) -> bool:
+        return bool(self._get_keys().get("private_key"))
+
+    @property
+    def account_index(self) -> int:
+        return int(self._get_keys().get("account_index", 0))
+
+    def book(self):
+        from perpsdex.lighter.utils.open_orders import get_open_order_book
+        return get_open_order_book(self.account_index)
+
+    async def _ensure_client(self):
+        """1 LighterClient dùng lại giữa các lần refresh (không dựng SignerClient mỗi lần)"""
+        if self._client is None:
+            from api.utils import initialize_lighter_client
+            self._client = await initialize_lighter_client(self._get_keys())
+            self._auth = None
+        if self._auth is None or time.time() - self._auth_created_at > AUTH_TOKEN_TTL_SECONDS:
+            signer = self._client.get_signer_client()
+            auth, error = await signer.create_auth_token(self._client.api_key_index)
+            if error:
+                raise RuntimeError(f"auth token: {error}")
+            self._auth, self._auth_created_at = auth, time.time()
+        return self._client
+
+    async def _close_client(self):
+        if self._client is not None:
+            try:
+                await self._client.close()
+            except Exception:
+                pass
+        self._client = None
+        self._auth = None
+
+    async def refresh(self) -> dict:
+        """Lấy toàn bộ active orders (mọi market) và diff vào book"""
+        async with self._refresh_lock:
+            try:
+                client = await self._ensure_client()
+                response = await client.get_order_api().account_active_orders(
+                    authorization=self._auth, account_index=self.account_index
+                )
+                self.last_result = self.book().sync(response.orders or [])
+                self.error = None
+            except Exception as e:
+                self.error = str(getattr(e, "detail", e))
+                # Client / token có thể đã hỏng -> dựng lại ở lần sau
+                await self._close_client()
+                print(f"⚠️  [OpenOrders] Lighter refresh lỗi: {self.error}")
+            return {"success": self.error is None, "error": self.error, **(self.last_result or {})}
+
+    async def ensure_synced(self, max_age: Optional[float] = None):
+        age = self.book().age_seconds()
+        if age is None or age > (max_age if max_age is not None else self.max_age):
+            await self.refresh()
+
+    async def _run(self):
+        from perpsdex.lighter.utils.account_mirror import get_live_account_mirror
+
+        while True:
+            # Account stream live đã đẩy order vào book -> chỉ full sync khi book quá max_age
+            if get_live_account_mirror(self.account_index) is not None:
+                await self.ensure_synced()
+            else:
+                await self.refresh()
+            await asyncio.sleep(self.interval)
+
+    def start(self) -> bool:
+        if self._task is not None and not self._task.done():
+            return True
+        if not self.configured():
+            return False
+        self._task = asyncio.create_task(self._run(), name="lighter-open-orders")
+        print(f"📒 [OpenOrders] Lighter tracker started (account {self.account_index}, mỗi {self.interval}s)")
+        return True
+
+    async def stop(self):
+        if self._task is not None and not self._task.done():
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+        await self._close_client()
+
+    @property
+    def running(self) -> bool:
+        return self._task is not None and not self._task.done()
+
+    def status(self) -> dict:
+        return dict(self.book().to_dict(), running=self.running, error=self.error)
+
+
+_tracker: Optional[LighterOpenOrderTracker] = None
+
+
+def get_lighter_open_order_tracker() -> LighterOpenOrderTracker:
+    global _tracker
+    if _tracker is None:
+        _tracker = LighterOpenOrderTracker()
+    return _tracker
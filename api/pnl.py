@@ -0,0 +1,364 @@
+"""
+PnLEngine - Mark-to-market incremental cho mọi position đang mở
+
+- Position của mỗi sàn nằm trong ExchangePositions (mảng NumPy: entry, qty có dấu, mark, upnl),
+  sync lại từ exchange mỗi PNL_POSITION_SYNC_INTERVAL giây.
+- Mỗi tick giá chỉ tính lại các dòng của symbol đó và cộng delta vào tổng theo symbol / tag / sàn.
+- Sau mỗi vòng tick, 1 snapshot (dict bất biến) được publish; /api/pnl trả snapshot đó, O(1),
+  không gọi exchange.
+
+Nguồn giá: shared memory quote (multi-worker) nếu có, không thì REST theo symbol đang giữ.
+Tag lấy từ order gần nhất trong bảng orders cùng (exchange, symbol, side).
+
+ENV:
+    - PNL_ENGINE (default: 1)
+    - PNL_TICK_INTERVAL (default: 2 giây)
+    - PNL_POSITION_SYNC_INTERVAL (default: 30 giây)
+"""
+
+import asyncio
+import os
+import time
+from typing import Dict, List, Optional
+
+import numpy as np
+
+from api.shared_quotes import read_shared_quote
+from api.startup import get_db
+from perpsdex.common.deadline import clear_deadline
+
+UNTAGGED = "untagged"
+
+
+def pnl_engine_enabled() -> bool:
+    return os.getenv("PNL_ENGINE", "1").strip().lower() in ("1", "true", "yes", "on")
+
+
+def _empty_totals() -> dict:
+    return {"unrealized_pnl": 0.0, "notional": 0.0, "cost": 0.0, "positions": 0}
+
+
+class ExchangePositions:
+    """
+    Position của 1 sàn, lưu dạng cột
+
+    Arrays (cùng độ dài N):
+        - entry: giá entry
+        - qty: size có dấu (+ long, - short)
+        - mark: giá mark gần nhất
+        - upnl: (mark - entry) * qty
+
+    Index:
+        - symbol -> np.ndarray các dòng
+    """
+
+    def __init__(self, exchange: str):
+        self.exchange = exchange
+        self.symbols: List[str] = []
+        self.tags: List[str] = []
+        self.leverage = np.zeros(0)
+        self.entry = np.zeros(0)
+        self.qty = np.zeros(0)
+        self.mark = np.zeros(0)
+        self.upnl = np.zeros(0)
+        self._rows: Dict[str, np.ndarray] = {}
+        self.by_symbol: Dict[str, dict] = {}
+        self.by_tag: Dict[str, dict] = {}
+        self.synced_at: Optional[float] = None
+
+    def __len__(self) -> int:
+        return len(self.symbols)
+
+    def held_symbols(self) -> List[str]:
+        return list(self._rows)
+
+    def load(self, rows: List[dict], tags: Dict[tuple, str]):
+        """
+        Thay toàn bộ position (sau 1 lần sync), giữ mark cũ nếu symbol vẫn còn giữ
+
+        rows: output của get_lighter_positions / get_aster_positions
+        """
+        previous_marks = {symbol: float(self.mark[idx[0]]) for symbol, idx in self._rows.items()}
+
+        self.symbols = [r["symbol_base"] for r in rows]
+        self.tags = [tags.get((r["symbol_base"], r["side"]), UNTAGGED) for r in rows]
+        self.leverage = np.array([float(r.get("leverage") or 1) for r in rows])
+        self.entry = np.array([float(r["entry_price"]) for r in rows])
+        self.qty = np.array([
+            float(r["position_size"]) * (1 if r["side"] == "long" else -1) for r in rows
+        ])
+        self.mark = np.array([
+            previous_marks.get(r["symbol_base"]) or float(r.get("current_price") or r["entry_price"]) for r in rows
+        ])
+        self.upnl = (self.mark - self.entry) * self.qty
+
+        rows_by_symbol: Dict[str, list] = {}
+        for i, symbol in enumerate(self.symbols):
+            rows_by_symbol.setdefault(symbol, []).append(i)
+        self._rows = {symbol: np.array(idx, dtype=np.intp) for symbol, idx in rows_by_symbol.items()}
+        self.synced_at = time.time()
+        self._rebuild_totals()
+
+    def _rebuild_totals(self):
+        """Tính lại tổng theo symbol / tag từ đầu (chỉ gọi sau load)"""
+        self.by_symbol = {}
+        self.by_tag = {}
+        notional = np.abs(self.qty) * self.mark
+        cost = np.abs(self.qty) * self.entry
+        for i, symbol in enumerate(self.symbols):
+            for bucket in (self.by_symbol.setdefault(symbol, _empty_totals()),
+                           self.by_tag.setdefault(self.tags[i], _empty_totals())):
+                bucket["unrealized_pnl"] += float(self.upnl[i])
+                bucket["notional"] += float(notional[i])
+                bucket["cost"] += float(cost[i])
+                bucket["positions"] += 1
+
+    def update_mark(self, symbol: str, price: float) -> bool:
+        """
+        Tick giá cho 1 symbol: chỉ tính lại các dòng của symbol, cộng delta vào tổng
+
+        Output:
+            bool: True nếu có position bị ảnh hưởng
+        """
+        idx = self._rows.get(symbol)
+        if idx is None or price <= 0:
+            return False
+
+        old_upnl = self.upnl[idx]
+        old_notional = np.abs(self.qty[idx]) * self.mark[idx]
+        self.mark[idx] = price
+        new_upnl = (price - self.entry[idx]) * self.qty[idx]
+        self.upnl[idx] = new_upnl
+
+        delta_upnl = new_upnl - old_upnl
+        delta_notional = np.abs(self.qty[idx]) * price - old_notional
+        symbol_totals = self.by_symbol[symbol]
+        symbol_totals["unrealized_pnl"] += float(delta_upnl.sum())
+        symbol_totals["notional"] += float(delta_notional.sum())
+        for j, row in enumerate(idx):
+            tag_totals = self.by_tag[self.tags[row]]
+            tag_totals["unrealized_pnl"] += float(delta_upnl[j])
+            tag_totals["notional"] += float(delta_notional[j])
+        return True
+
+    def position_rows(self) -> List[dict]:
+        cost = np.abs(self.qty) * self.entry
+        pnl_percent = np.divide(self.upnl, cost, out=np.zeros_like(self.upnl), where=cost > 0) * 100
+        return [
+            {
+                "exchange": self.exchange,
+                "symbol_base": self.symbols[i],
+                "side": "long" if self.qty[i] > 0 else "short",
+                "tag": self.tags[i],
+                "position_size": float(abs(self.qty[i])),
+                "entry_price": float(self.entry[i]),
+                "mark_price": float(self.mark[i]),
+                "leverage": float(self.leverage[i]),
+                "pnl_usd": float(self.upnl[i]),
+                "pnl_percent": float(pnl_percent[i]),
+            }
+            for i in range(len(self.symbols))
+        ]
+
+
+def _add(bucket: dict, totals: dict):
+    for field in ("unrealized_pnl", "notional", "cost", "positions"):
+        bucket[field] += totals[field]
+
+
+def _merge(target: Dict[str, dict], source: Dict[str, dict]):
+    for key, totals in source.items():
+        _add(target.setdefault(key, _empty_totals()), totals)
+
+
+def _with_percent(totals: dict) -> dict:
+    result = dict(totals)
+    result["pnl_percent"] = totals["unrealized_pnl"] / totals["cost"] * 100 if totals["cost"] > 0 else 0.0
+    return result
+
+
+class PnLEngine:
+    """
+    Giữ ExchangePositions của 2 sàn + snapshot PnL mới nhất
+
+    Methods:
+        - start() / stop(): Background loop (tick giá + sync position)
+        - sync_positions(exchange): Load lại position từ exchange
+        - apply_marks(exchange, {symbol: price}): Tick giá (incremental)
+        - snapshot(): Snapshot hiện tại (O(1))
+    """
+
+    EXCHANGES = ("lighter", "aster")
+
+    def __init__(self):
+        self.books: Dict[str, ExchangePositions] = {ex: ExchangePositions(ex) for ex in self.EXCHANGES}
+        self.tick_interval = float(os.getenv("PNL_TICK_INTERVAL", 2.0))
+        self.sync_interval = float(os.getenv("PNL_POSITION_SYNC_INTERVAL", 30.0))
+        self.errors: Dict[str, Optional[str]] = {ex: None for ex in self.EXCHANGES}
+        self._version = 0
+        self._snapshot: dict = self._build_snapshot()
+        self._task: Optional[asyncio.Task] = None
+
+    # ------------------------------------------------------------------ snapshot
+
+    def snapshot(self) -> dict:
+        return self._snapshot
+
+    def _build_snapshot(self) -> dict:
+        self._version += 1
+        total = _empty_totals()
+        by_symbol: Dict[str, dict] = {}
+        by_tag: Dict[str, dict] = {}
+        by_exchange = {}
+        positions = []
+
+        for exchange, book in self.books.items():
+            exchange_totals = _empty_totals()
+            for totals in book.by_symbol.values():
+                _add(exchange_totals, totals)
+            by_exchange[exchange] = dict(
+                _with_percent(exchange_totals),
+                synced_at=book.synced_at,
+                error=self.errors[exchange],
+            )
+            _add(total, exchange_totals)
+            _merge(by_symbol, book.by_symbol)
+            _merge(by_tag, book.by_tag)
+            positions.extend(book.position_rows())
+
+        return {
+            "version": self._version,
+            "updated_at": time.time(),
+            "total": _with_percent(total),
+            "by_exchange": by_exchange,
+            "by_symbol": {k: _with_percent(v) for k, v in sorted(by_symbol.items())},
+            "by_tag": {k: _with_percent(v) for k, v in sorted(by_tag.items())},
+            "positions": positions,
+        }
+
+    def _publish(self):
+        self._snapshot = self._build_snapshot()
+
+    # ------------------------------------------------------------------ updates
+
+    def apply_marks(self, exchange: str, marks: Dict[str, float]) -> int:
+        """Tick giá cho nhiều symbol rồi publish 1 snapshot"""
+        book = self.books[exchange]
+        changed = sum(1 for symbol, price in marks.items() if book.update_mark(symbol, price))
+        if changed:
+            self._publish()
+        return changed
+
+    async def sync_positions(self, exchange: str) -> bool:
+        """Load lại position của 1 sàn bằng ENV keys (bỏ qua nếu chưa cấu hình key)"""
+        from api.utils import get_keys_or_env, initialize_lighter_client, initialize_aster_client
+        from api.positions import get_lighter_positions, get_aster_positions
+
+        keys = get_keys_or_env(None, exchange)
+        if not (keys.get("private_key") if exchange == "lighter" else keys.get("api_key")):
+            self.errors[exchange] = "keys chưa cấu hình"
+            return False
+
+        client = None
+        try:
+            if exchange == "lighter":
+                client = await initialize_lighter_client(keys)
+                rows = await get_lighter_positions(client, keys.get("account_index", 0), fetch_prices=False)
+            else:
+                client = await initialize_aster_client(keys)
+                rows = await get_aster_positions(client)
+            tags = await asyncio.to_thread(_load_tags, exchange)
+            self.books[exchange].load(rows, tags)
+            self.errors[exchange] = None
+            self._publish()
+            return True
+        except Exception as e:
+            self.errors[exchange] = str(e)
+            print(f"⚠️  [PnL] Sync {exchange} positions lỗi: {e}")
+            return False
+        finally:
+            if client is not None and hasattr(client, "close"):
+                try:
+                    await client.close()
+                except Exception:
+                    pass
+
+    async def _fetch_marks(self, exchange: str, symbols: List[str]) -> Dict[str, float]:
+        """Mid price cho các symbol đang giữ: shared memory trước, thiếu thì REST"""
+        marks = {}
+        missing = []
+        for symbol in symbols:
+            quote = read_shared_quote(exchange, symbol)
+            if quote:
+                marks[symbol] = quote["mid"]
+            else:
+                missing.append(symbol)
+
+        if missing:
+            from api.batch_calculator import fetch_quotes
+
+            for symbol, quote in (await fetch_quotes(exchange, missing)).items():
+                if quote.get("success"):
+                    marks[symbol] = quote["mid"]
+        return marks
+
+    async def _run(self):
+        # Có thể được start từ /api/pnl -> bỏ deadline của request đó
+        clear_deadline()
+        last_sync = {ex: 0.0 for ex in self.EXCHANGES}
+        while True:
+            started = time.time()
+            for exchange in self.EXCHANGES:
+                try:
+                    if started - last_sync[exchange] >= self.sync_interval:
+                        await self.sync_positions(exchange)
+                        last_sync[exchange] = started
+
+                    symbols = self.books[exchange].held_symbols()
+                    if symbols:
+                        self.apply_marks(exchange, await self._fetch_marks(exchange, symbols))
+                except Exception as e:
+                    print(f"⚠️  [PnL] Tick {exchange} lỗi: {e}")
+            await asyncio.sleep(max(self.tick_interval - (time.time() - started), 0.1))
+
+    def start(self):
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run(), name="pnl-engine")
+            print(f"📈 [PnL] Engine started (tick {self.tick_interval}s, sync {self.sync_interval}s)")
+
+    async def stop(self):
+        if self._task is not None and not self._task.done():
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+
+    @property
+    def running(self) -> bool:
+        return self._task is not None and not self._task.done()
+
+
+def _load_tags(exchange: str, limit: int = 500) -> Dict[tuple, str]:
+    """(symbol_base, side) -> tag của order gần nhất có tag trong bảng orders"""
+    db = get_db()
+    if db is None:
+        return {}
+    tags = {}
+    # query_orders trả về mới nhất trước -> giữ tag đầu tiên gặp
+    for order in db.query_orders(exchange=exchange, limit=limit):
+        key = (order["symbol_base"], order["side"])
+        if order.get("tag") and key not in tags:
+            tags[key] = order["tag"]
+    return tags
+
+
+_engine: Optional[PnLEngine] = None
+
+
+def get_pnl_engine() -> PnLEngine:
+    """Lấy engine singleton"""
+    global _engine
+    if _engine is None:
+        _engine = PnLEngine()
+    return _engine
@@ -1,21 +1,29 @@
 """
 Helper functions để lấy positions và open orders từ SDK
+
+Lỗi sàn / SDK được raise (không trả [] giả) -> breaker `read` tính là lỗi, cache account không
+lưu kết quả rỗng, risk / PnL engine giữ nguyên state cũ thay vì coi như không có position.
 """
 
-from typing import Dict, List, Optional
+from typing import Dict, List, Optional, TYPE_CHECKING
+
+from perpsdex.common.deadline import hedged_read
+from perpsdex.lighter.utils.market_registry import get_market_registry as get_lighter_registry
+from perpsdex.aster.utils.market_registry import get_market_registry as get_aster_registry
 
-from perpsdex.lighter.core.client import LighterClient
-from perpsdex.lighter.core.market import MarketData as LighterMarketData
-from perpsdex.lighter.utils.config import ConfigLoader as LighterConfigLoader
-from perpsdex.aster.core.client import AsterClient
-from perpsdex.aster.core.market import MarketData as AsterMarketData
-from perpsdex.aster.core.order import OrderExecutor as AsterOrderExecutor
+# Exchange stack được import lazy trong từng hàm (xem api/startup.py)
+if TYPE_CHECKING:
+    from perpsdex.lighter.core.client import LighterClient
+    from perpsdex.aster.core.client import AsterClient
 
 
-async def get_lighter_positions(client: LighterClient, account_index: int) -> List[Dict]:
+async def get_lighter_positions(client: "LighterClient", account_index: int, fetch_prices: bool = True) -> List[Dict]:
     """
     Lấy positions từ Lighter và tính PnL
     
+    fetch_prices=False: không gọi order book cho từng position (current_price = entry_price),
+    dùng khi caller tự mark-to-market (VD: PnLEngine).
+    
     Returns:
         List[Dict]: [
             {
@@ -35,132 +43,54 @@ async def get_lighter_positions(client: LighterClient, account_index: int) -> Li
             }
         ]
     """
+    from perpsdex.lighter.utils.account_mirror import get_account_mirror, get_live_account_mirror
+
     try:
-        print(f"[Lighter Positions] Starting... account_index={account_index}")
-        
-        # Lấy trực tiếp từ Account API để xem raw data và dùng nó thay vì qua MarketData
-        account_api = client.get_account_api()
-        print(f"[Lighter Positions] Getting account data directly from Account API...")
-        accounts_data = await account_api.account(by='index', value=str(account_index))
-        
-        if not accounts_data or not accounts_data.accounts:
-            print(f"[Lighter Positions] ❌ No account data found")
-            return []
-        
-        account = accounts_data.accounts[0]
-        raw_positions = account.positions or []
-        print(f"[Lighter Positions] Raw positions from account: {len(raw_positions)}")
-        
-        if not raw_positions:
-            print("[Lighter Positions] ⚠️ No positions in account")
-            return []
-        
-        # Log từng position object để xem structure
-        positions_to_process = []
-        for idx, raw_pos in enumerate(raw_positions):
-            print(f"[Lighter Positions] Raw position {idx+1}: {raw_pos}")
-            print(f"[Lighter Positions] Raw position {idx+1} type: {type(raw_pos)}")
-            if hasattr(raw_pos, '__dict__'):
-                print(f"[Lighter Positions] Raw position {idx+1} __dict__: {raw_pos.__dict__}")
-            # Try to get all attributes
-            attrs = [attr for attr in dir(raw_pos) if not attr.startswith('_')]
-            print(f"[Lighter Positions] Raw position {idx+1} attributes: {attrs}")
-            
-            # Lighter dùng field 'position' (string), không phải 'size'
-            market_id = getattr(raw_pos, 'market_id', None)
-            position_str = getattr(raw_pos, 'position', '0')
-            sign = getattr(raw_pos, 'sign', 1)  # 1 = long, -1 = short (có thể)
-            
-            # Convert position string to float
-            try:
-                position_float = float(position_str) if position_str is not None else 0.0
-            except (ValueError, TypeError):
-                print(f"[Lighter Positions] ⚠️ Cannot convert position to float: {position_str} (type: {type(position_str)})")
-                position_float = 0.0
-            
-            # Size = position * sign (nếu sign được dùng để chỉ direction)
-            # Nhưng từ logs, position='0.00119' và sign=1, có vẻ position đã là absolute value
-            # Vậy size = position_float, và side được xác định sau
-            size = position_float
-            
-            avg_entry_price = getattr(raw_pos, 'avg_entry_price', 0)
-            try:
-                avg_entry_price = float(avg_entry_price) if avg_entry_price is not None else 0.0
-            except (ValueError, TypeError):
-                avg_entry_price = 0.0
-            
-            # Log để debug
-            print(f"[Lighter Positions] Raw position {idx+1}.position = {position_str} (type: {type(position_str)})")
-            print(f"[Lighter Positions] Raw position {idx+1}.sign = {sign} (type: {type(sign)})")
-            print(f"[Lighter Positions] Raw position {idx+1} converted: position_float={position_float}, size={size}")
-            
-            print(f"[Lighter Positions] Position {idx+1} extracted: market_id={market_id}, size={size}, entry={avg_entry_price}")
-            
-            # Chỉ thêm position có size != 0
-            if size != 0:
-                positions_to_process.append({
-                    'market_id': market_id,
-                    'size': size,
-                    'avg_entry_price': avg_entry_price,
-                    'raw': raw_pos  # Keep raw for debugging
-                })
-        
-        print(f"[Lighter Positions] Positions with size != 0: {len(positions_to_process)}")
-        
-        if not positions_to_process:
-            print("[Lighter Positions] ⚠️ All positions have size=0, skipping")
+        # Account stream live -> đọc mirror local, không thì 1 lần account_api.account rồi nạp vào mirror
+        mirror = get_live_account_mirror(account_index)
+        if mirror is None:
+            account_api = client.get_account_api()
+            accounts_data = await hedged_read(
+                "lighter.account", lambda: account_api.account(by='index', value=str(account_index))
+            )
+            if not accounts_data or not accounts_data.accounts:
+                raise RuntimeError(f"Lighter: không tìm thấy account {account_index}")
+            mirror = get_account_mirror(account_index)
+            mirror.load_account(accounts_data.accounts[0])
+
+        positions = mirror.open_positions()
+        if not positions:
             return []
-        
-        # Use positions_to_process (đã lấy trực tiếp từ Account API)
-        positions = positions_to_process
-        print(f"[Lighter Positions] Processing {len(positions)} positions with size != 0...")
-        
+
+        from perpsdex.lighter.core.market import MarketData as LighterMarketData
+
         market = LighterMarketData(
             client.get_order_api(),
             client.get_account_api()
         )
         
+        registry = get_lighter_registry()
+        
         # Convert market_id sang symbol và lấy giá hiện tại
         formatted_positions = []
-        for idx, pos in enumerate(positions):
-            market_id = pos['market_id']
-            size = pos['size']
-            entry_price = pos['avg_entry_price']
-            raw_pos = pos.get('raw')  # Keep raw for additional fields if needed
-            
-            print(f"[Lighter Positions] Processing position {idx+1}: market_id={market_id}, size={size}, entry_price={entry_price}")
+        for pos in positions:
+            market_id = pos.market_id
+            entry_price = pos.entry_price
             
-            # Lấy symbol từ market_id (reverse mapping)
-            try:
-                # Reverse lookup từ PAIR_TO_MARKET_ID
-                pair_to_market = LighterConfigLoader.PAIR_TO_MARKET_ID
-                market_to_pair = {v: k for k, v in pair_to_market.items()}
-                pair = market_to_pair.get(market_id)
-                if pair:
-                    symbol_base = pair.split('-')[0]  # BTC-USDT -> BTC
-                else:
-                    symbol_base = f"MARKET_{market_id}"
-            except Exception:
-                symbol_base = f"MARKET_{market_id}"
+            # Lấy symbol từ market_id (reverse index của MarketRegistry)
+            symbol_base = registry.get_symbol(market_id) or f"MARKET_{market_id}"
             
             # Lấy giá hiện tại
-            try:
-                print(f"[Lighter Positions] Getting price for market_id={market_id}, symbol={symbol_base}...")
-                price_result = await market.get_price(market_id, symbol_base)
-                print(f"[Lighter Positions] Price result: success={price_result.get('success')}, mid={price_result.get('mid')}")
-                current_price = price_result.get('mid', entry_price) if price_result.get('success') else entry_price
-            except Exception as price_err:
-                print(f"[Lighter Positions] ⚠️ Error getting price: {price_err}, using entry_price")
-                current_price = entry_price
+            current_price = entry_price
+            if fetch_prices:
+                try:
+                    price_result = await market.get_price(market_id, symbol_base)
+                    current_price = price_result.get('mid', entry_price) if price_result.get('success') else entry_price
+                except Exception as price_err:
+                    print(f"[Lighter Positions] ⚠️ Error getting price: {price_err}, using entry_price")
             
-            # Xác định side (dựa vào sign từ raw position, hoặc mặc định long nếu size > 0)
-            if raw_pos:
-                sign = getattr(raw_pos, 'sign', 1)
-                # sign=1 thường là long, nhưng cần kiểm tra
-                side = 'long' if sign >= 0 else 'short'
-            else:
-                side = 'long' if size > 0 else 'short'
-            size_abs = abs(size)
+            side = pos.side
+            size_abs = abs(pos.size)
             
             # Tính PnL
             if side == 'long':
@@ -182,7 +112,8 @@ async def get_lighter_positions(client: LighterClient, account_index: int) -> Li
                 'side': side,
                 'order_type': 'market',  # Lighter không lưu order_type trong position
                 'size_usd': size_usd,
-                'leverage': 1,  # Lighter không lưu leverage trong position
+                # Leverage suy ra từ initial_margin_fraction của position
+                'leverage': pos.leverage or 1,
                 'entry_price': entry_price,
                 'current_price': current_price,
                 'position_size': size_abs,
@@ -193,41 +124,42 @@ async def get_lighter_positions(client: LighterClient, account_index: int) -> Li
                 'market_id': market_id,  # Thêm market_id để dùng khi close
                 'created_at': None  # Lighter không lưu created_at
             })
-            print(f"[Lighter Positions] ✅ Added position: {symbol_base} {side} {size_abs} @ ${entry_price}")
         
-        print(f"[Lighter Positions] ✅ Total formatted positions: {len(formatted_positions)}")
         return formatted_positions
         
     except Exception as e:
-        import traceback
         print(f"[Lighter Positions] ❌ Exception: {e}")
-        traceback.print_exc()
-        return []
+        raise
 
 
-async def get_aster_positions(client: AsterClient) -> List[Dict]:
+async def get_aster_positions(client: "AsterClient") -> List[Dict]:
     """
     Lấy positions từ Aster (đã có PnL sẵn)
     
     Returns:
         List[Dict]: Same format as get_lighter_positions
     """
+    from perpsdex.aster.core.market import MarketData as AsterMarketData
+
     try:
         market = AsterMarketData(client)
         result = await market.get_positions()
         
         if not result.get('success'):
-            return []
+            raise RuntimeError(f"Aster: lấy positions thất bại: {result.get('error') or result.get('message')}")
         
         positions = result.get('positions', [])
         if not positions:
             return []
         
+        registry = get_aster_registry()
         formatted_positions = []
         for pos in positions:
             symbol = pos.get('symbol', '')
-            # Remove USDT suffix: BTCUSDT -> BTC
-            symbol_base = symbol.replace('USDT', '') if symbol.endswith('USDT') else symbol
+            # BTCUSDT -> BTC (qua registry, fallback bỏ suffix USDT)
+            symbol_base = registry.get_base_symbol(symbol) or (
+                symbol[:-len('USDT')] if symbol.endswith('USDT') else symbol
+            )
             
             side_str = pos.get('side', 'LONG')
             side = 'long' if side_str == 'LONG' else 'short'
@@ -275,89 +207,76 @@ async def get_aster_positions(client: AsterClient) -> List[Dict]:
         
     except Exception as e:
         print(f"[Aster] Error getting positions: {e}")
-        return []
+        raise
 
 
-async def get_lighter_open_orders(client: LighterClient, account_index: int) -> List[Dict]:
+def get_lighter_open_orders(account_index: int, market_id: Optional[int] = None) -> List[Dict]:
     """
-    Lấy open orders từ Lighter (từ DB vì SDK không có method trực tiếp)
-    
+    Lấy open orders Lighter từ OpenOrderBook in-memory (O(k), không gọi sàn / DB)
+
+    Book được cập nhật khi đặt / huỷ lệnh và sync với active orders của sàn bởi
+    LighterOpenOrderTracker (api/open_orders.py).
+
     Returns:
         List[Dict]: [
             {
                 'exchange': 'lighter',
                 'symbol_base': 'BTC',
                 'side': 'long' | 'short',
-                'order_type': 'limit',
+                'order_type': 'limit' | 'take_profit' | 'stop_loss' | ...,
                 'size_usd': float,
-                'leverage': int,
                 'limit_price': float,
                 'tp_price': Optional[float],
                 'sl_price': Optional[float],
-                'exchange_order_id': str
+                'client_order_index': int,
+                'exchange_order_id': Optional[str],
+                'size', 'filled', 'remaining': float (coin),
+                'status': 'pending' (chưa được sàn xác nhận) | 'open' | ...
             }
         ]
     """
-    print(f"[Lighter Open Orders] Starting... account_index={account_index}")
-    
-    # Lighter SDK không có method để lấy open orders trực tiếp
-    # Cần query từ DB các lệnh LIMIT/TP/SL đang ở trạng thái 'submitted' hoặc 'pending'
-    # và chưa có position_size_asset > 0
-    
-    # Import query_orders nếu chưa có
-    try:
-        from db import query_orders as _query_orders
-    except Exception as _db_import_err:
-        print(f"[Lighter Open Orders] ⚠️ DB module not available: {_db_import_err}")
-        return []
-    
-    try:
-        print("[Lighter Open Orders] Querying DB for submitted/pending LIMIT/TP/SL orders...")
-        lighter_open_orders_db = _query_orders(
-            exchange="lighter",
-            status="submitted",  # Hoặc 'pending' nếu muốn hiển thị cả lệnh chưa gửi
-            order_type=["limit", "take_profit", "stop_loss"]
-        )
-        
-        print(f"[Lighter Open Orders] Found {len(lighter_open_orders_db)} orders from DB")
-        
-        formatted_open_orders = []
-        for order in lighter_open_orders_db:
-            # Chỉ lấy các lệnh chưa khớp hoặc khớp 1 phần nhỏ
-            position_size = order.get("position_size_asset", 0) or 0
-            if position_size == 0:
-                formatted_open_orders.append({
-                    "exchange": "lighter",
-                    "symbol_base": order.get("symbol_base"),
-                    "side": order.get("side"),
-                    "order_type": order.get("order_type"),
-                    "size_usd": order.get("size_usd"),
-                    "leverage": order.get("leverage"),
-                    "limit_price": order.get("limit_price"),
-                    "tp_price": order.get("tp_price"),
-                    "sl_price": order.get("sl_price"),
-                    "client_order_id": order.get("client_order_id"),
-                    "exchange_order_id": order.get("exchange_order_id"),
-                    "created_at": order.get("created_at"),
-                })
-        
-        print(f"[Lighter Open Orders] ✅ Returning {len(formatted_open_orders)} open orders from DB")
-        return formatted_open_orders
-        
-    except Exception as e:
-        import traceback
-        print(f"[Lighter Open Orders] ❌ Error getting open orders: {e}")
-        traceback.print_exc()
-        return []
+    from perpsdex.lighter.utils.open_orders import get_open_order_book
 
+    registry = get_lighter_registry()
+    formatted_open_orders = []
+    for order in get_open_order_book(account_index).orders(market_id):
+        order_type = order["order_type"]
+        trigger_price = order.get("trigger_price")
+        price = order.get("price") or 0
+        remaining = order.get("remaining") if order.get("remaining") is not None else order.get("size")
+        formatted_open_orders.append({
+            "exchange": "lighter",
+            "symbol_base": registry.get_symbol(order["market_id"]),
+            "market_id": order["market_id"],
+            "side": order["side"],
+            "order_type": order_type,
+            "size_usd": price * (remaining or 0),
+            "leverage": None,
+            "limit_price": price,
+            "tp_price": trigger_price if "take" in order_type else None,
+            "sl_price": trigger_price if "stop" in order_type else None,
+            "reduce_only": order["reduce_only"],
+            "client_order_index": order["client_order_index"],
+            "client_order_id": str(order["client_order_index"]),
+            "exchange_order_id": str(order["order_index"]) if order.get("order_index") is not None else None,
+            "size": order.get("size"),
+            "filled": order.get("filled"),
+            "remaining": remaining,
+            "status": order["status"],
+            "created_at": order["created_at"],
+        })
+    return formatted_open_orders
 
-async def get_aster_open_orders(client: AsterClient, symbol: Optional[str] = None) -> List[Dict]:
+
+async def get_aster_open_orders(client: "AsterClient", symbol: Optional[str] = None) -> List[Dict]:
     """
     Lấy open orders từ Aster
     
     Returns:
         List[Dict]: Same format as get_lighter_open_orders
     """
+    from perpsdex.aster.core.order import OrderExecutor as AsterOrderExecutor
+
     try:
         print(f"[Aster Open Orders] Starting... symbol={symbol}")
         executor = AsterOrderExecutor(client)
@@ -372,7 +291,7 @@ async def get_aster_open_orders(client: AsterClient, symbol: Optional[str] = Non
         if not result.get('success'):
             error_msg = result.get('message', 'Unknown error')
             print(f"[Aster Open Orders] ❌ Failed: {error_msg}")
-            return []
+            raise RuntimeError(f"Aster: lấy open orders thất bại: {error_msg}")
         
         orders = result.get('orders', [])
         print(f"[Aster Open Orders] Found {len(orders)} orders")
@@ -380,10 +299,13 @@ async def get_aster_open_orders(client: AsterClient, symbol: Optional[str] = Non
             print("[Aster Open Orders] ⚠️ No orders found")
             return []
         
+        registry = get_aster_registry()
         formatted_orders = []
         for order in orders:
             symbol_full = order.get('symbol', '')
-            symbol_base = symbol_full.replace('USDT', '') if symbol_full.endswith('USDT') else symbol_full
+            symbol_base = registry.get_base_symbol(symbol_full) or (
+                symbol_full[:-len('USDT')] if symbol_full.endswith('USDT') else symbol_full
+            )
             
             side_str = order.get('side', 'BUY')
             side = 'long' if side_str == 'BUY' else 'short'
@@ -417,8 +339,6 @@ async def get_aster_open_orders(client: AsterClient, symbol: Optional[str] = Non
         return formatted_orders
         
     except Exception as e:
-        import traceback
         print(f"[Aster Open Orders] ❌ Error getting open orders: {e}")
-        traceback.print_exc()
-        return []
+        raise
 
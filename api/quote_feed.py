@@ -0,0 +1,194 @@
+"""
+Quote feed process - writer duy nhất của SharedQuoteTable (api/shared_quotes.py)
+
+Chạy trong 1 process riêng khi api_server khởi động nhiều worker (API_WORKERS > 1)
+hoặc API_SHARED_QUOTES=1:
+    - Metadata: refresh MarketRegistry 2 sàn 1 lần lúc start + mỗi QUOTE_FEED_METADATA_INTERVAL giây
+    - Aster: 1 request /fapi/v1/ticker/bookTicker cho toàn bộ symbol mỗi tick
+    - Lighter: order_book_orders cho các symbol trong QUOTE_FEED_LIGHTER_SYMBOLS mỗi tick
+
+ENV:
+    - QUOTE_FEED_INTERVAL (default: 1.0 giây)
+    - QUOTE_FEED_METADATA_INTERVAL (default: 3600 giây)
+    - QUOTE_FEED_LIGHTER_SYMBOLS (default: BTC,ETH,SOL)
+
+Chạy tay: python -m api.quote_feed
+"""
+
+import asyncio
+import multiprocessing
+import os
+import time
+
+from dotenv import load_dotenv
+
+from api.shared_quotes import SharedQuoteTable, DEPTH_LEVELS, default_path
+
+
+def _publish_metadata(table: SharedQuoteTable) -> dict:
+    from perpsdex.lighter.utils.market_registry import get_market_registry as get_lighter_registry
+    from perpsdex.aster.utils.market_registry import get_market_registry as get_aster_registry
+
+    counts = {}
+    for exchange, registry in (("lighter", get_lighter_registry()), ("aster", get_aster_registry())):
+        counts[exchange] = sum(
+            1 for market in registry.all_markets() if table.publish_metadata(exchange, market) is not None
+        )
+    return counts
+
+
+async def _refresh_metadata(table: SharedQuoteTable):
+    from api.utils import refresh_market_registries
+
+    try:
+        status = await refresh_market_registries(use_shared=False)
+        for exchange, result in status.items():
+            if not result.get("success"):
+                print(f"⚠️  [QuoteFeed] {exchange}: refresh lỗi, dùng registry từ JSON ({result.get('error')})")
+    except Exception as e:
+        print(f"⚠️  [QuoteFeed] Không refresh được market registry: {e}")
+    counts = _publish_metadata(table)
+    print(f"📋 [QuoteFeed] Metadata: lighter={counts['lighter']} aster={counts['aster']} markets")
+
+
+async def _poll_aster(table: SharedQuoteTable, client) -> int:
+    """1 request bookTicker cho mọi symbol"""
+    from perpsdex.aster.utils.market_registry import get_market_registry as get_aster_registry
+
+    result = await client._request("GET", "/fapi/v1/ticker/bookTicker", signed=False)
+    if not result.get("success") or not isinstance(result.get("data"), list):
+        return 0
+
+    registry = get_aster_registry()
+    published = 0
+    for row in result["data"]:
+        symbol = registry.get_base_symbol(row.get("symbol", ""))
+        if symbol is None:
+            continue
+        bid = float(row.get("bidPrice") or 0)
+        ask = float(row.get("askPrice") or 0)
+        if bid <= 0 or ask <= 0:
+            continue
+        published += table.publish_quote(
+            "aster", symbol, bid, ask,
+            bids=[(bid, float(row.get("bidQty") or 0))],
+            asks=[(ask, float(row.get("askQty") or 0))],
+        )
+    return published
+
+
+async def _poll_lighter(table: SharedQuoteTable, order_api, symbols: list) -> int:
+    """order_book_orders song song cho các symbol cấu hình"""
+    from perpsdex.lighter.utils.market_registry import get_market_registry as get_lighter_registry
+
+    registry = get_lighter_registry()
+
+    async def _one(symbol):
+        market_id = registry.get_market_id(symbol)
+        if market_id is None:
+            return False
+        data = await order_api.order_book_orders(market_id=market_id, limit=DEPTH_LEVELS)
+        if not data or not data.bids or not data.asks:
+            return False
+        bids = [(float(o.price), float(o.remaining_base_amount)) for o in data.bids]
+        asks = [(float(o.price), float(o.remaining_base_amount)) for o in data.asks]
+        return table.publish_quote("lighter", symbol, bids[0][0], asks[0][0], bids=bids, asks=asks)
+
+    results = await asyncio.gather(*(_one(s) for s in symbols), return_exceptions=True)
+    return sum(1 for r in results if r is True)
+
+
+async def _feed_loop(table: SharedQuoteTable):
+    from api.startup import ensure_stack_loaded
+    from api.utils import get_keys_or_env
+
+    interval = float(os.getenv("QUOTE_FEED_INTERVAL", 1.0))
+    metadata_interval = float(os.getenv("QUOTE_FEED_METADATA_INTERVAL", 3600))
+    lighter_symbols = [
+        s.strip().upper() for s in os.getenv("QUOTE_FEED_LIGHTER_SYMBOLS", "BTC,ETH,SOL").split(",") if s.strip()
+    ]
+
+    await _refresh_metadata(table)
+    metadata_at = time.time()
+
+    lighter_api_client = order_api = None
+    if ensure_stack_loaded("lighter"):
+        from lighter import ApiClient, Configuration, OrderApi
+        from perpsdex.lighter.core.client import LighterClient
+
+        lighter_api_client = ApiClient(configuration=Configuration(host=LighterClient.DEFAULT_URL))
+        order_api = OrderApi(lighter_api_client)
+
+    aster_client = None
+    if ensure_stack_loaded("aster"):
+        from perpsdex.aster.core.client import AsterClient
+
+        keys = get_keys_or_env(None, "aster")
+        aster_client = AsterClient(
+            api_url=keys["api_url"],
+            api_key=keys.get("api_key") or "",
+            secret_key=keys.get("secret_key") or "",
+        )
+
+    print(f"📡 [QuoteFeed] Publishing to {table.path} mỗi {interval}s (lighter: {', '.join(lighter_symbols)})")
+    try:
+        while True:
+            started = time.time()
+            if started - metadata_at > metadata_interval:
+                await _refresh_metadata(table)
+                metadata_at = started
+
+            tasks = []
+            if aster_client is not None:
+                tasks.append(_poll_aster(table, aster_client))
+            if order_api is not None:
+                tasks.append(_poll_lighter(table, order_api, lighter_symbols))
+            for result in await asyncio.gather(*tasks, return_exceptions=True):
+                if isinstance(result, Exception):
+                    print(f"⚠️  [QuoteFeed] Poll lỗi: {result}")
+
+            table.heartbeat()
+            await asyncio.sleep(max(interval - (time.time() - started), 0.05))
+    finally:
+        if lighter_api_client is not None:
+            await lighter_api_client.close()
+        if aster_client is not None:
+            await aster_client.close()
+
+
+def run_quote_feed(path: str = None):
+    """Entry point của feed process (blocking)"""
+    load_dotenv()
+    table = SharedQuoteTable(path=path or default_path(), create=True)
+    try:
+        asyncio.run(_feed_loop(table))
+    except KeyboardInterrupt:
+        pass
+    finally:
+        table.close()
+
+
+def start_quote_feed_process(path: str = None) -> multiprocessing.Process:
+    """
+    Start feed process (spawn) và chờ tới khi file shared memory đã được tạo
+
+    Output:
+        multiprocessing.Process (daemon, tự tắt cùng process cha)
+    """
+    path = path or default_path()
+    if os.path.exists(path):
+        os.remove(path)
+
+    process = multiprocessing.get_context("spawn").Process(
+        target=run_quote_feed, args=(path,), name="quote-feed", daemon=True
+    )
+    process.start()
+
+    deadline = time.time() + 10
+    while not os.path.exists(path) and time.time() < deadline and process.is_alive():
+        time.sleep(0.05)
+    return process
+
+
+if __name__ == "__main__":
+    run_quote_feed()
@@ -0,0 +1,190 @@
+"""
+Readiness pre-warm - Làm nóng mọi thứ lệnh đầu tiên cần trước khi báo ready
+
+Chạy song song lúc startup (trong warm_up của api_server.py):
+    - db: import SQLAlchemy + _init_engine + connect thử (pool đã có connection)
+    - markets: MarketRegistry 2 sàn (JSON + refresh từ exchange / shared memory)
+    - lighter: dựng LighterClient (load signer library, SignerClient trên signer thread,
+      check key) rồi snapshot order book PREWARM_SYMBOLS vào DepthBook
+    - aster: AsterClient + ping (DNS / TLS) rồi lấy giá PREWARM_SYMBOLS
+Sàn chưa cấu hình key (hoặc PREWARM_ENABLED=0) -> component 'skipped', db + markets vẫn chạy.
+Nhiều worker: chỉ worker primary (api/startup.py is_primary_worker) warm 2 sàn, worker còn lại
+chỉ warm db + markets (lighter / aster 'skipped').
+
+GET /api/ready: 200 khi mọi component đã xong (ready / failed / skipped), 503 khi còn đang warm.
+Trạng thái từng component: status, ms, error.
+
+ENV:
+    - PREWARM_ENABLED (default: 1)
+    - PREWARM_SYMBOLS (default: BTC,ETH)
+    - PREWARM_TIMEOUT (default: 30 giây / component)
+"""
+
+import asyncio
+import os
+import time
+from typing import Dict, List, Optional
+
+PENDING = "pending"
+WARMING = "warming"
+READY = "ready"
+FAILED = "failed"
+SKIPPED = "skipped"
+
+COMPONENTS = ("db", "markets", "lighter", "aster")
+
+
+def prewarm_enabled() -> bool:
+    return os.getenv("PREWARM_ENABLED", "1").strip().lower() in ("1", "true", "yes", "on")
+
+
+def _prewarm_symbols() -> List[str]:
+    return [s.strip().upper() for s in os.getenv("PREWARM_SYMBOLS", "BTC,ETH").split(",") if s.strip()]
+
+
+class Readiness:
+    """
+    Trạng thái pre-warm của từng component
+
+    Methods:
+        - pre_warm(exchanges): Chạy mọi component song song (1 lần), exchanges=False bỏ qua 2 sàn
+        - status(): {'ready', 'components': {name: {status, ms, error, detail}}}
+    """
+
+    def __init__(self):
+        self.timeout = float(os.getenv("PREWARM_TIMEOUT", 30))
+        self.components: Dict[str, dict] = {name: {"status": PENDING} for name in COMPONENTS}
+        self.exchanges = True
+        self.started_at: Optional[float] = None
+        self.finished_at: Optional[float] = None
+        self._markets_done = asyncio.Event()
+
+    # ------------------------------------------------------------------ components
+
+    async def _warm_db(self) -> Optional[dict]:
+        from api.startup import ensure_stack_loaded, get_db
+
+        if not await asyncio.to_thread(ensure_stack_loaded, "db"):
+            print("\n⚠️  [DB] Database module không available, skip connection check.")
+            raise RuntimeError("Database module không available")
+
+        db_status = await asyncio.to_thread(get_db().test_db_connection)
+        status_icon = "✅" if db_status["connected"] else "❌" if db_status["status"] == "failed" else "⚠️"
+        print(f"\n{status_icon} [DB] {db_status['message']}")
+        if db_status["status"] == "not_configured":
+            return None
+        if not db_status["connected"]:
+            print("   ⚠️  Orders sẽ KHÔNG được lưu vào database cho đến khi fix lỗi.")
+            raise RuntimeError(db_status["message"])
+        return {"status": db_status["status"]}
+
+    async def _warm_markets(self) -> dict:
+        from api.utils import refresh_market_registries
+
+        registry_status = await refresh_market_registries()
+        for ex, status in registry_status.items():
+            icon = "✅" if status.get("success") else "⚠️"
+            print(f"{icon} [Markets] {ex}: {status.get('count', 0)} markets")
+        return {ex: status.get("count", 0) for ex, status in registry_status.items()}
+
+    async def _warm_lighter(self) -> Optional[dict]:
+        from api.utils import get_keys_or_env, initialize_lighter_client, normalize_symbol
+
+        keys = get_keys_or_env(None, "lighter")
+        if not self.exchanges or not prewarm_enabled() or not keys.get("private_key"):
+            return None
+
+        client = await initialize_lighter_client(keys)
+        try:
+            from perpsdex.lighter.core.market import MarketData
+
+            await self._markets_done.wait()
+            market = MarketData(client.get_order_api(), client.get_account_api())
+            prices = {}
+            for symbol in _prewarm_symbols():
+                norm = normalize_symbol("lighter", symbol)
+                result = await market.get_price(norm["market_id"], symbol)
+                await market.get_market_metadata(norm["market_id"])
+                prices[symbol] = result.get("mid") if result.get("success") else None
+            return {"keys_mismatch": client.keys_mismatch, "prices": prices}
+        finally:
+            await client.close()
+
+    async def _warm_aster(self) -> Optional[dict]:
+        from api.utils import get_keys_or_env, initialize_aster_client, normalize_symbol
+
+        keys = get_keys_or_env(None, "aster")
+        if not self.exchanges or not prewarm_enabled() or not keys.get("api_key") or not keys.get("secret_key"):
+            return None
+
+        client = await initialize_aster_client(keys)
+        try:
+            from perpsdex.aster.core.market import MarketData
+
+            await self._markets_done.wait()
+            market = MarketData(client)
+            prices = {}
+            for symbol in _prewarm_symbols():
+                norm = normalize_symbol("aster", symbol)
+                result = await market.get_price(norm["symbol_pair"])
+                prices[symbol] = result.get("mid") if result.get("success") else None
+            return {"prices": prices}
+        finally:
+            await client.close()
+
+    # ------------------------------------------------------------------ run
+
+    async def _run_component(self, name: str, warm):
+        component = self.components[name]
+        component.update(status=WARMING, error=None)
+        started = time.perf_counter()
+        try:
+            detail = await asyncio.wait_for(warm(), timeout=self.timeout)
+            component["status"] = SKIPPED if detail is None else READY
+            component["detail"] = detail
+        except Exception as e:
+            component["status"] = FAILED
+            component["error"] = str(getattr(e, "detail", e)) or type(e).__name__
+            print(f"⚠️  [Ready] {name}: {component['error']}")
+        finally:
+            if name == "markets":
+                self._markets_done.set()
+        component["ms"] = round((time.perf_counter() - started) * 1000, 1)
+
+    async def pre_warm(self, exchanges: bool = True) -> dict:
+        """DB, markets, client 2 sàn và giá khởi tạo - chạy song song"""
+        self.exchanges = exchanges
+        self.started_at = time.time()
+        await asyncio.gather(
+            self._run_component("db", self._warm_db),
+            self._run_component("markets", self._warm_markets),
+            self._run_component("lighter", self._warm_lighter),
+            self._run_component("aster", self._warm_aster),
+        )
+        self.finished_at = time.time()
+        summary = ", ".join(f"{name}={c['status']}" for name, c in self.components.items())
+        print(f"🔥 [Ready] Pre-warm xong sau {self.finished_at - self.started_at:.1f}s ({summary})")
+        return self.status()
+
+    @property
+    def ready(self) -> bool:
+        return all(c["status"] not in (PENDING, WARMING) for c in self.components.values())
+
+    def status(self) -> dict:
+        return {
+            "ready": self.ready,
+            "healthy": all(c["status"] != FAILED for c in self.components.values()),
+            "started_at": self.started_at,
+            "finished_at": self.finished_at,
+            "components": self.components,
+        }
+
+
+_readiness: Optional[Readiness] = None
+
+
+def get_readiness() -> Readiness:
+    global _readiness
+    if _readiness is None:
+        _readiness = Readiness()
+    return _readiness
@@ -0,0 +1,258 @@
+"""
+OrderReconciler - Đối soát bảng orders (journal) với trạng thái thật trên sàn
+
+Dòng orders dừng ở 'submitted' sau khi gửi lệnh; reconciler chạy nền để chốt status cuối:
+- Lấy theo batch (id tăng dần) các dòng market / limit chưa ở trạng thái cuối.
+- Trạng thái sàn đọc hàng loạt từ bảng exchange_orders (HistorySync đã đồng bộ):
+  Lighter theo client_order_id, Aster theo exchange_order_id -> 1 query / batch, không gọi sàn.
+- Order Aster chưa có trong exchange_orders (ngoài cửa sổ allOrders) -> GET /fapi/v1/order
+  từng lệnh, giới hạn bởi token bucket + số call tối đa / vòng.
+- Diff -> chỉ dòng thay đổi được ghi bằng 1 executemany UPDATE.
+- Incremental: batch đầy thì vòng sau đi tiếp từ id cuối, batch thiếu thì quay về đầu.
+
+ENV:
+    - RECONCILE_ENABLED (default: 1, cần DB)
+    - RECONCILE_INTERVAL (default: 120 giây)
+    - RECONCILE_BATCH_SIZE (default: 1000 dòng / vòng)
+    - RECONCILE_MAX_EXCHANGE_CALLS (default: 50 call sàn / vòng)
+    - RECONCILE_RATE_PER_SECOND (default: 5 call / giây)
+"""
+
+import asyncio
+import os
+import time
+from typing import Dict, List, Optional
+
+
+def reconcile_enabled() -> bool:
+    return os.getenv("RECONCILE_ENABLED", "1").strip().lower() in ("1", "true", "yes", "on")
+
+
+class _TokenBucket:
+    """Rate limit đơn giản: tối đa `rate` call / giây, burst = rate"""
+
+    def __init__(self, rate: float):
+        self.rate = max(rate, 0.1)
+        self.tokens = self.rate
+        self.updated = time.monotonic()
+
+    async def acquire(self):
+        while True:
+            now = time.monotonic()
+            self.tokens = min(self.rate, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+            if self.tokens >= 1:
+                self.tokens -= 1
+                return
+            await asyncio.sleep((1 - self.tokens) / self.rate)
+
+
+def _journal_update(journal: dict, exchange_order: dict) -> Optional[dict]:
+    """
+    Order trên sàn -> update cho dòng journal (None nếu không có gì thay đổi)
+
+    Status sàn (Lighter: 'filled', 'canceled-*', 'open' ... / Aster: 'filled', 'canceled',
+    'partially_filled' ...) được quy về: filled | cancelled | rejected | partially_filled.
+    """
+    status = (exchange_order.get("status") or "").lower()
+    filled = exchange_order.get("filled_asset") or 0.0
+    filled_usd = exchange_order.get("filled_usd") or 0.0
+
+    if status.startswith("filled"):
+        new_status = "filled"
+    elif status.startswith(("cancel", "expired")):
+        new_status = "cancelled"
+    elif status.startswith("rejected"):
+        new_status = "rejected"
+    elif filled > 0:
+        new_status = "partially_filled"
+    else:
+        new_status = journal["status"]
+
+    if filled > 0:
+        entry_price = filled_usd / filled if filled_usd else exchange_order.get("price")
+        size = filled
+    elif new_status in ("cancelled", "rejected"):
+        # Không khớp gì -> bỏ giá requested đã ghi lúc đặt lệnh
+        entry_price, size = None, 0.0
+    else:
+        entry_price, size = journal["entry_price_filled"], journal["position_size_asset"]
+
+    update = {
+        "id": journal["id"],
+        "status": new_status,
+        "entry_price_filled": entry_price,
+        "position_size_asset": size,
+    }
+    unchanged = (
+        new_status == journal["status"]
+        and entry_price == journal["entry_price_filled"]
+        and size == journal["position_size_asset"]
+    )
+    return None if unchanged else update
+
+
+class OrderReconciler:
+    """
+    Background job đối soát orders <-> exchange
+
+    Methods:
+        - run_once(): 1 batch (dùng cho POST /api/orders/reconcile)
+        - start() / stop()
+        - status(): Kết quả vòng gần nhất + cursor
+    """
+
+    def __init__(self):
+        self.interval = float(os.getenv("RECONCILE_INTERVAL", 120))
+        self.batch_size = int(os.getenv("RECONCILE_BATCH_SIZE", 1000))
+        self.max_exchange_calls = int(os.getenv("RECONCILE_MAX_EXCHANGE_CALLS", 50))
+        self._bucket = _TokenBucket(float(os.getenv("RECONCILE_RATE_PER_SECOND", 5)))
+        self.cursor_id = 0
+        self._exchange_calls = 0
+        self.last_result: Optional[dict] = None
+        self._run_lock = asyncio.Lock()
+        self._task: Optional[asyncio.Task] = None
+        self._lock_file = None
+
+    async def _exchange_state(self, journal: List[dict]) -> Dict[int, dict]:
+        """{journal id: exchange order row} - bulk từ DB, fallback gọi sàn cho Aster"""
+        from api.startup import get_db
+
+        db = get_db()
+        by_exchange: Dict[str, List[dict]] = {}
+        for row in journal:
+            by_exchange.setdefault(row["exchange"], []).append(row)
+
+        state: Dict[int, dict] = {}
+        for exchange, rows in by_exchange.items():
+            # Journal Lighter lưu client_order_index, Aster lưu orderId của sàn
+            key_column = "client_order_id" if exchange == "lighter" else "exchange_order_id"
+            found = await asyncio.to_thread(
+                db.lookup_exchange_orders, exchange, key_column, [r["exchange_order_id"] for r in rows]
+            )
+            for row in rows:
+                if row["exchange_order_id"] in found:
+                    state[row["id"]] = found[row["exchange_order_id"]]
+
+        missing = [r for r in by_exchange.get("aster", []) if r["id"] not in state][: self.max_exchange_calls]
+        if missing:
+            state.update(await self._fetch_aster(missing))
+        return state
+
+    async def _fetch_aster(self, rows: List[dict]) -> Dict[int, dict]:
+        from fastapi import HTTPException
+        from api.history_sync import get_history_sync
+        from api.utils import normalize_symbol
+
+        requests, ids = [], {}
+        for row in rows:
+            try:
+                symbol = normalize_symbol("aster", row["symbol_base"])["symbol_api"]
+            except HTTPException:
+                continue
+            requests.append((symbol, row["exchange_order_id"]))
+            ids[row["exchange_order_id"]] = row["id"]
+
+        self._exchange_calls += len(requests)
+        fetched = await get_history_sync().fetch_aster_orders(requests, throttle=self._bucket.acquire)
+        return {ids[order_id]: row for order_id, row in fetched.items() if order_id in ids}
+
+    async def run_once(self) -> dict:
+        from api.history_sync import get_history_sync
+        from api.startup import get_db
+
+        db = await asyncio.to_thread(get_db)
+        if db is None or not db.DB_URL:
+            return {"success": False, "error": "DB chưa cấu hình"}
+
+        async with self._run_lock:
+            started = time.time()
+            self._exchange_calls = 0
+            try:
+                # Không có job sync nền ở worker này -> tự kéo exchange_orders mới nhất trước
+                history = get_history_sync()
+                if not history.running:
+                    await history.sync_once()
+
+                journal = await asyncio.to_thread(db.query_open_journal_orders, self.cursor_id, self.batch_size)
+                state = await self._exchange_state(journal) if journal else {}
+                updates = [
+                    update for update in (_journal_update(row, state[row["id"]]) for row in journal if row["id"] in state)
+                    if update is not None
+                ]
+                updated = await asyncio.to_thread(db.bulk_update_order_status, updates)
+
+                self.cursor_id = journal[-1]["id"] if len(journal) >= self.batch_size else 0
+                result = {
+                    "success": True,
+                    "checked": len(journal),
+                    "matched": len(state),
+                    "updated": updated,
+                    "unresolved": len(journal) - len(state),
+                    "exchange_calls": self._exchange_calls,
+                }
+            except Exception as e:
+                result = {"success": False, "error": str(getattr(e, "detail", e))}
+                print(f"⚠️  [Reconciler] Lỗi: {result['error']}")
+
+            result["cursor"] = self.cursor_id
+            result["reconciled_at"] = time.time()
+            result["duration_ms"] = round((time.time() - started) * 1000, 1)
+            self.last_result = result
+            if result.get("updated"):
+                print(f"🧾 [Reconciler] Cập nhật {result['updated']}/{result['checked']} order")
+            return result
+
+    async def _run(self):
+        while True:
+            await self.run_once()
+            # Còn batch tiếp theo -> chạy ngay, không chờ interval
+            await asyncio.sleep(1 if self.cursor_id else self.interval)
+
+    def start(self) -> bool:
+        from api.startup import acquire_worker_lock
+
+        if self._task is not None and not self._task.done():
+            return True
+        if self._lock_file is None:
+            self._lock_file = acquire_worker_lock("reconciler")
+        if self._lock_file is None:
+            print("ℹ️  [Reconciler] Đang chạy ở process khác")
+            return False
+        self._task = asyncio.create_task(self._run(), name="order-reconciler")
+        print(f"🧾 [Reconciler] Started (mỗi {self.interval}s, batch {self.batch_size})")
+        return True
+
+    async def stop(self):
+        if self._task is not None and not self._task.done():
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+        if self._lock_file is not None:
+            self._lock_file.close()
+            self._lock_file = None
+
+    @property
+    def running(self) -> bool:
+        return self._task is not None and not self._task.done()
+
+    def status(self) -> dict:
+        return {
+            "running": self.running,
+            "interval": self.interval,
+            "batch_size": self.batch_size,
+            "cursor": self.cursor_id,
+            "last_result": self.last_result,
+        }
+
+
+_reconciler: Optional[OrderReconciler] = None
+
+
+def get_order_reconciler() -> OrderReconciler:
+    global _reconciler
+    if _reconciler is None:
+        _reconciler = OrderReconciler()
+    return _reconciler
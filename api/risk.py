@@ -0,0 +1,185 @@
+"""
+PreTradeRiskEngine - Check exposure / margin in-memory trước khi ký / gửi lệnh
+
+- Ledger (perpsdex/common/exposure.py) giữ notional theo (sàn, symbol) / sàn / tag (cộng mọi
+  account đã cấu hình trong AccountRegistry) + balance snapshot của account ENV, check 1 lệnh chỉ
+  mất vài micro giây (không gọi sàn).
+- /api/order, /api/orders/ladder: reserve trước khi dispatch (reject -> 400, journal 'rejected'),
+  commit khi lệnh vào sàn, release khi lỗi. TWAP giữ chỗ cả parent, commit phần đã khớp khi kết thúc.
+- /api/positions/close: trả exposure + margin ngay sau khi đóng.
+- Loop nền sync balance + position mọi account của 2 sàn mỗi RISK_SYNC_INTERVAL giây để sửa sai
+  lệch (fill ngoài API này, limit order chưa khớp, funding ...). Client lấy từ ClientPool; 1 account
+  lỗi -> bỏ qua lần sync đó của sàn, ledger giữ nguyên.
+
+Lệnh của account khác ENV chỉ bị check limit theo lệnh / exposure, không check margin. Lệnh gửi kèm
+keys riêng (không có trong AccountRegistry) chỉ nằm trong ledger tới lần sync kế tiếp.
+Ledger là in-memory của từng worker: chạy nhiều worker thì lệnh của worker khác chỉ thấy sau lần sync.
+
+ENV:
+    - RISK_ENGINE (default: 1)
+    - RISK_SYNC_INTERVAL (default: 30 giây)
+    - RISK_MAX_* / RISK_CHECK_MARGIN / RISK_MARGIN_BUFFER: xem perpsdex/common/exposure.py
+"""
+
+import asyncio
+import os
+import time
+from typing import Dict, Optional
+
+from fastapi import HTTPException
+
+from perpsdex.common.exposure import ExposureLedger, Reservation
+
+
+def risk_engine_enabled() -> bool:
+    return os.getenv("RISK_ENGINE", "1").strip().lower() in ("1", "true", "yes", "on")
+
+
+class PreTradeRiskEngine:
+    """
+    Methods:
+        - reserve_order(...): Check + giữ chỗ, raise HTTPException 400 nếu vi phạm limit
+        - commit(reservation, filled_usd) / release(reservation)
+        - on_close(exchange, symbol, percentage)
+        - sync(exchange): Balance (account ENV) + position mọi account từ sàn
+        - start() / stop(): Loop sync nền
+    """
+
+    EXCHANGES = ("lighter", "aster")
+
+    def __init__(self):
+        self.ledger = ExposureLedger()
+        self.sync_interval = float(os.getenv("RISK_SYNC_INTERVAL", 30.0))
+        self.errors: Dict[str, Optional[str]] = {ex: None for ex in self.EXCHANGES}
+        self._task: Optional[asyncio.Task] = None
+
+    # ------------------------------------------------------------------ pre-trade
+
+    def reserve_order(self, exchange: str, symbol: str, side: str, size_usd: float, leverage: float,
+                      tag: Optional[str] = None, own_account: bool = True) -> Optional[Reservation]:
+        if not risk_engine_enabled():
+            return None
+        reservation, reason = self.ledger.reserve(
+            exchange, symbol.upper(), side, size_usd, leverage, tag=tag, account=own_account
+        )
+        if reason is not None:
+            print(f"🛑 [Risk] Reject {exchange} {side} {symbol.upper()} ${size_usd}: {reason}")
+            raise HTTPException(status_code=400, detail=f"Risk check: {reason}")
+        return reservation
+
+    def commit(self, reservation: Optional[Reservation], filled_usd: Optional[float] = None):
+        self.ledger.commit(reservation, filled_usd)
+
+    def release(self, reservation: Optional[Reservation]):
+        self.ledger.release(reservation)
+
+    def on_close(self, exchange: str, symbol: str, percentage: float):
+        if risk_engine_enabled():
+            self.ledger.apply_close(exchange, symbol.upper(), percentage / 100.0)
+
+    # ------------------------------------------------------------------ sync
+
+    async def _fetch(self, account, balance: bool) -> tuple:
+        """(balance | None, position rows) của 1 account, qua client dùng chung của ClientPool"""
+        from api.accounts import is_transport_error
+        from api.balance import get_lighter_balance, get_aster_balance
+        from api.positions import get_lighter_positions, get_aster_positions
+
+        try:
+            client = await account.client()
+            if account.exchange == "lighter":
+                result = await get_lighter_balance(client, account.account_index) if balance else None
+                rows = await get_lighter_positions(client, account.account_index, fetch_prices=False)
+            else:
+                result = await get_aster_balance(client) if balance else None
+                rows = await get_aster_positions(client)
+        except Exception as e:
+            if is_transport_error(e):
+                account.drop_client()
+            raise RuntimeError(f"account {account.name}: {e}") from e
+        if result is not None and not result.get("success"):
+            raise RuntimeError(f"account {account.name}: {result.get('error') or 'lỗi lấy balance'}")
+        return result, rows
+
+    async def sync(self, exchange: str) -> bool:
+        """
+        Load lại balance (account ENV) + position của mọi account đã cấu hình trên 1 sàn.
+
+        Chỉ ghi vào ledger khi mọi account đều lấy được: 1 account lỗi -> giữ nguyên ledger
+        (không xoá exposure đang có bằng danh sách rỗng / thiếu).
+        """
+        from api.accounts import get_account_registry
+
+        registry = get_account_registry()
+        accounts = registry.select(exchange, "all")
+        if not accounts:
+            self.errors[exchange] = "keys chưa cấu hình"
+            return False
+
+        default = registry.find(exchange)
+        try:
+            results = await asyncio.gather(*(self._fetch(a, a is default) for a in accounts))
+        except Exception as e:
+            self.errors[exchange] = str(e)
+            print(f"⚠️  [Risk] Sync {exchange} lỗi, giữ nguyên ledger: {e}")
+            return False
+
+        for account, (balance, _) in zip(accounts, results):
+            if account is default:
+                self.ledger.load_account(
+                    exchange, balance.get("available", 0), balance.get("total", 0), balance.get("collateral")
+                )
+        self.ledger.load_positions(exchange, [
+            {
+                "symbol": r["symbol_base"],
+                "side": r["side"],
+                "notional": float(r["position_size"]) * float(r.get("current_price") or r["entry_price"]),
+                "leverage": r.get("leverage"),
+            }
+            for _, rows in results
+            for r in rows
+        ])
+        self.errors[exchange] = None
+        return True
+
+    async def _run(self):
+        while True:
+            started = time.time()
+            for exchange in self.EXCHANGES:
+                await self.sync(exchange)
+            await asyncio.sleep(max(self.sync_interval - (time.time() - started), 1.0))
+
+    def start(self):
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run(), name="risk-engine")
+            print(f"🛡️  [Risk] Pre-trade engine started (sync {self.sync_interval}s)")
+
+    async def stop(self):
+        if self._task is not None and not self._task.done():
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+
+    @property
+    def running(self) -> bool:
+        return self._task is not None and not self._task.done()
+
+    def status(self) -> dict:
+        return dict(
+            self.ledger.status(),
+            enabled=risk_engine_enabled(),
+            running=self.running,
+            errors=self.errors,
+        )
+
+
+_engine: Optional[PreTradeRiskEngine] = None
+
+
+def get_risk_engine() -> PreTradeRiskEngine:
+    global _engine
+    if _engine is None:
+        _engine = PreTradeRiskEngine()
+    return _engine
@@ -2,18 +2,23 @@
 API routes
 """
 
+import asyncio
+import sys
+import time
 from typing import Optional
-from fastapi import APIRouter, HTTPException
+from fastapi import APIRouter, HTTPException, Query
 from fastapi.responses import HTMLResponse
 
-from api.models import UnifiedOrderRequest, ClosePositionRequest
+from api.models import UnifiedOrderRequest, ClosePositionRequest, BatchCalculateRequest, LadderOrderRequest
 from api.handlers import (
     handle_lighter_order,
     handle_aster_order,
     handle_lighter_close_position,
     handle_aster_close_position,
+    handle_ladder_order,
+    handle_twap_order,
 )
-from api.utils import get_keys_or_env, initialize_lighter_client, initialize_aster_client
+from api.utils import get_keys_or_env
 from api.positions import (
     get_lighter_positions,
     get_aster_positions,
@@ -24,18 +29,13 @@ from api.balance import (
     get_lighter_balance,
     get_aster_balance,
 )
-
-# Import DB functions (optional)
-try:
-    from db import (
-        log_order_request,
-        update_order_after_result,
-        query_orders,
-    )
-except Exception:
-    log_order_request = None
-    update_order_after_result = None
-    query_orders = None
+from api.circuit_breaker import exchange_guard
+from api.risk import get_risk_engine
+from api.fills import get_fill_dispatcher
+from api.accounts import DEFAULT_ACCOUNT, get_account_registry, invalidate_account_state, is_transport_error
+from api.sequencer import get_order_sequencer
+from api.startup import get_db, get_startup_profile
+from api.shared_quotes import get_shared_quotes
 
 router = APIRouter()
 
@@ -43,82 +43,219 @@ router = APIRouter()
 @router.get("/api/status")
 async def get_status():
     """Health check"""
+    from api.circuit_breaker import circuit_status
+    from api.account_streams import get_account_streams
+    from api.loop_monitor import get_loop_lag_monitor
+    from perpsdex.common.deadline import get_hedged_reader
+    from perpsdex.common.leverage import get_leverage_cache
+    from perpsdex.common.order_ids import get_order_index_allocator
+
+    shared_quotes = get_shared_quotes()
+    # Chỉ có số liệu signer khi đã dựng Lighter client (không import exchange stack ở healthcheck)
+    signer_worker = sys.modules.get("perpsdex.lighter.utils.signer_worker")
     return {
         "status": "online",
         "message": "Trading API Server is running",
+        "startup": get_startup_profile(),
+        "shared_quotes": shared_quotes.status() if shared_quotes is not None else None,
+        "event_loop": get_loop_lag_monitor().status(),
+        "lighter_signer": signer_worker.get_signer_worker().stats() if signer_worker else None,
+        "hedged_reads": get_hedged_reader().stats(),
+        "circuits": circuit_status(),
+        "leverage_cache": get_leverage_cache().stats(),
+        "fills": get_fill_dispatcher().status(),
+        "account_streams": get_account_streams().status(),
+        "order_index": get_order_index_allocator().status(),
+        "order_sequencer": get_order_sequencer().status(),
     }
 
 
+@router.get("/api/ready")
+async def get_ready():
+    """Readiness: 200 khi pre-warm xong (DB, markets, client + giá 2 sàn), 503 khi còn đang warm"""
+    from fastapi.responses import JSONResponse
+    from api.readiness import get_readiness
+
+    status = get_readiness().status()
+    return JSONResponse(status_code=200 if status["ready"] else 503, content=status)
+
+
+@router.get("/api/pnl")
+async def get_pnl(include_positions: bool = True):
+    """
+    Snapshot PnL mark-to-market (tổng, theo sàn / symbol / tag, từng position).
+
+    Đọc snapshot in-memory của PnLEngine, không gọi exchange. Position được sync nền
+    mỗi PNL_POSITION_SYNC_INTERVAL giây, giá mỗi PNL_TICK_INTERVAL giây.
+    """
+    from api.pnl import get_pnl_engine, pnl_engine_enabled
+
+    engine = get_pnl_engine()
+    if pnl_engine_enabled() and not engine.running:
+        engine.start()
+
+    snapshot = engine.snapshot()
+    if not include_positions:
+        snapshot = {key: value for key, value in snapshot.items() if key != "positions"}
+    return {"success": True, "running": engine.running, **snapshot}
+
+
+def _timeseries_window(start: Optional[float], end: Optional[float], window: Optional[int]):
+    now = time.time()
+    end = end if end is not None else now
+    if start is None:
+        start = end - (window if window is not None else 3600)
+    if start >= end:
+        raise HTTPException(status_code=400, detail="start phải nhỏ hơn end")
+    return start, end
+
+
+def _query_timeseries(name: str, start, end, window, resolution: str, max_points: int):
+    from api.timeseries import get_timeseries_store, TIER_RESOLUTION
+
+    if resolution != "auto" and resolution not in TIER_RESOLUTION:
+        raise HTTPException(status_code=400, detail=f"resolution phải là auto/{'/'.join(TIER_RESOLUTION)}")
+    start, end = _timeseries_window(start, end, window)
+    result = get_timeseries_store().query(name, start, end, resolution=resolution, max_points=max_points)
+    return {"success": True, "start": start, "end": end, **result}
+
+
+@router.get("/api/risk")
+async def get_risk():
+    """
+    Pre-trade risk: exposure theo sàn / tag / (sàn, symbol), balance snapshot, limits,
+    số lệnh bị reject theo rule (in-memory, không gọi sàn)
+    """
+    return get_risk_engine().status()
+
+
+@router.get("/api/timeseries")
+async def list_timeseries():
+    """Danh sách series equity / position đang lưu + trạng thái sampler"""
+    from api.timeseries import get_timeseries_store, get_equity_sampler
+
+    store = get_timeseries_store()
+    return {
+        "success": True,
+        "sampler_running": get_equity_sampler().running,
+        "directory": store.directory,
+        "series": await asyncio.to_thread(store.list_series),
+    }
+
+
+@router.get("/api/timeseries/equity")
+async def get_equity_curve(
+    exchange: str = "total",
+    start: Optional[float] = None,
+    end: Optional[float] = None,
+    window: Optional[int] = Query(None, gt=0, description="Số giây tính ngược từ end (default 3600)"),
+    resolution: str = "auto",
+    max_points: int = Query(1500, ge=10, le=20000),
+):
+    """
+    Equity curve dạng cột (t, balance, available, unrealized_pnl, equity, notional, positions).
+
+    resolution=auto chọn tier (1s/1m/1h) mịn nhất mà window không vượt max_points.
+    """
+    if exchange not in ("total", "lighter", "aster"):
+        raise HTTPException(status_code=400, detail="exchange phải là total/lighter/aster")
+    return await asyncio.to_thread(
+        _query_timeseries, f"equity:{exchange}", start, end, window, resolution, max_points
+    )
+
+
+@router.get("/api/timeseries/position")
+async def get_position_series(
+    exchange: str,
+    symbol: str,
+    start: Optional[float] = None,
+    end: Optional[float] = None,
+    window: Optional[int] = Query(None, gt=0),
+    resolution: str = "auto",
+    max_points: int = Query(1500, ge=10, le=20000),
+):
+    """Lịch sử net position của 1 symbol (size có dấu, entry, mark, notional, unrealized_pnl)"""
+    if exchange not in ("lighter", "aster"):
+        raise HTTPException(status_code=400, detail="exchange phải là lighter/aster")
+    return await asyncio.to_thread(
+        _query_timeseries, f"position:{exchange}:{symbol.upper()}", start, end, window, resolution, max_points
+    )
+
+
+async def _for_accounts(exchange: Optional[str], accounts: Optional[str], load) -> tuple:
+    """
+    Chạy load(account, call) song song cho mọi account được chọn (mỗi account có client / rate
+    budget riêng). call = GuardedCall của exchange_guard: load gọi call.fail() khi sàn trả lỗi mềm.
+
+    Output:
+        (List[(account, result)], List[(account, error)])
+    """
+    registry = get_account_registry()
+    targets = [
+        account
+        for ex in ("lighter", "aster") if exchange is None or exchange == ex
+        for account in registry.select(ex, accounts)
+    ]
+
+    async def _run(account):
+        try:
+            async with exchange_guard(account.exchange, "read") as call:
+                return await load(account, call)
+        except Exception as e:
+            # Lỗi kết nối: client có thể đã hỏng -> request sau dựng client mới
+            # (503 breaker / bulkhead, 4xx không liên quan tới client)
+            if is_transport_error(e):
+                account.drop_client()
+            raise
+
+    results = await asyncio.gather(*(_run(a) for a in targets), return_exceptions=True)
+    ok, failed = [], []
+    for account, result in zip(targets, results):
+        if isinstance(result, BaseException):
+            print(f"[Accounts] {account.exchange}/{account.name} error: {getattr(result, 'detail', result)}")
+            failed.append((account, result))
+        else:
+            ok.append((account, result))
+    return ok, failed
+
+
+def _account_errors(failed) -> list:
+    return [
+        {"exchange": account.exchange, "account": account.name, "error": str(getattr(e, "detail", e))}
+        for account, e in failed
+    ]
+
+
 @router.get("/api/orders/positions")
-async def get_positions(exchange: Optional[str] = None):
+async def get_positions(exchange: Optional[str] = None, accounts: Optional[str] = None):
     """
     Lấy danh sách các vị thế đang mở (có position thực tế trên sàn) kèm PnL.
     
-    Call SDK để lấy positions từ exchange và tính PnL.
+    Query:
+        - exchange: lighter | aster | None (tất cả)
+        - accounts: None (account ENV) | 'all' | 'sub1,sub2' - gọi song song, mỗi dòng có field 'account'
     """
-    print(f"\n[Positions] Request: exchange={exchange}")
-    all_positions = []
-    
+    async def load(account, call):
+        client = await account.client()
+        if account.exchange == "lighter":
+            rows = await account.cached(
+                "positions", lambda: get_lighter_positions(client, account.account_index)
+            )
+        else:
+            rows = await account.cached("positions", lambda: get_aster_positions(client))
+        return [dict(row, account=account.name) for row in rows]
+
     try:
-        # Lighter
-        if exchange is None or exchange == "lighter":
-            client = None
-            try:
-                print("[Positions] Fetching Lighter positions...")
-                keys = get_keys_or_env(None, "lighter")
-                client = await initialize_lighter_client(keys)
-                account_index = keys.get("account_index", 0)
-                lighter_positions = await get_lighter_positions(client, account_index)
-                print(f"[Positions] Lighter: found {len(lighter_positions)} positions")
-                all_positions.extend(lighter_positions)
-            except Exception as e:
-                import traceback
-                print(f"[Positions] Lighter error: {e}")
-                traceback.print_exc()
-            finally:
-                # Đóng client để tránh "Unclosed client session"
-                if client and hasattr(client, 'close'):
-                    try:
-                        await client.close()
-                    except:
-                        pass
-        
-        # Aster
-        if exchange is None or exchange == "aster":
-            client = None
-            try:
-                print("[Positions] Fetching Aster positions...")
-                keys = get_keys_or_env(None, "aster")
-                client = await initialize_aster_client(keys)
-                aster_positions = await get_aster_positions(client)
-                print(f"[Positions] Aster: found {len(aster_positions)} positions")
-                all_positions.extend(aster_positions)
-            except Exception as e:
-                import traceback
-                print(f"[Positions] Aster error: {e}")
-                traceback.print_exc()
-            finally:
-                # Đóng client để tránh "Unclosed client session"
-                if client and hasattr(client, 'close'):
-                    try:
-                        await client.close()
-                    except:
-                        pass
-        
-        print(f"[Positions] Total: {len(all_positions)} positions")
-        
-        # Debug: Nếu không có positions, log thêm thông tin
-        if len(all_positions) == 0:
-            print("[Positions] ⚠️ No positions found. Check:")
-            print(f"  - Exchange filter: {exchange}")
-            print(f"  - Lighter keys configured: {bool(get_keys_or_env(None, 'lighter').get('private_key'))}")
-            print(f"  - Aster keys configured: {bool(get_keys_or_env(None, 'aster').get('api_key'))}")
-        
+        ok, failed = await _for_accounts(exchange, accounts, load)
+        all_positions = [row for _, rows in ok for row in rows]
+        print(f"[Positions] Total: {len(all_positions)} positions ({len(ok)} accounts)")
         return {
             "positions": all_positions,
-            "total": len(all_positions)
+            "total": len(all_positions),
+            "errors": _account_errors(failed),
         }
-        
+    except HTTPException:
+        raise
     except Exception as e:
         import traceback
         traceback.print_exc()
@@ -126,59 +263,48 @@ async def get_positions(exchange: Optional[str] = None):
 
 
 @router.get("/api/orders/open")
-async def get_open_orders(exchange: Optional[str] = None):
+async def get_open_orders(exchange: Optional[str] = None, accounts: Optional[str] = None):
     """
     Lấy danh sách các lệnh mở đang chờ khớp (LIMIT, TP/SL orders).
     
-    Call SDK để lấy open orders từ exchange.
+    Lighter: book in-memory (account ENV: LighterOpenOrderTracker, account khác: sync
+    account_active_orders vào book của account đó), Aster: call SDK / user data stream.
+    Query accounts: như /api/orders/positions.
     """
-    all_open_orders = []
-    
+    from api.open_orders import get_lighter_open_order_tracker
+    from perpsdex.lighter.utils.open_orders import get_open_order_book
+
+    async def load(account, call):
+        if account.exchange == "lighter":
+            tracker = get_lighter_open_order_tracker()
+            if tracker.configured() and tracker.account_index == account.account_index:
+                # Đọc OpenOrderBook in-memory (chỉ sync với sàn nếu book chưa có / quá cũ)
+                await tracker.ensure_synced()
+            else:
+                async def sync_book():
+                    client = await account.client()
+                    response = await client.get_order_api().account_active_orders(
+                        authorization=await account.lighter_auth(), account_index=account.account_index
+                    )
+                    return get_open_order_book(account.account_index).sync(response.orders or [])
+
+                await account.cached("open_orders", sync_book)
+            rows = get_lighter_open_orders(account.account_index)
+        else:
+            client = await account.client()
+            rows = await account.cached("open_orders", lambda: get_aster_open_orders(client))
+        return [dict(row, account=account.name) for row in rows]
+
     try:
-        # Lighter
-        if exchange is None or exchange == "lighter":
-            client = None
-            try:
-                keys = get_keys_or_env(None, "lighter")
-                client = await initialize_lighter_client(keys)
-                account_index = keys.get("account_index", 0)
-                lighter_orders = await get_lighter_open_orders(client, account_index)
-                all_open_orders.extend(lighter_orders)
-            except Exception as e:
-                print(f"[Open Orders] Lighter error: {e}")
-            finally:
-                if client and hasattr(client, 'close'):
-                    try:
-                        await client.close()
-                    except:
-                        pass
-        
-        # Aster
-        if exchange is None or exchange == "aster":
-            client = None
-            try:
-                print("[Open Orders] Fetching Aster open orders...")
-                keys = get_keys_or_env(None, "aster")
-                client = await initialize_aster_client(keys)
-                aster_orders = await get_aster_open_orders(client)
-                print(f"[Open Orders] Aster: found {len(aster_orders)} open orders")
-                all_open_orders.extend(aster_orders)
-            except Exception as e:
-                import traceback
-                print(f"[Open Orders] Aster error: {e}")
-                traceback.print_exc()
-            finally:
-                if client and hasattr(client, 'close'):
-                    try:
-                        await client.close()
-                    except:
-                        pass
-        
+        ok, failed = await _for_accounts(exchange, accounts, load)
+        all_open_orders = [row for _, rows in ok for row in rows]
         return {
             "open_orders": all_open_orders,
-            "total": len(all_open_orders)
+            "total": len(all_open_orders),
+            "errors": _account_errors(failed),
         }
-        
+    except HTTPException:
+        raise
     except Exception as e:
         import traceback
         traceback.print_exc()
@@ -186,18 +312,20 @@ async def get_open_orders(exchange: Optional[str] = None):
 
 
 @router.get("/api/balance")
-async def get_balance(exchange: Optional[str] = None):
+async def get_balance(exchange: Optional[str] = None, accounts: Optional[str] = None):
     """
     Lấy số dư tài khoản từ các sàn.
     
     Query params:
         - exchange: "lighter" | "aster" | None (tất cả)
+        - accounts: None (account ENV) | 'all' | 'sub1,sub2' (gọi song song từng account)
     
     Returns:
         {
             "balances": [
                 {
                     "exchange": "lighter",
+                    "account": "default",
                     "available": float,
                     "collateral": float,  # chỉ có Lighter
                     "total": float,
@@ -206,73 +334,36 @@ async def get_balance(exchange: Optional[str] = None):
                 },
                 ...
             ],
-            "total_available": float,  # Tổng available từ tất cả sàn
-            "total_balance": float,    # Tổng balance từ tất cả sàn
+            "total_available": float,  # Tổng available từ tất cả sàn / account
+            "total_balance": float,    # Tổng balance từ tất cả sàn / account
             "count": int
         }
     """
-    print(f"\n[Balance] Request: exchange={exchange}")
-    all_balances = []
-    
+    async def load(account, call):
+        client = await account.client()
+        if account.exchange == "lighter":
+            balance = await account.cached(
+                "balance", lambda: get_lighter_balance(client, account.account_index)
+            )
+        else:
+            balance = await account.cached("balance", lambda: get_aster_balance(client))
+        if not balance.get("success"):
+            account.invalidate("balance")
+            call.fail(balance.get("error"))
+        return dict(balance, account=account.name)
+
     try:
-        # Lighter
-        if exchange is None or exchange == "lighter":
-            client = None
-            try:
-                print("[Balance] Fetching Lighter balance...")
-                keys = get_keys_or_env(None, "lighter")
-                client = await initialize_lighter_client(keys)
-                account_index = keys.get("account_index", 0)
-                lighter_balance = await get_lighter_balance(client, account_index)
-                print(f"[Balance] Lighter: available=${lighter_balance.get('available', 0):.2f}, total=${lighter_balance.get('total', 0):.2f}")
-                all_balances.append(lighter_balance)
-            except Exception as e:
-                import traceback
-                print(f"[Balance] Lighter error: {e}")
-                traceback.print_exc()
-                all_balances.append({
-                    'exchange': 'lighter',
-                    'available': 0,
-                    'collateral': 0,
-                    'total': 0,
-                    'success': False,
-                    'error': str(e)
-                })
-            finally:
-                if client and hasattr(client, 'close'):
-                    try:
-                        await client.close()
-                    except:
-                        pass
-        
-        # Aster
-        if exchange is None or exchange == "aster":
-            client = None
-            try:
-                print("[Balance] Fetching Aster balance...")
-                keys = get_keys_or_env(None, "aster")
-                client = await initialize_aster_client(keys)
-                aster_balance = await get_aster_balance(client)
-                print(f"[Balance] Aster: available=${aster_balance.get('available', 0):.2f}, total=${aster_balance.get('total', 0):.2f}")
-                all_balances.append(aster_balance)
-            except Exception as e:
-                import traceback
-                print(f"[Balance] Aster error: {e}")
-                traceback.print_exc()
-                all_balances.append({
-                    'exchange': 'aster',
-                    'available': 0,
-                    'total': 0,
-                    'wallet_balance': 0,
-                    'success': False,
-                    'error': str(e)
-                })
-            finally:
-                if client and hasattr(client, 'close'):
-                    try:
-                        await client.close()
-                    except:
-                        pass
+        ok, failed = await _for_accounts(exchange, accounts, load)
+        all_balances = [balance for _, balance in ok]
+        for account, e in failed:
+            all_balances.append({
+                'exchange': account.exchange,
+                'account': account.name,
+                'available': 0,
+                'total': 0,
+                'success': False,
+                'error': str(getattr(e, "detail", e))
+            })
         
         # Tính tổng
         total_available = sum(b.get('available', 0) for b in all_balances if b.get('success'))
@@ -287,12 +378,20 @@ async def get_balance(exchange: Optional[str] = None):
             "count": len(all_balances)
         }
         
+    except HTTPException:
+        raise
     except Exception as e:
         import traceback
         traceback.print_exc()
         raise HTTPException(status_code=500, detail=str(e))
 
 
+@router.get("/api/accounts")
+async def list_accounts():
+    """Account có tên theo sàn (không trả keys): client, rate budget, state cache"""
+    return {"success": True, "accounts": get_account_registry().status()}
+
+
 @router.get("/api/orders/history")
 async def get_order_history(
     exchange: Optional[str] = None,
@@ -302,14 +401,16 @@ async def get_order_history(
     """
     Lấy lịch sử tất cả các orders đã lưu trong database.
     """
-    if query_orders is None:
+    # DB layer (SQLAlchemy) import lazy ở lần dùng đầu tiên
+    db = get_db()
+    if db is None:
         raise HTTPException(
             status_code=503,
             detail="Database module không available, không thể query orders"
         )
     
     try:
-        all_orders = query_orders(
+        all_orders = db.query_orders(
             exchange=exchange,
             status=status,
             limit=limit
@@ -350,6 +451,177 @@ async def get_order_history(
         raise HTTPException(status_code=500, detail=str(e))
 
 
+def _epoch_to_datetime(value: Optional[float]):
+    import datetime as dt
+    return dt.datetime.utcfromtimestamp(value) if value is not None else None
+
+
+def _synced_history_db():
+    db = get_db()
+    if db is None or not db.DB_URL:
+        raise HTTPException(status_code=503, detail="Database chưa cấu hình, không có history đã sync")
+    return db
+
+
+@router.get("/api/orders/history/exchange")
+async def get_synced_order_history(
+    exchange: Optional[str] = None,
+    symbol: Optional[str] = None,
+    status: Optional[str] = None,
+    start: Optional[float] = None,
+    end: Optional[float] = None,
+    limit: int = Query(100, ge=1, le=5000),
+):
+    """
+    Order history của account trên sàn (mọi lệnh, không chỉ lệnh đặt qua API này).
+
+    Đọc bảng exchange_orders do HistorySync đồng bộ nền, không gọi exchange. start / end: epoch giây.
+    """
+    db = _synced_history_db()
+    orders = await asyncio.to_thread(
+        db.query_exchange_orders,
+        exchange=exchange,
+        symbol_base=symbol.upper() if symbol else None,
+        status=status,
+        start=_epoch_to_datetime(start),
+        end=_epoch_to_datetime(end),
+        limit=limit,
+    )
+    return {"orders": orders, "total": len(orders)}
+
+
+@router.get("/api/orders/history/fills")
+async def get_synced_fill_history(
+    exchange: Optional[str] = None,
+    symbol: Optional[str] = None,
+    order_id: Optional[str] = None,
+    start: Optional[float] = None,
+    end: Optional[float] = None,
+    limit: int = Query(100, ge=1, le=5000),
+):
+    """Fill (trade) history đã sync: giá, size, fee, realized PnL, maker/taker"""
+    db = _synced_history_db()
+    fills = await asyncio.to_thread(
+        db.query_exchange_trades,
+        exchange=exchange,
+        symbol_base=symbol.upper() if symbol else None,
+        exchange_order_id=order_id,
+        start=_epoch_to_datetime(start),
+        end=_epoch_to_datetime(end),
+        limit=limit,
+    )
+    return {"fills": fills, "total": len(fills)}
+
+
+@router.get("/api/orders/history/sync")
+async def get_history_sync_status():
+    """Trạng thái job sync history (kết quả vòng gần nhất của từng sàn)"""
+    from api.history_sync import get_history_sync
+    return get_history_sync().status()
+
+
+@router.post("/api/orders/history/sync")
+async def trigger_history_sync():
+    """Chạy 1 vòng sync ngay (incremental theo cursor đã lưu)"""
+    from api.history_sync import get_history_sync
+    _synced_history_db()
+    return {"success": True, "exchanges": await get_history_sync().sync_once()}
+
+
+@router.get("/api/orders/reconcile")
+async def get_reconcile_status():
+    """Trạng thái job đối soát bảng orders với sàn (vòng gần nhất + cursor batch)"""
+    from api.reconciler import get_order_reconciler
+    return get_order_reconciler().status()
+
+
+@router.post("/api/orders/reconcile")
+async def trigger_reconcile():
+    """Đối soát ngay 1 batch order chưa ở trạng thái cuối (pending / submitted / partially_filled)"""
+    from api.reconciler import get_order_reconciler
+    _synced_history_db()
+    return await get_order_reconciler().run_once()
+
+
+@router.post("/api/orders/calculate/batch")
+async def calculate_batch(request: BatchCalculateRequest):
+    """
+    Batch calculator (không place order): size, scaled int, TP/SL, R:R cho N bracket trong 1 call.
+
+    Body (mỗi field là 1 giá trị hoặc mảng cùng độ dài):
+    {
+        "exchange": "lighter",
+        "symbol": ["BTC", "BTC", "SOL"],
+        "side": ["long", "short", "long"],
+        "size_usd": 100,
+        "leverage": 5,
+        "sl_percent": [2, 3, 1.5],
+        "rr": [2, 2, 3],
+        "entry_price": [65000, 65000, null]   // null -> lấy giá thị trường
+    }
+
+    Response dạng cột: {"count": N, "valid_count": int, "columns": {"position_size": [...], ...}}
+    hoặc "rows": [...] nếu as_rows = true.
+    """
+    # NumPy chỉ import khi endpoint này được gọi lần đầu
+    from api.batch_calculator import BatchCalculator, fetch_quotes
+
+    try:
+        columns = BatchCalculator.broadcast({
+            "exchange": request.exchange,
+            "symbol": request.symbol,
+            "side": request.side,
+            "size_usd": request.size_usd,
+            "leverage": request.leverage,
+            "sl_percent": request.sl_percent,
+            "rr": request.rr,
+            "entry_price": request.entry_price,
+        })
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    try:
+        # Dòng không có entry_price -> lấy giá thị trường (mỗi symbol 1 lần)
+        missing = {}
+        for i, price in enumerate(columns["entry_price"]):
+            if price is None or price <= 0:
+                missing.setdefault(columns["exchange"][i], set()).add(columns["symbol"][i])
+
+        entry_prices = list(columns["entry_price"])
+        for ex, symbols in missing.items():
+            quotes = await fetch_quotes(ex, sorted(symbols))
+            for i, price in enumerate(entry_prices):
+                if columns["exchange"][i] != ex or (price is not None and price > 0):
+                    continue
+                quote = quotes.get(columns["symbol"][i], {})
+                if quote.get("success"):
+                    entry_prices[i] = quote["ask"] if columns["side"][i] == "long" else quote["bid"]
+                else:
+                    entry_prices[i] = float("nan")
+        columns["entry_price"] = entry_prices
+
+        result = BatchCalculator.calculate(max_sl_percent=request.max_sl_percent, **columns)
+        output = BatchCalculator.to_columns(result)
+        count = len(output["valid"])
+
+        response = {
+            "count": count,
+            "valid_count": sum(output["valid"]),
+        }
+        if request.as_rows:
+            response["rows"] = [{key: values[i] for key, values in output.items()} for i in range(count)]
+        else:
+            response["columns"] = output
+        return response
+
+    except HTTPException:
+        raise
+    except Exception as e:
+        import traceback
+        traceback.print_exc()
+        raise HTTPException(status_code=500, detail=str(e))
+
+
 @router.post("/api/order")
 async def place_unified_order(order: UnifiedOrderRequest):
     """
@@ -357,6 +629,7 @@ async def place_unified_order(order: UnifiedOrderRequest):
     cho cả Lighter và Aster, theo spec trong docs/api/api.md.
     """
     db_order_id = None
+    db = get_db()
 
     try:
         print(f"\n{'=' * 60}")
@@ -372,8 +645,8 @@ async def place_unified_order(order: UnifiedOrderRequest):
         print(f"SL Price   : {order.sl_price}")
 
         # Ghi log order vào DB ở trạng thái 'pending' (nếu DB được cấu hình)
-        if log_order_request is not None:
-            db_order_id = log_order_request(
+        if db is not None:
+            db_order_id = db.log_order_request(
                 exchange=order.exchange,
                 symbol_base=order.symbol.upper(),
                 symbol_pair=None,
@@ -391,13 +664,51 @@ async def place_unified_order(order: UnifiedOrderRequest):
             )
 
         # Chuẩn hoá keys và gửi lệnh xuống từng sàn
-        keys = get_keys_or_env(order.keys, order.exchange)
+        keys = get_keys_or_env(order.keys, order.exchange, order.account)
 
-        # Dispatch theo sàn
-        if order.exchange == "lighter":
-            result = await handle_lighter_order(order, keys)
-        else:
-            result = await handle_aster_order(order, keys)
+        # Pre-trade risk (in-memory, trước khi ký / gửi): vi phạm limit -> 400, journal 'rejected'
+        risk = get_risk_engine()
+        reservation = risk.reserve_order(
+            order.exchange, order.symbol, order.side, order.size_usd, order.leverage,
+            tag=order.tag, own_account=order.keys is None and order.account in (None, DEFAULT_ACCOUNT),
+        )
+
+        try:
+            # TWAP: chạy nền trong ExecutionScheduler, scheduler tự cập nhật DB khi parent kết thúc
+            if order.order_type == "twap":
+                result = await handle_twap_order(order, keys, db_order_id, reservation)
+                print(f"\n🕒 TWAP PARENT STARTED: {result['order_id']}")
+                print(f"{'=' * 60}\n")
+                return result
+
+            # Lane (sàn, account, market): lệnh cùng market gửi theo thứ tự, market khác song song.
+            # Dispatch theo sàn (circuit breaker / bulkhead riêng cho từng sàn)
+            async with get_order_sequencer().lane(order.exchange, keys, order.symbol, order.order_type), \
+                    exchange_guard(order.exchange, "trade"):
+                if order.exchange == "lighter":
+                    result = await handle_lighter_order(order, keys)
+                else:
+                    result = await handle_aster_order(order, keys)
+        except BaseException:
+            risk.release(reservation)
+            raise
+        risk.commit(reservation)
+        invalidate_account_state(order.exchange, order.account)
+
+        # wait_for_fill: chờ qua FillDispatcher (poller / stream dùng chung), entry_price = giá khớp thật
+        entry_price_requested = result.get("entry_price")
+        journal_status = "submitted"
+        if order.wait_for_fill and result.get("order_id") is not None:
+            fill = await get_fill_dispatcher().wait(
+                order.exchange, result["order_id"], keys,
+                symbol=order.symbol, timeout=order.wait_for_fill_timeout,
+            )
+            result["fill"] = fill
+            if fill.get("filled_size"):
+                result["entry_price"] = fill.get("avg_price") or entry_price_requested
+                result["position_size"] = fill["filled_size"]
+            if fill["status"] != "open":
+                journal_status = fill["status"]
 
         print("\n✅ ORDER PLACED SUCCESSFULLY")
         print(f"Order ID     : {result.get('order_id')}")
@@ -406,16 +717,16 @@ async def place_unified_order(order: UnifiedOrderRequest):
         print(f"{'=' * 60}\n")
 
         # Cập nhật DB sau khi gọi sàn thành công
-        if update_order_after_result is not None:
+        if db is not None:
             try:
-                update_order_after_result(
+                db.update_order_after_result(
                     db_order_id=db_order_id,
-                    status="submitted",
+                    status=journal_status,
                     exchange_order_id=str(result.get("order_id"))
                     if result.get("order_id") is not None
                     else None,
-                    entry_price_requested=float(result.get("entry_price"))
-                    if result.get("entry_price") is not None
+                    entry_price_requested=float(entry_price_requested)
+                    if entry_price_requested is not None
                     else None,
                     entry_price_filled=float(result.get("entry_price"))
                     if result.get("entry_price") is not None
@@ -432,9 +743,9 @@ async def place_unified_order(order: UnifiedOrderRequest):
         
     except HTTPException as http_exc:
         # Nếu đã có DB record thì cập nhật trạng thái rejected/error
-        if update_order_after_result is not None:
+        if db is not None:
             try:
-                update_order_after_result(
+                db.update_order_after_result(
                     db_order_id=db_order_id,
                     status="rejected" if http_exc.status_code == 400 else "error",
                     exchange_order_id=None,
@@ -450,9 +761,9 @@ async def place_unified_order(order: UnifiedOrderRequest):
         import traceback
         traceback.print_exc()
         # Cập nhật DB cho lỗi 500 nội bộ
-        if update_order_after_result is not None:
+        if db is not None:
             try:
-                update_order_after_result(
+                db.update_order_after_result(
                     db_order_id=db_order_id,
                     status="error",
                     exchange_order_id=None,
@@ -466,6 +777,81 @@ async def place_unified_order(order: UnifiedOrderRequest):
         raise HTTPException(status_code=500, detail=str(e))
 
 
+@router.post("/api/orders/ladder")
+async def place_ladder_order(request: LadderOrderRequest):
+    """
+    Grid / ladder LIMIT: chia [price_from, price_to] thành N lệnh, gửi theo batch.
+
+    - Lighter: ký tất cả lệnh với nonce liên tiếp, gửi bằng sendTxBatch (50 lệnh / batch)
+    - Aster: /fapi/v1/batchOrders (5 lệnh / request)
+    - Mỗi level được ghi vào bảng orders (client_order_id = <ladder_id>-L<level>)
+    """
+    print(
+        f"\n[Ladder] {request.exchange.upper()} {request.side.upper()} {request.symbol.upper()} "
+        f"{request.levels} levels {request.price_from} -> {request.price_to}, ${request.size_usd}"
+    )
+    try:
+        keys = get_keys_or_env(request.keys, request.exchange, request.account)
+        risk = get_risk_engine()
+        reservation = risk.reserve_order(
+            request.exchange, request.symbol, request.side, request.size_usd, request.leverage,
+            tag=request.tag, own_account=request.keys is None and request.account in (None, DEFAULT_ACCOUNT),
+        )
+        try:
+            async with get_order_sequencer().lane(request.exchange, keys, request.symbol, "ladder"), \
+                    exchange_guard(request.exchange, "trade"):
+                result = await handle_ladder_order(request, keys)
+        except BaseException:
+            risk.release(reservation)
+            raise
+        # Chỉ tính các level đã vào sàn
+        risk.commit(reservation, sum(l["size_usd"] for l in result["levels"] if l.get("status") == "submitted"))
+        invalidate_account_state(request.exchange, request.account)
+        return result
+    except HTTPException:
+        raise
+    except Exception as e:
+        import traceback
+        traceback.print_exc()
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+@router.get("/api/orders/twap")
+async def list_twap_orders(status: Optional[str] = None):
+    """
+    Danh sách TWAP parent order (in-memory, mới nhất trước)
+
+    Query:
+        - status: running | completed | cancelled | expired | failed | active (chưa kết thúc)
+    """
+    from api.execution import get_execution_scheduler
+
+    parents = get_execution_scheduler().list(status)
+    return {"success": True, "count": len(parents), "parents": parents}
+
+
+@router.get("/api/orders/twap/{parent_id}")
+async def get_twap_order(parent_id: str):
+    """Chi tiết 1 TWAP parent: fill, VWAP, slippage so với arrival price, danh sách child"""
+    from api.execution import get_execution_scheduler
+
+    parent = get_execution_scheduler().get(parent_id)
+    if parent is None:
+        raise HTTPException(status_code=404, detail=f"Không tìm thấy TWAP parent {parent_id}")
+    return {"success": True, "parent": parent.to_dict()}
+
+
+@router.post("/api/orders/twap/{parent_id}/cancel")
+async def cancel_twap_order(parent_id: str):
+    """Dừng TWAP parent: không gửi thêm child, phần đã khớp được giữ nguyên"""
+    from api.execution import get_execution_scheduler
+
+    snapshot = await get_execution_scheduler().cancel(parent_id)
+    if snapshot is None:
+        raise HTTPException(status_code=404, detail=f"Không tìm thấy TWAP parent {parent_id}")
+    return {"success": True, "parent": snapshot}
+
+
 @router.post("/api/positions/close")
 async def close_position(request: ClosePositionRequest):
     """
@@ -494,20 +880,14 @@ async def close_position(request: ClosePositionRequest):
         print(f"Percentage : {request.percentage}%")
         
         # Chuẩn hoá keys
-        keys = get_keys_or_env(request.keys, request.exchange)
+        keys = get_keys_or_env(request.keys, request.exchange, request.account)
         
-        # Dispatch theo sàn
-        if request.exchange == "lighter":
-            result = await handle_lighter_close_position(
-                symbol=request.symbol,
-                percentage=request.percentage,
-                keys=keys,
-                position_id=request.position_id,
-                entry_price=request.entry_price,
-                side=request.side
-            )
-        else:
-            result = await handle_aster_close_position(
+        # Dispatch theo sàn (sau các lệnh cùng market đã vào lane trước)
+        handle_close = (
+            handle_lighter_close_position if request.exchange == "lighter" else handle_aster_close_position
+        )
+        async with get_order_sequencer().lane(request.exchange, keys, request.symbol, "close"):
+            result = await handle_close(
                 symbol=request.symbol,
                 percentage=request.percentage,
                 keys=keys,
@@ -516,6 +896,10 @@ async def close_position(request: ClosePositionRequest):
                 side=request.side
             )
         
+        if request.keys is None and request.account in (None, DEFAULT_ACCOUNT):
+            get_risk_engine().on_close(request.exchange, result["symbol"], request.percentage)
+        invalidate_account_state(request.exchange, request.account)
+
         print("\n✅ POSITION CLOSED SUCCESSFULLY")
         print(f"Order ID     : {result.get('order_id')}")
         print(f"Close Price  : {result.get('close_price')}")
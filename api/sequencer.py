@@ -0,0 +1,160 @@
+"""
+OrderSequencer - Hàng đợi lệnh theo (sàn, account, market)
+
+Lệnh cùng 1 market của 1 account đi qua 1 lane FIFO: lệnh sau chỉ gửi khi lệnh trước đã gửi
+xong (entry rồi mới tới TP/SL của nó, close sau lệnh mở gửi trước đó, ladder không chen giữa).
+Market khác / account khác / sàn khác là lane khác -> chạy song song hoàn toàn, không còn
+phải chạy tuần tự toàn cục để an toàn. Nonce Lighter không phụ thuộc lane: mọi lệnh (kể cả
+TWAP child) của 1 account dùng chung SignerClient từ ClientPool (api/accounts.py), SDK khoá
+api key trong lúc ký + gửi -> market khác nhau chạy song song không ký trùng nonce.
+
+Lane chỉ giữ trong lúc gửi lệnh (handler), không giữ lúc wait_for_fill. TWAP child đi qua
+ExecutionScheduler (đã tuần tự theo venue) nên không qua sequencer.
+
+Số liệu mỗi lane: depth (đang gửi + đang chờ), max_depth, wait p50 / p95 / max (ms), processed,
+rejected. Lane idle quá ORDER_SEQUENCER_IDLE_TTL giây bị xoá.
+
+ENV:
+    - ORDER_SEQUENCER (default: 1)
+    - ORDER_SEQUENCER_MAX_DEPTH (default: 0 = không giới hạn): lane đầy -> 503 ngay
+    - ORDER_SEQUENCER_IDLE_TTL (default: 300 giây)
+"""
+
+import asyncio
+import os
+import time
+from collections import deque
+from contextlib import asynccontextmanager
+from typing import Dict, Optional, Tuple
+
+from fastapi import HTTPException
+
+# Số mẫu wait gần nhất giữ cho mỗi lane
+WAIT_SAMPLES = 200
+
+
+def order_sequencer_enabled() -> bool:
+    return os.getenv("ORDER_SEQUENCER", "1").strip().lower() in ("1", "true", "yes", "on")
+
+
+def _percentile(ordered: list, q: float) -> Optional[float]:
+    if not ordered:
+        return None
+    return round(ordered[min(len(ordered) - 1, int(q * len(ordered)))], 2)
+
+
+class _Lane:
+    """1 (sàn, account, market): asyncio.Lock đánh thức waiter theo thứ tự FIFO"""
+
+    def __init__(self):
+        self.lock = asyncio.Lock()
+        self.depth = 0
+        self.max_depth = 0
+        self.processed = 0
+        self.rejected = 0
+        self.waits = deque(maxlen=WAIT_SAMPLES)
+        self.max_wait_ms = 0.0
+        self.current: Optional[str] = None
+        self.used_at = time.monotonic()
+
+    def to_dict(self) -> dict:
+        ordered = sorted(self.waits)
+        return {
+            "depth": self.depth,
+            "waiting": max(self.depth - (1 if self.lock.locked() else 0), 0),
+            "max_depth": self.max_depth,
+            "current": self.current,
+            "processed": self.processed,
+            "rejected": self.rejected,
+            "wait_p50_ms": _percentile(ordered, 0.50),
+            "wait_p95_ms": _percentile(ordered, 0.95),
+            "wait_max_ms": round(self.max_wait_ms, 2),
+        }
+
+
+class OrderSequencer:
+    """
+    Methods:
+        - lane(exchange, keys, symbol, kind): async context manager, giữ lane trong lúc gửi lệnh
+        - status()
+    """
+
+    def __init__(self):
+        self.max_depth = int(os.getenv("ORDER_SEQUENCER_MAX_DEPTH", 0))
+        self.idle_ttl = float(os.getenv("ORDER_SEQUENCER_IDLE_TTL", 300))
+        self._lanes: Dict[Tuple[str, str, str], _Lane] = {}
+
+    @staticmethod
+    def account_of(exchange: str, keys: dict) -> str:
+        from api.fills import FillDispatcher
+
+        return FillDispatcher.account_of(exchange, keys)
+
+    def _prune(self):
+        now = time.monotonic()
+        for key, lane in list(self._lanes.items()):
+            if lane.depth == 0 and now - lane.used_at > self.idle_ttl:
+                del self._lanes[key]
+
+    def _get_lane(self, key: Tuple[str, str, str]) -> _Lane:
+        lane = self._lanes.get(key)
+        if lane is None:
+            self._prune()
+            lane = self._lanes[key] = _Lane()
+        return lane
+
+    @asynccontextmanager
+    async def lane(self, exchange: str, keys: dict, symbol: str, kind: str = "order"):
+        if not order_sequencer_enabled():
+            yield
+            return
+
+        lane = self._get_lane((exchange, self.account_of(exchange, keys), symbol.upper()))
+        if self.max_depth and lane.depth >= self.max_depth:
+            lane.rejected += 1
+            raise HTTPException(
+                status_code=503,
+                detail=f"{exchange} {symbol.upper()}: quá {self.max_depth} lệnh đang chờ gửi, thử lại sau",
+            )
+
+        lane.depth += 1
+        lane.max_depth = max(lane.max_depth, lane.depth)
+        started = time.perf_counter()
+        try:
+            async with lane.lock:
+                wait_ms = (time.perf_counter() - started) * 1000
+                lane.waits.append(wait_ms)
+                lane.max_wait_ms = max(lane.max_wait_ms, wait_ms)
+                lane.current = kind
+                try:
+                    yield
+                finally:
+                    lane.current = None
+                    lane.processed += 1
+        finally:
+            lane.depth -= 1
+            lane.used_at = time.monotonic()
+
+    def status(self) -> dict:
+        lanes = {
+            f"{exchange}:{account[:8]}:{symbol}": lane.to_dict()
+            for (exchange, account, symbol), lane in self._lanes.items()
+        }
+        return {
+            "enabled": order_sequencer_enabled(),
+            "max_depth": self.max_depth,
+            "lanes": len(lanes),
+            "depth": sum(lane["depth"] for lane in lanes.values()),
+            "waiting": sum(lane["waiting"] for lane in lanes.values()),
+            "by_lane": lanes,
+        }
+
+
+_sequencer: Optional[OrderSequencer] = None
+
+
+def get_order_sequencer() -> OrderSequencer:
+    global _sequencer
+    if _sequencer is None:
+        _sequencer = OrderSequencer()
+    return _sequencer
@@ -0,0 +1,360 @@
+"""
+SharedQuoteTable - Bảng quote + market metadata trên shared memory (mmap, layout cố định)
+
+Dùng khi chạy nhiều uvicorn worker: 1 feed process (api/quote_feed.py) là writer duy nhất,
+mọi worker chỉ đọc -> số request lên exchange không tăng theo số worker.
+
+Layout file (little-endian):
+    Header (64 bytes): magic, version, slot_count, slot_size, used, feed_pid, heartbeat
+    Slot i (SLOT_SIZE bytes): seq (uint64) + body
+
+Mỗi slot = 1 market của 1 sàn (metadata + top-of-book + tối đa DEPTH_LEVELS level mỗi side).
+Đồng bộ bằng seqlock: writer tăng seq lên số lẻ -> ghi body -> tăng seq lên số chẵn;
+reader đọc seq, body, seq và retry nếu seq lẻ hoặc 2 lần đọc khác nhau. Reader không cần lock.
+"""
+
+import mmap
+import os
+import struct
+import tempfile
+import time
+from typing import Dict, List, Optional, Tuple
+
+MAGIC = b'PDQT'
+VERSION = 1
+DEFAULT_SLOT_COUNT = 1024
+DEPTH_LEVELS = 10
+READ_RETRIES = 64
+
+EXCHANGE_IDS = {'lighter': 1, 'aster': 2}
+EXCHANGE_NAMES = {v: k for k, v in EXCHANGE_IDS.items()}
+
+# magic, version, slot_count, slot_size, used, feed_pid, heartbeat
+_HEADER = struct.Struct('<4sIIIIId')
+HEADER_SIZE = 64
+
+_SEQ = struct.Struct('<Q')
+# exchange_id, symbol, symbol_api, market_id, price_decimals, size_decimals,
+# tick_size, step_size, min_qty, min_notional, meta_updated_at,
+# bid, ask, quote_ts, n_bids, n_asks, levels (bids: price,size ... | asks: price,size ...)
+_BODY = struct.Struct(f'<B16s16s3xiiiddddddddII{DEPTH_LEVELS * 4}d')
+SLOT_SIZE = _SEQ.size + _BODY.size
+
+_EMPTY_LEVELS = (0.0,) * (DEPTH_LEVELS * 2)
+
+
+def default_path() -> str:
+    """ENV API_SHARED_QUOTES_PATH, mặc định /dev/shm (RAM) nếu có, không thì thư mục tmp"""
+    path = os.getenv('API_SHARED_QUOTES_PATH')
+    if path:
+        return path
+    base = '/dev/shm' if os.path.isdir('/dev/shm') else tempfile.gettempdir()
+    return os.path.join(base, 'perp-dex-api-quotes')
+
+
+def shared_quotes_enabled() -> bool:
+    """API_SHARED_QUOTES=1 -> worker đọc quote / metadata từ shared memory"""
+    return os.getenv('API_SHARED_QUOTES', '0').strip().lower() in ('1', 'true', 'yes', 'on')
+
+
+def _encode(text: Optional[str]) -> bytes:
+    return (text or '').encode('utf-8')[:16]
+
+
+def _decode(raw: bytes) -> str:
+    return raw.split(b'\0', 1)[0].decode('utf-8')
+
+
+def _pack_levels(levels: List[Tuple[float, float]]) -> tuple:
+    flat = []
+    for price, size in levels[:DEPTH_LEVELS]:
+        flat.extend((float(price), float(size)))
+    return tuple(flat) + (0.0,) * (DEPTH_LEVELS * 2 - len(flat))
+
+
+def _unpack_levels(flat: tuple, count: int) -> List[Tuple[float, float]]:
+    return [(flat[i * 2], flat[i * 2 + 1]) for i in range(count)]
+
+
+class SharedQuoteTable:
+    """
+    Wrapper quanh file mmap
+
+    Input:
+        - path: Đường dẫn file (mặc định default_path())
+        - create: True cho writer (tạo / reset file), False cho reader
+        - slot_count: Số slot tối đa (chỉ dùng khi create)
+
+    Writer methods:
+        - publish_metadata(exchange, market): Ghi / cập nhật metadata 1 market
+        - publish_quote(exchange, symbol, bid, ask, bids, asks): Ghi quote + depth
+        - heartbeat(): Cập nhật heartbeat của feed
+
+    Reader methods:
+        - read_quote(exchange, symbol, max_age): Quote mới nhất (None nếu cũ / không có)
+        - read_markets(exchange): Metadata tất cả market của 1 sàn
+        - status(): Thông tin header
+    """
+
+    def __init__(self, path: Optional[str] = None, create: bool = False, slot_count: int = DEFAULT_SLOT_COUNT):
+        self.path = path or default_path()
+        self.writable = create
+
+        if create:
+            size = HEADER_SIZE + slot_count * SLOT_SIZE
+            fd = os.open(self.path, os.O_RDWR | os.O_CREAT | os.O_TRUNC, 0o600)
+            try:
+                os.ftruncate(fd, size)
+                self._mm = mmap.mmap(fd, size, access=mmap.ACCESS_WRITE)
+            finally:
+                os.close(fd)
+            self.slot_count = slot_count
+            self._write_header(used=0, heartbeat=0.0)
+        else:
+            fd = os.open(self.path, os.O_RDONLY)
+            try:
+                self._mm = mmap.mmap(fd, 0, access=mmap.ACCESS_READ)
+            finally:
+                os.close(fd)
+            magic, version, slot_count, slot_size, _, _, _ = _HEADER.unpack_from(self._mm, 0)
+            if magic != MAGIC or version != VERSION or slot_size != SLOT_SIZE:
+                self._mm.close()
+                raise ValueError(f'{self.path}: layout không khớp (magic={magic!r}, version={version})')
+            self.slot_count = slot_count
+
+        self._slots: Dict[Tuple[int, str], int] = {}  # (exchange_id, symbol) -> slot index
+        self._indexed_used = 0
+
+    def close(self):
+        self._mm.close()
+
+    # ------------------------------------------------------------------ header
+
+    def _read_header(self) -> tuple:
+        return _HEADER.unpack_from(self._mm, 0)
+
+    def _write_header(self, used: int, heartbeat: float):
+        _HEADER.pack_into(self._mm, 0, MAGIC, VERSION, self.slot_count, SLOT_SIZE, used, os.getpid(), heartbeat)
+
+    def heartbeat(self):
+        self._write_header(used=len(self._slots), heartbeat=time.time())
+
+    def status(self) -> dict:
+        _, _, slot_count, _, used, feed_pid, heartbeat = self._read_header()
+        return {
+            'path': self.path,
+            'slot_count': slot_count,
+            'used': used,
+            'feed_pid': feed_pid,
+            'heartbeat_age': round(time.time() - heartbeat, 3) if heartbeat else None,
+        }
+
+    # ------------------------------------------------------------------ seqlock
+
+    def _offset(self, slot: int) -> int:
+        return HEADER_SIZE + slot * SLOT_SIZE
+
+    def _read_slot(self, slot: int) -> Optional[tuple]:
+        """Đọc body 1 slot theo seqlock (None nếu slot chưa ghi hoặc writer ghi liên tục)"""
+        offset = self._offset(slot)
+        for _ in range(READ_RETRIES):
+            (seq_before,) = _SEQ.unpack_from(self._mm, offset)
+            if seq_before & 1:
+                continue
+            body = _BODY.unpack_from(self._mm, offset + _SEQ.size)
+            (seq_after,) = _SEQ.unpack_from(self._mm, offset)
+            if seq_before == seq_after:
+                return body if seq_before else None
+        return None
+
+    def _write_slot(self, slot: int, body: tuple):
+        offset = self._offset(slot)
+        (seq,) = _SEQ.unpack_from(self._mm, offset)
+        _SEQ.pack_into(self._mm, offset, seq + 1)
+        _BODY.pack_into(self._mm, offset + _SEQ.size, *body)
+        _SEQ.pack_into(self._mm, offset, seq + 2)
+
+    # ------------------------------------------------------------------ index
+
+    def _refresh_index(self):
+        """Reader: index thêm các slot writer mới cấp từ lần đọc trước"""
+        used = self._read_header()[4]
+        for slot in range(self._indexed_used, used):
+            body = self._read_slot(slot)
+            if body is None:
+                return  # slot đang được ghi lần đầu -> index lại lần sau
+            self._slots[(body[0], _decode(body[1]))] = slot
+            self._indexed_used = slot + 1
+
+    def _lookup(self, exchange: str, symbol: str) -> Optional[int]:
+        key = (EXCHANGE_IDS[exchange], symbol.upper())
+        slot = self._slots.get(key)
+        if slot is None and not self.writable:
+            self._refresh_index()
+            slot = self._slots.get(key)
+        return slot
+
+    # ------------------------------------------------------------------ writer
+
+    def publish_metadata(self, exchange: str, market: dict) -> Optional[int]:
+        """
+        Ghi metadata 1 market (cấp slot mới nếu chưa có), giữ nguyên quote hiện tại
+
+        market: dict theo format MarketRegistry của từng sàn
+        """
+        symbol = market['symbol'].upper()
+        key = (EXCHANGE_IDS[exchange], symbol)
+        slot = self._slots.get(key)
+        if slot is None:
+            if len(self._slots) >= self.slot_count:
+                return None
+            slot = self._slots[key] = len(self._slots)
+            quote = (0.0, 0.0, 0.0, 0, 0) + _EMPTY_LEVELS * 2
+        else:
+            quote = self._read_slot(slot)[11:]
+
+        if exchange == 'lighter':
+            meta = (
+                market.get('market_id') or 0,
+                market.get('price_decimals') if market.get('price_decimals') is not None else -1,
+                market.get('size_decimals') if market.get('size_decimals') is not None else -1,
+                0.0, 0.0, 0.0,
+                market.get('min_base_amount') or 0.0,
+            )
+        else:
+            meta = (
+                0,
+                market.get('price_precision') if market.get('price_precision') is not None else -1,
+                market.get('quantity_precision') if market.get('quantity_precision') is not None else -1,
+                market.get('tick_size') or 0.0,
+                market.get('step_size') or 0.0,
+                market.get('min_qty') or 0.0,
+                market.get('min_notional') or 0.0,
+            )
+
+        self._write_slot(slot, (key[0], _encode(symbol), _encode(market.get('symbol_api'))) + meta + (time.time(),) + quote)
+        return slot
+
+    def publish_quote(self, exchange: str, symbol: str, bid: float, ask: float,
+                      bids: Optional[List[Tuple[float, float]]] = None,
+                      asks: Optional[List[Tuple[float, float]]] = None) -> bool:
+        """Ghi top-of-book + depth cho market đã có metadata"""
+        slot = self._lookup(exchange, symbol)
+        if slot is None:
+            return False
+        head = self._read_slot(slot)[:11]
+        bids = bids or []
+        asks = asks or []
+        body = head + (
+            float(bid), float(ask), time.time(),
+            min(len(bids), DEPTH_LEVELS), min(len(asks), DEPTH_LEVELS),
+        ) + _pack_levels(bids) + _pack_levels(asks)
+        self._write_slot(slot, body)
+        return True
+
+    # ------------------------------------------------------------------ reader
+
+    def read_quote(self, exchange: str, symbol: str, max_age: float) -> Optional[dict]:
+        """
+        Quote mới nhất của 1 market
+
+        Output:
+            dict: {'success', 'bid', 'ask', 'mid', 'bids', 'asks', 'updated_at', 'age', 'source'}
+            hoặc None nếu không có / cũ hơn max_age giây
+        """
+        slot = self._lookup(exchange, symbol)
+        if slot is None:
+            return None
+        body = self._read_slot(slot)
+        if body is None:
+            return None
+
+        bid, ask, quote_ts, n_bids, n_asks = body[11:16]
+        age = time.time() - quote_ts
+        if not quote_ts or bid <= 0 or ask <= 0 or age > max_age:
+            return None
+
+        levels = body[16:]
+        return {
+            'success': True,
+            'bid': bid,
+            'ask': ask,
+            'mid': (bid + ask) / 2,
+            'bids': _unpack_levels(levels[:DEPTH_LEVELS * 2], n_bids),
+            'asks': _unpack_levels(levels[DEPTH_LEVELS * 2:], n_asks),
+            'updated_at': quote_ts,
+            'age': age,
+            'source': 'shared',
+        }
+
+    def read_markets(self, exchange: str) -> List[dict]:
+        """Metadata tất cả market của 1 sàn (format raw của MarketRegistry.load_markets)"""
+        self._refresh_index()
+        exchange_id = EXCHANGE_IDS[exchange]
+        markets = []
+        for (ex_id, _), slot in self._slots.items():
+            if ex_id != exchange_id:
+                continue
+            body = self._read_slot(slot)
+            if body is None:
+                continue
+            _, symbol, symbol_api, market_id, price_dec, size_dec, tick, step, min_qty, min_notional = body[:10]
+            if exchange == 'lighter':
+                markets.append({
+                    'symbol': _decode(symbol),
+                    'market_id': market_id,
+                    'price_decimals': price_dec if price_dec >= 0 else None,
+                    'size_decimals': size_dec if size_dec >= 0 else None,
+                    'min_base_amount': min_notional or None,
+                })
+            else:
+                markets.append({
+                    'symbol': _decode(symbol),
+                    'symbol_api': _decode(symbol_api) or None,
+                    'price_precision': price_dec if price_dec >= 0 else None,
+                    'quantity_precision': size_dec if size_dec >= 0 else None,
+                    'tick_size': tick or None,
+                    'step_size': step or None,
+                    'min_qty': min_qty or None,
+                    'min_notional': min_notional or None,
+                })
+        return markets
+
+
+_reader: Optional[SharedQuoteTable] = None
+_reader_error: Optional[str] = None
+
+
+def get_shared_quotes() -> Optional[SharedQuoteTable]:
+    """
+    Reader singleton cho worker hiện tại
+
+    Output:
+        SharedQuoteTable | None nếu API_SHARED_QUOTES tắt hoặc feed chưa tạo file
+    """
+    global _reader, _reader_error
+    if _reader is not None or not shared_quotes_enabled():
+        return _reader
+    try:
+        _reader = SharedQuoteTable(create=False)
+        _reader_error = None
+    except (OSError, ValueError) as e:
+        if _reader_error != str(e):
+            print(f"⚠️  [SharedQuotes] Chưa attach được {default_path()}: {e}")
+        _reader_error = str(e)
+    return _reader
+
+
+def read_shared_quote(exchange: str, symbol: str, max_age: Optional[float] = None) -> Optional[dict]:
+    """
+    Quote từ shared memory nếu còn mới (ENV API_SHARED_QUOTES_MAX_AGE, default 2s)
+
+    Output:
+        dict giống MarketData.get_price (+ 'bids' / 'asks'), hoặc None -> caller tự gọi REST
+    """
+    table = get_shared_quotes()
+    if table is None:
+        return None
+    if max_age is None:
+        max_age = float(os.getenv('API_SHARED_QUOTES_MAX_AGE', 2.0))
+    return table.read_quote(exchange, symbol, max_age)
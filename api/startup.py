@@ -0,0 +1,201 @@
+"""
+Startup helpers: lazy import từng exchange stack + import-time profile lúc boot
+
+Mode (ENV API_LAZY_IMPORTS, default: 1):
+    - 1: Chỉ import FastAPI + routes lúc boot. Lighter SDK / Aster stack / SQLAlchemy
+         được import ở lần dùng đầu tiên (hoặc trong background warm-up sau khi server đã nhận request).
+    - 0: Import hết mọi thứ lúc boot (behaviour cũ).
+
+Mọi lần import (eager hoặc lazy) đều được ghi vào profile, xem bằng report_import_profile()
+hoặc field "startup" trong /api/status.
+"""
+
+import importlib
+import os
+import tempfile
+import threading
+import time
+from contextlib import contextmanager
+from typing import Dict, List, Optional
+
+# Mốc thời gian boot: module này được import đầu tiên trong api_server.py
+BOOT_STARTED_AT = time.perf_counter()
+
+# Module nặng của từng stack, import theo thứ tự
+STACK_MODULES: Dict[str, tuple] = {
+    'lighter': (
+        'lighter',
+        'perpsdex.lighter.core.client',
+        'perpsdex.lighter.core.market',
+        'perpsdex.lighter.core.order',
+        'perpsdex.lighter.core.risk',
+    ),
+    'aster': (
+        'perpsdex.aster.core.client',
+        'perpsdex.aster.core.market',
+        'perpsdex.aster.core.order',
+        'perpsdex.aster.core.risk',
+    ),
+    'db': (
+        'db',
+    ),
+}
+
+_profile: List[dict] = []
+_loaded_stacks: Dict[str, Optional[str]] = {}  # stack -> None (ok) | error message
+_stack_lock = threading.Lock()
+_ready_at: Optional[float] = None
+
+
+def lazy_imports_enabled() -> bool:
+    """API_LAZY_IMPORTS=1 (default) -> defer import nặng tới lần dùng đầu tiên"""
+    return os.getenv('API_LAZY_IMPORTS', '1').strip().lower() in ('1', 'true', 'yes', 'on')
+
+
+@contextmanager
+def profile_import(label: str, phase: str = 'boot'):
+    """
+    Đo thời gian 1 block import và ghi vào profile
+
+    Example:
+        with profile_import('api.routes'):
+            from api.routes import router
+    """
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        _profile.append({
+            'module': label,
+            'phase': phase,
+            'ms': round((time.perf_counter() - started) * 1000, 1),
+            'at_ms': round((started - BOOT_STARTED_AT) * 1000, 1),
+        })
+
+
+def ensure_stack_loaded(stack: str) -> bool:
+    """
+    Import toàn bộ module của 1 stack ('lighter' | 'aster' | 'db') nếu chưa import
+
+    Thread-safe (warm-up chạy trong worker thread). Lỗi import không raise,
+    chỉ log + ghi nhận để caller tự fallback.
+
+    Output:
+        bool: True nếu stack đã sẵn sàng
+    """
+    if stack in _loaded_stacks:
+        return _loaded_stacks[stack] is None
+
+    with _stack_lock:
+        if stack in _loaded_stacks:
+            return _loaded_stacks[stack] is None
+
+        phase = 'lazy' if _ready_at is not None else 'boot'
+        error = None
+        with profile_import(stack, phase=phase):
+            try:
+                for module_name in STACK_MODULES[stack]:
+                    importlib.import_module(module_name)
+            except Exception as e:
+                error = str(e)
+
+        elapsed = _profile[-1]['ms']
+        if error is None:
+            print(f"📦 [Startup] Loaded {stack} stack ({phase}) in {elapsed:.0f}ms")
+        else:
+            print(f"⚠️  [Startup] Không import được {stack} stack: {error}")
+        _loaded_stacks[stack] = error
+        return error is None
+
+
+def get_db():
+    """
+    Lấy module db (SQLAlchemy) ở lần dùng đầu tiên
+
+    Output:
+        module db, hoặc None nếu không import được (DB logging chạy no-op)
+    """
+    if not ensure_stack_loaded('db'):
+        return None
+    return importlib.import_module('db')
+
+
+def acquire_worker_lock(name: str):
+    """
+    Non-blocking file lock để 1 background job chỉ chạy ở 1 worker (API_WORKERS > 1)
+
+    Output:
+        file object giữ lock (đóng file = nhả lock), None nếu process khác đang giữ.
+        Không có fcntl (Windows) thì luôn lấy được lock.
+    """
+    try:
+        import fcntl
+    except ImportError:
+        return open(os.devnull, 'w')
+
+    lock_file = open(os.path.join(tempfile.gettempdir(), f"perp-dex-api-{name}.lock"), 'w')
+    try:
+        fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        return lock_file
+    except OSError:
+        lock_file.close()
+        return None
+
+
+_primary_lock = None
+
+
+def is_primary_worker() -> bool:
+    """
+    Worker giữ lock 'primary' (1 worker duy nhất khi API_WORKERS > 1) chạy pre-warm sàn và các
+    job nền theo account (account stream, risk / PnL engine, open order tracker). Giữ lock tới hết
+    đời process.
+    """
+    global _primary_lock
+    if _primary_lock is None:
+        _primary_lock = acquire_worker_lock("primary")
+    return _primary_lock is not None
+
+
+def preload_all():
+    """Eager mode: import mọi stack ngay lúc boot"""
+    for stack in STACK_MODULES:
+        ensure_stack_loaded(stack)
+
+
+def mark_ready():
+    """Gọi khi server bắt đầu nhận request (lifespan startup xong)"""
+    global _ready_at
+    if _ready_at is None:
+        _ready_at = time.perf_counter()
+
+
+def get_startup_profile() -> dict:
+    """
+    Snapshot profile startup
+
+    Output:
+        dict: {
+            'lazy_imports': bool,
+            'ready_ms': float | None,   # boot -> server nhận request
+            'loaded': {stack: bool},
+            'imports': [{'module', 'phase', 'ms', 'at_ms'}, ...]
+        }
+    """
+    return {
+        'lazy_imports': lazy_imports_enabled(),
+        'ready_ms': round((_ready_at - BOOT_STARTED_AT) * 1000, 1) if _ready_at is not None else None,
+        'loaded': {stack: error is None for stack, error in _loaded_stacks.items()},
+        'imports': list(_profile),
+    }
+
+
+def report_import_profile():
+    """In bảng import-time profile (sort theo thời gian giảm dần)"""
+    profile = get_startup_profile()
+    mode = 'lazy' if profile['lazy_imports'] else 'eager'
+    print(f"\n⏱️  [Startup] Import profile ({mode} mode)")
+    for entry in sorted(profile['imports'], key=lambda e: e['ms'], reverse=True):
+        print(f"   {entry['ms']:>8.1f}ms  {entry['module']:<20} [{entry['phase']}]")
+    if profile['ready_ms'] is not None:
+        print(f"   → Ready sau {profile['ready_ms']:.0f}ms kể từ boot")
@@ -0,0 +1,456 @@
+"""
+TimeSeriesStore - Lịch sử equity / position dạng cột, tự downsample 1s -> 1m -> 1h
+
+- Sampler nền chụp balance + PnL (từ PnLEngine, in-memory) mỗi TIMESERIES_INTERVAL giây.
+  Balance chỉ được gọi lại từ exchange mỗi TIMESERIES_BALANCE_INTERVAL giây.
+- Mỗi series có 3 tier. Khi 1 bucket của tier trên đóng lại, giá trị cuối (close) của bucket
+  được đẩy lên tier đó:
+    1s: chỉ giữ trong RAM (2 giờ)
+    1m: RAM 2 ngày + chunk .npz theo ngày trên disk (giữ 30 ngày)
+    1h: RAM 60 ngày + chunk .npz theo 30 ngày trên disk
+- Query chọn tier thô nhất vẫn đủ điểm cho window -> không bao giờ quét sample 1s cho window dài.
+
+Nhiều worker: chỉ 1 process giữ file lock và chạy sampler; worker khác đọc chunk trên disk.
+
+ENV:
+    - TIMESERIES_ENABLED (default: 1)
+    - TIMESERIES_DIR (default: data/timeseries)
+    - TIMESERIES_INTERVAL (default: 1 giây)
+    - TIMESERIES_BALANCE_INTERVAL (default: 30 giây)
+"""
+
+import asyncio
+import os
+import time
+from typing import Dict, List, Optional
+
+import numpy as np
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+EQUITY_COLUMNS = ("balance", "available", "unrealized_pnl", "equity", "notional", "positions")
+POSITION_COLUMNS = ("size", "entry_price", "mark_price", "notional", "unrealized_pnl")
+
+# name, resolution (s), RAM retention (s), chunk span trên disk (s) | None, disk retention (s) | None
+TIERS = (
+    ("1s", 1, 2 * 3600, None, None),
+    ("1m", 60, 2 * 86400, 86400, 30 * 86400),
+    ("1h", 3600, 60 * 86400, 30 * 86400, None),
+)
+TIER_RESOLUTION = {name: resolution for name, resolution, _, _, _ in TIERS}
+FLUSH_INTERVAL = 60
+
+
+def timeseries_enabled() -> bool:
+    return os.getenv("TIMESERIES_ENABLED", "1").strip().lower() in ("1", "true", "yes", "on")
+
+
+def default_dir() -> str:
+    return os.getenv("TIMESERIES_DIR") or os.path.join(ROOT_DIR, "data", "timeseries")
+
+
+class ColumnBuffer:
+    """
+    Buffer cột (t + ma trận values) tăng dần theo t, cấp phát theo kiểu doubling
+
+    Methods:
+        - append(t, row): Thêm dòng (cùng t với dòng cuối -> ghi đè)
+        - window(start, end): (t, values) trong [start, end]
+        - drop_before(t)
+    """
+
+    def __init__(self, width: int, capacity: int = 256):
+        self.width = width
+        self._t = np.empty(capacity)
+        self._v = np.empty((capacity, width))
+        self._n = 0
+
+    def __len__(self) -> int:
+        return self._n
+
+    def _reserve(self, extra: int):
+        if self._n + extra <= len(self._t):
+            return
+        capacity = max(len(self._t) * 2, self._n + extra)
+        self._t = np.resize(self._t, capacity)
+        values = np.empty((capacity, self.width))
+        values[:self._n] = self._v[:self._n]
+        self._v = values
+
+    def append(self, t: float, row):
+        # Cùng timestamp (VD: bucket được ghi lại) -> thay dòng cuối
+        if self._n and self._t[self._n - 1] == t:
+            self._v[self._n - 1] = row
+            return
+        self._reserve(1)
+        self._t[self._n] = t
+        self._v[self._n] = row
+        self._n += 1
+
+    def window(self, start: float, end: float):
+        n, t, v = self._n, self._t, self._v
+        lo = np.searchsorted(t[:n], start, side="left")
+        hi = np.searchsorted(t[:n], end, side="right")
+        return t[lo:hi].copy(), v[lo:hi].copy()
+
+    def drop_before(self, t: float):
+        cut = int(np.searchsorted(self._t[:self._n], t, side="left"))
+        if cut == 0:
+            return
+        remaining = self._n - cut
+        self._t[:remaining] = self._t[cut:self._n]
+        self._v[:remaining] = self._v[cut:self._n]
+        self._n = remaining
+
+
+class Series:
+    """1 series (VD: equity:total) với 3 tier"""
+
+    def __init__(self, name: str, columns: tuple):
+        self.name = name
+        self.columns = columns
+        self.buffers: Dict[str, ColumnBuffer] = {tier: ColumnBuffer(len(columns)) for tier, *_ in TIERS}
+        # tier -> (bucket_start, row) của bucket đang mở
+        self._open: Dict[str, Optional[tuple]] = {tier: None for tier, *_ in TIERS[1:]}
+        self.dirty_chunks: Dict[str, set] = {tier: set() for tier, *_ in TIERS}
+
+    def add(self, t: float, row):
+        """Thêm 1 sample 1s rồi cascade bucket đã đóng lên 1m / 1h"""
+        row = np.asarray(row, dtype=float)
+        self.buffers["1s"].append(float(int(t)), row)
+
+        for tier, resolution, _, chunk_span, _ in TIERS[1:]:
+            bucket = float(int(t // resolution) * resolution)
+            current = self._open[tier]
+            self._open[tier] = (bucket, row)
+            if current is None or current[0] == bucket:
+                return
+            # Bucket trước đã đóng -> ghi close vào tier, tiếp tục cascade với bucket đó
+            closed_t, closed_row = current
+            self.buffers[tier].append(closed_t, closed_row)
+            if chunk_span:
+                self.dirty_chunks[tier].add(int(closed_t // chunk_span) * chunk_span)
+            t, row = closed_t, closed_row
+
+    def checkpoint(self):
+        """Ghi bucket đang mở (giá trị tạm) vào tier để flush / query thấy; bucket đóng sẽ ghi đè cùng t"""
+        for tier, _, _, chunk_span, _ in TIERS[1:]:
+            current = self._open[tier]
+            if current is None:
+                continue
+            self.buffers[tier].append(current[0], current[1])
+            if chunk_span:
+                self.dirty_chunks[tier].add(int(current[0] // chunk_span) * chunk_span)
+
+    def trim(self, now: float):
+        for tier, _, retention, _, _ in TIERS:
+            self.buffers[tier].drop_before(now - retention)
+
+
+class TimeSeriesStore:
+    """
+    Quản lý mọi series + chunk trên disk
+
+    Methods:
+        - record(name, columns, t, row)
+        - flush(): Ghi các chunk thay đổi ra disk
+        - query(name, start, end, resolution, max_points)
+        - list_series()
+    """
+
+    def __init__(self, directory: Optional[str] = None):
+        self.directory = directory or default_dir()
+        self.series: Dict[str, Series] = {}
+
+    def record(self, name: str, columns: tuple, t: float, row):
+        series = self.series.get(name)
+        if series is None:
+            series = self.series[name] = Series(name, columns)
+        series.add(t, row)
+
+    # ------------------------------------------------------------------ disk
+
+    def _chunk_path(self, name: str, tier: str, chunk_start: int) -> str:
+        return os.path.join(self.directory, name.replace(":", "__"), tier, f"{chunk_start}.npz")
+
+    def flush(self):
+        """Ghi lại toàn bộ chunk có dòng mới (ghi file tạm rồi os.replace để reader không đọc nửa vời)"""
+        now = time.time()
+        for series in list(self.series.values()):
+            series.checkpoint()
+            for tier, _, _, chunk_span, disk_retention in TIERS:
+                if not chunk_span:
+                    continue
+                for chunk_start in sorted(series.dirty_chunks[tier]):
+                    t, values = series.buffers[tier].window(chunk_start, chunk_start + chunk_span - 1e-9)
+                    disk_t, disk_values = self._read_chunk(series.name, tier, chunk_start)
+                    t, values = _merge_rows(disk_t, disk_values, t, values)
+                    path = self._chunk_path(series.name, tier, chunk_start)
+                    os.makedirs(os.path.dirname(path), exist_ok=True)
+                    tmp_path = path + ".tmp.npz"
+                    np.savez(tmp_path, t=t, values=values, columns=np.array(series.columns))
+                    os.replace(tmp_path, path)
+                series.dirty_chunks[tier].clear()
+                if disk_retention:
+                    self._prune_chunks(series.name, tier, now - disk_retention, chunk_span)
+            series.trim(now)
+
+    def _read_chunk(self, name: str, tier: str, chunk_start: int):
+        path = self._chunk_path(name, tier, chunk_start)
+        if not os.path.exists(path):
+            return None, None
+        try:
+            with np.load(path) as data:
+                return data["t"], data["values"]
+        except Exception as e:
+            print(f"⚠️  [TimeSeries] Không đọc được {path}: {e}")
+            return None, None
+
+    def _chunk_starts(self, name: str, tier: str) -> List[int]:
+        folder = os.path.join(self.directory, name.replace(":", "__"), tier)
+        if not os.path.isdir(folder):
+            return []
+        return sorted(int(f[:-4]) for f in os.listdir(folder) if f.endswith(".npz") and f[:-4].isdigit())
+
+    def _prune_chunks(self, name: str, tier: str, before: float, chunk_span: int):
+        for chunk_start in self._chunk_starts(name, tier):
+            if chunk_start + chunk_span < before:
+                os.remove(self._chunk_path(name, tier, chunk_start))
+
+    # ------------------------------------------------------------------ query
+
+    def list_series(self) -> List[dict]:
+        names = set(self.series)
+        if os.path.isdir(self.directory):
+            names.update(d.replace("__", ":") for d in os.listdir(self.directory)
+                         if os.path.isdir(os.path.join(self.directory, d)))
+        return [{"name": name, "columns": list(self._columns(name) or ())} for name in sorted(names)]
+
+    def _columns(self, name: str) -> Optional[tuple]:
+        if name in self.series:
+            return self.series[name].columns
+        if name.startswith("equity:"):
+            return EQUITY_COLUMNS
+        if name.startswith("position:"):
+            return POSITION_COLUMNS
+        return None
+
+    @staticmethod
+    def pick_resolution(start: float, end: float, max_points: int, now: float) -> str:
+        """Tier mịn nhất mà window <= max_points điểm (1s chỉ khi window còn trong RAM)"""
+        span = max(end - start, 1)
+        for tier, resolution, retention, _, _ in TIERS:
+            if tier == "1s" and start < now - retention:
+                continue
+            if span / resolution <= max_points:
+                return tier
+        return TIERS[-1][0]
+
+    def query(self, name: str, start: float, end: float, resolution: str = "auto", max_points: int = 1500) -> dict:
+        """
+        Output:
+            dict: {'series', 'resolution', 'columns': {'t': [...], <col>: [...]}, 'points'}
+        """
+        columns = self._columns(name)
+        if columns is None:
+            return {"series": name, "resolution": None, "columns": {}, "points": 0}
+
+        now = time.time()
+        tier = self.pick_resolution(start, end, max_points, now) if resolution == "auto" else resolution
+        _, tier_resolution, _, chunk_span, _ = next(spec for spec in TIERS if spec[0] == tier)
+
+        t = np.empty(0)
+        values = np.empty((0, len(columns)))
+        if chunk_span:
+            first = int(start // chunk_span) * chunk_span
+            for chunk_start in self._chunk_starts(name, tier):
+                if chunk_start < first or chunk_start > end:
+                    continue
+                disk_t, disk_values = self._read_chunk(name, tier, chunk_start)
+                if disk_t is not None:
+                    t, values = _merge_rows(t, values, disk_t, disk_values)
+
+        series = self.series.get(name)
+        if series is not None:
+            mem_t, mem_values = series.buffers[tier].window(start, end)
+            t, values = _merge_rows(t, values, mem_t, mem_values)
+
+        mask = (t >= start) & (t <= end)
+        t, values = t[mask], values[mask]
+        return {
+            "series": name,
+            "resolution": tier,
+            "resolution_seconds": tier_resolution,
+            "points": int(len(t)),
+            "columns": dict(
+                {"t": t.tolist()},
+                **{column: values[:, i].tolist() for i, column in enumerate(columns)}
+            ),
+        }
+
+
+def _merge_rows(t_a, values_a, t_b, values_b):
+    """Gộp 2 khối (t, values), trùng timestamp thì giữ khối b (mới hơn), kết quả sort theo t"""
+    if t_a is None or len(t_a) == 0:
+        return t_b, values_b
+    if len(t_b) == 0:
+        return t_a, values_a
+    t = np.concatenate([t_b, t_a])
+    values = np.concatenate([values_b, values_a])
+    # np.unique giữ lần xuất hiện đầu tiên -> b được ưu tiên
+    t, first = np.unique(t, return_index=True)
+    return t, values[first]
+
+
+class EquitySampler:
+    """Background sampler: balance (cache) + PnL snapshot -> TimeSeriesStore"""
+
+    EXCHANGES = ("lighter", "aster")
+
+    def __init__(self, store: TimeSeriesStore):
+        self.store = store
+        self.interval = float(os.getenv("TIMESERIES_INTERVAL", 1.0))
+        self.balance_interval = float(os.getenv("TIMESERIES_BALANCE_INTERVAL", 30.0))
+        self.balances: Dict[str, dict] = {}
+        self._held: Dict[str, set] = {ex: set() for ex in self.EXCHANGES}
+        self._task: Optional[asyncio.Task] = None
+        self._lock_file = None
+
+    async def _refresh_balances(self):
+        from api.balance import get_lighter_balance, get_aster_balance
+        from api.utils import get_keys_or_env, initialize_lighter_client, initialize_aster_client
+
+        for exchange in self.EXCHANGES:
+            keys = get_keys_or_env(None, exchange)
+            if not (keys.get("private_key") if exchange == "lighter" else keys.get("api_key")):
+                continue
+            client = None
+            try:
+                if exchange == "lighter":
+                    client = await initialize_lighter_client(keys)
+                    result = await get_lighter_balance(client, keys.get("account_index", 0))
+                else:
+                    client = await initialize_aster_client(keys)
+                    result = await get_aster_balance(client)
+                if result.get("success"):
+                    self.balances[exchange] = result
+            except Exception as e:
+                print(f"⚠️  [TimeSeries] Balance {exchange} lỗi: {e}")
+            finally:
+                if client is not None and hasattr(client, "close"):
+                    try:
+                        await client.close()
+                    except Exception:
+                        pass
+
+    def sample(self, now: float, pnl_snapshot: dict):
+        """Ghi 1 sample cho equity:<exchange>, equity:total và position:<exchange>:<symbol>"""
+        totals = np.zeros(len(EQUITY_COLUMNS))
+        for exchange in self.EXCHANGES:
+            balance = self.balances.get(exchange, {})
+            pnl = pnl_snapshot["by_exchange"].get(exchange, {})
+            balance_total = float(balance.get("total") or 0)
+            upnl = float(pnl.get("unrealized_pnl") or 0)
+            row = np.array([
+                balance_total,
+                float(balance.get("available") or 0),
+                upnl,
+                balance_total + upnl,
+                float(pnl.get("notional") or 0),
+                float(pnl.get("positions") or 0),
+            ])
+            totals += row
+            self.store.record(f"equity:{exchange}", EQUITY_COLUMNS, now, row)
+        self.store.record("equity:total", EQUITY_COLUMNS, now, totals)
+
+        # Net position theo (exchange, symbol)
+        net: Dict[tuple, np.ndarray] = {}
+        for pos in pnl_snapshot["positions"]:
+            key = (pos["exchange"], pos["symbol_base"])
+            sign = 1 if pos["side"] == "long" else -1
+            row = net.setdefault(key, np.zeros(len(POSITION_COLUMNS)))
+            row[0] += sign * pos["position_size"]
+            row[1] = pos["entry_price"]
+            row[2] = pos["mark_price"]
+            row[3] += pos["position_size"] * pos["mark_price"]
+            row[4] += pos["pnl_usd"]
+
+        for exchange in self.EXCHANGES:
+            held = {symbol for ex, symbol in net if ex == exchange}
+            # Position vừa đóng -> ghi 1 sample 0 để đường size về 0
+            for symbol in self._held[exchange] - held:
+                net[(exchange, symbol)] = np.zeros(len(POSITION_COLUMNS))
+            self._held[exchange] = held
+
+        for (exchange, symbol), row in net.items():
+            self.store.record(f"position:{exchange}:{symbol}", POSITION_COLUMNS, now, row)
+
+    async def _run(self):
+        from api.pnl import get_pnl_engine
+
+        engine = get_pnl_engine()
+        last_balance = 0.0
+        last_flush = time.time()
+        try:
+            while True:
+                now = time.time()
+                if now - last_balance >= self.balance_interval:
+                    await self._refresh_balances()
+                    last_balance = now
+                try:
+                    self.sample(now, engine.snapshot())
+                except Exception as e:
+                    print(f"⚠️  [TimeSeries] Sample lỗi: {e}")
+                if now - last_flush >= FLUSH_INTERVAL:
+                    await asyncio.to_thread(self.store.flush)
+                    last_flush = now
+                await asyncio.sleep(max(self.interval - (time.time() - now), 0.05))
+        finally:
+            self.store.flush()
+
+    def start(self) -> bool:
+        if self._task is not None and not self._task.done():
+            return True
+        from api.startup import acquire_worker_lock
+
+        if self._lock_file is None:
+            self._lock_file = acquire_worker_lock("timeseries")
+        if self._lock_file is None:
+            print("ℹ️  [TimeSeries] Sampler đang chạy ở process khác, worker này chỉ đọc")
+            return False
+        self._task = asyncio.create_task(self._run(), name="equity-sampler")
+        print(f"📊 [TimeSeries] Sampler started ({self.interval}s, dir={self.store.directory})")
+        return True
+
+    async def stop(self):
+        if self._task is not None and not self._task.done():
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+        if self._lock_file is not None:
+            self._lock_file.close()
+            self._lock_file = None
+
+    @property
+    def running(self) -> bool:
+        return self._task is not None and not self._task.done()
+
+
+_store: Optional[TimeSeriesStore] = None
+_sampler: Optional[EquitySampler] = None
+
+
+def get_timeseries_store() -> TimeSeriesStore:
+    global _store
+    if _store is None:
+        _store = TimeSeriesStore()
+    return _store
+
+
+def get_equity_sampler() -> EquitySampler:
+    global _sampler
+    if _sampler is None:
+        _sampler = EquitySampler(get_timeseries_store())
+    return _sampler
@@ -2,19 +2,33 @@
 Helper utilities for API
 """
 
+import asyncio
 import os
-from typing import Optional
+from typing import Optional, TYPE_CHECKING
 from fastapi import HTTPException
 
-from perpsdex.lighter.core.client import LighterClient
-from perpsdex.lighter.utils.config import ConfigLoader as LighterConfigLoader
-from perpsdex.aster.core.client import AsterClient
+from perpsdex.lighter.utils.market_registry import get_market_registry as get_lighter_registry
+from perpsdex.aster.utils.market_registry import get_market_registry as get_aster_registry
 
 from api.models import KeysConfig
+from api.startup import ensure_stack_loaded
+from api.shared_quotes import get_shared_quotes
 
+if TYPE_CHECKING:
+    from perpsdex.lighter.core.client import LighterClient
+    from perpsdex.aster.core.client import AsterClient
+
+
+def get_keys_or_env(keys_config: Optional[KeysConfig], exchange: str, account: Optional[str] = None) -> dict:
+    """
+    Lấy API keys từ request, account có tên (api/accounts.py) hoặc fallback ENV
+
+    Keys gửi trong request được ưu tiên hơn tên account.
+    """
+    if keys_config is None and account:
+        from api.accounts import get_account_registry
+        return get_account_registry().keys(exchange, account)
 
-def get_keys_or_env(keys_config: Optional[KeysConfig], exchange: str) -> dict:
-    """Lấy API keys từ request hoặc fallback ENV"""
     if exchange == "lighter":
         return {
             "private_key": (keys_config.lighter_private_key if keys_config else None)
@@ -40,6 +54,8 @@ def normalize_symbol(exchange: str, base_symbol: str) -> dict:
     """
     Chuẩn hoá symbol theo sàn, luôn input là base token (VD: BTC).
     
+    Lookup qua MarketRegistry của từng sàn (O(1), không rebuild dict theo request).
+    
     Returns:
         lighter: {base_symbol, pair, market_id}
         aster: {base_symbol, symbol_pair, symbol_api}
@@ -47,27 +63,37 @@ def normalize_symbol(exchange: str, base_symbol: str) -> dict:
     symbol = base_symbol.upper()
 
     if exchange == "lighter":
-        pair = f"{symbol}-USDT"
-        try:
-            market_id = LighterConfigLoader.get_market_id_for_pair(pair)
-        except Exception:
+        market = get_lighter_registry().get(symbol)
+        if market is None:
             raise HTTPException(
                 status_code=400,
-                detail=f"Lighter: symbol/pair không được hỗ trợ: {pair}",
+                detail=f"Lighter: symbol/pair không được hỗ trợ: {symbol}-USDT",
             )
         return {
-            "base_symbol": symbol,
-            "pair": pair,
-            "market_id": market_id,
+            "base_symbol": market["symbol"],
+            "pair": market["pair"],
+            "market_id": market["market_id"],
         }
 
     # aster
-    pair = f"{symbol}-USDT"
-    symbol_api = f"{symbol}USDT"
+    registry = get_aster_registry()
+    market = registry.get(symbol)
+    if market is None:
+        # Registry rỗng (chưa refresh được từ exchangeInfo) -> dùng quy ước BTC -> BTCUSDT
+        if len(registry) > 0:
+            raise HTTPException(
+                status_code=400,
+                detail=f"Aster: symbol/pair không được hỗ trợ: {symbol}-USDT",
+            )
+        return {
+            "base_symbol": symbol,
+            "symbol_pair": f"{symbol}-USDT",
+            "symbol_api": f"{symbol}USDT",
+        }
     return {
-        "base_symbol": symbol,
-        "symbol_pair": pair,
-        "symbol_api": symbol_api,
+        "base_symbol": market["symbol"],
+        "symbol_pair": market["pair"],
+        "symbol_api": market["symbol_api"],
     }
 
 
@@ -105,8 +131,11 @@ def validate_tp_sl(side: str, entry_price: float, tp_price: Optional[float], sl_
             )
 
 
-async def initialize_lighter_client(keys: dict) -> LighterClient:
+async def initialize_lighter_client(keys: dict) -> "LighterClient":
     """Khởi tạo LighterClient với keys đã chuẩn hoá"""
+    await asyncio.to_thread(ensure_stack_loaded, "lighter")
+    from perpsdex.lighter.core.client import LighterClient
+
     pk = keys.get("private_key")
     acc_idx = keys.get("account_index")
     api_idx = keys.get("api_key_index")
@@ -140,8 +169,11 @@ async def initialize_lighter_client(keys: dict) -> LighterClient:
     return client
 
 
-async def initialize_aster_client(keys: dict) -> AsterClient:
+async def initialize_aster_client(keys: dict) -> "AsterClient":
     """Khởi tạo AsterClient với keys đã chuẩn hoá"""
+    await asyncio.to_thread(ensure_stack_loaded, "aster")
+    from perpsdex.aster.core.client import AsterClient
+
     if not keys.get("api_key") or not keys.get("secret_key"):
         raise HTTPException(
             status_code=400,
@@ -163,3 +195,59 @@ async def initialize_aster_client(keys: dict) -> AsterClient:
 
     return client
 
+
+async def refresh_market_registries(use_shared: bool = True) -> dict:
+    """
+    Load MarketRegistry của cả 2 sàn (JSON) và refresh từ exchange (best-effort).
+    
+    Gọi 1 lần khi server startup; lỗi refresh chỉ log, registry giữ dữ liệu từ JSON.
+    Multi-worker (API_SHARED_QUOTES=1): lấy metadata từ shared memory do quote feed publish,
+    không gọi exchange từ từng worker.
+    
+    Returns:
+        {'lighter': {'success', 'count', ...}, 'aster': {...}}
+    """
+    results = {}
+
+    table = get_shared_quotes() if use_shared else None
+    if table is not None:
+        for exchange, registry in (("lighter", get_lighter_registry()), ("aster", get_aster_registry())):
+            markets = table.read_markets(exchange)
+            if markets:
+                results[exchange] = {"success": True, "count": registry.load_markets(markets, source="shared")}
+        if len(results) == 2:
+            return results
+        results = {}
+
+    lighter_registry = get_lighter_registry()
+    if await asyncio.to_thread(ensure_stack_loaded, "lighter"):
+        from lighter import ApiClient, Configuration, OrderApi
+        from perpsdex.lighter.core.client import LighterClient
+
+        api_client = ApiClient(configuration=Configuration(host=LighterClient.DEFAULT_URL))
+        try:
+            results["lighter"] = await lighter_registry.refresh(OrderApi(api_client))
+        finally:
+            await api_client.close()
+    else:
+        results["lighter"] = {"success": False, "count": len(lighter_registry), "error": "Lighter SDK không available"}
+
+    aster_registry = get_aster_registry()
+    if not await asyncio.to_thread(ensure_stack_loaded, "aster"):
+        results["aster"] = {"success": False, "count": len(aster_registry), "error": "Aster stack không available"}
+        return results
+
+    from perpsdex.aster.core.client import AsterClient
+
+    keys = get_keys_or_env(None, "aster")
+    aster_client = AsterClient(
+        api_url=keys["api_url"],
+        api_key=keys.get("api_key") or "",
+        secret_key=keys.get("secret_key") or "",
+    )
+    try:
+        results["aster"] = await aster_registry.refresh(aster_client)
+    finally:
+        await aster_client.close()
+
+    return results
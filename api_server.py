@@ -12,47 +12,158 @@ Run: python api_server.py
 Or: uvicorn api_server:app --host 0.0.0.0 --port 8080 --reload
 """
 
-from fastapi import FastAPI
-from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import HTMLResponse
-from contextlib import asynccontextmanager
+# api.startup import đầu tiên để lấy mốc thời gian boot cho import profile
+from api.startup import (
+    profile_import,
+    lazy_imports_enabled,
+    preload_all,
+    mark_ready,
+    report_import_profile,
+)
+
+import asyncio
 import os
-from dotenv import load_dotenv
 import json
 import urllib.request
+from contextlib import asynccontextmanager
+
+with profile_import("fastapi"):
+    from fastapi import FastAPI
+    from fastapi.middleware.cors import CORSMiddleware
+    from fastapi.responses import HTMLResponse
+    from dotenv import load_dotenv
 
 # Load environment
 load_dotenv()
 
-# Optional DB layer for logging orders
-try:
-    from db import test_db_connection
-except Exception as _db_import_err:
-    print(f"[DB] Warning: không thể import db module: {_db_import_err}")
-    test_db_connection = None  # type: ignore
+# Import routes from api module (exchange stack + DB được import lazy, xem api/startup.py)
+with profile_import("api.routes"):
+    from api.routes import router
+    from api.middleware import get_default_response_class, setup_deadline_middleware, setup_response_middleware
+
+# Eager mode: import hết Lighter SDK / Aster / SQLAlchemy ngay lúc boot (behaviour cũ)
+if not lazy_imports_enabled():
+    preload_all()
+
+
+async def warm_up():
+    """
+    Pre-warm song song (DB, markets, client + giá 2 sàn, xem api/readiness.py) rồi start job nền
+
+    API_WORKERS > 1: chỉ worker primary (file lock) warm 2 sàn và chạy job nền theo account,
+    worker khác chỉ warm DB + markets (không mở N lần WS / loop sync tới sàn cho cùng account).
+    """
+    from api.readiness import get_readiness
+    from api.startup import is_primary_worker
+
+    primary = is_primary_worker()
+    await get_readiness().pre_warm(exchanges=primary)
+    if primary:
+        await start_account_jobs()
+    else:
+        print("ℹ️  [Startup] Pre-warm sàn + job nền theo account đang chạy ở worker khác")
 
-# Import routes from api module
-from api.routes import router
+    # Sync order / fill history từ exchange vào DB (incremental theo cursor)
+    from api.history_sync import get_history_sync, history_sync_enabled
+    if history_sync_enabled():
+        get_history_sync().start()
+
+    # Đối soát bảng orders (submitted -> filled / cancelled ...) với trạng thái trên sàn
+    from api.reconciler import get_order_reconciler, reconcile_enabled
+    if reconcile_enabled():
+        get_order_reconciler().start()
+
+
+async def start_account_jobs():
+    """Job nền theo account - chỉ chạy ở worker primary"""
+    # Account stream (WS): position / order / balance local + event fill cho wait_for_fill
+    from api.account_streams import account_streams_enabled, get_account_streams
+    if account_streams_enabled():
+        await get_account_streams().start()
+
+    # Pre-trade risk: balance + position snapshot cho check margin / exposure in-memory
+    from api.risk import get_risk_engine, risk_engine_enabled
+    if risk_engine_enabled():
+        get_risk_engine().start()
+
+    # PnL engine: mark-to-market nền cho /api/pnl (numpy chỉ import ở đây, sau khi server đã ready)
+    from api.pnl import get_pnl_engine, pnl_engine_enabled
+    if pnl_engine_enabled():
+        get_pnl_engine().start()
+
+    # Equity / position time series (sampler đọc snapshot PnL cùng process -> chạy cạnh PnL engine)
+    from api.timeseries import get_equity_sampler, timeseries_enabled
+    if timeseries_enabled():
+        get_equity_sampler().start()
+
+    # Open order Lighter: book in-memory, sync với active orders của sàn
+    from api.open_orders import get_lighter_open_order_tracker, open_order_tracker_enabled
+    if open_order_tracker_enabled():
+        get_lighter_open_order_tracker().start()
 
 
 # Lifespan event: Kiểm tra database connection khi server startup
 @asynccontextmanager
 async def lifespan(app: FastAPI):
-    """Lifespan context manager để kiểm tra DB khi startup"""
+    """
+    Lifespan context manager để kiểm tra DB + refresh markets khi startup
+
+    Lazy mode: warm-up chạy background sau khi server đã nhận request,
+    healthcheck (/api/status) không phải chờ DB / exchange.
+    """
     # Startup
-    if test_db_connection is not None:
-        db_status = test_db_connection()
-        status_icon = "✅" if db_status["connected"] else "❌" if db_status["status"] == "failed" else "⚠️"
-        print(f"\n{status_icon} [DB] {db_status['message']}")
-        if not db_status["connected"]:
-            print("   ⚠️  Orders sẽ KHÔNG được lưu vào database cho đến khi fix lỗi.")
+    # Đo lag event loop ngay từ đầu (warm-up / ký tx đồng bộ đều hiện ở /api/status)
+    from api.loop_monitor import get_loop_lag_monitor
+    get_loop_lag_monitor().start()
+
+    warm_up_task = None
+    if lazy_imports_enabled():
+        warm_up_task = asyncio.create_task(warm_up())
     else:
-        print("\n⚠️  [DB] Database module không available, skip connection check.")
-    
+        await warm_up()
+
+    mark_ready()
+    report_import_profile()
+
     yield  # Server running
-    
-    # Shutdown (nếu cần cleanup, thêm code ở đây)
-    pass
+
+    # Shutdown
+    if warm_up_task is not None and not warm_up_task.done():
+        warm_up_task.cancel()
+
+    # Dừng các TWAP parent còn chạy (phần đã khớp được ghi lại vào DB)
+    from api.execution import get_execution_scheduler
+    await get_execution_scheduler().shutdown()
+
+    from api.fills import get_fill_dispatcher
+    await get_fill_dispatcher().stop()
+
+    from api.reconciler import get_order_reconciler
+    await get_order_reconciler().stop()
+
+    from api.history_sync import get_history_sync
+    await get_history_sync().stop()
+
+    from api.open_orders import get_lighter_open_order_tracker
+    await get_lighter_open_order_tracker().stop()
+
+    # Sampler flush chunk còn lại ra disk trước khi PnL engine dừng
+    from api.timeseries import get_equity_sampler
+    await get_equity_sampler().stop()
+
+    from api.pnl import get_pnl_engine
+    await get_pnl_engine().stop()
+
+    from api.risk import get_risk_engine
+    await get_risk_engine().stop()
+
+    from api.account_streams import get_account_streams
+    await get_account_streams().stop()
+
+    from api.accounts import get_account_registry
+    await get_account_registry().close()
+
+    await get_loop_lag_monitor().stop()
 
 
 # FastAPI app
@@ -61,6 +172,7 @@ app = FastAPI(
     description="API for placing orders on Lighter and Aster DEX",
     version="1.0.0",
     lifespan=lifespan,
+    default_response_class=get_default_response_class(),
 )
 
 # CORS
@@ -70,6 +182,21 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["ETag"],
+)
+
+# Deadline end-to-end cho mỗi request (call đọc tới sàn bị cắt khi hết budget, có hedged read)
+setup_deadline_middleware(app)
+
+# ETag (304 cho snapshot không đổi) + gzip/brotli cho các endpoint đọc mà dashboard poll
+setup_response_middleware(
+    app,
+    etag_paths=[
+        "/api/orders/positions",
+        "/api/orders/open",
+        "/api/orders/history",
+        "/api/balance",
+    ],
 )
 
 
@@ -94,13 +221,11 @@ app.include_router(router)
 
 # =============== UI ROUTE ===============
 
-# Import UI template
-from api.ui import HTML_TEMPLATE
-
-
 @app.get("/", response_class=HTMLResponse)
 async def root():
     """Simple HTML UI để đặt lệnh qua /api/order"""
+    # Template ~1.5k dòng, chỉ import khi có người mở UI
+    from api.ui import HTML_TEMPLATE
     return HTML_TEMPLATE
 
 
@@ -130,13 +255,38 @@ if __name__ == "__main__":
     # Log IP public để hỗ trợ cấu hình whitelist trên Aster, v.v.
     log_public_ip()
     
-    # Tắt reload để tránh lỗi ModuleNotFoundError với multiprocessing spawn
-    # Nếu cần reload, dùng: uvicorn api_server:app --reload
-    uvicorn.run(
-        app,  # Pass app object trực tiếp (không dùng import string)
-        host="0.0.0.0",
-        port=port,
-        log_level="info",
-        reload=False  # Tắt reload để tránh lỗi import
-    )
+    # Multi-worker: 1 quote feed process publish quote + metadata vào shared memory,
+    # mọi worker đọc từ đó thay vì tự gọi exchange (xem api/shared_quotes.py)
+    workers = max(int(os.getenv("API_WORKERS", 1)), 1)
+    feed_process = None
+    if workers > 1 or os.getenv("API_SHARED_QUOTES", "0").strip().lower() in ("1", "true", "yes", "on"):
+        from api.quote_feed import start_quote_feed_process
+
+        os.environ["API_SHARED_QUOTES"] = "1"
+        feed_process = start_quote_feed_process()
+        print(f"📡 Quote feed process: pid={feed_process.pid}, workers={workers}")
+
+    try:
+        if workers > 1:
+            # uvicorn cần import string để spawn worker
+            uvicorn.run(
+                "api_server:app",
+                host="0.0.0.0",
+                port=port,
+                log_level="info",
+                workers=workers,
+            )
+        else:
+            # Tắt reload để tránh lỗi ModuleNotFoundError với multiprocessing spawn
+            # Nếu cần reload, dùng: uvicorn api_server:app --reload
+            uvicorn.run(
+                app,  # Pass app object trực tiếp (không dùng import string)
+                host="0.0.0.0",
+                port=port,
+                log_level="info",
+                reload=False  # Tắt reload để tránh lỗi import
+            )
+    finally:
+        if feed_process is not None and feed_process.is_alive():
+            feed_process.terminate()
 
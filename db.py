@@ -8,7 +8,7 @@ Nếu không set `DB_URL`, các hàm log sẽ chạy no-op (không làm gì, ch
 import os
 import json
 import datetime as dt
-from typing import Optional, Dict, Any
+from typing import Optional, Dict, Any, List
 from urllib.parse import quote_plus
 
 from sqlalchemy import (
@@ -19,8 +19,12 @@ from sqlalchemy import (
     Integer,
     String,
     Float,
+    Boolean,
     DateTime,
     Text,
+    Index,
+    UniqueConstraint,
+    bindparam,
     text,
 )
 from sqlalchemy.engine import Engine
@@ -97,6 +101,76 @@ orders_table = Table(
 )
 
 
+# Lịch sử order / fill đồng bộ từ exchange (api/history_sync.py), khác với bảng `orders`
+# chỉ chứa lệnh do API này đặt.
+exchange_orders_table = Table(
+    "exchange_orders",
+    metadata,
+    Column("id", Integer, primary_key=True, autoincrement=True),
+    Column("exchange", String(16), nullable=False),
+    Column("account", String(64), nullable=False),
+    Column("exchange_order_id", String(128), nullable=False),
+    Column("client_order_id", String(128)),
+    Column("symbol_base", String(32)),
+    Column("side", String(8)),
+    Column("order_type", String(32)),
+    Column("status", String(32)),
+    Column("price", Float),
+    Column("size_asset", Float),
+    Column("filled_asset", Float),
+    Column("filled_usd", Float),
+    Column("reduce_only", Boolean),
+    Column("exchange_created_at", DateTime),
+    Column("exchange_updated_at", DateTime),
+    Column("raw", Text),
+    Column("synced_at", DateTime, default=dt.datetime.utcnow, nullable=False),
+    UniqueConstraint("exchange", "account", "exchange_order_id", name="uq_exchange_orders_order"),
+    Index("ix_exchange_orders_symbol_time", "exchange", "symbol_base", "exchange_created_at"),
+)
+
+exchange_trades_table = Table(
+    "exchange_trades",
+    metadata,
+    Column("id", Integer, primary_key=True, autoincrement=True),
+    Column("exchange", String(16), nullable=False),
+    Column("account", String(64), nullable=False),
+    Column("trade_id", String(128), nullable=False),
+    Column("exchange_order_id", String(128)),
+    Column("symbol_base", String(32)),
+    Column("side", String(8)),
+    Column("price", Float),
+    Column("size_asset", Float),
+    Column("size_usd", Float),
+    Column("fee", Float),
+    Column("realized_pnl", Float),
+    Column("is_maker", Boolean),
+    Column("executed_at", DateTime),
+    Column("raw", Text),
+    Column("synced_at", DateTime, default=dt.datetime.utcnow, nullable=False),
+    UniqueConstraint("exchange", "account", "trade_id", name="uq_exchange_trades_trade"),
+    Index("ix_exchange_trades_symbol_time", "exchange", "symbol_base", "executed_at"),
+    Index("ix_exchange_trades_order", "exchange", "exchange_order_id"),
+)
+
+# Cursor của job sync, 1 dòng / (exchange, account, stream)
+sync_cursors_table = Table(
+    "sync_cursors",
+    metadata,
+    Column("exchange", String(16), primary_key=True),
+    Column("account", String(64), primary_key=True),
+    Column("stream", String(64), primary_key=True),
+    Column("cursor", String(128)),
+    Column("updated_at", DateTime, default=dt.datetime.utcnow, nullable=False),
+)
+
+# Status của bảng orders mà reconciler còn phải theo dõi (market / limit đã gửi xuống sàn)
+JOURNAL_OPEN_STATUSES = ("pending", "submitted", "partially_filled")
+
+# Các cột so sánh để biết 1 order đã thay đổi hay chưa (chỉ update dòng thay đổi)
+EXCHANGE_ORDER_MUTABLE_FIELDS = ("status", "price", "size_asset", "filled_asset", "filled_usd", "exchange_updated_at")
+BULK_CHUNK_SIZE = 500
+
+
 def _init_engine() -> Optional[Engine]:
     """Khởi tạo engine nếu có DB_URL, nếu không thì trả None (no-op mode)."""
     global engine
@@ -353,3 +427,292 @@ def query_orders(
 
 
 
+
+
+def _bulk_upsert(table: Table, key_column: str, exchange: str, account: str, rows: List[dict],
+                 mutable_fields: tuple = ()) -> Dict[str, int]:
+    """
+    Upsert theo (exchange, account, key_column): 1 SELECT / chunk để lấy dòng đã có,
+    INSERT dòng mới và UPDATE dòng có mutable_fields thay đổi bằng executemany.
+    """
+    stats = {"inserted": 0, "updated": 0, "unchanged": 0}
+    eng = _init_engine()
+    if eng is None or not rows:
+        return stats
+
+    key = table.c[key_column]
+    # Dòng trùng key trong cùng batch: giữ dòng cuối
+    unique_rows = {row[key_column]: row for row in rows}
+    now = dt.datetime.utcnow()
+
+    try:
+        with eng.begin() as conn:
+            keys = list(unique_rows)
+            existing: Dict[str, Any] = {}
+            for i in range(0, len(keys), BULK_CHUNK_SIZE):
+                columns = [table.c.id, key] + [table.c[field] for field in mutable_fields]
+                result = conn.execute(
+                    table.select().with_only_columns(*columns).where(
+                        table.c.exchange == exchange,
+                        table.c.account == account,
+                        key.in_(keys[i:i + BULK_CHUNK_SIZE]),
+                    )
+                )
+                for row in result:
+                    existing[row._mapping[key_column]] = row._mapping
+
+            inserts, updates = [], []
+            for key_value, row in unique_rows.items():
+                current = existing.get(key_value)
+                values = dict(row, exchange=exchange, account=account, synced_at=now)
+                if current is None:
+                    inserts.append(values)
+                elif any(current[field] != values.get(field) for field in mutable_fields):
+                    updates.append(dict(
+                        {f"_{field}": values.get(field) for field in mutable_fields},
+                        _id=current["id"], _raw=values.get("raw"), _synced_at=now,
+                    ))
+                else:
+                    stats["unchanged"] += 1
+
+            if inserts:
+                conn.execute(table.insert(), inserts)
+            if updates:
+                conn.execute(
+                    table.update()
+                    .where(table.c.id == bindparam("_id"))
+                    .values(
+                        raw=bindparam("_raw"),
+                        synced_at=bindparam("_synced_at"),
+                        **{field: bindparam(f"_{field}") for field in mutable_fields},
+                    ),
+                    updates,
+                )
+            stats["inserted"] = len(inserts)
+            stats["updated"] = len(updates)
+    except SQLAlchemyError as e:
+        print(f"[DB] Lỗi khi upsert {table.name}: {e}")
+        stats["error"] = str(e)
+    return stats
+
+
+def upsert_exchange_orders(exchange: str, account: str, rows: List[dict]) -> Dict[str, int]:
+    """
+    Upsert order history từ exchange (chỉ ghi dòng mới hoặc thay đổi status / fill).
+
+    Returns:
+        {'inserted', 'updated', 'unchanged'}
+    """
+    return _bulk_upsert(
+        exchange_orders_table, "exchange_order_id", exchange, account, rows, EXCHANGE_ORDER_MUTABLE_FIELDS
+    )
+
+
+def insert_exchange_trades(exchange: str, account: str, rows: List[dict]) -> Dict[str, int]:
+    """Insert fill mới (fill không đổi sau khi khớp -> trade_id đã có thì bỏ qua)"""
+    return _bulk_upsert(exchange_trades_table, "trade_id", exchange, account, rows)
+
+
+def get_sync_cursors(exchange: str, account: str) -> Dict[str, str]:
+    """Toàn bộ cursor của 1 (exchange, account): {stream: cursor}"""
+    eng = _init_engine()
+    if eng is None:
+        return {}
+    try:
+        with eng.connect() as conn:
+            result = conn.execute(
+                sync_cursors_table.select().where(
+                    sync_cursors_table.c.exchange == exchange,
+                    sync_cursors_table.c.account == account,
+                )
+            )
+            return {row.stream: row.cursor for row in result}
+    except SQLAlchemyError as e:
+        print(f"[DB] Lỗi khi đọc sync cursor: {e}")
+        return {}
+
+
+def set_sync_cursor(exchange: str, account: str, stream: str, cursor: str) -> None:
+    """Lưu cursor (UPDATE, chưa có thì INSERT)"""
+    eng = _init_engine()
+    if eng is None:
+        return
+    try:
+        with eng.begin() as conn:
+            table = sync_cursors_table
+            result = conn.execute(
+                table.update()
+                .where(table.c.exchange == exchange, table.c.account == account, table.c.stream == stream)
+                .values(cursor=cursor, updated_at=dt.datetime.utcnow())
+            )
+            if result.rowcount == 0:
+                conn.execute(table.insert().values(
+                    exchange=exchange, account=account, stream=stream,
+                    cursor=cursor, updated_at=dt.datetime.utcnow(),
+                ))
+    except SQLAlchemyError as e:
+        print(f"[DB] Lỗi khi lưu sync cursor: {e}")
+
+
+def _history_row(row) -> dict:
+    result = {}
+    for column, value in row._mapping.items():
+        if column in ("raw", "id"):
+            continue
+        result[column] = value.isoformat() if isinstance(value, dt.datetime) else value
+    return result
+
+
+def _query_history(table: Table, time_column: str, filters: Dict[str, Any],
+                   start: Optional[dt.datetime], end: Optional[dt.datetime], limit: int) -> list:
+    eng = _init_engine()
+    if eng is None:
+        return []
+    try:
+        query = table.select()
+        for column, value in filters.items():
+            if value is not None:
+                query = query.where(table.c[column] == value)
+        if start is not None:
+            query = query.where(table.c[time_column] >= start)
+        if end is not None:
+            query = query.where(table.c[time_column] <= end)
+        query = query.order_by(table.c[time_column].desc()).limit(limit)
+        with eng.connect() as conn:
+            return [_history_row(row) for row in conn.execute(query)]
+    except SQLAlchemyError as e:
+        print(f"[DB] Lỗi khi query {table.name}: {e}")
+        return []
+
+
+def query_exchange_orders(
+    exchange: Optional[str] = None,
+    symbol_base: Optional[str] = None,
+    status: Optional[str] = None,
+    start: Optional[dt.datetime] = None,
+    end: Optional[dt.datetime] = None,
+    limit: int = 100,
+) -> list:
+    """Order history đã sync (mới nhất trước), filter theo index (exchange, symbol_base, thời gian)"""
+    return _query_history(
+        exchange_orders_table, "exchange_created_at",
+        {"exchange": exchange, "symbol_base": symbol_base, "status": status}, start, end, limit,
+    )
+
+
+def query_exchange_trades(
+    exchange: Optional[str] = None,
+    symbol_base: Optional[str] = None,
+    exchange_order_id: Optional[str] = None,
+    start: Optional[dt.datetime] = None,
+    end: Optional[dt.datetime] = None,
+    limit: int = 100,
+) -> list:
+    """Fill history đã sync (mới nhất trước)"""
+    return _query_history(
+        exchange_trades_table, "executed_at",
+        {"exchange": exchange, "symbol_base": symbol_base, "exchange_order_id": exchange_order_id},
+        start, end, limit,
+    )
+
+
+def query_open_journal_orders(after_id: int = 0, limit: int = 1000) -> list:
+    """
+    Lệnh market / limit trong bảng orders chưa ở trạng thái cuối và đã có exchange_order_id,
+    theo id tăng dần từ after_id (reconciler đi từng batch).
+    """
+    eng = _init_engine()
+    if eng is None:
+        return []
+    try:
+        query = (
+            orders_table.select()
+            .with_only_columns(
+                orders_table.c.id,
+                orders_table.c.exchange,
+                orders_table.c.symbol_base,
+                orders_table.c.status,
+                orders_table.c.exchange_order_id,
+                orders_table.c.entry_price_filled,
+                orders_table.c.position_size_asset,
+            )
+            .where(
+                orders_table.c.id > after_id,
+                orders_table.c.status.in_(JOURNAL_OPEN_STATUSES),
+                orders_table.c.order_type.in_(("market", "limit")),
+                orders_table.c.exchange_order_id.isnot(None),
+            )
+            .order_by(orders_table.c.id)
+            .limit(limit)
+        )
+        with eng.connect() as conn:
+            return [dict(row._mapping) for row in conn.execute(query)]
+    except SQLAlchemyError as e:
+        print(f"[DB] Lỗi khi query journal orders: {e}")
+        return []
+
+
+def lookup_exchange_orders(exchange: str, key_column: str, values: List[str]) -> Dict[str, dict]:
+    """
+    Tìm order đã sync (exchange_orders) theo exchange_order_id hoặc client_order_id, 1 query / chunk.
+
+    Returns:
+        {value: row dict}
+    """
+    eng = _init_engine()
+    if eng is None or not values:
+        return {}
+    table = exchange_orders_table
+    key = table.c[key_column]
+    found: Dict[str, dict] = {}
+    try:
+        with eng.connect() as conn:
+            for i in range(0, len(values), BULK_CHUNK_SIZE):
+                result = conn.execute(
+                    table.select().where(table.c.exchange == exchange, key.in_(values[i:i + BULK_CHUNK_SIZE]))
+                )
+                for row in result:
+                    found[row._mapping[key_column]] = dict(row._mapping)
+    except SQLAlchemyError as e:
+        print(f"[DB] Lỗi khi lookup exchange_orders: {e}")
+    return found
+
+
+def bulk_update_order_status(updates: List[dict]) -> int:
+    """
+    Cập nhật status / giá khớp / size khớp cho nhiều dòng orders bằng 1 executemany.
+
+    Input:
+        updates: [{'id', 'status', 'entry_price_filled', 'position_size_asset'}]
+    """
+    eng = _init_engine()
+    if eng is None or not updates:
+        return 0
+    now = dt.datetime.utcnow()
+    params = [
+        {
+            "_id": u["id"],
+            "_status": u["status"],
+            "_entry_price_filled": u.get("entry_price_filled"),
+            "_position_size_asset": u.get("position_size_asset"),
+            "_updated_at": now,
+        }
+        for u in updates
+    ]
+    try:
+        with eng.begin() as conn:
+            conn.execute(
+                orders_table.update()
+                .where(orders_table.c.id == bindparam("_id"))
+                .values(
+                    status=bindparam("_status"),
+                    entry_price_filled=bindparam("_entry_price_filled"),
+                    position_size_asset=bindparam("_position_size_asset"),
+                    updated_at=bindparam("_updated_at"),
+                ),
+                params,
+            )
+        return len(params)
+    except SQLAlchemyError as e:
+        print(f"[DB] Lỗi khi bulk update orders: {e}")
+        return 0
@@ -26,6 +26,7 @@ from perpsdex.aster.core.order import OrderExecutor
 from perpsdex.aster.core.risk import RiskManager
 from perpsdex.aster.utils.calculator import Calculator
 from perpsdex.aster.utils.config import ConfigLoader
+from perpsdex.aster.utils.market_registry import get_market_registry
 
 from dotenv import load_dotenv
 load_dotenv()
@@ -101,10 +102,28 @@ async def get_client() -> AsterClient:
             raise HTTPException(status_code=500, detail=f"Connection failed: {result.get('message')}")
         
         print("✅ Kết nối thành công đến Aster DEX")
+        
+        # Refresh market registry từ exchangeInfo 1 lần khi connect (fallback: aster_markets.json)
+        await get_market_registry().refresh(_client)
     
     return _client
 
 
+def get_symbol_pair(symbol: str) -> str:
+    """
+    Chuẩn hoá symbol (BTC / BTC-USDT / BTCUSDT) -> 'BTC-USDT' qua MarketRegistry
+    
+    Nếu registry chưa có dữ liệu thì giữ nguyên symbol như trước.
+    """
+    registry = get_market_registry()
+    market = registry.get(symbol)
+    if market is None:
+        if len(registry) > 0:
+            raise HTTPException(status_code=400, detail=f"Symbol không được hỗ trợ trên Aster: {symbol}")
+        return symbol.upper()
+    return market['pair']
+
+
 # =============== ROUTES ===============
 
 @app.get("/")
@@ -159,6 +178,7 @@ async def get_price(symbol: str):
     """
     try:
         client = await get_client()
+        symbol = get_symbol_pair(symbol)
         market = MarketData(client)
         
         print(f"📈 Đang lấy giá {symbol}...")
@@ -253,13 +273,14 @@ async def calculate_order(order: BracketOrderRequest):
     """
     try:
         client = await get_client()
+        symbol = get_symbol_pair(order.symbol)
         
         # Get entry price: use custom price if provided, otherwise fetch from market
         if order.entry_price and order.entry_price > 0:
             entry_price = order.entry_price
         else:
             market = MarketData(client)
-            price_result = await market.get_price(order.symbol)
+            price_result = await market.get_price(symbol)
             
             if not price_result['success']:
                 raise HTTPException(status_code=400, detail="Failed to get price")
@@ -288,7 +309,7 @@ async def calculate_order(order: BracketOrderRequest):
         validation = Calculator.validate_sl_price(sl_price, entry_price, order.side.lower(), max_percent=5)
         
         return {
-            "symbol": order.symbol.upper(),
+            "symbol": symbol,
             "side": order.side.lower(),
             "entry_price": entry_price,
             "position_size": position_size,
@@ -326,11 +347,12 @@ async def place_long_order(order: OrderRequest):
     """
     try:
         client = await get_client()
+        symbol = get_symbol_pair(order.symbol)
         order_executor = OrderExecutor(client)
         
         # Get current price
         market = MarketData(client)
-        price_result = await market.get_price(order.symbol)
+        price_result = await market.get_price(symbol)
         
         if not price_result['success']:
             raise HTTPException(status_code=400, detail="Failed to get price")
@@ -339,7 +361,7 @@ async def place_long_order(order: OrderRequest):
         
         # Place MARKET order
         result = await order_executor.place_market_order(
-            symbol=order.symbol,
+            symbol=symbol,
             side='BUY',
             size=order.size_usd,
             leverage=order.leverage
@@ -365,7 +387,7 @@ async def place_long_order(order: OrderRequest):
             position_size = Calculator.calculate_position_size(order.size_usd, entry_price)
             print(f"🔵 TP/SL Debug: size_usd={order.size_usd}, entry_price={entry_price}, position_size={position_size}")
             tp_sl_result = await risk_manager.place_tp_sl(
-                symbol=order.symbol,
+                symbol=symbol,
                 side='BUY',
                 size=position_size,  # Use calculated size
                 entry_price=entry_price,
@@ -397,11 +419,12 @@ async def place_short_order(order: OrderRequest):
     """
     try:
         client = await get_client()
+        symbol = get_symbol_pair(order.symbol)
         order_executor = OrderExecutor(client)
         
         # Get current price
         market = MarketData(client)
-        price_result = await market.get_price(order.symbol)
+        price_result = await market.get_price(symbol)
         
         if not price_result['success']:
             raise HTTPException(status_code=400, detail="Failed to get price")
@@ -410,7 +433,7 @@ async def place_short_order(order: OrderRequest):
         
         # Place MARKET order
         result = await order_executor.place_market_order(
-            symbol=order.symbol,
+            symbol=symbol,
             side='SELL',
             size=order.size_usd,
             leverage=order.leverage
@@ -434,7 +457,7 @@ async def place_short_order(order: OrderRequest):
             
             # Place TP/SL
             tp_sl_result = await risk_manager.place_tp_sl(
-                symbol=order.symbol,
+                symbol=symbol,
                 side='SELL',
                 size=result['filled_size'],
                 entry_price=entry_price,
@@ -477,11 +500,12 @@ async def place_limit_long_order(order: OrderRequest):
             raise HTTPException(status_code=400, detail="limit_price is required for limit orders")
         
         client = await get_client()
+        symbol = get_symbol_pair(order.symbol)
         order_executor = OrderExecutor(client)
         
         # Place LIMIT order
         result = await order_executor.place_limit_order(
-            symbol=order.symbol,
+            symbol=symbol,
             side='BUY',
             size=order.size_usd,
             price=order.limit_price,
@@ -506,7 +530,7 @@ async def place_limit_long_order(order: OrderRequest):
             
             # Place TP/SL
             tp_sl_result = await risk_manager.place_tp_sl(
-                symbol=order.symbol,
+                symbol=symbol,
                 side='BUY',
                 size=result['size'],
                 entry_price=order.limit_price,
@@ -541,11 +565,12 @@ async def place_limit_short_order(order: OrderRequest):
             raise HTTPException(status_code=400, detail="limit_price is required for limit orders")
         
         client = await get_client()
+        symbol = get_symbol_pair(order.symbol)
         order_executor = OrderExecutor(client)
         
         # Place LIMIT order
         result = await order_executor.place_limit_order(
-            symbol=order.symbol,
+            symbol=symbol,
             side='SELL',
             size=order.size_usd,
             price=order.limit_price,
@@ -570,7 +595,7 @@ async def place_limit_short_order(order: OrderRequest):
             
             # Place TP/SL
             tp_sl_result = await risk_manager.place_tp_sl(
-                symbol=order.symbol,
+                symbol=symbol,
                 side='SELL',
                 size=result['size'],
                 entry_price=order.limit_price,
@@ -746,6 +771,19 @@ async def close_position_endpoint(request: dict):
         raise HTTPException(status_code=500, detail=str(e))
 
 
+@app.get("/api/markets")
+async def get_supported_markets():
+    """
+    Lấy danh sách tất cả pairs được support (từ MarketRegistry)
+    """
+    registry = get_market_registry()
+    return {
+        "total": len(registry),
+        "source": registry.source,
+        "markets": registry.all_markets()
+    }
+
+
 # =============== SERVER STARTUP ===============
 
 if __name__ == "__main__":
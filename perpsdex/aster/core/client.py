@@ -7,12 +7,15 @@ Based on research from docs.asterdex.com:
 - Private key for order signing (TBD)
 """
 
+import asyncio
 import hashlib
 import hmac
 import time
 import aiohttp
 from typing import Optional, Dict, Any
 
+from perpsdex.common.deadline import hedged_read, remaining_budget
+
 
 class AsterClient:
     """
@@ -148,12 +151,16 @@ class AsterClient:
         print(f"🌐 Final URL: {url_with_params}")
         
         try:
+            # GET không chờ quá deadline còn lại của API request (lệnh POST / DELETE thì không cắt)
+            # Không có budget thì không truyền timeout -> giữ timeout mặc định của session
+            # (timeout=None = chờ vô hạn)
+            budget = remaining_budget() if method == 'GET' else None
+            request_kwargs = {'headers': headers}
+            if budget is not None:
+                request_kwargs['timeout'] = aiohttp.ClientTimeout(total=max(budget, 0.001))
+            
             # ✅ Send request with pre-built URL (no params arg)
-            async with self.session.request(
-                method,
-                url_with_params,
-                headers=headers
-            ) as response:
+            async with self.session.request(method, url_with_params, **request_kwargs) as response:
                 data = await response.json()
                 
                 if response.status != 200:
@@ -166,6 +173,27 @@ class AsterClient:
             print(f"❌ Request failed: {e}")
             return {'success': False, 'error': str(e)}
     
+    async def _read(
+        self,
+        endpoint: str,
+        params: Optional[Dict] = None,
+        signed: bool = False
+    ) -> Dict:
+        """
+        GET idempotent (giá, depth, balance, position ...) qua hedged read:
+        quá p95 latency của endpoint thì gửi thêm 1 request dự phòng, lấy cái về trước.
+        
+        Output:
+            Như _request(); hết deadline -> {'success': False, 'error': ...}
+        """
+        try:
+            return await hedged_read(
+                f"aster.{endpoint.split('?')[0]}",
+                lambda: self._request('GET', endpoint, params=params, signed=signed)
+            )
+        except asyncio.TimeoutError as e:
+            return {'success': False, 'error': str(e) or 'Request timeout'}
+    
     async def test_connection(self) -> Dict:
         """
         Test connection to Aster API
@@ -232,8 +260,6 @@ class AsterClient:
 
 # Placeholder for testing
 if __name__ == "__main__":
-    import asyncio
-    
     async def test():
         client = AsterClient(
             api_url="https://api.aster.xyz",  # TBD: Find actual URL
@@ -6,6 +6,8 @@ TODO: Adapt based on actual Aster API endpoints
 
 from typing import Dict, Optional
 
+from perpsdex.aster.core.user_stream import get_live_user_stream
+
 
 class MarketData:
     """
@@ -16,6 +18,7 @@ class MarketData:
     
     Methods:
         - get_price(symbol): Lấy giá hiện tại
+        - get_order_book(symbol, limit): Lấy order book (depth)
         - get_balance(): Lấy số dư tài khoản
         - get_positions(): Lấy positions đang mở
     """
@@ -43,8 +46,7 @@ class MarketData:
             # Convert BTC-USDT to BTCUSDT
             symbol_no_dash = symbol.replace('-', '')
             
-            result = await self.client._request(
-                'GET',
+            result = await self.client._read(
                 f'/fapi/v1/ticker/24hr?symbol={symbol_no_dash}',
                 signed=False
             )
@@ -72,6 +74,47 @@ class MarketData:
                 'error': f"Failed to get price: {str(e)}"
             }
     
+    async def get_order_book(self, symbol: str, limit: int = 10) -> Dict:
+        """
+        Lấy order book (depth) của symbol
+        
+        Input:
+            - symbol: Trading pair (e.g., 'BTC-USDT')
+            - limit: Số level mỗi side (Aster chấp nhận 5, 10, 20, 50, 100, 500, 1000)
+            
+        Output:
+            {
+                'success': bool,
+                'bids': [(price, qty), ...],  # giá giảm dần
+                'asks': [(price, qty), ...],  # giá tăng dần
+                'error': str (nếu có)
+            }
+        """
+        try:
+            symbol_no_dash = symbol.replace('-', '')
+            
+            result = await self.client._read(
+                f'/fapi/v1/depth?symbol={symbol_no_dash}&limit={limit}',
+                signed=False
+            )
+            
+            if not result['success']:
+                return result
+            
+            data = result['data']
+            
+            return {
+                'success': True,
+                'bids': [(float(price), float(qty)) for price, qty in data.get('bids', [])],
+                'asks': [(float(price), float(qty)) for price, qty in data.get('asks', [])]
+            }
+            
+        except Exception as e:
+            return {
+                'success': False,
+                'error': f"Failed to get order book: {str(e)}"
+            }
+    
     async def get_balance(self, asset: str = 'USDT') -> Dict:
         """
         Lấy số dư tài khoản
@@ -89,12 +132,16 @@ class MarketData:
             }
         """
         try:
-            # ✅ Use Binance-style /fapi/v1/balance endpoint
-            result = await self.client._request(
-                'GET',
-                '/fapi/v1/balance',
-                signed=True
-            )
+            # User data stream đang live -> đọc bảng local, không gọi sàn
+            stream = get_live_user_stream(self.client.api_key)
+            if stream is not None:
+                result = {'success': True, 'data': stream.balance_rows()}
+            else:
+                # ✅ Use Binance-style /fapi/v1/balance endpoint
+                result = await self.client._read(
+                    '/fapi/v1/balance',
+                    signed=True
+                )
             
             if not result['success']:
                 return result
@@ -149,12 +196,15 @@ class MarketData:
             }
         """
         try:
-            # ✅ Binance-style uses /fapi/v1/positionRisk
-            result = await self.client._request(
-                'GET',
-                '/fapi/v1/positionRisk',
-                signed=True
-            )
+            stream = get_live_user_stream(self.client.api_key)
+            if stream is not None:
+                result = {'success': True, 'data': stream.position_rows()}
+            else:
+                # ✅ Binance-style uses /fapi/v1/positionRisk
+                result = await self.client._read(
+                    '/fapi/v1/positionRisk',
+                    signed=True
+                )
             
             if not result['success']:
                 return result
@@ -208,8 +258,7 @@ class MarketData:
         """
         try:
             # TODO: Find actual Aster endpoint
-            result = await self.client._request(
-                'GET',
+            result = await self.client._read(
                 f'/fapi/v1/markets/{symbol}',
                 signed=False
             )
@@ -4,8 +4,17 @@ OrderExecutor - Place orders on Aster DEX
 TODO: Adapt based on actual Aster API endpoints
 """
 
-import time
-from typing import Dict, Optional
+import asyncio
+import json
+import math
+from typing import Dict, List, Optional
+from urllib.parse import quote
+
+from perpsdex.aster.utils.market_registry import get_market_registry
+from perpsdex.common.ladder import calculate_ladder_levels
+from perpsdex.common.leverage import ISOLATED, get_leverage_cache
+from perpsdex.common.order_ids import next_client_order_index
+from perpsdex.aster.core.user_stream import get_live_user_stream
 
 
 class OrderExecutor:
@@ -18,9 +27,14 @@ class OrderExecutor:
     Methods:
         - place_market_order(symbol, side, size, leverage)
         - place_limit_order(symbol, side, size, price, leverage)
+        - ensure_leverage(symbol, leverage, margin_mode): /fapi/v1/leverage + marginType, chỉ khi khác cache
+        - build_ladder(...) / submit_ladder(...): Grid / ladder LIMIT qua /fapi/v1/batchOrders
         - cancel_order(order_id)
     """
     
+    # /fapi/v1/batchOrders nhận tối đa 5 lệnh / request
+    MAX_BATCH_SIZE = 5
+    
     def __init__(self, client):
         self.client = client
     
@@ -30,7 +44,8 @@ class OrderExecutor:
         side: str,
         size: float,
         leverage: float = 1.0,
-        reduce_only: bool = False
+        reduce_only: bool = False,
+        margin_mode: Optional[str] = None
     ) -> Dict:
         """
         Đặt lệnh MARKET
@@ -39,8 +54,9 @@ class OrderExecutor:
             symbol: Trading pair (e.g., 'BTC-USDT')
             side: 'BUY' or 'SELL'
             size: Order size in USD
-            leverage: Leverage multiplier (optional, default: 1.0)
+            leverage: Leverage multiplier (optional, default: 1.0), set qua ensure_leverage (bỏ qua khi reduce_only)
             reduce_only: If True, only close position, don't open new (optional, default: False)
+            margin_mode: 'cross' | 'isolated' | None (giữ mode hiện tại của symbol)
             
         Output:
             {
@@ -112,8 +128,11 @@ class OrderExecutor:
             if reduce_only:
                 print(f"   🔒 [reduce_only] Closing position with quantity: {quantity_rounded}")
             
-            # TODO: Set leverage (may need different endpoint or account-level setting)
-            # For now, Aster may use account-default leverage or per-position leverage
+            # Leverage là setting theo symbol của account -> chỉ gọi sàn khi khác giá trị đã set
+            if not reduce_only:
+                leverage_result = await self.ensure_leverage(symbol_no_dash, leverage, margin_mode)
+                if not leverage_result['success']:
+                    return leverage_result
             
             # Place market order
             params = {
@@ -135,6 +154,7 @@ class OrderExecutor:
             )
             
             if not result['success']:
+                self._invalidate_leverage(symbol_no_dash)
                 return result
             
             data = result['data']
@@ -161,7 +181,8 @@ class OrderExecutor:
         size: float,  # size in USD (tương tự MARKET)
         price: float,  # limit price
         leverage: float = 1.0,
-        time_in_force: str = 'GTC'
+        time_in_force: str = 'GTC',
+        margin_mode: Optional[str] = None
     ) -> Dict:
         """
         Đặt lệnh LIMIT
@@ -171,8 +192,9 @@ class OrderExecutor:
             side: 'BUY' or 'SELL'
             size: Order size in USD
             price: Limit price
-            leverage: Leverage multiplier
+            leverage: Leverage multiplier, set qua ensure_leverage (không phải param của lệnh)
             time_in_force: 'GTC', 'IOC', 'FOK'
+            margin_mode: 'cross' | 'isolated' | None
             
         Output:
             {
@@ -213,6 +235,10 @@ class OrderExecutor:
                 quantity_scaled = 1
             quantity_rounded = quantity_scaled / multiplier
 
+            leverage_result = await self.ensure_leverage(symbol_no_dash, leverage, margin_mode)
+            if not leverage_result['success']:
+                return leverage_result
+
             params = {
                 'symbol': symbol_no_dash,
                 'side': side.upper(),
@@ -220,7 +246,6 @@ class OrderExecutor:
                 # Dùng quantity (base) đã convert từ size_usd
                 'quantity': quantity_rounded,
                 'price': price,
-                'leverage': leverage,
                 'timeInForce': time_in_force
             }
             
@@ -232,6 +257,7 @@ class OrderExecutor:
             )
             
             if not result['success']:
+                self._invalidate_leverage(symbol_no_dash)
                 return result
             
             data = result['data']
@@ -310,6 +336,218 @@ class OrderExecutor:
                 'error': f"Failed to place stop order: {str(e)}"
             }
     
+    async def ensure_leverage(self, symbol: str, leverage: float, margin_mode: Optional[str] = None) -> Dict:
+        """
+        Set leverage (+ margin type nếu có) cho symbol nếu khác giá trị đã cache
+        
+        Input:
+            symbol: 'BTCUSDT' / 'BTC-USDT'
+            leverage: Làm tròn về số nguyên >= 1
+            margin_mode: 'cross' | 'isolated' | None (không đổi margin type)
+            
+        Output:
+            {'success', 'cached', 'leverage', 'margin_mode', 'error' (nếu có)}
+        """
+        symbol_no_dash = symbol.replace('-', '')
+        leverage = max(int(round(leverage or 1)), 1)
+        
+        async def apply(previous):
+            if margin_mode and (previous or {}).get('margin_mode') != margin_mode:
+                result = await self.client._request(
+                    'POST',
+                    '/fapi/v1/marginType',
+                    params={'symbol': symbol_no_dash, 'marginType': 'ISOLATED' if margin_mode == ISOLATED else 'CROSSED'},
+                    signed=True
+                )
+                # -4046: No need to change margin type (đã đúng mode)
+                error = result.get('error')
+                if not result['success'] and not (isinstance(error, dict) and error.get('code') == -4046):
+                    return result
+            
+            result = await self.client._request(
+                'POST',
+                '/fapi/v1/leverage',
+                params={'symbol': symbol_no_dash, 'leverage': leverage},
+                signed=True
+            )
+            if not result['success']:
+                return result
+            print(f"⚙️  Leverage {symbol_no_dash}: {leverage}x{f' {margin_mode}' if margin_mode else ''}")
+            return {'success': True, 'margin_mode': margin_mode}
+        
+        result = await get_leverage_cache().ensure(
+            'aster', self.client.api_key, symbol_no_dash, leverage, margin_mode, apply
+        )
+        if not result['success']:
+            result['error'] = f"Không set được leverage {leverage}x cho {symbol_no_dash}: {result['error']}"
+        return result
+    
+    def _invalidate_leverage(self, symbol: str):
+        """Lệnh bị từ chối -> leverage trên sàn có thể khác cache, lệnh sau set lại"""
+        get_leverage_cache().invalidate('aster', self.client.api_key, symbol.replace('-', ''))
+    
+    async def build_ladder(
+        self,
+        symbol: str,
+        side: str,
+        price_from: float,
+        price_to: float,
+        levels: int,
+        total_usd: float,
+        distribution='flat',
+        geometric_ratio: float = 1.5
+    ) -> Dict:
+        """
+        Tính tất cả level của ladder theo tickSize / stepSize của symbol
+        
+        Input:
+            symbol: Trading pair (e.g., 'BTC-USDT')
+            side: 'long' / 'short' (hoặc 'BUY' / 'SELL')
+            price_from, price_to: Khoảng giá
+            levels: Số level
+            total_usd: Tổng USD của ladder
+            distribution: 'flat' | 'linear' | 'geometric' | list weights
+            
+        Output:
+            Dict: Kết quả calculate_ladder_levels (perpsdex/common/ladder.py)
+        """
+        registry = get_market_registry()
+        market = registry.get(symbol)
+        if market is None or not market.get('tick_size') or not market.get('step_size'):
+            # Registry chưa có filter -> refresh exchangeInfo 1 lần
+            await registry.refresh(self.client)
+            market = registry.get(symbol) or {}
+        
+        tick_size = market.get('tick_size')
+        step_size = market.get('step_size')
+        
+        if not tick_size:
+            # Giữ 5 chữ số có nghĩa cho giá
+            tick_size = 10 ** (math.floor(math.log10(min(price_from, price_to))) - 4)
+        if not step_size:
+            # Heuristic giống place_market_order, theo quantity trung bình mỗi level
+            avg_quantity = total_usd / levels / ((price_from + price_to) / 2)
+            if avg_quantity < 0.1:
+                step_size = 0.001
+            elif avg_quantity < 10:
+                step_size = 0.01
+            elif avg_quantity < 1000:
+                step_size = 0.1
+            else:
+                step_size = 1
+        
+        side_normalized = 'long' if side.upper() in ('BUY', 'LONG') else 'short'
+        return calculate_ladder_levels(
+            side=side_normalized,
+            price_from=price_from,
+            price_to=price_to,
+            levels=levels,
+            total_usd=total_usd,
+            price_step=tick_size,
+            size_step=step_size,
+            min_size=market.get('min_qty') or 0.0,
+            distribution=distribution,
+            geometric_ratio=geometric_ratio,
+        )
+    
+    async def submit_ladder(
+        self,
+        symbol: str,
+        side: str,
+        ladder: Dict,
+        batch_size: int = MAX_BATCH_SIZE,
+        max_concurrency: int = 2,
+        client_order_id_prefix: Optional[str] = None,
+        time_in_force: str = 'GTC'
+    ) -> Dict:
+        """
+        Gửi các level của ladder qua /fapi/v1/batchOrders, tối đa max_concurrency request song song
+        
+        Input:
+            symbol: Trading pair (e.g., 'BTC-USDT')
+            side: 'long' / 'short' (hoặc 'BUY' / 'SELL')
+            ladder: Output của build_ladder (level có skip=True sẽ bỏ qua)
+            batch_size: Số lệnh mỗi request (<= MAX_BATCH_SIZE)
+            max_concurrency: Số request song song
+            client_order_id_prefix: newClientOrderId = <prefix>-L<level> (default: OrderIndexAllocator)
+            
+        Output:
+            {
+                'success': bool,        # True nếu ít nhất 1 level được submit
+                'levels': list,         # Mỗi level thêm 'status', 'client_order_id', 'order_id', 'error'
+                'submitted': int, 'failed': int, 'skipped': int, 'batches': int
+            }
+        """
+        symbol_no_dash = symbol.replace('-', '')
+        order_side = 'BUY' if side.upper() in ('BUY', 'LONG') else 'SELL'
+        prefix = client_order_id_prefix or str(next_client_order_index())
+        price_decimals = ladder['price_decimals']
+        size_decimals = ladder['size_decimals']
+        levels = ladder['levels']
+        batch_size = max(1, min(batch_size, self.MAX_BATCH_SIZE))
+        
+        active = []
+        for level in levels:
+            if level.get('skip'):
+                level['status'] = 'skipped'
+                continue
+            level['client_order_id'] = f"{prefix}-L{level['level']}"
+            active.append(level)
+        
+        chunks = [active[i:i + batch_size] for i in range(0, len(active), batch_size)]
+        semaphore = asyncio.Semaphore(max(1, max_concurrency))
+        
+        async def _submit(chunk: List[Dict]):
+            orders = [
+                {
+                    'symbol': symbol_no_dash,
+                    'side': order_side,
+                    'type': 'LIMIT',
+                    'timeInForce': time_in_force,
+                    'quantity': f"{level['size']:.{size_decimals}f}",
+                    'price': f"{level['price']:.{price_decimals}f}",
+                    'newClientOrderId': level['client_order_id'],
+                }
+                for level in chunk
+            ]
+            async with semaphore:
+                # batchOrders là JSON trong query string -> URL-encode trước khi ký
+                result = await self.client._request(
+                    'POST',
+                    '/fapi/v1/batchOrders',
+                    params={'batchOrders': quote(json.dumps(orders, separators=(',', ':')))},
+                    signed=True
+                )
+            
+            if not result['success']:
+                for level in chunk:
+                    level['status'], level['error'] = 'failed', str(result.get('error'))
+                return
+            
+            # Response: list cùng thứ tự, mỗi phần tử là order hoặc {'code', 'msg'}
+            for level, item in zip(chunk, result['data']):
+                if isinstance(item, dict) and item.get('orderId') is not None:
+                    level['status'], level['order_id'] = 'submitted', item['orderId']
+                else:
+                    level['status'], level['error'] = 'failed', str(item)
+        
+        print(f"🪜 Ladder {order_side} {symbol_no_dash}: {len(active)} lệnh / {len(chunks)} batch")
+        await asyncio.gather(*(_submit(chunk) for chunk in chunks))
+        
+        submitted = sum(1 for l in levels if l.get('status') == 'submitted')
+        failed = sum(1 for l in levels if l.get('status') == 'failed')
+        skipped = sum(1 for l in levels if l.get('status') == 'skipped')
+        print(f"✅ Ladder: {submitted} submitted, {failed} failed, {skipped} skipped")
+        
+        return {
+            'success': submitted > 0,
+            'levels': levels,
+            'submitted': submitted,
+            'failed': failed,
+            'skipped': skipped,
+            'batches': len(chunks),
+        }
+    
     async def cancel_order(self, symbol: str, order_id: str) -> Dict:
         """
         Hủy lệnh
@@ -365,6 +603,13 @@ class OrderExecutor:
             }
         """
         try:
+            stream = get_live_user_stream(self.client.api_key)
+            if stream is not None:
+                return {
+                    'success': True,
+                    'orders': stream.open_order_rows(symbol)
+                }
+            
             params = {}
             if symbol:
                 params['symbol'] = symbol
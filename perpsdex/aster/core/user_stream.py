@@ -0,0 +1,375 @@
+"""
+AsterUserStream - User data stream (listenKey) giữ bản sao local của position / order / balance
+
+- listenKey: POST /fapi/v1/listenKey lúc connect, PUT keepalive mỗi ASTER_LISTEN_KEY_KEEPALIVE
+  giây, sự kiện listenKeyExpired -> tạo key mới + reconnect.
+- Event áp thẳng vào bảng local (cùng format response REST để code đọc không phải đổi):
+    - ORDER_TRADE_UPDATE -> orders (/fapi/v1/openOrders), lệnh kết thúc bị xoá khỏi bảng
+    - ACCOUNT_UPDATE -> positions (/fapi/v1/positionRisk) + balances (/fapi/v1/balance)
+    - ACCOUNT_CONFIG_UPDATE -> leverage của position
+    - markPriceUpdate (tự subscribe <symbol>@markPrice@1s cho symbol đang có position)
+      -> markPrice + unRealizedProfit
+- REST chỉ dùng để resync: ngay sau khi (re)connect và mỗi ASTER_USER_STREAM_RESYNC giây.
+  Event đến trong lúc chờ snapshot được giữ lại và áp lại sau khi thay bảng (snapshot có thể
+  cũ hơn event -> không để lệnh đã huỷ / khớp sống lại).
+  availableBalance không có trong stream -> đọc lại /fapi/v1/balance (debounce) sau khi có lệnh mới / khớp.
+- MarketData.get_positions / get_balance và OrderExecutor.get_open_orders đọc bảng local khi
+  stream của api key đó đang live (get_live_user_stream), không thì gọi REST như cũ.
+
+ENV:
+    - ASTER_WS_URL (default: wss://fstream.asterdex.com)
+    - ASTER_LISTEN_KEY_KEEPALIVE (default: 1800 giây)
+    - ASTER_USER_STREAM_RESYNC (default: 300 giây)
+"""
+
+import asyncio
+import json
+import os
+import time
+from typing import Callable, Dict, List, Optional
+
+import aiohttp
+
+from perpsdex.common.leverage import get_leverage_cache
+
+# Trạng thái lệnh đã kết thúc -> xoá khỏi bảng open orders
+TERMINAL_STATUSES = ('FILLED', 'CANCELED', 'EXPIRED', 'REJECTED')
+BALANCE_REFRESH_DELAY = 0.5
+RECONNECT_DELAY_MAX = 30.0
+
+
+class AsterUserStream:
+    """
+    Input:
+        - client: AsterClient (stream giữ client riêng, đóng khi stop)
+
+    Methods:
+        - start() / stop()
+        - live: Đã connect + resync xong
+        - position_rows() / open_order_rows(symbol) / balance_rows(): Bảng local (format REST)
+        - add_listener(callback): callback(event: dict) cho mọi event từ stream
+        - status()
+    """
+
+    def __init__(self, client):
+        self.client = client
+        self.ws_url = os.getenv('ASTER_WS_URL', 'wss://fstream.asterdex.com').rstrip('/')
+        self.keepalive_interval = float(os.getenv('ASTER_LISTEN_KEY_KEEPALIVE', 1800))
+        self.resync_interval = float(os.getenv('ASTER_USER_STREAM_RESYNC', 300))
+
+        self.positions: Dict[str, dict] = {}
+        self.orders: Dict[int, dict] = {}
+        self.balances: Dict[str, dict] = {}
+
+        self.listen_key: Optional[str] = None
+        self.connected = False
+        self.synced_at: Optional[float] = None
+        self.last_event_at: Optional[float] = None
+        self.events = 0
+        self.reconnects = 0
+        self.error: Optional[str] = None
+
+        self._listeners: List[Callable[[dict], None]] = []
+        self._ws = None
+        self._mark_subscribed = set()
+        self._task: Optional[asyncio.Task] = None
+        self._balance_task: Optional[asyncio.Task] = None
+        # != None trong lúc resync: event cần áp lại lên snapshot
+        self._replay: Optional[List[dict]] = None
+
+    @property
+    def api_key(self) -> str:
+        return self.client.api_key
+
+    @property
+    def live(self) -> bool:
+        return self.connected and self.synced_at is not None
+
+    def add_listener(self, callback: Callable[[dict], None]):
+        self._listeners.append(callback)
+
+    # ------------------------------------------------------------------ reads
+
+    def position_rows(self) -> List[dict]:
+        return list(self.positions.values())
+
+    def open_order_rows(self, symbol: Optional[str] = None) -> List[dict]:
+        if symbol:
+            return [o for o in self.orders.values() if o.get('symbol') == symbol]
+        return list(self.orders.values())
+
+    def balance_rows(self) -> List[dict]:
+        return list(self.balances.values())
+
+    # ------------------------------------------------------------------ resync (REST)
+
+    async def resync(self):
+        """Snapshot positionRisk + openOrders + balance thay toàn bộ bảng local"""
+        self._replay = []
+        try:
+            positions, orders, balances = await asyncio.gather(
+                self.client._request('GET', '/fapi/v1/positionRisk', signed=True),
+                self.client._request('GET', '/fapi/v1/openOrders', signed=True),
+                self.client._request('GET', '/fapi/v1/balance', signed=True),
+            )
+            for name, result in (('positionRisk', positions), ('openOrders', orders), ('balance', balances)):
+                if not result.get('success'):
+                    raise RuntimeError(f"{name}: {result.get('error')}")
+
+            self.positions = {
+                p['symbol']: p for p in positions['data']
+                if float(p.get('positionAmt', 0) or 0) != 0
+            }
+            self.orders = {int(o['orderId']): o for o in orders['data']}
+            self.balances = {b['asset']: b for b in balances['data']}
+            # Event áp trong lúc chờ snapshot đã bị ghi đè -> áp lại theo đúng thứ tự
+            for event in self._replay:
+                self._apply(event)
+        finally:
+            self._replay = None
+        self.synced_at = time.time()
+        await self._subscribe_mark_prices()
+
+    async def _refresh_balance(self):
+        await asyncio.sleep(BALANCE_REFRESH_DELAY)
+        result = await self.client._request('GET', '/fapi/v1/balance', signed=True)
+        if result.get('success'):
+            self.balances = {b['asset']: b for b in result['data']}
+
+    def _schedule_balance_refresh(self):
+        # Nhiều event liên tiếp chỉ đọc lại balance 1 lần
+        if self._balance_task is None or self._balance_task.done():
+            self._balance_task = asyncio.create_task(self._refresh_balance(), name='aster-balance-refresh')
+
+    # ------------------------------------------------------------------ events
+
+    def _apply_order(self, o: dict):
+        order_id = int(o['i'])
+        status = o.get('X')
+        if status in TERMINAL_STATUSES:
+            self.orders.pop(order_id, None)
+        else:
+            previous = self.orders.get(order_id, {})
+            self.orders[order_id] = dict(
+                previous,
+                symbol=o.get('s'),
+                orderId=order_id,
+                clientOrderId=o.get('c'),
+                side=o.get('S'),
+                type=o.get('o'),
+                origType=o.get('ot', o.get('o')),
+                timeInForce=o.get('f'),
+                origQty=o.get('q'),
+                price=o.get('p'),
+                avgPrice=o.get('ap'),
+                stopPrice=o.get('sp'),
+                executedQty=o.get('z'),
+                status=status,
+                reduceOnly=o.get('R', False),
+                positionSide=o.get('ps'),
+                updateTime=o.get('T'),
+            )
+        if o.get('x') in ('NEW', 'TRADE', 'CANCELED', 'EXPIRED'):
+            self._schedule_balance_refresh()
+
+    def _apply_account(self, a: dict):
+        for b in a.get('B') or []:
+            asset = b.get('a')
+            previous = self.balances.get(asset, {'asset': asset})
+            wallet = float(b.get('wb', 0) or 0)
+            # availableBalance không có trong stream: dịch theo thay đổi wallet, balance refresh sửa lại sau
+            available = float(previous.get('availableBalance', 0) or 0) + wallet - float(previous.get('balance', 0) or 0)
+            self.balances[asset] = dict(
+                previous,
+                balance=str(wallet),
+                crossWalletBalance=b.get('cw', previous.get('crossWalletBalance')),
+                availableBalance=str(available),
+            )
+        for p in a.get('P') or []:
+            symbol = p.get('s')
+            amount = float(p.get('pa', 0) or 0)
+            if amount == 0:
+                self.positions.pop(symbol, None)
+                continue
+            previous = self.positions.get(symbol)
+            if previous is None:
+                # Position mới mở: leverage lấy từ cache đã set (ensure_leverage), resync sửa lại sau
+                cached = get_leverage_cache().get('aster', self.api_key, symbol)
+                previous = {'symbol': symbol, 'leverage': str(cached['leverage'] if cached else 1)}
+            self.positions[symbol] = dict(
+                previous,
+                positionAmt=p.get('pa'),
+                entryPrice=p.get('ep'),
+                unRealizedProfit=p.get('up'),
+                marginType=p.get('mt', previous.get('marginType')),
+                isolatedWallet=p.get('iw', previous.get('isolatedWallet')),
+                positionSide=p.get('ps', previous.get('positionSide')),
+            )
+        self._schedule_balance_refresh()
+
+    def _apply_mark_price(self, event: dict):
+        position = self.positions.get(event.get('s'))
+        if position is None:
+            return
+        mark = float(event.get('p', 0) or 0)
+        amount = float(position.get('positionAmt', 0) or 0)
+        entry = float(position.get('entryPrice', 0) or 0)
+        position['markPrice'] = str(mark)
+        position['unRealizedProfit'] = str(amount * (mark - entry))
+
+    def _apply(self, event: dict):
+        """Áp 1 event vào bảng local"""
+        kind = event.get('e')
+        if kind == 'ORDER_TRADE_UPDATE':
+            self._apply_order(event.get('o') or {})
+        elif kind == 'ACCOUNT_UPDATE':
+            self._apply_account(event.get('a') or {})
+        elif kind == 'ACCOUNT_CONFIG_UPDATE':
+            config = event.get('ac') or {}
+            if config.get('s') in self.positions:
+                self.positions[config['s']]['leverage'] = str(config.get('l'))
+        elif kind == 'markPriceUpdate':
+            self._apply_mark_price(event)
+
+    async def _handle(self, event: dict):
+        self.events += 1
+        self.last_event_at = time.time()
+        kind = event.get('e')
+        if kind == 'listenKeyExpired':
+            raise ConnectionError('listenKey expired')
+        self._apply(event)
+        if self._replay is not None:
+            self._replay.append(event)
+        if kind == 'ACCOUNT_UPDATE':
+            await self._subscribe_mark_prices()
+
+        for callback in self._listeners:
+            try:
+                callback(event)
+            except Exception as e:
+                print(f"⚠️  [Aster Stream] listener lỗi: {e}")
+
+    async def _subscribe_mark_prices(self):
+        missing = [s for s in self.positions if s not in self._mark_subscribed]
+        if not missing or self._ws is None or self._ws.closed:
+            return
+        await self._ws.send_json({
+            'method': 'SUBSCRIBE',
+            'params': [f"{s.lower()}@markPrice@1s" for s in missing],
+            'id': int(time.time() * 1000),
+        })
+        self._mark_subscribed.update(missing)
+
+    # ------------------------------------------------------------------ connection
+
+    async def _create_listen_key(self) -> str:
+        result = await self.client._request('POST', '/fapi/v1/listenKey')
+        if not result.get('success'):
+            raise RuntimeError(f"listenKey: {result.get('error')}")
+        return result['data']['listenKey']
+
+    async def _keepalive(self):
+        while True:
+            await asyncio.sleep(self.keepalive_interval)
+            result = await self.client._request('PUT', '/fapi/v1/listenKey')
+            if not result.get('success'):
+                print(f"⚠️  [Aster Stream] keepalive lỗi: {result.get('error')}")
+
+    async def _periodic_resync(self):
+        while True:
+            await asyncio.sleep(self.resync_interval)
+            await self.resync()
+
+    async def _session(self):
+        self.listen_key = await self._create_listen_key()
+        await self.client._ensure_session()
+        async with self.client.session.ws_connect(f"{self.ws_url}/ws/{self.listen_key}", heartbeat=30) as ws:
+            self._ws = ws
+            self._mark_subscribed = set()
+            self.connected = True
+            # Resync sau khi đã connect -> không mất event giữa snapshot và stream
+            await self.resync()
+            print(f"📡 [Aster Stream] Connected ({len(self.positions)} positions, {len(self.orders)} open orders)")
+            helpers = [
+                asyncio.create_task(self._keepalive(), name='aster-listen-key-keepalive'),
+                asyncio.create_task(self._periodic_resync(), name='aster-user-stream-resync'),
+            ]
+            try:
+                async for msg in ws:
+                    if msg.type == aiohttp.WSMsgType.TEXT:
+                        data = json.loads(msg.data)
+                        if 'e' in data:
+                            await self._handle(data)
+                    elif msg.type in (aiohttp.WSMsgType.CLOSED, aiohttp.WSMsgType.ERROR):
+                        break
+                    for task in helpers:
+                        if task.done() and task.exception() is not None:
+                            raise task.exception()
+            finally:
+                for task in helpers:
+                    task.cancel()
+                self.connected = False
+                self._ws = None
+
+    async def _run(self):
+        delay = 1.0
+        while True:
+            try:
+                await self._session()
+                self.error = 'connection closed'
+                delay = 1.0
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                self.error = str(e)
+                print(f"⚠️  [Aster Stream] {self.error}, reconnect sau {delay:.0f}s")
+            self.reconnects += 1
+            await asyncio.sleep(delay)
+            delay = min(delay * 2, RECONNECT_DELAY_MAX)
+
+    def start(self):
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run(), name='aster-user-stream')
+            _streams[self.api_key] = self
+
+    async def stop(self):
+        _streams.pop(self.api_key, None)
+        for task in (self._task, self._balance_task):
+            if task is not None and not task.done():
+                task.cancel()
+                try:
+                    await task
+                except asyncio.CancelledError:
+                    pass
+        if self.listen_key is not None:
+            try:
+                await self.client._request('DELETE', '/fapi/v1/listenKey')
+            except Exception:
+                pass
+        await self.client.close()
+
+    @property
+    def running(self) -> bool:
+        return self._task is not None and not self._task.done()
+
+    def status(self) -> dict:
+        return {
+            'running': self.running,
+            'live': self.live,
+            'positions': len(self.positions),
+            'open_orders': len(self.orders),
+            'events': self.events,
+            'reconnects': self.reconnects,
+            'synced_at': self.synced_at,
+            'last_event_at': self.last_event_at,
+            'error': self.error,
+        }
+
+
+_streams: Dict[str, AsterUserStream] = {}
+
+
+def get_live_user_stream(api_key: Optional[str]) -> Optional[AsterUserStream]:
+    """Stream của api key nếu đang live (đọc bảng local được), None thì gọi REST"""
+    stream = _streams.get(api_key) if api_key else None
+    return stream if stream is not None and stream.live else None
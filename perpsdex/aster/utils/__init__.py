@@ -4,9 +4,12 @@ Aster DEX Utils
 
 from .calculator import Calculator
 from .config import ConfigLoader
+from .market_registry import MarketRegistry, get_market_registry
 
 __all__ = [
     'Calculator',
     'ConfigLoader',
+    'MarketRegistry',
+    'get_market_registry',
 ]
 
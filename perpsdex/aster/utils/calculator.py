@@ -263,4 +263,3 @@ class Calculator:
             return 0
         
         return reward / risk
-
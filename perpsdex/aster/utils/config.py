@@ -8,6 +8,8 @@ import json
 import os
 from typing import Dict, Optional
 
+from perpsdex.aster.utils.market_registry import get_market_registry
+
 
 class ConfigLoader:
     """
@@ -60,12 +62,16 @@ class ConfigLoader:
         """
         Get all supported markets
         
-        TODO: Load from aster_markets.json after research
+        Đọc từ MarketRegistry (aster_markets.json / exchangeInfo),
+        fallback về list mặc định nếu registry chưa có dữ liệu.
         
         Output:
             Dict mapping symbols to market IDs
         """
-        # TODO: Implement after API research
+        registry = get_market_registry()
+        if len(registry) > 0:
+            return {m['pair']: m['pair'] for m in registry.all_markets()}
+        
         return {
             'BTC-USDT': 'BTC-USDT',
             'ETH-USDT': 'ETH-USDT',
@@ -0,0 +1,239 @@
+"""
+MarketRegistry - Registry market Aster (base symbol <-> symbol API) kèm precision
+
+Load 1 lần từ aster_markets.json, sau đó refresh từ /fapi/v1/exchangeInfo
+(stepSize, tickSize, minQty, minNotional). Mọi lookup đều O(1) qua dict index.
+"""
+
+import json
+import os
+import time
+from typing import Dict, List, Optional
+
+
+DEFAULT_MARKETS_FILE = os.path.join(
+    os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+    'aster_markets.json'
+)
+
+QUOTE_ASSET = 'USDT'
+
+
+def _base_key(symbol: str) -> str:
+    """BTC / btc / BTC-USDT / BTCUSDT -> BTC"""
+    key = symbol.strip().upper().replace('-', '')
+    if key.endswith(QUOTE_ASSET) and len(key) > len(QUOTE_ASSET):
+        key = key[:-len(QUOTE_ASSET)]
+    return key
+
+
+class MarketRegistry:
+    """
+    Registry tất cả market của Aster
+
+    Mỗi market là 1 dict:
+        {
+            'symbol': str,          # BTC
+            'symbol_api': str,      # BTCUSDT
+            'pair': str,            # BTC-USDT
+            'status': str,
+            'tick_size': float,
+            'step_size': float,
+            'min_qty': float,
+            'min_notional': float,
+            'price_precision': int,
+            'quantity_precision': int,
+        }
+
+    Index:
+        - base symbol -> market
+        - symbol API -> market
+
+    Methods:
+        - load_from_file(path): Load từ aster_markets.json
+        - refresh(client): Refresh từ exchangeInfo
+        - get(symbol): Lookup theo BTC / BTC-USDT / BTCUSDT
+        - get_symbol_api(symbol) / get_base_symbol(symbol_api)
+        - save_to_file(path): Ghi snapshot hiện tại ra JSON
+    """
+
+    def __init__(self):
+        self._by_symbol: Dict[str, dict] = {}
+        self._by_symbol_api: Dict[str, dict] = {}
+        self.source: Optional[str] = None
+        self.updated_at: Optional[float] = None
+
+    def __len__(self) -> int:
+        return len(self._by_symbol_api)
+
+    def __contains__(self, symbol: str) -> bool:
+        return self.get(symbol) is not None
+
+    @staticmethod
+    def _parse_exchange_symbol(raw: dict) -> Optional[dict]:
+        """Parse 1 entry trong exchangeInfo['symbols'] (Binance-style filters)"""
+        if raw.get('quoteAsset', QUOTE_ASSET) != QUOTE_ASSET:
+            return None
+
+        filters = {f.get('filterType'): f for f in raw.get('filters', [])}
+        price_filter = filters.get('PRICE_FILTER', {})
+        lot_size = filters.get('LOT_SIZE', {})
+        min_notional = filters.get('MIN_NOTIONAL', {})
+
+        return {
+            'symbol': raw.get('baseAsset'),
+            'symbol_api': raw.get('symbol'),
+            'status': 'active' if raw.get('status', 'TRADING') == 'TRADING' else str(raw.get('status')).lower(),
+            'tick_size': price_filter.get('tickSize'),
+            'step_size': lot_size.get('stepSize'),
+            'min_qty': lot_size.get('minQty'),
+            'min_notional': min_notional.get('notional', min_notional.get('minNotional')),
+            'price_precision': raw.get('pricePrecision'),
+            'quantity_precision': raw.get('quantityPrecision'),
+        }
+
+    @staticmethod
+    def _build_market(raw: dict) -> Optional[dict]:
+        """Chuẩn hoá 1 entry (từ JSON hoặc exchange) thành market dict"""
+        symbol_api = raw.get('symbol_api')
+        symbol = raw.get('symbol') or (symbol_api and _base_key(symbol_api))
+        if not symbol:
+            return None
+
+        symbol = _base_key(symbol)
+        symbol_api = (symbol_api or f"{symbol}{QUOTE_ASSET}").upper()
+
+        def _float(key):
+            value = raw.get(key)
+            return float(value) if value is not None else None
+
+        return {
+            'symbol': symbol,
+            'symbol_api': symbol_api,
+            'pair': f"{symbol}-{QUOTE_ASSET}",
+            'status': raw.get('status', 'active'),
+            'tick_size': _float('tick_size'),
+            'step_size': _float('step_size'),
+            'min_qty': _float('min_qty'),
+            'min_notional': _float('min_notional'),
+            'price_precision': raw.get('price_precision'),
+            'quantity_precision': raw.get('quantity_precision'),
+        }
+
+    def load_markets(self, markets: List[dict], source: str) -> int:
+        """
+        Thay toàn bộ registry bằng list markets
+
+        Build index mới rồi swap 1 lần để reader không bao giờ thấy state nửa vời.
+
+        Output:
+            int: Số market đã load
+        """
+        by_symbol: Dict[str, dict] = {}
+        by_symbol_api: Dict[str, dict] = {}
+
+        for raw in markets:
+            market = self._build_market(raw)
+            if market is None:
+                continue
+            by_symbol[market['symbol']] = market
+            by_symbol_api[market['symbol_api']] = market
+
+        self._by_symbol = by_symbol
+        self._by_symbol_api = by_symbol_api
+        self.source = source
+        self.updated_at = time.time()
+        return len(by_symbol_api)
+
+    def load_from_file(self, file_path: str = DEFAULT_MARKETS_FILE) -> int:
+        """
+        Load registry từ aster_markets.json
+
+        Output:
+            int: Số market đã load (0 nếu file rỗng / lỗi)
+        """
+        try:
+            with open(file_path, 'r') as f:
+                data = json.load(f)
+        except Exception as e:
+            print(f"⚠️  [Aster Markets] Không load được {file_path}: {e}")
+            return 0
+
+        markets = data.get('markets', []) if isinstance(data, dict) else data
+        count = self.load_markets(markets, source='file')
+        print(f"✅ [Aster Markets] Loaded {count} markets từ {os.path.basename(file_path)}")
+        return count
+
+    async def refresh(self, client) -> dict:
+        """
+        Refresh registry từ /fapi/v1/exchangeInfo
+
+        Input:
+            - client: AsterClient instance
+
+        Output:
+            dict: {'success': bool, 'count': int, 'error': str (nếu có)}
+        """
+        try:
+            result = await client._request('GET', '/fapi/v1/exchangeInfo', signed=False)
+            if not result.get('success'):
+                return {'success': False, 'count': len(self), 'error': str(result.get('error'))}
+
+            symbols = result['data'].get('symbols', [])
+            markets = [m for m in (self._parse_exchange_symbol(s) for s in symbols) if m]
+            if not markets:
+                return {'success': False, 'count': len(self), 'error': 'No symbols in exchangeInfo'}
+
+            count = self.load_markets(markets, source='exchange')
+            print(f"✅ [Aster Markets] Refreshed {count} markets từ exchange")
+            return {'success': True, 'count': count}
+
+        except Exception as e:
+            print(f"⚠️  [Aster Markets] Refresh thất bại, giữ registry hiện tại: {e}")
+            return {'success': False, 'count': len(self), 'error': str(e)}
+
+    def save_to_file(self, file_path: str = DEFAULT_MARKETS_FILE):
+        """Ghi snapshot registry ra JSON (cùng format aster_markets.json)"""
+        markets = self.all_markets()
+        with open(file_path, 'w') as f:
+            json.dump({
+                'last_updated': time.strftime('%Y-%m-%d', time.gmtime(self.updated_at or time.time())),
+                'total_markets': len(markets),
+                'markets': markets,
+            }, f, indent=2)
+        print(f"✅ [Aster Markets] Saved {len(markets)} markets -> {file_path}")
+
+    def get(self, symbol: str) -> Optional[dict]:
+        """Lấy market theo BTC / BTC-USDT / BTCUSDT"""
+        key = symbol.strip().upper().replace('-', '')
+        market = self._by_symbol_api.get(key)
+        if market is None:
+            market = self._by_symbol.get(_base_key(key))
+        return market
+
+    def get_symbol_api(self, symbol: str) -> Optional[str]:
+        """Base symbol -> symbol API (BTC -> BTCUSDT), None nếu không hỗ trợ"""
+        market = self.get(symbol)
+        return market['symbol_api'] if market else None
+
+    def get_base_symbol(self, symbol_api: str) -> Optional[str]:
+        """Symbol API -> base symbol (BTCUSDT -> BTC), None nếu không biết"""
+        market = self._by_symbol_api.get(symbol_api.upper())
+        return market['symbol'] if market else None
+
+    def all_markets(self) -> List[dict]:
+        """Danh sách tất cả market, sort theo symbol"""
+        return sorted(self._by_symbol_api.values(), key=lambda m: m['symbol'])
+
+
+_registry: Optional[MarketRegistry] = None
+
+
+def get_market_registry() -> MarketRegistry:
+    """Lấy registry singleton (load từ JSON ở lần gọi đầu tiên)"""
+    global _registry
+    if _registry is None:
+        registry = MarketRegistry()
+        registry.load_from_file()
+        _registry = registry
+    return _registry
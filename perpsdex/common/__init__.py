@@ -0,0 +1,23 @@
+"""
+PerpDEX - Utility dùng chung cho các sàn
+"""
+
+from .deadline import DeadlineExceeded, clear_deadline, deadline_scope, hedged_read, remaining_budget
+from .exposure import ExposureLedger, Reservation, RiskLimits
+from .ladder import calculate_ladder_levels
+from .order_ids import OrderIndexAllocator, get_order_index_allocator, next_client_order_index
+
+__all__ = [
+    'DeadlineExceeded',
+    'clear_deadline',
+    'deadline_scope',
+    'hedged_read',
+    'remaining_budget',
+    'ExposureLedger',
+    'Reservation',
+    'RiskLimits',
+    'calculate_ladder_levels',
+    'OrderIndexAllocator',
+    'get_order_index_allocator',
+    'next_client_order_index',
+]
@@ -0,0 +1,201 @@
+"""
+Deadline budget + hedged read cho các call đọc idempotent tới sàn
+
+- Deadline: mỗi API request có 1 mốc hết hạn (ContextVar, set bởi DeadlineMiddleware).
+  Mọi call sàn bên dưới đọc remaining_budget() -> không call nào chờ quá thời gian còn lại
+  của request. Scope lồng nhau chỉ có thể rút ngắn deadline, không kéo dài.
+  Task nền tạo trong request (TWAP, fill poller, PnL engine ...) copy context của request ->
+  gọi clear_deadline() ở đầu task, không thì hết deadline request là mọi call trong task đều fail.
+- Hedged read: gửi request chính; nếu quá p95 latency gần nhất của cùng loại call mà chưa có
+  kết quả thì gửi thêm 1 request dự phòng, lấy kết quả về trước, huỷ cái còn lại.
+  Bình thường (< p95) không phát sinh request thêm.
+
+Chỉ dùng cho call đọc (giá, metadata, account, position, balance) - KHÔNG dùng cho lệnh.
+
+ENV:
+    - HEDGED_READS (default: 1)
+    - HEDGE_QUANTILE (default: 0.95)
+    - HEDGE_MIN_SAMPLES (default: 20, chưa đủ mẫu thì không hedge)
+    - HEDGE_MIN_DELAY_MS (default: 50)
+"""
+
+import asyncio
+import contextvars
+import os
+import time
+from collections import deque
+from contextlib import contextmanager
+from typing import Awaitable, Callable, Dict, Optional
+
+# Số mẫu latency gần nhất giữ cho mỗi loại call
+LATENCY_WINDOW = 200
+# Tính lại percentile sau mỗi N mẫu mới (sort 200 phần tử mỗi call là thừa)
+RECOMPUTE_EVERY = 10
+
+_deadline: contextvars.ContextVar[Optional[float]] = contextvars.ContextVar("perpsdex_deadline", default=None)
+
+
+class DeadlineExceeded(asyncio.TimeoutError):
+    """Hết deadline budget của request trước khi call sàn trả về"""
+
+
+def remaining_budget() -> Optional[float]:
+    """Số giây còn lại của deadline hiện tại (None = không có deadline)"""
+    deadline = _deadline.get()
+    if deadline is None:
+        return None
+    return deadline - time.monotonic()
+
+
+def clear_deadline():
+    """Bỏ deadline trong context hiện tại (đầu task nền sống lâu hơn request tạo ra nó)"""
+    _deadline.set(None)
+
+
+@contextmanager
+def deadline_scope(seconds: Optional[float]):
+    """Đặt deadline = now + seconds cho mọi call bên trong (giữ deadline cũ nếu sớm hơn)"""
+    if seconds is None:
+        yield
+        return
+    deadline = time.monotonic() + seconds
+    current = _deadline.get()
+    token = _deadline.set(deadline if current is None else min(current, deadline))
+    try:
+        yield
+    finally:
+        _deadline.reset(token)
+
+
+def _env_flag(name: str, default: bool) -> bool:
+    value = os.getenv(name)
+    if value is None:
+        return default
+    return value.strip().lower() in ("1", "true", "yes", "on")
+
+
+class _LatencyStats:
+    """Latency gần nhất của 1 loại call + ngưỡng hedge (percentile) đã cache"""
+
+    def __init__(self):
+        self.samples = deque(maxlen=LATENCY_WINDOW)
+        self.threshold: Optional[float] = None
+        self.since_recompute = 0
+        self.calls = 0
+        self.hedged = 0
+        self.hedge_wins = 0
+        self.deadline_exceeded = 0
+
+    def record(self, seconds: float, quantile: float, min_samples: int):
+        self.samples.append(seconds)
+        self.since_recompute += 1
+        if len(self.samples) >= min_samples and (self.threshold is None or self.since_recompute >= RECOMPUTE_EVERY):
+            ordered = sorted(self.samples)
+            self.threshold = ordered[min(len(ordered) - 1, int(quantile * len(ordered)))]
+            self.since_recompute = 0
+
+    def to_dict(self) -> dict:
+        return {
+            "calls": self.calls,
+            "hedged": self.hedged,
+            "hedge_wins": self.hedge_wins,
+            "deadline_exceeded": self.deadline_exceeded,
+            "hedge_after_ms": round(self.threshold * 1000, 1) if self.threshold is not None else None,
+            "samples": len(self.samples),
+        }
+
+
+class HedgedReader:
+    """
+    Methods:
+        - read(key, factory): chạy factory() với deadline + hedge theo p95 của key
+        - stats(): số call / hedge / thắng nhờ hedge / hết deadline theo từng key
+    """
+
+    def __init__(self):
+        self.enabled = _env_flag("HEDGED_READS", True)
+        self.quantile = float(os.getenv("HEDGE_QUANTILE", 0.95))
+        self.min_samples = int(os.getenv("HEDGE_MIN_SAMPLES", 20))
+        self.min_delay = float(os.getenv("HEDGE_MIN_DELAY_MS", 50)) / 1000
+        self._stats: Dict[str, _LatencyStats] = {}
+
+    def _get_stats(self, key: str) -> _LatencyStats:
+        stats = self._stats.get(key)
+        if stats is None:
+            stats = self._stats[key] = _LatencyStats()
+        return stats
+
+    async def read(self, key: str, factory: Callable[[], Awaitable]):
+        """
+        Input:
+            - key: Loại call (VD: 'lighter.order_book_orders') - latency thống kê theo key
+            - factory: Hàm không tham số trả về awaitable MỚI mỗi lần gọi (request idempotent)
+
+        Output:
+            Kết quả của request về trước. Raise DeadlineExceeded nếu hết budget.
+        """
+        stats = self._get_stats(key)
+        stats.calls += 1
+        budget = remaining_budget()
+        if budget is not None and budget <= 0:
+            stats.deadline_exceeded += 1
+            raise DeadlineExceeded(f"{key}: hết deadline trước khi gọi")
+
+        started = time.monotonic()
+        primary = asyncio.ensure_future(factory())
+        attempts = {primary: started}
+        hedge_after = stats.threshold if self.enabled else None
+        try:
+            if hedge_after is not None:
+                hedge_after = max(hedge_after, self.min_delay)
+                if budget is None or hedge_after < budget:
+                    done, _ = await asyncio.wait({primary}, timeout=hedge_after)
+                    if not done:
+                        stats.hedged += 1
+                        attempts[asyncio.ensure_future(factory())] = time.monotonic()
+
+            pending = set(attempts)
+            while pending:
+                budget = remaining_budget()
+                if budget is not None and budget <= 0:
+                    break
+                done, pending = await asyncio.wait(pending, timeout=budget, return_when=asyncio.FIRST_COMPLETED)
+                for task in sorted(done, key=lambda t: t.exception() is not None):
+                    if task.exception() is None or not pending:
+                        # Lỗi của 1 request chỉ trả về khi không còn request nào khác đang chạy
+                        now = time.monotonic()
+                        stats.record(now - attempts[task], self.quantile, self.min_samples)
+                        if task is not primary:
+                            stats.hedge_wins += 1
+                            if not primary.done():
+                                # Primary chậm bị huỷ: ghi cận dưới latency của nó, không thì
+                                # p95 chỉ còn mẫu nhanh -> ngưỡng hedge tụt dần, hedge ngày càng nhiều
+                                stats.record(now - started, self.quantile, self.min_samples)
+                        return task.result()
+                if not done:
+                    break
+
+            stats.deadline_exceeded += 1
+            raise DeadlineExceeded(f"{key}: quá deadline sau {time.monotonic() - started:.2f}s")
+        finally:
+            for task in attempts:
+                if not task.done():
+                    task.cancel()
+
+    def stats(self) -> Dict[str, dict]:
+        return {key: stats.to_dict() for key, stats in self._stats.items()}
+
+
+_reader: Optional[HedgedReader] = None
+
+
+def get_hedged_reader() -> HedgedReader:
+    global _reader
+    if _reader is None:
+        _reader = HedgedReader()
+    return _reader
+
+
+async def hedged_read(key: str, factory: Callable[[], Awaitable]):
+    """Shortcut: get_hedged_reader().read(key, factory)"""
+    return await get_hedged_reader().read(key, factory)
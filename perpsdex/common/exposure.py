@@ -0,0 +1,361 @@
+"""
+ExposureLedger - Pre-trade risk check in-memory (không gọi sàn)
+
+Ledger giữ:
+    - notional có dấu theo (sàn, symbol) (+ long, - short) + tag + leverage của position
+    - notional đang "giữ chỗ" của lệnh đang gửi (reservation) -> 2 lệnh song song không cùng lọt limit
+    - account snapshot mỗi sàn: available / collateral / total (margin khả dụng)
+    - tổng gross notional theo sàn / tag / toàn bộ, cập nhật incremental ở mỗi thay đổi
+
+Check 1 lệnh chỉ là vài phép so sánh trên dict -> vài micro giây, thay cho 1 RTT get_balance.
+Fill / close cập nhật ledger ngay; sync định kỳ từ sàn (load_account / load_positions) sửa sai lệch.
+
+Lệnh giảm exposure (ngược chiều position) luôn được cho qua, trừ limit theo lệnh.
+
+ENV (0 / không set = tắt limit đó):
+    - RISK_MAX_ORDER_NOTIONAL: USD tối đa 1 lệnh
+    - RISK_MAX_SYMBOL_NOTIONAL: |notional| tối đa của 1 (sàn, symbol)
+    - RISK_MAX_EXCHANGE_NOTIONAL: gross notional tối đa 1 sàn
+    - RISK_MAX_TAG_NOTIONAL: gross notional tối đa 1 tag
+    - RISK_MAX_TOTAL_NOTIONAL: gross notional tối đa mọi sàn
+    - RISK_MAX_LEVERAGE: leverage tối đa của 1 lệnh
+    - RISK_MAX_ACCOUNT_LEVERAGE: gross notional / total balance tối đa của 1 sàn
+    - RISK_CHECK_MARGIN (default: 1): margin lệnh cần (size_usd / leverage) <= available
+    - RISK_MARGIN_BUFFER (default: 0): phần available giữ lại, VD 0.1 = chỉ dùng 90%
+"""
+
+import os
+import time
+from typing import Dict, List, Optional, Tuple
+
+UNTAGGED = "untagged"
+
+
+def _env_float(name: str) -> Optional[float]:
+    value = os.getenv(name, "").strip()
+    if not value:
+        return None
+    value = float(value)
+    return value if value > 0 else None
+
+
+class RiskLimits:
+    """Ngưỡng pre-trade (None = không giới hạn)"""
+
+    def __init__(self):
+        self.max_order_notional = _env_float("RISK_MAX_ORDER_NOTIONAL")
+        self.max_symbol_notional = _env_float("RISK_MAX_SYMBOL_NOTIONAL")
+        self.max_exchange_notional = _env_float("RISK_MAX_EXCHANGE_NOTIONAL")
+        self.max_tag_notional = _env_float("RISK_MAX_TAG_NOTIONAL")
+        self.max_total_notional = _env_float("RISK_MAX_TOTAL_NOTIONAL")
+        self.max_leverage = _env_float("RISK_MAX_LEVERAGE")
+        self.max_account_leverage = _env_float("RISK_MAX_ACCOUNT_LEVERAGE")
+        self.check_margin = os.getenv("RISK_CHECK_MARGIN", "1").strip().lower() in ("1", "true", "yes", "on")
+        self.margin_buffer = float(os.getenv("RISK_MARGIN_BUFFER", 0))
+
+    def to_dict(self) -> dict:
+        return dict(vars(self))
+
+
+class Reservation:
+    """Notional + margin giữ chỗ cho 1 lệnh đang gửi (trả lại qua commit / release)"""
+
+    def __init__(self, exchange: str, symbol: str, signed_usd: float, leverage: float, tag: Optional[str],
+                 margin: float, account: bool):
+        self.exchange = exchange
+        self.symbol = symbol
+        self.signed_usd = signed_usd
+        self.leverage = leverage
+        self.tag = tag
+        self.margin = margin
+        self.account = account
+        self.done = False
+
+
+class ExposureLedger:
+    """
+    Methods:
+        - check(...): Lý do reject (str) hoặc None
+        - reserve(...): check + giữ chỗ, trả (Reservation, None) hoặc (None, lý do)
+        - commit(reservation, filled_usd) / release(reservation)
+        - apply_fill(...) / apply_close(...): Cập nhật incremental sau fill / đóng position
+        - load_account(...) / load_positions(...): Snapshot từ sàn
+        - status(): Exposure hiện tại + limits + thống kê check
+    """
+
+    def __init__(self, limits: Optional[RiskLimits] = None):
+        self.limits = limits or RiskLimits()
+        self._net: Dict[Tuple[str, str], float] = {}
+        self._reserved: Dict[Tuple[str, str], float] = {}
+        self._tags: Dict[Tuple[str, str], str] = {}
+        self._leverage: Dict[Tuple[str, str], float] = {}
+        self.exchange_gross: Dict[str, float] = {}
+        self.tag_gross: Dict[str, float] = {}
+        self.total_gross = 0.0
+        self.accounts: Dict[str, dict] = {}
+        self.reserved_margin: Dict[str, float] = {}
+        self.checks = 0
+        self.rejected = 0
+        self.rejected_by_rule: Dict[str, int] = {}
+        self._check_ns = 0
+
+    # ------------------------------------------------------------------ exposure
+
+    def exposure(self, exchange: str, symbol: str) -> float:
+        """Notional có dấu đang tính cho (sàn, symbol), gồm cả phần giữ chỗ"""
+        key = (exchange, symbol)
+        return self._net.get(key, 0.0) + self._reserved.get(key, 0.0)
+
+    def _move(self, key: Tuple[str, str], before: float, after: float):
+        """Cộng delta |exposure| vào tổng theo sàn / tag / toàn bộ"""
+        delta = abs(after) - abs(before)
+        if delta == 0:
+            return
+        tag = self._tags.get(key, UNTAGGED)
+        self.exchange_gross[key[0]] = self.exchange_gross.get(key[0], 0.0) + delta
+        self.tag_gross[tag] = self.tag_gross.get(tag, 0.0) + delta
+        self.total_gross += delta
+
+    def _set_tag(self, key: Tuple[str, str], tag: Optional[str]):
+        if not tag or self._tags.get(key, UNTAGGED) == tag:
+            return
+        gross = abs(self.exposure(*key))
+        old_tag = self._tags.get(key, UNTAGGED)
+        self.tag_gross[old_tag] = self.tag_gross.get(old_tag, 0.0) - gross
+        self.tag_gross[tag] = self.tag_gross.get(tag, 0.0) + gross
+        self._tags[key] = tag
+
+    def _update(self, key: Tuple[str, str], net_delta: float = 0.0, reserved_delta: float = 0.0):
+        before = self.exposure(*key)
+        if net_delta:
+            net = self._net.get(key, 0.0) + net_delta
+            if abs(net) < 1e-9:
+                self._net.pop(key, None)
+            else:
+                self._net[key] = net
+        if reserved_delta:
+            reserved = self._reserved.get(key, 0.0) + reserved_delta
+            if abs(reserved) < 1e-9:
+                self._reserved.pop(key, None)
+            else:
+                self._reserved[key] = reserved
+        self._move(key, before, self.exposure(*key))
+
+    # ------------------------------------------------------------------ check
+
+    def _reject(self, rule: str, reason: str) -> str:
+        self.rejected += 1
+        self.rejected_by_rule[rule] = self.rejected_by_rule.get(rule, 0) + 1
+        return reason
+
+    def _check(self, exchange: str, symbol: str, signed_usd: float, leverage: float,
+               tag: Optional[str], account: bool) -> Tuple[Optional[str], float]:
+        """(lý do reject | None, margin cần thêm)"""
+        limits = self.limits
+        size_usd = abs(signed_usd)
+        if limits.max_leverage is not None and leverage > limits.max_leverage:
+            return self._reject("max_leverage", f"leverage {leverage:g}x > {limits.max_leverage:g}x"), 0.0
+        if limits.max_order_notional is not None and size_usd > limits.max_order_notional:
+            return self._reject(
+                "max_order_notional", f"lệnh ${size_usd:,.2f} > ${limits.max_order_notional:,.2f}/lệnh"
+            ), 0.0
+
+        key = (exchange, symbol)
+        before = self.exposure(exchange, symbol)
+        after = before + signed_usd
+        added = abs(after) - abs(before)
+        if added <= 0:
+            # Giảm exposure -> luôn cho qua
+            return None, 0.0
+
+        if limits.max_symbol_notional is not None and abs(after) > limits.max_symbol_notional:
+            return self._reject(
+                "max_symbol_notional",
+                f"{exchange} {symbol}: exposure ${abs(after):,.2f} > ${limits.max_symbol_notional:,.2f}",
+            ), 0.0
+        exchange_gross = self.exchange_gross.get(exchange, 0.0) + added
+        if limits.max_exchange_notional is not None and exchange_gross > limits.max_exchange_notional:
+            return self._reject(
+                "max_exchange_notional",
+                f"{exchange}: gross exposure ${exchange_gross:,.2f} > ${limits.max_exchange_notional:,.2f}",
+            ), 0.0
+        if limits.max_tag_notional is not None:
+            tag = tag or self._tags.get(key, UNTAGGED)
+            tag_gross = self.tag_gross.get(tag, 0.0) + added
+            if tag_gross > limits.max_tag_notional:
+                return self._reject(
+                    "max_tag_notional", f"tag {tag}: exposure ${tag_gross:,.2f} > ${limits.max_tag_notional:,.2f}"
+                ), 0.0
+        if limits.max_total_notional is not None and self.total_gross + added > limits.max_total_notional:
+            return self._reject(
+                "max_total_notional",
+                f"tổng exposure ${self.total_gross + added:,.2f} > ${limits.max_total_notional:,.2f}",
+            ), 0.0
+
+        margin = added / max(leverage, 1.0)
+        snapshot = self.accounts.get(exchange) if account else None
+        if snapshot is None:
+            return None, margin
+
+        if limits.check_margin:
+            available = snapshot["available"] * (1 - limits.margin_buffer) - self.reserved_margin.get(exchange, 0.0)
+            if margin > available:
+                return self._reject(
+                    "margin", f"{exchange}: không đủ margin, cần ${margin:,.2f}, available ${max(available, 0):,.2f}"
+                ), 0.0
+        if limits.max_account_leverage is not None and snapshot["total"] > 0:
+            account_leverage = exchange_gross / snapshot["total"]
+            if account_leverage > limits.max_account_leverage:
+                return self._reject(
+                    "max_account_leverage",
+                    f"{exchange}: account leverage {account_leverage:.2f}x > {limits.max_account_leverage:g}x",
+                ), 0.0
+        return None, margin
+
+    def check(self, exchange: str, symbol: str, side: str, size_usd: float, leverage: float = 1.0,
+              tag: Optional[str] = None, account: bool = True) -> Optional[str]:
+        """
+        Input:
+            - side: 'long' | 'short'
+            - size_usd: notional của lệnh
+            - account: False khi lệnh dùng key khác account ENV (bỏ check margin / account leverage)
+
+        Output:
+            str | None: Lý do reject, None nếu cho qua
+        """
+        started = time.perf_counter_ns()
+        signed_usd = size_usd if side == "long" else -size_usd
+        reason, _ = self._check(exchange, symbol, signed_usd, leverage, tag, account)
+        self.checks += 1
+        self._check_ns += time.perf_counter_ns() - started
+        return reason
+
+    def reserve(self, exchange: str, symbol: str, side: str, size_usd: float, leverage: float = 1.0,
+                tag: Optional[str] = None, account: bool = True) -> Tuple[Optional[Reservation], Optional[str]]:
+        """Check rồi giữ chỗ notional + margin cho tới khi commit / release"""
+        started = time.perf_counter_ns()
+        signed_usd = size_usd if side == "long" else -size_usd
+        reason, margin = self._check(exchange, symbol, signed_usd, leverage, tag, account)
+        reservation = None
+        if reason is None:
+            reservation = Reservation(exchange, symbol, signed_usd, leverage, tag, margin if account else 0.0, account)
+            self._update((exchange, symbol), reserved_delta=signed_usd)
+            self.reserved_margin[exchange] = self.reserved_margin.get(exchange, 0.0) + reservation.margin
+        self.checks += 1
+        self._check_ns += time.perf_counter_ns() - started
+        return reservation, reason
+
+    def release(self, reservation: Optional[Reservation]):
+        """Lệnh không được gửi / bị sàn từ chối -> trả lại phần giữ chỗ"""
+        if reservation is None or reservation.done:
+            return
+        reservation.done = True
+        self._update((reservation.exchange, reservation.symbol), reserved_delta=-reservation.signed_usd)
+        self.reserved_margin[reservation.exchange] = max(
+            0.0, self.reserved_margin.get(reservation.exchange, 0.0) - reservation.margin
+        )
+
+    def commit(self, reservation: Optional[Reservation], filled_usd: Optional[float] = None):
+        """Lệnh đã vào sàn: bỏ giữ chỗ, ghi fill (filled_usd None = cả lệnh)"""
+        if reservation is None or reservation.done:
+            return
+        self.release(reservation)
+        size_usd = abs(reservation.signed_usd) if filled_usd is None else filled_usd
+        if size_usd > 0:
+            self.apply_fill(
+                reservation.exchange,
+                reservation.symbol,
+                "long" if reservation.signed_usd > 0 else "short",
+                size_usd,
+                reservation.leverage,
+                reservation.tag,
+                account=reservation.account,
+            )
+
+    # ------------------------------------------------------------------ updates
+
+    def apply_fill(self, exchange: str, symbol: str, side: str, size_usd: float, leverage: float = 1.0,
+                   tag: Optional[str] = None, account: bool = True):
+        """Fill mới: cộng notional, trừ / trả margin khả dụng trong account snapshot"""
+        key = (exchange, symbol)
+        signed_usd = size_usd if side == "long" else -size_usd
+        before = self._net.get(key, 0.0)
+        after = before + signed_usd
+        position_leverage = self._leverage.get(key, leverage)
+        if abs(after) > abs(before):
+            self._leverage[key] = leverage
+            self._set_tag(key, tag)
+        self._update(key, net_delta=signed_usd)
+
+        snapshot = self.accounts.get(exchange) if account else None
+        if snapshot is not None:
+            opened = max(abs(after) - abs(before), 0.0) if before * after >= 0 else abs(after)
+            closed = abs(signed_usd) - opened
+            snapshot["available"] += closed / max(position_leverage, 1.0) - opened / max(leverage, 1.0)
+
+    def apply_close(self, exchange: str, symbol: str, fraction: float):
+        """Đóng fraction (0-1) position của (sàn, symbol)"""
+        key = (exchange, symbol)
+        net = self._net.get(key, 0.0)
+        if not net:
+            return
+        closed = net * min(max(fraction, 0.0), 1.0)
+        self._update(key, net_delta=-closed)
+        snapshot = self.accounts.get(exchange)
+        if snapshot is not None:
+            snapshot["available"] += abs(closed) / max(self._leverage.get(key, 1.0), 1.0)
+
+    def load_account(self, exchange: str, available: float, total: float, collateral: Optional[float] = None):
+        """Snapshot balance từ sàn (thay hoàn toàn phần đã cập nhật incremental)"""
+        self.accounts[exchange] = {
+            "available": float(available),
+            "total": float(total),
+            "collateral": float(collateral) if collateral is not None else None,
+            "synced_at": time.time(),
+        }
+
+    def load_positions(self, exchange: str, rows: List[dict]):
+        """
+        Thay toàn bộ position của 1 sàn
+
+        rows: [{'symbol', 'side', 'notional', 'leverage', 'tag' (optional)}]
+        """
+        for key in [k for k in self._net if k[0] == exchange]:
+            self._update(key, net_delta=-self._net[key])
+        for row in rows:
+            key = (exchange, row["symbol"])
+            signed_usd = abs(row["notional"]) if row["side"] == "long" else -abs(row["notional"])
+            self._leverage[key] = float(row.get("leverage") or 1)
+            self._set_tag(key, row.get("tag"))
+            self._update(key, net_delta=signed_usd)
+
+    # ------------------------------------------------------------------ status
+
+    def positions(self) -> List[dict]:
+        keys = sorted(set(self._net) | set(self._reserved))
+        return [
+            {
+                "exchange": exchange,
+                "symbol": symbol,
+                "notional": round(self._net.get((exchange, symbol), 0.0), 6),
+                "reserved": round(self._reserved.get((exchange, symbol), 0.0), 6),
+                "leverage": self._leverage.get((exchange, symbol)),
+                "tag": self._tags.get((exchange, symbol), UNTAGGED),
+            }
+            for exchange, symbol in keys
+        ]
+
+    def status(self) -> dict:
+        return {
+            "total_gross": round(self.total_gross, 6),
+            "by_exchange": {k: round(v, 6) for k, v in self.exchange_gross.items()},
+            "by_tag": {k: round(v, 6) for k, v in self.tag_gross.items() if abs(v) > 1e-9},
+            "accounts": self.accounts,
+            "reserved_margin": self.reserved_margin,
+            "positions": self.positions(),
+            "limits": self.limits.to_dict(),
+            "checks": self.checks,
+            "rejected": self.rejected,
+            "rejected_by_rule": self.rejected_by_rule,
+            "avg_check_us": round(self._check_ns / self.checks / 1000, 2) if self.checks else None,
+        }
@@ -0,0 +1,136 @@
+"""
+Ladder / grid - Chia 1 khoảng giá thành N level LIMIT và phân bổ size
+
+Thuần tính toán (không gọi sàn), dùng chung cho build_ladder của Lighter (step = 10^-decimals
+của market) và Aster (tickSize / stepSize của symbol).
+"""
+
+from decimal import Decimal
+
+
+def calculate_ladder_levels(
+    side: str,
+    price_from: float,
+    price_to: float,
+    levels: int,
+    total_usd: float,
+    price_step: float,
+    size_step: float,
+    min_size: float = 0.0,
+    distribution='flat',
+    geometric_ratio: float = 1.5
+) -> dict:
+    """
+    Chia 1 khoảng giá thành N level (grid / ladder) và phân bổ size
+
+    Input:
+        - side: 'long' hoặc 'short'
+        - price_from, price_to: Khoảng giá (level đầu tiên = price_from)
+        - levels: Số level (>= 1)
+        - total_usd: Tổng USD của cả ladder (chưa nhân leverage)
+        - price_step: Tick size (VD: 0.1, Lighter = 10^-price_decimals)
+        - size_step: Step size (VD: 0.001, Lighter = 10^-size_decimals)
+        - min_size: Size tối thiểu của sàn (level nhỏ hơn bị đánh dấu skip)
+        - distribution: 'flat' | 'linear' | 'geometric' | list weights (cùng độ dài levels)
+        - geometric_ratio: Tỉ lệ giữa 2 level liên tiếp khi distribution = 'geometric'
+
+    Output:
+        dict: {
+            'success': bool,
+            'levels': [
+                {'level': int, 'price': float, 'size': float, 'size_usd': float,
+                 'price_int': int, 'size_int': int, 'skip': bool, 'reason': str}
+            ],
+            'total_size': float,
+            'total_usd': float,   # USD thực tế sau khi làm tròn
+            'price_decimals': int,
+            'size_decimals': int,
+            'error': str (nếu có)
+        }
+        price_int / size_int: Giá trị đã scale theo step (Lighter: chính là int gửi lên SignerClient)
+
+    Example:
+        >>> calculate_ladder_levels('long', 64000, 62000, 3, 300, 0.1, 0.00001)
+        {'success': True, 'levels': [{'level': 0, 'price': 64000.0, 'size': 0.00156, ...}, ...]}
+    """
+    if levels < 1:
+        return {'success': False, 'error': 'levels phải >= 1'}
+    if price_from <= 0 or price_to <= 0 or total_usd <= 0:
+        return {'success': False, 'error': 'price_from, price_to, total_usd phải > 0'}
+    if price_step <= 0 or size_step <= 0:
+        return {'success': False, 'error': 'price_step, size_step phải > 0'}
+
+    # Weights theo distribution
+    if isinstance(distribution, (list, tuple)):
+        if len(distribution) != levels or any(w < 0 for w in distribution) or sum(distribution) <= 0:
+            return {'success': False, 'error': 'distribution weights phải có đúng levels phần tử >= 0'}
+        weights = [float(w) for w in distribution]
+    elif distribution == 'flat':
+        weights = [1.0] * levels
+    elif distribution == 'linear':
+        weights = [float(i + 1) for i in range(levels)]
+    elif distribution == 'geometric':
+        weights = [geometric_ratio ** i for i in range(levels)]
+    else:
+        return {'success': False, 'error': f"distribution không hợp lệ: {distribution}"}
+
+    # Số decimals của tick / step để bỏ nhiễu float khi nhân ngược lại
+    price_decimals = max(0, -Decimal(str(price_step)).normalize().as_tuple().exponent)
+    size_decimals = max(0, -Decimal(str(size_step)).normalize().as_tuple().exponent)
+
+    weight_sum = sum(weights)
+    step = (price_to - price_from) / (levels - 1) if levels > 1 else 0.0
+
+    result_levels = []
+    seen_price_ints = set()
+    total_size = 0.0
+    actual_usd = 0.0
+
+    for i in range(levels):
+        raw_price = price_from + step * i
+        price_int = int(round(raw_price / price_step))
+        price = round(price_int * price_step, price_decimals)
+
+        level_usd = total_usd * weights[i] / weight_sum
+        # Floor size theo step để tổng không vượt total_usd
+        size_int = int(level_usd / price / size_step + 1e-9) if price > 0 else 0
+        size = round(size_int * size_step, size_decimals)
+
+        level = {
+            'level': i,
+            'price': price,
+            'size': size,
+            'size_usd': round(size * price, 8),
+            'price_int': price_int,
+            'size_int': size_int,
+            'skip': False,
+            'reason': None,
+        }
+
+        if price_int in seen_price_ints:
+            level['skip'], level['reason'] = True, 'Trùng giá với level khác sau khi làm tròn tick'
+        elif size_int <= 0 or size < min_size:
+            level['skip'], level['reason'] = True, f"Size {size} < min size {min_size}"
+        else:
+            seen_price_ints.add(price_int)
+            total_size += size
+            actual_usd += size * price
+
+        result_levels.append(level)
+
+    if all(l['skip'] for l in result_levels):
+        return {
+            'success': False,
+            'levels': result_levels,
+            'error': 'Không có level hợp lệ (size quá nhỏ hoặc khoảng giá quá hẹp so với tick)',
+        }
+
+    return {
+        'success': True,
+        'side': side.lower(),
+        'levels': result_levels,
+        'total_size': round(total_size, size_decimals),
+        'total_usd': round(actual_usd, 8),
+        'price_decimals': price_decimals,
+        'size_decimals': size_decimals,
+    }
@@ -0,0 +1,133 @@
+"""
+LeverageCache - Leverage / margin mode đã set trên sàn theo (sàn, account, symbol)
+
+Leverage là setting của account (Aster: /fapi/v1/leverage + /fapi/v1/marginType, Lighter: tx
+update_leverage), không phải param của lệnh. Cache giữ giá trị đã set thành công:
+    - Lệnh cùng leverage / margin mode -> không gọi sàn (0 RTT)
+    - Khác giá trị đã cache -> gọi sàn 1 lần, thành công thì cache lại
+    - Set lỗi hoặc lệnh bị sàn từ chối -> invalidate, lệnh sau set lại
+Các lệnh song song cùng key chờ chung 1 lần set (lock theo key).
+
+ENV:
+    - LEVERAGE_CACHE_TTL (default: 0 = không hết hạn, giây): set lại định kỳ nếu leverage
+      có thể bị đổi ngoài API này (UI sàn)
+"""
+
+import asyncio
+import os
+import time
+from typing import Awaitable, Callable, Dict, Optional, Tuple
+
+CROSS = "cross"
+ISOLATED = "isolated"
+
+
+class LeverageCache:
+    """
+    Methods:
+        - ensure(exchange, account, symbol, leverage, margin_mode, apply): set nếu khác cache
+        - get(exchange, account, symbol): {'leverage', 'margin_mode', 'set_at'} | None
+        - invalidate(exchange, account, symbol=None)
+        - stats(): hits / sets / errors / invalidations
+    """
+
+    def __init__(self):
+        self.ttl = float(os.getenv("LEVERAGE_CACHE_TTL", 0))
+        self._state: Dict[Tuple[str, str, str], dict] = {}
+        self._locks: Dict[Tuple[str, str, str], asyncio.Lock] = {}
+        self.hits = 0
+        self.sets = 0
+        self.errors = 0
+        self.invalidations = 0
+
+    def get(self, exchange: str, account, symbol) -> Optional[dict]:
+        state = self._state.get((exchange, str(account), str(symbol)))
+        if state is None:
+            return None
+        if self.ttl > 0 and time.time() - state["set_at"] > self.ttl:
+            return None
+        return state
+
+    def _matches(self, state: Optional[dict], leverage: int, margin_mode: Optional[str]) -> bool:
+        if state is None or state["leverage"] != leverage:
+            return False
+        # margin_mode None = giữ mode hiện tại
+        return margin_mode is None or state["margin_mode"] == margin_mode
+
+    async def ensure(
+        self,
+        exchange: str,
+        account,
+        symbol,
+        leverage: int,
+        margin_mode: Optional[str],
+        apply: Callable[[Optional[dict]], Awaitable[dict]],
+    ) -> dict:
+        """
+        Input:
+            - margin_mode: 'cross' | 'isolated' | None (giữ mode đã cache / mặc định của sàn)
+            - apply(previous_state): coroutine gọi sàn, trả {'success', 'margin_mode', 'error'}
+
+        Output:
+            dict: {'success', 'cached': bool, 'leverage', 'margin_mode', 'error' (nếu có)}
+        """
+        key = (exchange, str(account), str(symbol))
+        state = self.get(exchange, account, symbol)
+        if self._matches(state, leverage, margin_mode):
+            self.hits += 1
+            return {"success": True, "cached": True, "leverage": leverage, "margin_mode": state["margin_mode"]}
+
+        lock = self._locks.get(key)
+        if lock is None:
+            lock = self._locks[key] = asyncio.Lock()
+        async with lock:
+            # Lệnh khác cùng key có thể vừa set xong trong lúc chờ lock
+            state = self.get(exchange, account, symbol)
+            if self._matches(state, leverage, margin_mode):
+                self.hits += 1
+                return {"success": True, "cached": True, "leverage": leverage, "margin_mode": state["margin_mode"]}
+
+            try:
+                result = await apply(state)
+            except Exception as e:
+                result = {"success": False, "error": str(e)}
+
+            if not result.get("success"):
+                self.errors += 1
+                self._state.pop(key, None)
+                return {"success": False, "cached": False, "error": result.get("error")}
+
+            self.sets += 1
+            mode = result.get("margin_mode") or margin_mode or (state or {}).get("margin_mode")
+            self._state[key] = {"leverage": leverage, "margin_mode": mode, "set_at": time.time()}
+            return {"success": True, "cached": False, "leverage": leverage, "margin_mode": mode}
+
+    def invalidate(self, exchange: str, account, symbol=None):
+        """Xoá cache của 1 symbol / market (hoặc cả account khi symbol=None)"""
+        account = str(account)
+        keys = [
+            k for k in self._state
+            if k[0] == exchange and k[1] == account and (symbol is None or k[2] == str(symbol))
+        ]
+        for key in keys:
+            self._state.pop(key, None)
+        self.invalidations += len(keys)
+
+    def stats(self) -> dict:
+        return {
+            "entries": len(self._state),
+            "hits": self.hits,
+            "sets": self.sets,
+            "errors": self.errors,
+            "invalidations": self.invalidations,
+        }
+
+
+_cache: Optional[LeverageCache] = None
+
+
+def get_leverage_cache() -> LeverageCache:
+    global _cache
+    if _cache is None:
+        _cache = LeverageCache()
+    return _cache
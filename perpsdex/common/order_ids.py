@@ -0,0 +1,112 @@
+"""
+OrderIndexAllocator - Cấp client_order_index tăng dần, không trùng cho lệnh gửi song song
+
+Trước đây mỗi lệnh dùng int(time.time() * 1000) (TP / SL: +1 / +2, SL retry: +10) -> 2 lệnh
+trong cùng 1 ms trùng index. Allocator giữ index cuối đã cấp:
+    index = max(now_ms, last + 1)   (làm tròn lên để index % slots == slot)
+-> vẫn gần timestamp ms như cũ (dễ đọc log), burst nhiều lệnh trong 1 ms thì chạy trước đồng hồ
+vài đơn vị, không bao giờ cấp lại index đã cấp kể cả khi đồng hồ bị chỉnh lùi.
+
+Nhiều process cùng 1 account (API_WORKERS > 1, bot + API): mỗi process giữ 1 slot bằng file lock
+(perp-dex-api-order-index-<slot>.lock), index của slot k luôn ≡ k (mod ORDER_INDEX_SLOTS) ->
+không trùng giữa các process. Hết slot trống thì lấy slot theo pid (in cảnh báo).
+
+Cũng dùng làm phần unique cho client order id dạng string (ladder / TWAP id, prefix Aster).
+
+ENV:
+    - ORDER_INDEX_SLOTS (default: API_WORKERS, tối thiểu 1): số process được cấp index song song
+"""
+
+import os
+import tempfile
+import threading
+import time
+from typing import List, Optional
+
+
+class OrderIndexAllocator:
+    """
+    Methods:
+        - next(): 1 index mới
+        - reserve(count): count index mới (tăng dần) cho ladder / batch
+        - status()
+    """
+
+    def __init__(self, slots: Optional[int] = None, slot: Optional[int] = None):
+        if slots is None:
+            slots = int(os.getenv("ORDER_INDEX_SLOTS", os.getenv("API_WORKERS", 1)))
+        self.slots = max(int(slots), 1)
+        self._lock_file = None
+        self.slot = self._claim_slot() if slot is None else int(slot) % self.slots
+        self._last = 0
+        self._lock = threading.Lock()
+        self.issued = 0
+        self.ahead = 0
+
+    def _claim_slot(self) -> int:
+        if self.slots == 1:
+            return 0
+        try:
+            import fcntl
+        except ImportError:
+            return os.getpid() % self.slots
+
+        for slot in range(self.slots):
+            lock_file = open(os.path.join(tempfile.gettempdir(), f"perp-dex-api-order-index-{slot}.lock"), 'w')
+            try:
+                fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except OSError:
+                lock_file.close()
+                continue
+            # Giữ file mở suốt đời process = giữ slot
+            self._lock_file = lock_file
+            return slot
+
+        slot = os.getpid() % self.slots
+        print(f"⚠️  [OrderIndex] Hết slot trống ({self.slots}), dùng slot theo pid: {slot}")
+        return slot
+
+    def _advance(self, now_ms: int) -> int:
+        index = max(now_ms, self._last + 1)
+        index += (self.slot - index) % self.slots
+        if index > now_ms + self.slots:
+            self.ahead += 1
+        self._last = index
+        self.issued += 1
+        return index
+
+    def next(self) -> int:
+        with self._lock:
+            return self._advance(int(time.time() * 1000))
+
+    def reserve(self, count: int) -> List[int]:
+        with self._lock:
+            now_ms = int(time.time() * 1000)
+            return [self._advance(now_ms) for _ in range(max(count, 0))]
+
+    def status(self) -> dict:
+        return {
+            "slots": self.slots,
+            "slot": self.slot,
+            "last": self._last,
+            "issued": self.issued,
+            "ahead_of_clock": self.ahead,
+        }
+
+
+_allocator: Optional[OrderIndexAllocator] = None
+_allocator_lock = threading.Lock()
+
+
+def get_order_index_allocator() -> OrderIndexAllocator:
+    global _allocator
+    if _allocator is None:
+        with _allocator_lock:
+            if _allocator is None:
+                _allocator = OrderIndexAllocator()
+    return _allocator
+
+
+def next_client_order_index() -> int:
+    """client_order_index mới cho 1 lệnh Lighter (thay cho int(time.time() * 1000))"""
+    return get_order_index_allocator().next()
@@ -11,17 +11,21 @@ from pydantic import BaseModel
 from typing import Optional, List
 import sys
 import os
+import time
 from pathlib import Path
 
 # Add parent to path
 sys.path.insert(0, str(Path(__file__).parent.parent.parent.parent))
 
+from perpsdex.common.exposure import ExposureLedger, Reservation
+from perpsdex.common.order_ids import next_client_order_index
 from perpsdex.lighter.core.client import LighterClient
 from perpsdex.lighter.core.market import MarketData
 from perpsdex.lighter.core.order import OrderExecutor
 from perpsdex.lighter.core.risk import RiskManager
 from perpsdex.lighter.utils.calculator import Calculator
-from perpsdex.lighter.utils.config import ConfigLoader
+from perpsdex.lighter.utils.market_registry import get_market_registry
+from perpsdex.lighter.utils.open_orders import get_open_order_book
 
 from dotenv import load_dotenv
 load_dotenv()
@@ -45,6 +49,9 @@ app.add_middleware(
 # Global client (singleton pattern)
 _client: Optional[LighterClient] = None
 
+# Exposure + balance snapshot in-memory cho pre-trade check
+_ledger = ExposureLedger()
+
 
 # =============== MODELS ===============
 
@@ -89,14 +96,48 @@ async def get_client() -> LighterClient:
         result = await _client.connect()
         if not result['success']:
             raise HTTPException(status_code=500, detail=f"Connection failed: {result.get('error')}")
+        
+        # Refresh market registry từ exchange 1 lần khi connect (fallback: lighter_markets.json)
+        await get_market_registry().refresh(_client.get_order_api())
     
     return _client
 
 
+async def reserve_order(market: MarketData, symbol: str, side: str, size_usd: float, leverage: float) -> Reservation:
+    """
+    Pre-trade check in-memory (margin / exposure, xem perpsdex/common/exposure.py)
+
+    Balance chỉ fetch lại khi snapshot cũ hơn RISK_SYNC_INTERVAL giây, không còn 1 RTT / lệnh.
+    """
+    snapshot = _ledger.accounts.get('lighter')
+    if snapshot is None or time.time() - snapshot['synced_at'] > float(os.getenv('RISK_SYNC_INTERVAL', 30)):
+        balance_result = await market.get_balance()
+        if not balance_result['success']:
+            raise HTTPException(status_code=400, detail="Failed to get balance")
+        _ledger.load_account(
+            'lighter', balance_result['available'], balance_result['total'], balance_result.get('collateral')
+        )
+
+    reservation, reason = _ledger.reserve('lighter', symbol, side, size_usd, leverage)
+    if reason is not None:
+        raise HTTPException(status_code=400, detail=f"Risk check: {reason}")
+    return reservation
+
+
+def settle_order(reservation: Reservation, result: Optional[dict]):
+    """Lệnh vào sàn -> ghi exposure + trừ margin; lỗi -> trả lại phần giữ chỗ"""
+    if result and result.get('success'):
+        _ledger.commit(reservation)
+    else:
+        _ledger.release(reservation)
+
+
 def get_market_id(symbol: str) -> int:
-    """Convert symbol to market_id"""
-    pair = f"{symbol}-USDT"
-    return ConfigLoader.get_market_id_for_pair(pair)
+    """Convert symbol to market_id (qua MarketRegistry)"""
+    market_id = get_market_registry().get_market_id(symbol)
+    if market_id is None:
+        raise HTTPException(status_code=400, detail=f"Symbol không được hỗ trợ trên Lighter: {symbol}")
+    return market_id
 
 
 # =============== ENDPOINTS ===============
@@ -224,18 +265,7 @@ async def place_long_order(order: OrderRequest):
         if client.has_keys_mismatch():
             print("⚠️ WARNING: Placing order với keys mismatch (test mode)")
         
-        # Check balance first
         market = MarketData(client.get_order_api(), client.get_account_api())
-        balance_result = await market.get_balance()
-        if not balance_result['success']:
-            raise HTTPException(status_code=400, detail="Failed to get balance")
-        
-        available_balance = balance_result['available']
-        if available_balance < order.size_usd:
-            raise HTTPException(
-                status_code=400, 
-                detail=f"Insufficient balance. Available: ${available_balance:.2f}, Required: ${order.size_usd}"
-            )
         
         # Get price
         market_id = get_market_id(order.symbol.upper())
@@ -248,14 +278,19 @@ async def place_long_order(order: OrderRequest):
         
         # Place entry order
         executor = OrderExecutor(client.get_signer_client(), client.get_order_api())
-        result = await executor.place_order(
-            side='long',
-            entry_price=entry_price,
-            position_size_usd=order.size_usd,
-            market_id=market_id,
-            symbol=order.symbol.upper(),
-            leverage=order.leverage
-        )
+        reservation = await reserve_order(market, order.symbol.upper(), 'long', order.size_usd, order.leverage)
+        result = None
+        try:
+            result = await executor.place_order(
+                side='long',
+                entry_price=entry_price,
+                position_size_usd=order.size_usd,
+                market_id=market_id,
+                symbol=order.symbol.upper(),
+                leverage=order.leverage
+            )
+        finally:
+            settle_order(reservation, result)
         
         if not result['success']:
             raise HTTPException(status_code=400, detail=result.get('error'))
@@ -330,32 +365,26 @@ async def place_limit_long_order(order: OrderRequest):
         if client.has_keys_mismatch():
             print("⚠️ WARNING: Placing LIMIT LONG order với keys mismatch (test mode)")
         
-        # Check balance first
         market = MarketData(client.get_order_api(), client.get_account_api())
-        balance_result = await market.get_balance()
-        if not balance_result['success']:
-            raise HTTPException(status_code=400, detail="Failed to get balance")
-        
-        available_balance = balance_result['available']
-        if available_balance < order.size_usd:
-            raise HTTPException(
-                status_code=400, 
-                detail=f"Insufficient balance. Available: ${available_balance:.2f}, Required: ${order.size_usd}"
-            )
         
         # Get market ID
         market_id = get_market_id(order.symbol.upper())
         
         # Place LIMIT order (không cần get price vì đã có limit_price)
         executor = OrderExecutor(client.get_signer_client(), client.get_order_api())
-        result = await executor.place_limit_order(
-            side='long',
-            limit_price=order.limit_price,  # NEW: Use limit price
-            position_size_usd=order.size_usd,
-            market_id=market_id,
-            symbol=order.symbol.upper(),
-            leverage=order.leverage
-        )
+        reservation = await reserve_order(market, order.symbol.upper(), 'long', order.size_usd, order.leverage)
+        result = None
+        try:
+            result = await executor.place_limit_order(
+                side='long',
+                limit_price=order.limit_price,  # NEW: Use limit price
+                position_size_usd=order.size_usd,
+                market_id=market_id,
+                symbol=order.symbol.upper(),
+                leverage=order.leverage
+            )
+        finally:
+            settle_order(reservation, result)
         
         if not result['success']:
             raise HTTPException(status_code=400, detail=result.get('error'))
@@ -408,32 +437,26 @@ async def place_limit_short_order(order: OrderRequest):
         if client.has_keys_mismatch():
             print("⚠️ WARNING: Placing LIMIT SHORT order với keys mismatch (test mode)")
         
-        # Check balance first
         market = MarketData(client.get_order_api(), client.get_account_api())
-        balance_result = await market.get_balance()
-        if not balance_result['success']:
-            raise HTTPException(status_code=400, detail="Failed to get balance")
-        
-        available_balance = balance_result['available']
-        if available_balance < order.size_usd:
-            raise HTTPException(
-                status_code=400, 
-                detail=f"Insufficient balance. Available: ${available_balance:.2f}, Required: ${order.size_usd}"
-            )
         
         # Get market ID
         market_id = get_market_id(order.symbol.upper())
         
         # Place LIMIT order
         executor = OrderExecutor(client.get_signer_client(), client.get_order_api())
-        result = await executor.place_limit_order(
-            side='short',
-            limit_price=order.limit_price,
-            position_size_usd=order.size_usd,
-            market_id=market_id,
-            symbol=order.symbol.upper(),
-            leverage=order.leverage
-        )
+        reservation = await reserve_order(market, order.symbol.upper(), 'short', order.size_usd, order.leverage)
+        result = None
+        try:
+            result = await executor.place_limit_order(
+                side='short',
+                limit_price=order.limit_price,
+                position_size_usd=order.size_usd,
+                market_id=market_id,
+                symbol=order.symbol.upper(),
+                leverage=order.leverage
+            )
+        finally:
+            settle_order(reservation, result)
         
         if not result['success']:
             raise HTTPException(status_code=400, detail=result.get('error'))
@@ -490,18 +513,7 @@ async def place_short_order(order: OrderRequest):
         if client.has_keys_mismatch():
             print("⚠️ WARNING: Placing SHORT order với keys mismatch (test mode)")
         
-        # Check balance first
         market = MarketData(client.get_order_api(), client.get_account_api())
-        balance_result = await market.get_balance()
-        if not balance_result['success']:
-            raise HTTPException(status_code=400, detail="Failed to get balance")
-        
-        available_balance = balance_result['available']
-        if available_balance < order.size_usd:
-            raise HTTPException(
-                status_code=400, 
-                detail=f"Insufficient balance. Available: ${available_balance:.2f}, Required: ${order.size_usd}"
-            )
         
         # Get price
         market_id = get_market_id(order.symbol.upper())
@@ -514,6 +526,8 @@ async def place_short_order(order: OrderRequest):
         
         # Place entry order
         executor = OrderExecutor(client.get_signer_client(), client.get_order_api())
+        reservation = await reserve_order(market, order.symbol.upper(), 'short', order.size_usd, order.leverage)
+        result = None
         try:
             result = await executor.place_order(
                 side='short',
@@ -526,6 +540,8 @@ async def place_short_order(order: OrderRequest):
         except Exception as order_err:
             print(f"🔍 Exception in place_order: {type(order_err).__name__}: {order_err}")
             raise HTTPException(status_code=400, detail=f"Failed to place order: {str(order_err)}")
+        finally:
+            settle_order(reservation, result)
         
         if not result or not result.get('success'):
             error_msg = result.get('error', 'Unknown error') if result else 'No result returned'
@@ -622,6 +638,7 @@ async def cancel_order_endpoint(request: dict):
         
         if error is None and response:
             print(f"✅ Order cancelled: {response.tx_hash}")
+            get_open_order_book(client.account_index).record_cancel(order_index=order_index)
             return {
                 "success": True,
                 "tx_hash": response.tx_hash,
@@ -694,6 +711,7 @@ async def cancel_all_orders_endpoint(request: dict):
         
         if error is None and response:
             print(f"✅ All orders cancelled: {response.tx_hash}")
+            get_open_order_book(client.account_index).record_cancel()
             return {
                 "success": True,
                 "tx_hash": response.tx_hash,
@@ -821,8 +839,7 @@ async def close_position_endpoint(request: dict):
         price_int = Calculator.scale_to_int(close_price, price_decimals)
         
         # Generate unique order index
-        import time as time_module
-        client_order_index = int(time_module.time() * 1000)
+        client_order_index = next_client_order_index()
         
         print(f"🔄 Placing close order:")
         print(f"   Type: {'SELL' if is_ask else 'BUY'} (reduce_only)")
@@ -854,7 +871,9 @@ async def close_position_endpoint(request: dict):
                     pnl_percent = ((current_price - avg_entry_price) / avg_entry_price) * 100
                 else:
                     pnl_percent = ((avg_entry_price - current_price) / avg_entry_price) * 100
-            
+
+            _ledger.apply_close('lighter', symbol, close_percentage / 100.0)
+
             return {
                 "success": True,
                 "tx_hash": response.tx_hash,
@@ -1033,59 +1052,46 @@ async def get_supported_markets():
     
     Returns: List of supported pairs với market_id và category
     """
-    import json
-    from pathlib import Path
+    registry = get_market_registry()
     
-    # Load từ lighter_markets.json nếu có
-    markets_file = Path(__file__).parent.parent / 'lighter_markets.json'
+    # Group by category
+    categories = {
+        'major': [],
+        'defi': [],
+        'layer1_2': [],
+        'meme': [],
+        'other': []
+    }
     
-    if markets_file.exists():
-        with open(markets_file, 'r') as f:
-            markets_data = json.load(f)
-        
-        # Group by category
-        categories = {
-            'major': [],
-            'defi': [],
-            'layer1_2': [],
-            'meme': [],
-            'other': []
+    for m in registry.all_markets():
+        symbol = m['symbol']
+        market_info = {
+            'symbol': symbol,
+            'market_id': m['market_id'],
+            'pair': m['pair'],
+            'size_decimals': m['size_decimals'],
+            'price_decimals': m['price_decimals'],
+            'min_base_amount': m['min_base_amount'],
         }
         
-        for m in markets_data:
-            symbol = m['symbol']
-            market_info = {
-                'symbol': symbol,
-                'market_id': m['market_id'],
-                'price': m['mid'],
-                'pair': f"{symbol}-USDT"
-            }
-            
-            # Categorize
-            if symbol in ['BTC', 'SOL', 'BNB']:
-                categories['major'].append(market_info)
-            elif symbol in ['AAVE', 'UNI', 'LINK', 'GMX', 'LTC', 'BCH', 'CRV', 'LDO', 'DYDX', 'ONDO', 'PENDLE']:
-                categories['defi'].append(market_info)
-            elif symbol in ['AVAX', 'ARB', 'OP', 'DOT', 'APT', 'SUI', 'NEAR', 'SEI', 'TIA', 'MNT', 'BERA']:
-                categories['layer1_2'].append(market_info)
-            elif symbol in ['DOGE', 'WIF', 'TRUMP', '1000PEPE', '1000SHIB', '1000BONK', '1000FLOKI', 'POPCAT', 'FARTCOIN']:
-                categories['meme'].append(market_info)
-            else:
-                categories['other'].append(market_info)
-        
-        return {
-            "total": len(markets_data),
-            "categories": categories,
-            "note": "ETH-USDT is NOT available on Lighter DEX"
-        }
-    else:
-        # Fallback to hardcoded list
-        return {
-            "total": 66,
-            "note": "Run get_all_markets.py to generate full list",
-            "major": ["BTC", "SOL", "BNB"],
-            "eth_available": False
-        }
+        # Categorize
+        if symbol in ['BTC', 'SOL', 'BNB']:
+            categories['major'].append(market_info)
+        elif symbol in ['AAVE', 'UNI', 'LINK', 'GMX', 'LTC', 'BCH', 'CRV', 'LDO', 'DYDX', 'ONDO', 'PENDLE']:
+            categories['defi'].append(market_info)
+        elif symbol in ['AVAX', 'ARB', 'OP', 'DOT', 'APT', 'SUI', 'NEAR', 'SEI', 'TIA', 'MNT', 'BERA']:
+            categories['layer1_2'].append(market_info)
+        elif symbol in ['DOGE', 'WIF', 'TRUMP', '1000PEPE', '1000SHIB', '1000BONK', '1000FLOKI', 'POPCAT', 'FARTCOIN']:
+            categories['meme'].append(market_info)
+        else:
+            categories['other'].append(market_info)
+    
+    return {
+        "total": len(registry),
+        "source": registry.source,
+        "categories": categories,
+        "eth_available": "ETH" in registry
+    }
 
 
 if __name__ == "__main__":
@@ -0,0 +1,203 @@
+"""
+LighterAccountStream - WS account stream giữ LighterAccountMirror + OpenOrderBook của 1 account
+
+Channel (1 connection):
+    - account_all/{account_index}: positions (delta theo market) -> mirror.apply_positions
+    - user_stats/{account_index}: collateral / available_balance / portfolio_value -> mirror.apply_stats
+    - account_all_orders/{account_index} (cần auth token): order thay đổi -> OpenOrderBook.apply_exchange_order
+Seed bằng account_api.account (REST) ngay sau khi connect, resync mỗi LIGHTER_ACCOUNT_STREAM_RESYNC giây.
+Positions / stats đến trong lúc chờ snapshot được áp lại sau load_account (snapshot có thể cũ hơn).
+Mất kết nối -> mirror.live = False (reader quay về REST) rồi reconnect (backoff tối đa 30s).
+
+ENV:
+    - LIGHTER_WS_URL (default: wss://<host của LighterClient>/stream)
+    - LIGHTER_ACCOUNT_STREAM_RESYNC (default: 300 giây)
+"""
+
+import asyncio
+import json
+import os
+import time
+from typing import Callable, List, Optional
+
+import websockets
+
+from perpsdex.lighter.utils.account_mirror import get_account_mirror
+from perpsdex.lighter.utils.open_orders import get_open_order_book
+
+RECONNECT_DELAY_MAX = 30.0
+
+
+class LighterAccountStream:
+    """
+    Input:
+        - client: LighterClient đã connect (stream giữ client riêng, đóng khi stop)
+        - account_index
+
+    Methods:
+        - start() / stop()
+        - live: Đã connect + seed xong
+        - add_listener(callback): callback(order) cho mỗi order từ account_all_orders
+        - status()
+    """
+
+    def __init__(self, client, account_index: int):
+        self.client = client
+        self.account_index = int(account_index)
+        default_url = client.url.replace('https://', 'wss://').replace('http://', 'ws://').rstrip('/') + '/stream'
+        self.ws_url = os.getenv('LIGHTER_WS_URL', default_url)
+        self.resync_interval = float(os.getenv('LIGHTER_ACCOUNT_STREAM_RESYNC', 300))
+        self.mirror = get_account_mirror(self.account_index)
+        self.book = get_open_order_book(self.account_index)
+
+        self.events = 0
+        self.reconnects = 0
+        self.last_event_at: Optional[float] = None
+        self.error: Optional[str] = None
+        self._listeners: List[Callable] = []
+        self._task: Optional[asyncio.Task] = None
+        # != None trong lúc resync: (channel, message) positions / stats cần áp lại lên snapshot
+        self._replay: Optional[List[dict]] = None
+
+    @property
+    def live(self) -> bool:
+        return self.mirror.live
+
+    def add_listener(self, callback: Callable):
+        self._listeners.append(callback)
+
+    # ------------------------------------------------------------------ seed (REST)
+
+    async def resync(self):
+        self._replay = []
+        try:
+            response = await self.client.get_account_api().account(by='index', value=str(self.account_index))
+            if not response or not response.accounts:
+                raise RuntimeError('không lấy được account')
+            self.mirror.load_account(response.accounts[0])
+            for channel, message in self._replay:
+                self._apply(channel, message)
+        finally:
+            self._replay = None
+
+    async def _periodic_resync(self):
+        while True:
+            await asyncio.sleep(self.resync_interval)
+            await self.resync()
+
+    # ------------------------------------------------------------------ events
+
+    def _apply_orders(self, payload: dict):
+        for orders in (payload or {}).values():
+            for order in orders or []:
+                self.book.apply_exchange_order(order)
+                for callback in self._listeners:
+                    try:
+                        callback(order)
+                    except Exception as e:
+                        print(f"⚠️  [Lighter Stream] listener lỗi: {e}")
+
+    def _handle(self, message: dict):
+        kind = message.get('type') or ''
+        channel = kind.split('/', 1)[1] if '/' in kind else None
+        if channel is None:
+            return
+        self.events += 1
+        self.last_event_at = time.time()
+        if channel == 'account_all_orders':
+            self._apply_orders(message.get('orders'))
+            return
+        self._apply(channel, message)
+        if self._replay is not None:
+            self._replay.append((channel, message))
+
+    def _apply(self, channel: str, message: dict):
+        if channel == 'account_all':
+            if 'positions' in message:
+                self.mirror.apply_positions(message['positions'])
+        elif channel == 'user_stats':
+            self.mirror.apply_stats(message.get('stats') or {})
+
+    # ------------------------------------------------------------------ connection
+
+    async def _auth_token(self) -> str:
+        auth, error = await self.client.get_signer_client().create_auth_token(self.client.api_key_index)
+        if error:
+            raise RuntimeError(f"auth token: {error}")
+        return auth
+
+    async def _session(self):
+        async with websockets.connect(self.ws_url, ping_interval=20) as ws:
+            for channel in ('account_all', 'user_stats'):
+                await ws.send(json.dumps({'type': 'subscribe', 'channel': f"{channel}/{self.account_index}"}))
+            await ws.send(json.dumps({
+                'type': 'subscribe',
+                'channel': f"account_all_orders/{self.account_index}",
+                'auth': await self._auth_token(),
+            }))
+            await self.resync()
+            self.mirror.live = True
+            print(f"📡 [Lighter Stream] Connected (account {self.account_index}, {len(self.mirror.positions)} positions)")
+            resync_task = asyncio.create_task(self._periodic_resync(), name='lighter-account-resync')
+            try:
+                async for raw in ws:
+                    message = json.loads(raw)
+                    if message.get('type') == 'ping':
+                        await ws.send(json.dumps({'type': 'pong'}))
+                    elif message.get('type') == 'error' or 'error' in message:
+                        raise RuntimeError(f"ws error: {message.get('error') or message}")
+                    else:
+                        self._handle(message)
+                    if resync_task.done() and resync_task.exception() is not None:
+                        raise resync_task.exception()
+            finally:
+                resync_task.cancel()
+                self.mirror.live = False
+
+    async def _run(self):
+        delay = 1.0
+        while True:
+            try:
+                await self._session()
+                self.error = 'connection closed'
+                delay = 1.0
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                self.error = str(e)
+                print(f"⚠️  [Lighter Stream] {self.error}, reconnect sau {delay:.0f}s")
+            self.reconnects += 1
+            await asyncio.sleep(delay)
+            delay = min(delay * 2, RECONNECT_DELAY_MAX)
+
+    def start(self):
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run(), name='lighter-account-stream')
+
+    async def stop(self):
+        if self._task is not None and not self._task.done():
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+        self.mirror.live = False
+        try:
+            await self.client.close()
+        except Exception:
+            pass
+
+    @property
+    def running(self) -> bool:
+        return self._task is not None and not self._task.done()
+
+    def status(self) -> dict:
+        return dict(
+            self.mirror.to_dict(),
+            running=self.running,
+            open_orders=len(self.book),
+            events=self.events,
+            reconnects=self.reconnects,
+            last_event_at=self.last_event_at,
+            error=self.error,
+        )
@@ -3,9 +3,11 @@ LighterClient - Quản lý connection và API keys
 """
 
 import os
-from lighter import SignerClient, OrderApi, AccountApi
+from lighter import SignerClient, OrderApi, AccountApi, ApiClient, Configuration
 from lighter.signer_client import create_api_key as generate_api_key
 
+from perpsdex.lighter.utils.signer_worker import create_signer_client
+
 
 class LighterClient:
     """
@@ -20,18 +22,20 @@ class LighterClient:
         - l1_private_key: L1 private key để auto-fix (optional)
     
     Output:
-        - signer_client: SignerClient instance
+        - signer_client: SignerClient (chạy trên signer thread, xem utils/signer_worker.py)
         - order_api: OrderApi instance
         - account_api: AccountApi instance
         - keys_mismatch: Boolean - có lỗi key không
     """
     
+    DEFAULT_URL = "https://mainnet.zklighter.elliot.ai"
+    
     def __init__(
         self,
         private_key: str,
         api_key_index: int = 0,
         account_index: int = 0,
-        url: str = "https://mainnet.zklighter.elliot.ai",
+        url: str = DEFAULT_URL,
         auto_fix_keys: bool = False,
         l1_private_key: str = None
     ):
@@ -44,6 +48,7 @@ class LighterClient:
         
         # Client instances
         self.signer_client = None
+        self.api_client = None
         self.order_api = None
         self.account_api = None
         self.keys_mismatch = False
@@ -62,20 +67,22 @@ class LighterClient:
         try:
             print("\n🔗 Đang kết nối đến Lighter DEX...")
             
-            # Create SignerClient
-            self.signer_client = SignerClient(
+            # Create SignerClient trên signer thread (ký tx không chặn event loop chính)
+            self.signer_client = await create_signer_client(
+                SignerClient,
                 url=self.url,
                 private_key=self.private_key,
                 api_key_index=self.api_key_index,
                 account_index=self.account_index
             )
             
-            # Create API clients
-            self.order_api = OrderApi(self.signer_client.api_client)
-            self.account_api = AccountApi(self.signer_client.api_client)
+            # Create API clients (ApiClient riêng trên loop chính, signer giữ session của nó)
+            self.api_client = ApiClient(configuration=Configuration(host=self.url))
+            self.order_api = OrderApi(self.api_client)
+            self.account_api = AccountApi(self.api_client)
             
             # Check key mismatch
-            client_check = self.signer_client.check_client()
+            client_check = await self.signer_client.call_sync(self.signer_client.check_client)
             if client_check:
                 print(f"⚠️  Warning: {client_check}")
                 self.keys_mismatch = True
@@ -136,10 +143,10 @@ class LighterClient:
             
             # Update local client
             self.signer_client.api_key_dict[self.api_key_index] = new_priv
-            self.signer_client.create_client(self.api_key_index)
+            await self.signer_client.call_sync(self.signer_client.create_client, self.api_key_index)
             
             # Recheck
-            again = self.signer_client.check_client()
+            again = await self.signer_client.call_sync(self.signer_client.check_client)
             if again:
                 return {'success': False, 'error': f'Still mismatch: {again}'}
             
@@ -152,6 +159,8 @@ class LighterClient:
         """Đóng kết nối"""
         if self.signer_client:
             await self.signer_client.close()
+        if self.api_client:
+            await self.api_client.close()
         print("🔌 Đã đóng kết nối")
     
     def get_signer_client(self):
@@ -2,6 +2,23 @@
 MarketData - Lấy dữ liệu thị trường
 """
 
+from perpsdex.common.deadline import hedged_read
+from perpsdex.lighter.utils.market_registry import get_market_registry
+from perpsdex.lighter.utils.depth_book import get_depth_book
+
+# Số level mỗi side lấy về trong 1 lần gọi order_book_orders (dùng luôn cho DepthBook)
+DEPTH_SNAPSHOT_LEVELS = 20
+
+
+def _apply_order_book_snapshot(market_id: int, order_book_data):
+    """Đẩy snapshot order_book_orders vào DepthBook của market"""
+    book = get_depth_book(market_id)
+    book.apply_snapshot(
+        [(float(o.price), float(o.remaining_base_amount)) for o in order_book_data.bids],
+        [(float(o.price), float(o.remaining_base_amount)) for o in order_book_data.asks],
+    )
+    return book
+
 
 class MarketData:
     """
@@ -13,7 +30,7 @@ class MarketData:
     
     Methods:
         - get_price(market_id, symbol): Lấy giá từ order book
-        - get_order_book(market_id, limit): Lấy order book đầy đủ
+        - get_order_book(market_id, limit): Lấy order book đầy đủ (cập nhật DepthBook)
         - get_market_metadata(market_id): Lấy metadata (decimals, min_amount)
         - get_account_balance(account_index): Lấy balance
         - get_positions(account_index): Lấy positions
@@ -44,10 +61,14 @@ class MarketData:
             symbol_display = symbol or f"Market {market_id}"
             print(f"\n📈 Đang lấy giá {symbol_display}...")
             
-            # Lấy order book
-            order_book_data = await self.order_api.order_book_orders(market_id=market_id, limit=5)
+            # Lấy order book (đủ sâu để DepthBook tính giá limit cho lệnh kế tiếp, không cần gọi thêm)
+            order_book_data = await hedged_read(
+                "lighter.order_book_orders",
+                lambda: self.order_api.order_book_orders(market_id=market_id, limit=DEPTH_SNAPSHOT_LEVELS),
+            )
             
             if order_book_data and order_book_data.bids and order_book_data.asks:
+                _apply_order_book_snapshot(market_id, order_book_data)
                 best_bid = float(order_book_data.bids[0].price)
                 best_ask = float(order_book_data.asks[0].price)
                 mid_price = (best_bid + best_ask) / 2
@@ -88,19 +109,25 @@ class MarketData:
         Output:
             dict: {
                 'success': bool,
-                'bids': list,
-                'asks': list,
+                'bids': [(price, size), ...],  # giá giảm dần
+                'asks': [(price, size), ...],  # giá tăng dần
+                'book': DepthBook,
                 'error': str (nếu có)
             }
         """
         try:
-            order_book_data = await self.order_api.order_book_orders(market_id=market_id, limit=limit)
+            order_book_data = await hedged_read(
+                "lighter.order_book_orders",
+                lambda: self.order_api.order_book_orders(market_id=market_id, limit=limit),
+            )
             
             if order_book_data:
+                book = _apply_order_book_snapshot(market_id, order_book_data)
                 return {
                     'success': True,
-                    'bids': order_book_data.bids,
-                    'asks': order_book_data.asks
+                    'bids': book.bids.levels(limit),
+                    'asks': book.asks.levels(limit),
+                    'book': book
                 }
             else:
                 return {
@@ -130,11 +157,22 @@ class MarketData:
                 'error': str (nếu có)
             }
         """
+        # Precision đã có trong MarketRegistry -> không cần gọi REST
+        cached = get_market_registry().get_precision(market_id)
+        if cached is not None:
+            return cached
+        
         try:
-            details = await self.order_api.order_book_details(market_id=market_id)
+            details = await hedged_read(
+                "lighter.order_book_details",
+                lambda: self.order_api.order_book_details(market_id=market_id),
+            )
             
             if details and details.order_book_details:
                 ob = details.order_book_details[0]
+                get_market_registry().update_precision(
+                    market_id, ob.size_decimals, ob.price_decimals, ob.min_base_amount
+                )
                 return {
                     'success': True,
                     'size_decimals': ob.size_decimals,
@@ -192,7 +230,10 @@ class MarketData:
         try:
             print("\n💰 Đang lấy account balance...")
             
-            accounts_data = await self.account_api.account(by='index', value=str(account_index))
+            accounts_data = await hedged_read(
+                "lighter.account",
+                lambda: self.account_api.account(by='index', value=str(account_index)),
+            )
             
             if accounts_data and accounts_data.accounts and len(accounts_data.accounts) > 0:
                 account = accounts_data.accounts[0]
@@ -243,7 +284,10 @@ class MarketData:
         try:
             print("\n📈 Đang kiểm tra positions...")
             
-            accounts_data = await self.account_api.account(by='index', value=str(account_index))
+            accounts_data = await hedged_read(
+                "lighter.account",
+                lambda: self.account_api.account(by='index', value=str(account_index)),
+            )
             
             if accounts_data and accounts_data.accounts:
                 account = accounts_data.accounts[0]
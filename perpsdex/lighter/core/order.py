@@ -2,13 +2,19 @@
 OrderExecutor - Đặt lệnh trên Lighter
 """
 
-import time
+import asyncio
 import sys
 import os
 
 # Fix import path
 sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 from utils.calculator import Calculator
+from perpsdex.lighter.utils.market_registry import get_market_registry
+from perpsdex.lighter.utils.depth_book import get_depth_book
+from perpsdex.lighter.utils.open_orders import get_open_order_book
+from perpsdex.common.ladder import calculate_ladder_levels
+from perpsdex.common.leverage import CROSS, ISOLATED, get_leverage_cache
+from perpsdex.common.order_ids import get_order_index_allocator, next_client_order_index
 
 
 class OrderExecutor:
@@ -21,8 +27,19 @@ class OrderExecutor:
     
     Methods:
         - place_order(...): Đặt lệnh với đầy đủ parameters
+        - place_limit_order(...): Đặt 1 lệnh LIMIT
+        - ensure_leverage(...): Set leverage / margin mode của market (chỉ khi khác cache)
+        - build_ladder(...) / submit_ladder(...): Grid / ladder LIMIT, gửi theo batch tx
     """
     
+    # Số tx tối đa trong 1 sendTxBatch
+    MAX_BATCH_SIZE = 50
+    
+    # DepthBook cũ hơn ngưỡng này thì không dùng để tính giá limit
+    DEPTH_MAX_AGE_SECONDS = 2.0
+    # Khoảng đệm trên worst price (book có thể đổi giữa lúc snapshot và lúc khớp)
+    DEPTH_LIMIT_BUFFER_PERCENT = 0.05
+    
     def __init__(self, signer_client, order_api):
         self.signer_client = signer_client
         self.order_api = order_api
@@ -36,6 +53,7 @@ class OrderExecutor:
         symbol: str = None,
         leverage: float = 1.0,
         max_slippage_percent: float | None = None,
+        margin_mode: str | None = None,
     ) -> dict:
         """
         Đặt lệnh LONG hoặc SHORT
@@ -46,7 +64,8 @@ class OrderExecutor:
             - position_size_usd: Kích thước vị thế (USD)
             - market_id: ID của market
             - symbol: Tên symbol để hiển thị (optional)
-            - leverage: Đòn bẩy (optional, default: 1)
+            - leverage: Đòn bẩy (optional, default: 1), set qua ensure_leverage trước khi đặt lệnh
+            - margin_mode: 'cross' | 'isolated' | None (giữ mode đã set, mặc định cross)
         
         Output:
             dict: {
@@ -76,6 +95,10 @@ class OrderExecutor:
             is_long = side == 'long'
             symbol_display = symbol or f"Market {market_id}"
             
+            leverage_result = await self.ensure_leverage(market_id, leverage, margin_mode)
+            if not leverage_result['success']:
+                return leverage_result
+            
             # Tính position size
             position_size = Calculator.calculate_position_size(position_size_usd, entry_price)
             
@@ -108,11 +131,11 @@ class OrderExecutor:
             print(f"🔧 Scaled: base_amount_int={base_amount_int}, price_int={price_int}")
             
             # Prepare order parameters
-            client_order_index = int(time.time() * 1000)
+            client_order_index = next_client_order_index()
             is_ask = 0 if is_long else 1  # 0 = buy/LONG, 1 = sell/SHORT
             
             # 🎯 USE AGGRESSIVE LIMIT ORDER for instant fill
-            # Set limit price with configurable slippage (default 3%)
+            # Trần giá: max_slippage_percent (default 3%) so với entry_price
             slippage = max_slippage_percent if max_slippage_percent is not None else 3.0
             slippage_factor = 1 + (slippage / 100.0)
 
@@ -123,6 +146,20 @@ class OrderExecutor:
                 # SHORT (SELL): Set limit lower than market
                 limit_price = entry_price / slippage_factor
             
+            # Nếu DepthBook còn mới (snapshot từ get_price) -> limit = worst price cần để khớp đủ size,
+            # chỉ nới thêm DEPTH_LIMIT_BUFFER_PERCENT, không vượt trần slippage
+            depth_fill = None
+            book = get_depth_book(market_id)
+            if book.is_fresh(self.DEPTH_MAX_AGE_SECONDS):
+                depth_fill = book.side_for(is_long).fill_for_size(base_amount)
+            
+            if depth_fill:
+                buffer_factor = 1 + self.DEPTH_LIMIT_BUFFER_PERCENT / 100.0
+                if is_long:
+                    limit_price = min(depth_fill['worst_price'] * buffer_factor, limit_price)
+                else:
+                    limit_price = max(depth_fill['worst_price'] / buffer_factor, limit_price)
+            
             order_type = self.signer_client.ORDER_TYPE_LIMIT
             time_in_force = self.signer_client.ORDER_TIME_IN_FORCE_GOOD_TILL_TIME  # GTC - most compatible
             reduce_only = False
@@ -132,10 +169,14 @@ class OrderExecutor:
             # Scale limit_price to int
             limit_price_int = Calculator.scale_to_int(limit_price, price_decimals)
             
-            print(f"🎯 AGGRESSIVE LIMIT ORDER (3% slippage):")
-            direction_label = f"+{slippage}%" if is_long else f"-{slippage}%"
+            limit_offset = (limit_price / entry_price - 1) * 100
+            if depth_fill:
+                print(f"🎯 AGGRESSIVE LIMIT ORDER (depth: {depth_fill['levels']} levels, trần {slippage}%):")
+                print(f"   Expected VWAP: ${depth_fill['vwap']:,.6f}")
+            else:
+                print(f"🎯 AGGRESSIVE LIMIT ORDER ({slippage}% slippage):")
             print(f"   Market Price: ${entry_price:,.6f}")
-            print(f"   Limit Price: ${limit_price:,.6f} ({direction_label})")
+            print(f"   Limit Price: ${limit_price:,.6f} ({limit_offset:+.3f}%)")
             print(f"   Expected: Instant fill at best available price")
             
             # Create order
@@ -168,6 +209,8 @@ class OrderExecutor:
                     'order_id': client_order_index,  # Return the client_order_index we created
                     'tx_hash': send_resp.tx_hash,
                     'entry_price': entry_price,
+                    'limit_price': limit_price,
+                    'expected_fill_price': depth_fill['vwap'] if depth_fill else None,
                     'position_size': base_amount,
                     'side': side,
                 }
@@ -183,6 +226,7 @@ class OrderExecutor:
                     err_msg = "Unknown error - order may not have been executed"
                     
                 print(f"❌ Đặt lệnh thất bại: {err_msg}")
+                self._invalidate_leverage(market_id)
                 return {'success': False, 'error': err_msg}
                 
         except Exception as e:
@@ -196,7 +240,8 @@ class OrderExecutor:
         position_size_usd: float,
         market_id: int,
         symbol: str = None,
-        leverage: float = 1.0
+        leverage: float = 1.0,
+        margin_mode: str | None = None,
     ) -> dict:
         """
         Đặt lệnh LIMIT LONG hoặc SHORT
@@ -207,7 +252,8 @@ class OrderExecutor:
             - position_size_usd: Kích thước vị thế (USD)
             - market_id: ID của market
             - symbol: Tên symbol để hiển thị (optional)
-            - leverage: Đòn bẩy (optional, default: 1)
+            - leverage: Đòn bẩy (optional, default: 1), set qua ensure_leverage trước khi đặt lệnh
+            - margin_mode: 'cross' | 'isolated' | None
         
         Output:
             dict: {
@@ -218,6 +264,10 @@ class OrderExecutor:
             }
         """
         try:
+            leverage_result = await self.ensure_leverage(market_id, leverage, margin_mode)
+            if not leverage_result['success']:
+                return leverage_result
+            
             # Get market metadata (dùng cùng helper như MARKET order)
             metadata_result = await self._get_market_metadata(market_id)
             if not metadata_result['success']:
@@ -242,7 +292,7 @@ class OrderExecutor:
             is_ask = 1 if side.lower() == 'short' else 0
             
             # Generate unique order index
-            client_order_index = int(time.time() * 1000)
+            client_order_index = next_client_order_index()
             
             # Place LIMIT order
             order, response, error = await self.signer_client.create_order(
@@ -259,11 +309,15 @@ class OrderExecutor:
             )
             
             if error is not None or response is None:
+                self._invalidate_leverage(market_id)
                 return {
                     'success': False,
                     'error': f"Order failed: {error}"
                 }
             
+            self._open_orders().record_placement(
+                market_id, client_order_index, side.lower(), limit_price, position_size, tx_hash=response.tx_hash
+            )
             print(f"✅ LIMIT {side.upper()} order placed: {response.tx_hash}")
             print(f"📊 Order Details:")
             print(f"   💰 Position Size: {position_size} {symbol or 'tokens'}")
@@ -285,17 +339,279 @@ class OrderExecutor:
                 'error': f"Exception in place_limit_order: {str(e)}"
             }
     
+    async def ensure_leverage(self, market_id: int, leverage: float, margin_mode: str | None = None) -> dict:
+        """
+        Set leverage / margin mode cho market (tx update_leverage) nếu khác giá trị đã cache
+        
+        Input:
+            - leverage: Đòn bẩy (làm tròn về số nguyên >= 1)
+            - margin_mode: 'cross' | 'isolated' | None (giữ mode đã set, chưa set thì cross)
+        
+        Output:
+            dict: {'success', 'cached', 'leverage', 'margin_mode', 'error' (nếu có)}
+        """
+        signer = self.signer_client
+        leverage = max(int(round(leverage or 1)), 1)
+        
+        async def apply(previous):
+            mode = margin_mode or (previous or {}).get('margin_mode') or CROSS
+            mode_value = signer.ISOLATED_MARGIN_MODE if mode == ISOLATED else signer.CROSS_MARGIN_MODE
+            _, response, err = await signer.update_leverage(market_id, mode_value, leverage)
+            if err is not None or response is None:
+                return {'success': False, 'error': str(err) if err else 'Unknown error'}
+            print(f"⚙️  Leverage market {market_id}: {leverage}x {mode}")
+            return {'success': True, 'margin_mode': mode}
+        
+        result = await get_leverage_cache().ensure(
+            'lighter', signer.account_index, market_id, leverage, margin_mode, apply
+        )
+        if not result['success']:
+            print(f"❌ Set leverage {leverage}x market {market_id} thất bại: {result['error']}")
+            result['error'] = f"Không set được leverage {leverage}x: {result['error']}"
+        return result
+    
+    def _invalidate_leverage(self, market_id: int):
+        """Lệnh bị từ chối -> leverage trên sàn có thể khác cache, lệnh sau set lại"""
+        get_leverage_cache().invalidate('lighter', self.signer_client.account_index, market_id)
+    
+    async def build_ladder(
+        self,
+        side: str,
+        price_from: float,
+        price_to: float,
+        levels: int,
+        total_usd: float,
+        market_id: int,
+        distribution='flat',
+        geometric_ratio: float = 1.5
+    ) -> dict:
+        """
+        Tính tất cả level của ladder (metadata chỉ lấy 1 lần)
+        
+        Input:
+            - side: 'long' hoặc 'short'
+            - price_from, price_to: Khoảng giá
+            - levels: Số level
+            - total_usd: Tổng USD của ladder
+            - market_id: ID của market
+            - distribution: 'flat' | 'linear' | 'geometric' | list weights
+        
+        Output:
+            dict: Kết quả calculate_ladder_levels (price_int / size_int theo decimals của market)
+        """
+        metadata_result = await self._get_market_metadata(market_id)
+        if not metadata_result['success']:
+            return {
+                'success': False,
+                'error': metadata_result.get('error', 'Failed to get market metadata'),
+            }
+        
+        return calculate_ladder_levels(
+            side=side,
+            price_from=price_from,
+            price_to=price_to,
+            levels=levels,
+            total_usd=total_usd,
+            price_step=10 ** -metadata_result['price_decimals'],
+            size_step=10 ** -metadata_result['size_decimals'],
+            min_size=metadata_result['min_base_amount'],
+            distribution=distribution,
+            geometric_ratio=geometric_ratio,
+        )
+    
+    async def submit_ladder(
+        self,
+        side: str,
+        levels: list,
+        market_id: int,
+        symbol: str = None,
+        batch_size: int = MAX_BATCH_SIZE,
+        max_concurrency: int = 2,
+        client_order_index_start: int = None
+    ) -> dict:
+        """
+        Gửi các level của ladder theo batch tx (sendTxBatch), tối đa max_concurrency batch song song
+        
+        Input:
+            - side: 'long' hoặc 'short'
+            - levels: List level từ build_ladder (level có skip=True sẽ bỏ qua)
+            - market_id: ID của market
+            - symbol: Tên symbol để hiển thị (optional)
+            - batch_size: Số lệnh mỗi batch (<= MAX_BATCH_SIZE)
+            - max_concurrency: Số batch gửi song song
+            - client_order_index_start: client_order_index của level 0, các level sau = start + level
+              (default: cấp từ OrderIndexAllocator, không trùng với lệnh khác đang gửi song song)
+        
+        Output:
+            dict: {
+                'success': bool,           # True nếu ít nhất 1 level được submit
+                'levels': list,            # Mỗi level thêm 'status', 'client_order_index', 'tx_hash', 'error'
+                'submitted': int, 'failed': int, 'skipped': int, 'batches': int
+            }
+        """
+        is_ask = 1 if side.lower() == 'short' else 0
+        batch_size = max(1, min(batch_size, self.MAX_BATCH_SIZE))
+        
+        active = []
+        for level in levels:
+            if level.get('skip'):
+                level['status'] = 'skipped'
+                continue
+            active.append(level)
+        if client_order_index_start:
+            for level in active:
+                level['client_order_index'] = client_order_index_start + level['level']
+        else:
+            for level, index in zip(active, get_order_index_allocator().reserve(len(active))):
+                level['client_order_index'] = index
+        
+        chunks = [active[i:i + batch_size] for i in range(0, len(active), batch_size)]
+        semaphore = asyncio.Semaphore(max(1, max_concurrency))
+        
+        async def _submit(chunk):
+            async with semaphore:
+                await self._send_order_batch(market_id, is_ask, chunk)
+        
+        print(f"🪜 Ladder {side.upper()} {symbol or market_id}: {len(active)} lệnh / {len(chunks)} batch")
+        await asyncio.gather(*(_submit(chunk) for chunk in chunks))
+
+        open_orders = self._open_orders()
+        for level in active:
+            if level.get('status') == 'submitted':
+                open_orders.record_placement(
+                    market_id, level['client_order_index'], side.lower(), level['price'], level['size'],
+                    tx_hash=level.get('tx_hash'),
+                )
+        
+        submitted = sum(1 for l in levels if l.get('status') == 'submitted')
+        failed = sum(1 for l in levels if l.get('status') == 'failed')
+        skipped = sum(1 for l in levels if l.get('status') == 'skipped')
+        print(f"✅ Ladder: {submitted} submitted, {failed} failed, {skipped} skipped")
+        
+        return {
+            'success': submitted > 0,
+            'levels': levels,
+            'submitted': submitted,
+            'failed': failed,
+            'skipped': skipped,
+            'batches': len(chunks),
+        }
+    
+    async def _send_order_batch(self, market_id: int, is_ask: int, chunk: list):
+        """
+        Helper: Ký tất cả lệnh LIMIT trong chunk với nonce liên tiếp rồi gửi 1 sendTxBatch
+        
+        Kết quả ghi thẳng vào từng level ('status', 'tx_hash', 'error').
+        SDK không có nonce_manager / send_tx_batch -> fallback create_order từng lệnh.
+        """
+        signer = self.signer_client
+        nonce_manager = getattr(signer, 'nonce_manager', None)
+        
+        if nonce_manager is None or not hasattr(signer, 'send_tx_batch'):
+            for level in chunk:
+                _, response, error = await signer.create_order(
+                    market_id,
+                    level['client_order_index'],
+                    level['size_int'],
+                    level['price_int'],
+                    is_ask,
+                    signer.ORDER_TYPE_LIMIT,
+                    signer.ORDER_TIME_IN_FORCE_GOOD_TILL_TIME,
+                    False,
+                    signer.NIL_TRIGGER_PRICE,
+                    signer.DEFAULT_28_DAY_ORDER_EXPIRY,
+                )
+                if error is not None or response is None:
+                    level['status'], level['error'] = 'failed', f"Order failed: {error}"
+                else:
+                    level['status'], level['tx_hash'] = 'submitted', response.tx_hash
+            return
+        
+        run_on_signer = getattr(signer, 'run_on_signer', None)
+        if run_on_signer is not None:
+            # Nonce lock + ký + gửi batch đều chạy trên signer thread (loop của SignerClient)
+            await run_on_signer(self._sign_and_send_batch, signer.raw, market_id, is_ask, chunk)
+        else:
+            await self._sign_and_send_batch(signer, market_id, is_ask, chunk)
+    
+    async def _sign_and_send_batch(self, signer, market_id: int, is_ask: int, chunk: list):
+        """Helper: Ký chunk với nonce liên tiếp + 1 sendTxBatch (SDK có nonce_manager)"""
+        nonce_manager = signer.nonce_manager
+        
+        # Giữ lock của api key suốt lúc ký + gửi để nonce tới sequencer đúng thứ tự
+        api_key_index = nonce_manager.rotate_key()
+        async with nonce_manager.lock(api_key_index):
+            tx_types, tx_infos, signed_levels = [], [], []
+            
+            for level in chunk:
+                _, nonce = await nonce_manager.async_next_nonce(api_key_index)
+                tx_type, tx_info, _, error = signer.sign_create_order(
+                    market_id,
+                    level['client_order_index'],
+                    level['size_int'],
+                    level['price_int'],
+                    is_ask,
+                    signer.ORDER_TYPE_LIMIT,
+                    signer.ORDER_TIME_IN_FORCE_GOOD_TILL_TIME,
+                    False,
+                    signer.NIL_TRIGGER_PRICE,
+                    signer.DEFAULT_28_DAY_ORDER_EXPIRY,
+                    nonce=nonce,
+                    api_key_index=api_key_index,
+                )
+                if error is not None:
+                    nonce_manager.acknowledge_failure(api_key_index)
+                    level['status'], level['error'] = 'failed', f"Sign failed: {error}"
+                    continue
+                tx_types.append(tx_type)
+                tx_infos.append(tx_info)
+                signed_levels.append(level)
+            
+            if not signed_levels:
+                return
+            
+            try:
+                response = await signer.send_tx_batch(tx_types, tx_infos)
+            except Exception as e:
+                await nonce_manager.async_hard_refresh_nonce(api_key_index)
+                for level in signed_levels:
+                    level['status'], level['error'] = 'failed', f"Batch failed: {e}"
+                return
+            
+            if getattr(response, 'code', 200) != 200:
+                await nonce_manager.async_hard_refresh_nonce(api_key_index)
+                for level in signed_levels:
+                    level['status'], level['error'] = 'failed', f"Batch rejected: {getattr(response, 'message', response)}"
+                return
+            
+            tx_hashes = getattr(response, 'tx_hash', None) or []
+            for i, level in enumerate(signed_levels):
+                level['status'] = 'submitted'
+                level['tx_hash'] = tx_hashes[i] if i < len(tx_hashes) else None
+    
+    def _open_orders(self):
+        """OpenOrderBook của account đang ký lệnh"""
+        return get_open_order_book(self.signer_client.account_index)
+    
     async def _get_market_metadata(self, market_id: int) -> dict:
         """
         Helper: Lấy market metadata
         
         Internal method - không dùng trực tiếp từ bên ngoài
         """
+        # Precision đã có trong MarketRegistry -> không cần gọi REST
+        cached = get_market_registry().get_precision(market_id)
+        if cached is not None:
+            return cached
+        
         try:
             details = await self.order_api.order_book_details(market_id=market_id)
             
             if details and details.order_book_details:
                 ob = details.order_book_details[0]
+                get_market_registry().update_precision(
+                    market_id, ob.size_decimals, ob.price_decimals, ob.min_base_amount
+                )
                 return {
                     'success': True,
                     'size_decimals': ob.size_decimals,
@@ -6,6 +6,8 @@ import asyncio
 import time
 from typing import Optional
 
+from perpsdex.common.order_ids import next_client_order_index
+
 
 class PositionMonitor:
     """
@@ -176,7 +178,7 @@ class PositionMonitor:
             price_int = Calculator.scale_to_int(exit_price, price_decimals)
             
             # Create close order (reverse direction)
-            client_order_index = int(time.time() * 1000)
+            client_order_index = next_client_order_index()
             is_ask = 1 if is_long else 0  # Reverse: LONG -> SELL, SHORT -> BUY
             
             print(f"\n🔄 Closing {side.upper()} position:")
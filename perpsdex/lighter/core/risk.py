@@ -2,13 +2,15 @@
 RiskManager - Quản lý TP/SL orders
 """
 
-import time
 import sys
 import os
 
 # Fix import path
 sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 from utils.calculator import Calculator
+from perpsdex.lighter.utils.market_registry import get_market_registry
+from perpsdex.lighter.utils.open_orders import get_open_order_book
+from perpsdex.common.order_ids import next_client_order_index
 
 
 class RiskManager:
@@ -129,6 +131,17 @@ class RiskManager:
             )
             results.append(sl_result)
             
+            # TP/SL là lệnh reduce-only ngược chiều position
+            open_orders = get_open_order_book(self.signer_client.account_index)
+            close_side = 'short' if is_long else 'long'
+            for result, order_type in ((tp_result, 'take_profit'), (sl_result, 'stop_loss')):
+                if result['success']:
+                    open_orders.record_placement(
+                        market_id, result['client_order_index'], close_side, result['price'], base_amount,
+                        order_type=order_type, reduce_only=True, trigger_price=result['price'],
+                        tx_hash=result['tx_hash'],
+                    )
+            
             tp_success = tp_result['success']
             sl_success = sl_result['success']
             
@@ -159,7 +172,7 @@ class RiskManager:
         Internal method
         """
         try:
-            tp_client_order_index = int(time.time() * 1000) + 1
+            tp_client_order_index = next_client_order_index()
             tp_price_int = Calculator.scale_to_int(tp_price, price_decimals)
             
             # TP order: opposite direction to close position
@@ -188,7 +201,10 @@ class RiskManager:
             
             if tp_err is None and tp_resp:
                 print(f"✅ Take Profit order placed: {tp_resp.tx_hash}")
-                return {'type': 'tp', 'success': True, 'tx_hash': tp_resp.tx_hash}
+                return {
+                    'type': 'tp', 'success': True, 'tx_hash': tp_resp.tx_hash,
+                    'client_order_index': tp_client_order_index, 'price': tp_price,
+                }
             else:
                 print(f"❌ Take Profit order failed: {tp_err}")
                 return {'type': 'tp', 'success': False, 'error': str(tp_err)}
@@ -211,7 +227,7 @@ class RiskManager:
         Internal method
         """
         try:
-            sl_client_order_index = int(time.time() * 1000) + 2
+            sl_client_order_index = next_client_order_index()
             sl_price_int = Calculator.scale_to_int(sl_price, price_decimals)
             
             # SL order: same direction as TP (to close position)
@@ -240,7 +256,10 @@ class RiskManager:
             
             if sl_err is None and sl_resp:
                 print(f"✅ Stop Loss order placed: {sl_resp.tx_hash}")
-                return {'type': 'sl', 'success': True, 'tx_hash': sl_resp.tx_hash}
+                return {
+                    'type': 'sl', 'success': True, 'tx_hash': sl_resp.tx_hash,
+                    'client_order_index': sl_client_order_index, 'price': sl_price,
+                }
             else:
                 print(f"❌ Stop Loss order failed: {sl_err}")
                 
@@ -254,7 +273,7 @@ class RiskManager:
                         price_decimals,
                         sl_is_ask,
                         market_id,
-                        sl_client_order_index + 10
+                        next_client_order_index()
                     )
                     return retry_result
                 
@@ -295,7 +314,10 @@ class RiskManager:
             
             if sl_err2 is None and sl_resp2:
                 print(f"✅ Stop Loss order placed (retry): {sl_resp2.tx_hash}")
-                return {'type': 'sl', 'success': True, 'tx_hash': sl_resp2.tx_hash}
+                return {
+                    'type': 'sl', 'success': True, 'tx_hash': sl_resp2.tx_hash,
+                    'client_order_index': order_index, 'price': retry_sl_price,
+                }
             else:
                 print(f"❌ Stop Loss retry also failed: {sl_err2}")
                 return {'type': 'sl', 'success': False, 'error': str(sl_err2)}
@@ -309,11 +331,19 @@ class RiskManager:
         
         Internal method
         """
+        # Precision đã có trong MarketRegistry -> không cần gọi REST
+        cached = get_market_registry().get_precision(market_id)
+        if cached is not None:
+            return cached
+        
         try:
             details = await self.order_api.order_book_details(market_id=market_id)
             
             if details and details.order_book_details:
                 ob = details.order_book_details[0]
+                get_market_registry().update_precision(
+                    market_id, ob.size_decimals, ob.price_decimals, ob.min_base_amount
+                )
                 return {
                     'success': True,
                     'size_decimals': ob.size_decimals,
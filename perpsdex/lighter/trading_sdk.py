@@ -9,6 +9,7 @@ import json
 from dotenv import load_dotenv
 from lighter import SignerClient, OrderApi, AccountApi
 from lighter.signer_client import create_api_key as generate_api_key
+from perpsdex.common.order_ids import next_client_order_index
 
 load_dotenv()
 
@@ -251,8 +252,7 @@ class LighterTradingBotSDK:
             min_base_amount = float(ob.min_base_amount)
 
             market_index = self.market_id
-            import time
-            client_order_index = int(time.time() * 1000)
+            client_order_index = next_client_order_index()
 
             # Scale theo decimals
             base_amount = max(position_size, min_base_amount)
@@ -378,8 +378,7 @@ class LighterTradingBotSDK:
             results = []
             
             # Place Take Profit order
-            import time
-            tp_client_order_index = int(time.time() * 1000) + 1
+            tp_client_order_index = next_client_order_index()
             tp_price_int = int(round(tp_price * (10 ** price_decimals)))
             
             # TP order: opposite direction to close position
@@ -406,7 +405,7 @@ class LighterTradingBotSDK:
                 results.append({'type': 'tp', 'success': False, 'error': tp_err})
             
             # Place Stop Loss order
-            sl_client_order_index = int(time.time() * 1000) + 2
+            sl_client_order_index = next_client_order_index()
             sl_price_int = int(round(sl_price * (10 ** price_decimals)))
             
             # SL order: same direction as TP (to close position)
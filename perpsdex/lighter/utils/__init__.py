@@ -4,9 +4,12 @@ Lighter Trading Bot - Utility Modules
 
 from .calculator import Calculator
 from .config import ConfigLoader
+from .market_registry import MarketRegistry, get_market_registry
 
 __all__ = [
     'Calculator',
     'ConfigLoader',
+    'MarketRegistry',
+    'get_market_registry',
 ]
 
@@ -0,0 +1,164 @@
+"""
+LighterAccountMirror - Bản sao local (collateral, balance, position) của 1 account Lighter
+
+Parse SDK object / payload WS 1 lần khi nhận (float sẵn, __slots__), đọc không phải getattr / float lại:
+    - load_account(): snapshot từ account_api.account (REST) - seed lúc connect + resync
+    - apply_positions(): payload positions của channel account_all (delta theo market)
+    - apply_stats(): payload channel user_stats (collateral, available_balance, portfolio_value)
+Active orders nằm trong OpenOrderBook (open_orders.py) của cùng account.
+
+live = True khi account stream đang connect và đã seed (xem core/account_stream.py); lúc đó
+positions / balance / close position đọc mirror thay vì gọi account_api.account.
+"""
+
+import time
+from typing import Dict, List, Optional
+
+
+def _float(value, default: float = 0.0) -> float:
+    try:
+        return float(value) if value is not None and value != '' else default
+    except (TypeError, ValueError):
+        return default
+
+
+class LighterPosition:
+    """1 position theo market. size có dấu: > 0 long, < 0 short"""
+
+    __slots__ = (
+        'market_id', 'size', 'entry_price', 'position_value', 'unrealized_pnl',
+        'realized_pnl', 'liquidation_price', 'allocated_margin', 'margin_mode', 'leverage', 'updated_at',
+    )
+
+    def __init__(self, market_id: int, size: float, entry_price: float, position_value: float = 0.0,
+                 unrealized_pnl: float = 0.0, realized_pnl: float = 0.0, liquidation_price: float = 0.0,
+                 allocated_margin: float = 0.0, margin_mode: int = 0, leverage: Optional[float] = None):
+        self.market_id = market_id
+        self.size = size
+        self.entry_price = entry_price
+        self.position_value = position_value
+        self.unrealized_pnl = unrealized_pnl
+        self.realized_pnl = realized_pnl
+        self.liquidation_price = liquidation_price
+        self.allocated_margin = allocated_margin
+        self.margin_mode = margin_mode
+        self.leverage = leverage
+        self.updated_at = time.time()
+
+    @classmethod
+    def parse(cls, raw) -> 'LighterPosition':
+        """lighter.models.AccountPosition hoặc dict cùng field (payload WS)"""
+        get = raw.get if isinstance(raw, dict) else lambda key, default=None: getattr(raw, key, default)
+        sign = -1 if int(get('sign', 1) or 1) < 0 else 1
+        imf = _float(get('initial_margin_fraction'))
+        return cls(
+            market_id=int(get('market_id')),
+            size=sign * abs(_float(get('position'))),
+            entry_price=_float(get('avg_entry_price')),
+            position_value=_float(get('position_value')),
+            unrealized_pnl=_float(get('unrealized_pnl')),
+            realized_pnl=_float(get('realized_pnl')),
+            liquidation_price=_float(get('liquidation_price')),
+            allocated_margin=_float(get('allocated_margin')),
+            margin_mode=int(get('margin_mode', 0) or 0),
+            # initial_margin_fraction theo %: 10.00 -> 10x
+            leverage=round(100.0 / imf, 2) if imf > 0 else None,
+        )
+
+    @property
+    def side(self) -> str:
+        return 'long' if self.size > 0 else 'short'
+
+    def to_dict(self) -> dict:
+        return {slot: getattr(self, slot) for slot in self.__slots__}
+
+
+class LighterAccountMirror:
+    __slots__ = (
+        'account_index', 'collateral', 'available', 'total', 'positions',
+        'live', 'synced_at', 'updated_at', 'version',
+    )
+
+    def __init__(self, account_index: int):
+        self.account_index = account_index
+        self.collateral = 0.0
+        self.available = 0.0
+        self.total = 0.0
+        self.positions: Dict[int, LighterPosition] = {}
+        self.live = False
+        self.synced_at: Optional[float] = None
+        self.updated_at: Optional[float] = None
+        self.version = 0
+
+    def _touch(self):
+        self.updated_at = time.time()
+        self.version += 1
+
+    def load_account(self, account):
+        """DetailedAccount (account_api.account) -> thay toàn bộ balance + positions"""
+        self.collateral = _float(account.collateral)
+        self.available = _float(account.available_balance)
+        self.total = _float(account.total_asset_value)
+        positions = {}
+        for raw in account.positions or []:
+            position = LighterPosition.parse(raw)
+            if position.size != 0:
+                positions[position.market_id] = position
+        self.positions = positions
+        self.synced_at = time.time()
+        self._touch()
+
+    def apply_positions(self, payload: dict):
+        """{market_id: position} - chỉ market có thay đổi, size 0 = đã đóng"""
+        for raw in (payload or {}).values():
+            position = LighterPosition.parse(raw)
+            if position.size == 0:
+                self.positions.pop(position.market_id, None)
+            else:
+                self.positions[position.market_id] = position
+        self._touch()
+
+    def apply_stats(self, stats: dict):
+        if not stats:
+            return
+        self.collateral = _float(stats.get('collateral'), self.collateral)
+        self.available = _float(stats.get('available_balance'), self.available)
+        self.total = _float(stats.get('portfolio_value'), self.total)
+        self._touch()
+
+    def position(self, market_id: int) -> Optional[LighterPosition]:
+        return self.positions.get(int(market_id))
+
+    def open_positions(self) -> List[LighterPosition]:
+        return list(self.positions.values())
+
+    def to_dict(self) -> dict:
+        return {
+            'account_index': self.account_index,
+            'live': self.live,
+            'collateral': self.collateral,
+            'available': self.available,
+            'total': self.total,
+            'positions': len(self.positions),
+            'synced_at': self.synced_at,
+            'updated_at': self.updated_at,
+            'version': self.version,
+        }
+
+
+_mirrors: Dict[int, LighterAccountMirror] = {}
+
+
+def get_account_mirror(account_index: int) -> LighterAccountMirror:
+    """Lấy mirror của account (tạo mới nếu chưa có)"""
+    account_index = int(account_index)
+    mirror = _mirrors.get(account_index)
+    if mirror is None:
+        mirror = _mirrors[account_index] = LighterAccountMirror(account_index)
+    return mirror
+
+
+def get_live_account_mirror(account_index) -> Optional[LighterAccountMirror]:
+    """Mirror nếu account stream đang live, None thì caller gọi REST"""
+    mirror = _mirrors.get(int(account_index or 0))
+    return mirror if mirror is not None and mirror.live else None
@@ -257,4 +257,3 @@ class Calculator:
             return 0
         
         return reward / risk
-
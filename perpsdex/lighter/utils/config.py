@@ -5,6 +5,8 @@ ConfigLoader - Load và parse config từ JSON
 import json
 import os
 
+from perpsdex.lighter.utils.market_registry import get_market_registry
+
 
 class ConfigLoader:
     """
@@ -67,6 +69,7 @@ class ConfigLoader:
         
         # Full list (66 tokens total, NO ETH!)
         # Check lighter_markets.json for complete list
+        # ⚠️ Chỉ giữ lại để tương thích ngược - lookup thực tế dùng MarketRegistry
     }
     
     @staticmethod
@@ -122,7 +125,7 @@ class ConfigLoader:
         """
         pair = config.get('pair', 'BTC-USDT')
         symbol = pair.split('-')[0]
-        market_id = ConfigLoader.PAIR_TO_MARKET_ID.get(pair, 1)
+        market_id = ConfigLoader.get_market_id_for_pair(pair)
         
         return {
             'pair': pair,
@@ -196,19 +199,27 @@ class ConfigLoader:
     @staticmethod
     def get_market_id_for_pair(pair: str) -> int:
         """
-        Lấy market_id từ pair
+        Lấy market_id từ pair (qua MarketRegistry)
         
         Input:
             - pair: Pair string (VD: 'BTC-USDT')
         
         Output:
-            int: Market ID (default: 1 nếu không tìm thấy)
+            int: Market ID
+        
+        Raises:
+            ValueError: Nếu pair không được Lighter hỗ trợ
         
         Example:
-            >>> market_id = ConfigLoader.get_market_id_for_pair('ETH-USDT')
+            >>> market_id = ConfigLoader.get_market_id_for_pair('SOL-USDT')
             2
         """
-        return ConfigLoader.PAIR_TO_MARKET_ID.get(pair, 1)
+        market_id = get_market_registry().get_market_id(pair)
+        if market_id is None:
+            market_id = ConfigLoader.PAIR_TO_MARKET_ID.get(pair)
+        if market_id is None:
+            raise ValueError(f"Lighter không hỗ trợ pair: {pair}")
+        return market_id
     
     @staticmethod
     def add_pair_mapping(pair: str, market_id: int):
@@ -223,5 +234,11 @@ class ConfigLoader:
             >>> ConfigLoader.add_pair_mapping('SOL-USDT', 3)
         """
         ConfigLoader.PAIR_TO_MARKET_ID[pair] = market_id
+        registry = get_market_registry()
+        if registry.get(pair) is None:
+            registry.load_markets(
+                registry.all_markets() + [{'symbol': pair, 'market_id': market_id}],
+                source=registry.source or 'manual'
+            )
         print(f"✅ Added mapping: {pair} -> market_id {market_id}")
 
@@ -0,0 +1,232 @@
+"""
+DepthBook - Order book in-memory theo market, cập nhật incremental (snapshot hoặc delta)
+
+Mỗi side giữ level đã sort theo khoảng cách tới top-of-book + 2 mảng cộng dồn
+(size, notional). Query VWAP cho 1 size / worst price cho 1 notional chỉ cần binary search
+(O(log n)); mảng cộng dồn chỉ được tính lại từ level đầu tiên bị thay đổi.
+"""
+
+import time
+from bisect import bisect_left, bisect_right
+from typing import Dict, Iterable, List, Optional, Tuple
+
+
+class DepthSide:
+    """
+    1 side của book (bids hoặc asks)
+
+    Level được lưu theo key tăng dần = khoảng cách tới top:
+        - asks: key = price
+        - bids: key = -price
+    """
+
+    def __init__(self, is_bid: bool):
+        self.is_bid = is_bid
+        self._keys: List[float] = []
+        self._sizes: List[float] = []
+        self._cum_size: List[float] = []
+        self._cum_notional: List[float] = []
+        self._dirty_from = 0
+
+    def __len__(self) -> int:
+        return len(self._keys)
+
+    def _key(self, price: float) -> float:
+        return -price if self.is_bid else price
+
+    def _price(self, index: int) -> float:
+        key = self._keys[index]
+        return -key if self.is_bid else key
+
+    def replace(self, levels: Iterable[Tuple[float, float]]):
+        """Snapshot: thay toàn bộ level của side"""
+        merged: Dict[float, float] = {}
+        for price, size in levels:
+            if size > 0:
+                merged[self._key(price)] = size
+        self._keys = sorted(merged)
+        self._sizes = [merged[k] for k in self._keys]
+        self._dirty_from = 0
+
+    def update(self, price: float, size: float):
+        """Delta: set size của 1 level (size <= 0 -> xoá level)"""
+        key = self._key(price)
+        index = bisect_left(self._keys, key)
+        exists = index < len(self._keys) and self._keys[index] == key
+
+        if size <= 0:
+            if not exists:
+                return
+            del self._keys[index]
+            del self._sizes[index]
+        elif exists:
+            self._sizes[index] = size
+        else:
+            self._keys.insert(index, key)
+            self._sizes.insert(index, size)
+
+        self._dirty_from = min(self._dirty_from, index)
+
+    def _ensure_cumulative(self):
+        """Tính lại mảng cộng dồn từ level đầu tiên bị thay đổi"""
+        n = len(self._keys)
+        start = self._dirty_from
+        if start >= n and len(self._cum_size) == n:
+            return
+
+        del self._cum_size[start:]
+        del self._cum_notional[start:]
+        size_total = self._cum_size[-1] if start > 0 else 0.0
+        notional_total = self._cum_notional[-1] if start > 0 else 0.0
+        for i in range(start, n):
+            price = self._price(i)
+            size_total += self._sizes[i]
+            notional_total += self._sizes[i] * price
+            self._cum_size.append(size_total)
+            self._cum_notional.append(notional_total)
+        self._dirty_from = n
+
+    def best(self) -> Optional[float]:
+        return self._price(0) if self._keys else None
+
+    def levels(self, limit: Optional[int] = None) -> List[Tuple[float, float]]:
+        """[(price, size), ...] từ top-of-book"""
+        count = len(self._keys) if limit is None else min(limit, len(self._keys))
+        return [(self._price(i), self._sizes[i]) for i in range(count)]
+
+    def total_size(self) -> float:
+        self._ensure_cumulative()
+        return self._cum_size[-1] if self._cum_size else 0.0
+
+    def total_notional(self) -> float:
+        self._ensure_cumulative()
+        return self._cum_notional[-1] if self._cum_notional else 0.0
+
+    def fill_for_size(self, size: float) -> Optional[dict]:
+        """
+        Khớp `size` base token từ top-of-book
+
+        Output:
+            dict: {'vwap', 'worst_price', 'size', 'notional', 'levels'} | None nếu book không đủ depth
+        """
+        if size <= 0:
+            return None
+        self._ensure_cumulative()
+        index = bisect_left(self._cum_size, size)
+        if index >= len(self._cum_size):
+            return None
+
+        prev_size = self._cum_size[index - 1] if index > 0 else 0.0
+        prev_notional = self._cum_notional[index - 1] if index > 0 else 0.0
+        worst_price = self._price(index)
+        notional = prev_notional + (size - prev_size) * worst_price
+        return {
+            'vwap': notional / size,
+            'worst_price': worst_price,
+            'size': size,
+            'notional': notional,
+            'levels': index + 1,
+        }
+
+    def fill_for_notional(self, notional: float) -> Optional[dict]:
+        """
+        Khớp `notional` USD từ top-of-book
+
+        Output:
+            dict: {'vwap', 'worst_price', 'size', 'notional', 'levels'} | None nếu book không đủ depth
+        """
+        if notional <= 0:
+            return None
+        self._ensure_cumulative()
+        index = bisect_left(self._cum_notional, notional)
+        if index >= len(self._cum_notional):
+            return None
+
+        prev_size = self._cum_size[index - 1] if index > 0 else 0.0
+        prev_notional = self._cum_notional[index - 1] if index > 0 else 0.0
+        worst_price = self._price(index)
+        size = prev_size + (notional - prev_notional) / worst_price
+        return {
+            'vwap': notional / size,
+            'worst_price': worst_price,
+            'size': size,
+            'notional': notional,
+            'levels': index + 1,
+        }
+
+    def notional_within(self, price_limit: float) -> float:
+        """Tổng notional của các level không tệ hơn price_limit"""
+        self._ensure_cumulative()
+        count = bisect_right(self._keys, self._key(price_limit))
+        return self._cum_notional[count - 1] if count > 0 else 0.0
+
+
+class DepthBook:
+    """
+    Order book 1 market
+
+    Methods:
+        - apply_snapshot(bids, asks): Thay toàn bộ book
+        - apply_delta(bids, asks): Cập nhật từng level (size 0 = xoá)
+        - side_for(is_buy): Side bị khớp (BUY ăn asks, SELL ăn bids)
+        - age_seconds(): Tuổi của lần cập nhật cuối
+    """
+
+    def __init__(self, market_id: int):
+        self.market_id = market_id
+        self.bids = DepthSide(is_bid=True)
+        self.asks = DepthSide(is_bid=False)
+        self.updated_at: Optional[float] = None
+        self.updates = 0
+
+    def apply_snapshot(self, bids: Iterable[Tuple[float, float]], asks: Iterable[Tuple[float, float]],
+                       updated_at: Optional[float] = None):
+        """updated_at: thời điểm snapshot được chụp (VD: quote từ shared memory), default = now"""
+        self.bids.replace(bids)
+        self.asks.replace(asks)
+        self.updated_at = updated_at if updated_at is not None else time.time()
+        self.updates += 1
+
+    def apply_delta(self, bids: Iterable[Tuple[float, float]] = (), asks: Iterable[Tuple[float, float]] = ()):
+        for price, size in bids:
+            self.bids.update(price, size)
+        for price, size in asks:
+            self.asks.update(price, size)
+        self.updated_at = time.time()
+        self.updates += 1
+
+    def side_for(self, is_buy: bool) -> DepthSide:
+        return self.asks if is_buy else self.bids
+
+    def age_seconds(self) -> Optional[float]:
+        return time.time() - self.updated_at if self.updated_at is not None else None
+
+    def is_fresh(self, max_age_seconds: float) -> bool:
+        age = self.age_seconds()
+        return age is not None and age <= max_age_seconds
+
+    def to_dict(self, limit: int = 10) -> dict:
+        best_bid = self.bids.best()
+        best_ask = self.asks.best()
+        return {
+            'market_id': self.market_id,
+            'best_bid': best_bid,
+            'best_ask': best_ask,
+            'mid': (best_bid + best_ask) / 2 if best_bid is not None and best_ask is not None else None,
+            'bids': self.bids.levels(limit),
+            'asks': self.asks.levels(limit),
+            'bid_notional': self.bids.total_notional(),
+            'ask_notional': self.asks.total_notional(),
+            'age_seconds': self.age_seconds(),
+        }
+
+
+_books: Dict[int, DepthBook] = {}
+
+
+def get_depth_book(market_id: int) -> DepthBook:
+    """Lấy DepthBook của market (tạo mới nếu chưa có)"""
+    book = _books.get(market_id)
+    if book is None:
+        book = _books[market_id] = DepthBook(market_id)
+    return book
@@ -0,0 +1,235 @@
+"""
+MarketRegistry - Registry market Lighter (symbol <-> market_id) kèm precision
+
+Load 1 lần từ lighter_markets.json, sau đó có thể refresh từ exchange
+(order_book_details). Mọi lookup đều O(1) qua dict index, không rebuild theo request.
+"""
+
+import json
+import os
+import time
+from typing import Dict, List, Optional
+
+
+DEFAULT_MARKETS_FILE = os.path.join(
+    os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+    'lighter_markets.json'
+)
+
+
+def _symbol_key(symbol: str) -> str:
+    """BTC / btc / BTC-USDT -> BTC"""
+    return symbol.strip().upper().split('-')[0]
+
+
+class MarketRegistry:
+    """
+    Registry tất cả market của Lighter
+
+    Mỗi market là 1 dict:
+        {
+            'market_id': int,
+            'symbol': str,          # BTC
+            'pair': str,            # BTC-USDT
+            'status': str,
+            'size_decimals': int,
+            'price_decimals': int,
+            'min_base_amount': float,
+        }
+
+    Index:
+        - symbol -> market
+        - market_id -> market
+
+    Methods:
+        - load_from_file(path): Load từ lighter_markets.json
+        - refresh(order_api): Refresh từ exchange
+        - get(symbol) / get_by_market_id(market_id)
+        - get_market_id(symbol) / get_symbol(market_id)
+        - update_precision(market_id, ...): Cập nhật precision từ metadata mới
+    """
+
+    def __init__(self):
+        self._by_symbol: Dict[str, dict] = {}
+        self._by_market_id: Dict[int, dict] = {}
+        self.source: Optional[str] = None
+        self.updated_at: Optional[float] = None
+
+    def __len__(self) -> int:
+        return len(self._by_market_id)
+
+    def __contains__(self, symbol: str) -> bool:
+        return _symbol_key(symbol) in self._by_symbol
+
+    @staticmethod
+    def _build_market(raw: dict) -> Optional[dict]:
+        """Chuẩn hoá 1 entry (từ JSON hoặc exchange) thành market dict"""
+        symbol = raw.get('symbol')
+        market_id = raw.get('market_id')
+        if not symbol or market_id is None:
+            return None
+
+        symbol = _symbol_key(symbol)
+        return {
+            'market_id': int(market_id),
+            'symbol': symbol,
+            'pair': f"{symbol}-USDT",
+            'status': raw.get('status', 'active'),
+            'size_decimals': raw.get('size_decimals'),
+            'price_decimals': raw.get('price_decimals'),
+            'min_base_amount': float(raw['min_base_amount']) if raw.get('min_base_amount') is not None else None,
+        }
+
+    def load_markets(self, markets: List[dict], source: str) -> int:
+        """
+        Thay toàn bộ registry bằng list markets
+
+        Build index mới rồi swap 1 lần để reader không bao giờ thấy state nửa vời.
+
+        Output:
+            int: Số market đã load
+        """
+        by_symbol: Dict[str, dict] = {}
+        by_market_id: Dict[int, dict] = {}
+
+        for raw in markets:
+            market = self._build_market(raw)
+            if market is None:
+                continue
+            by_symbol[market['symbol']] = market
+            by_market_id[market['market_id']] = market
+
+        self._by_symbol = by_symbol
+        self._by_market_id = by_market_id
+        self.source = source
+        self.updated_at = time.time()
+        return len(by_market_id)
+
+    def load_from_file(self, file_path: str = DEFAULT_MARKETS_FILE) -> int:
+        """
+        Load registry từ lighter_markets.json
+
+        Output:
+            int: Số market đã load (0 nếu lỗi)
+        """
+        try:
+            with open(file_path, 'r') as f:
+                data = json.load(f)
+        except Exception as e:
+            print(f"⚠️  [Lighter Markets] Không load được {file_path}: {e}")
+            return 0
+
+        markets = data.get('markets', []) if isinstance(data, dict) else data
+        count = self.load_markets(markets, source='file')
+        print(f"✅ [Lighter Markets] Loaded {count} markets từ {os.path.basename(file_path)}")
+        return count
+
+    async def refresh(self, order_api) -> dict:
+        """
+        Refresh registry từ exchange (1 call order_book_details cho tất cả market)
+
+        Input:
+            - order_api: OrderApi instance
+
+        Output:
+            dict: {'success': bool, 'count': int, 'error': str (nếu có)}
+        """
+        try:
+            details = await order_api.order_book_details()
+            books = getattr(details, 'order_book_details', None) or []
+            if not books:
+                return {'success': False, 'count': len(self), 'error': 'No market metadata'}
+
+            markets = []
+            for ob in books:
+                markets.append({
+                    'market_id': getattr(ob, 'market_id', None),
+                    'symbol': getattr(ob, 'symbol', None),
+                    'status': getattr(ob, 'status', 'active'),
+                    'size_decimals': getattr(ob, 'size_decimals', None),
+                    'price_decimals': getattr(ob, 'price_decimals', None),
+                    'min_base_amount': getattr(ob, 'min_base_amount', None),
+                })
+
+            count = self.load_markets(markets, source='exchange')
+            print(f"✅ [Lighter Markets] Refreshed {count} markets từ exchange")
+            return {'success': True, 'count': count}
+
+        except Exception as e:
+            print(f"⚠️  [Lighter Markets] Refresh thất bại, giữ registry hiện tại: {e}")
+            return {'success': False, 'count': len(self), 'error': str(e)}
+
+    def get(self, symbol: str) -> Optional[dict]:
+        """Lấy market theo symbol (BTC hoặc BTC-USDT)"""
+        return self._by_symbol.get(_symbol_key(symbol))
+
+    def get_by_market_id(self, market_id: int) -> Optional[dict]:
+        """Lấy market theo market_id"""
+        return self._by_market_id.get(market_id)
+
+    def get_market_id(self, symbol: str) -> Optional[int]:
+        """Symbol -> market_id (None nếu không hỗ trợ)"""
+        market = self.get(symbol)
+        return market['market_id'] if market else None
+
+    def get_symbol(self, market_id: int) -> Optional[str]:
+        """market_id -> symbol (None nếu không biết)"""
+        market = self._by_market_id.get(market_id)
+        return market['symbol'] if market else None
+
+    def get_precision(self, market_id: int) -> Optional[dict]:
+        """
+        Lấy precision đã cache cho market (không gọi REST)
+
+        Output:
+            dict: {'success', 'size_decimals', 'price_decimals', 'min_base_amount', 'market_id'}
+            hoặc None nếu chưa có đủ precision
+        """
+        market = self._by_market_id.get(market_id)
+        if (
+            market is None
+            or market['size_decimals'] is None
+            or market['price_decimals'] is None
+            or market['min_base_amount'] is None
+        ):
+            return None
+
+        return {
+            'success': True,
+            'size_decimals': market['size_decimals'],
+            'price_decimals': market['price_decimals'],
+            'min_base_amount': market['min_base_amount'],
+            'market_id': market_id,
+        }
+
+    def update_precision(
+        self,
+        market_id: int,
+        size_decimals: int,
+        price_decimals: int,
+        min_base_amount: float
+    ):
+        """Cập nhật precision cho market đã biết (VD: sau 1 lần gọi order_book_details)"""
+        market = self._by_market_id.get(market_id)
+        if market is None:
+            return
+        market['size_decimals'] = size_decimals
+        market['price_decimals'] = price_decimals
+        market['min_base_amount'] = float(min_base_amount)
+
+    def all_markets(self) -> List[dict]:
+        """Danh sách tất cả market, sort theo symbol"""
+        return sorted(self._by_market_id.values(), key=lambda m: m['symbol'])
+
+
+_registry: Optional[MarketRegistry] = None
+
+
+def get_market_registry() -> MarketRegistry:
+    """Lấy registry singleton (load từ JSON ở lần gọi đầu tiên)"""
+    global _registry
+    if _registry is None:
+        registry = MarketRegistry()
+        registry.load_from_file()
+        _registry = registry
+    return _registry
@@ -0,0 +1,263 @@
+"""
+OpenOrderBook - Open order in-memory của 1 account Lighter
+
+Index theo client_order_index (key chính), market_id và order_index của sàn.
+Cập nhật incremental:
+    - record_placement(): ngay sau khi create_order thành công (status 'pending' tới khi sàn xác nhận)
+    - record_cancel(): sau khi cancel_order / cancel_all_orders thành công
+    - apply_exchange_order(): 1 order từ sàn (active orders / account stream) -> thêm / cập nhật fill
+    - sync(): full snapshot active orders -> diff (order biến mất = đã khớp hết hoặc bị huỷ)
+Đọc (orders / get) là O(k) theo số order trả về, không gọi sàn.
+"""
+
+import time
+from typing import Dict, Iterable, List, Optional
+
+# Order vừa đặt chưa thấy trên sàn trong khoảng này thì vẫn giữ (sàn chưa index kịp)
+PENDING_GRACE_SECONDS = 15.0
+# Status Lighter dạng 'canceled-post-only', 'canceled-expired', ... -> so khớp theo prefix
+TERMINAL_STATUS_PREFIXES = ('filled', 'cancel', 'expired', 'rejected')
+
+
+def _float(value) -> Optional[float]:
+    try:
+        return float(value) if value is not None and value != '' else None
+    except (TypeError, ValueError):
+        return None
+
+
+class OpenOrderBook:
+    """
+    Open order của 1 account
+
+    Mỗi order là dict: client_order_index, order_index, market_id, side ('long' | 'short'),
+    order_type, price, trigger_price, size, filled, remaining, reduce_only, status, source,
+    created_at, updated_at
+    """
+
+    def __init__(self, account_index: int):
+        self.account_index = account_index
+        self._by_client: Dict[int, dict] = {}
+        self._by_market: Dict[int, Dict[int, dict]] = {}
+        self._client_by_order_index: Dict[int, int] = {}
+        self.synced_at: Optional[float] = None
+        self.version = 0
+
+    def __len__(self) -> int:
+        return len(self._by_client)
+
+    # ------------------------------------------------------------------ index
+
+    def _put(self, order: dict):
+        client_index = order['client_order_index']
+        previous = self._by_client.get(client_index)
+        if previous is not None and previous['market_id'] != order['market_id']:
+            self._by_market.get(previous['market_id'], {}).pop(client_index, None)
+        self._by_client[client_index] = order
+        self._by_market.setdefault(order['market_id'], {})[client_index] = order
+        if order.get('order_index') is not None:
+            self._client_by_order_index[order['order_index']] = client_index
+        self.version += 1
+
+    def _remove(self, client_index: int) -> Optional[dict]:
+        order = self._by_client.pop(client_index, None)
+        if order is None:
+            return None
+        market_orders = self._by_market.get(order['market_id'])
+        if market_orders is not None:
+            market_orders.pop(client_index, None)
+            if not market_orders:
+                del self._by_market[order['market_id']]
+        if order.get('order_index') is not None:
+            self._client_by_order_index.pop(order['order_index'], None)
+        self.version += 1
+        return order
+
+    # ------------------------------------------------------------------ events
+
+    def record_placement(
+        self,
+        market_id: int,
+        client_order_index: int,
+        side: str,
+        price: float,
+        size: float,
+        order_type: str = 'limit',
+        reduce_only: bool = False,
+        trigger_price: Optional[float] = None,
+        tx_hash: Optional[str] = None,
+    ) -> dict:
+        """Ghi nhận lệnh vừa gửi thành công (chưa có order_index của sàn)"""
+        now = time.time()
+        order = {
+            'client_order_index': int(client_order_index),
+            'order_index': None,
+            'market_id': int(market_id),
+            'side': side,
+            'order_type': order_type,
+            'price': price,
+            'trigger_price': trigger_price,
+            'size': size,
+            'filled': 0.0,
+            'remaining': size,
+            'reduce_only': reduce_only,
+            'status': 'pending',
+            'source': 'local',
+            'tx_hash': tx_hash,
+            'created_at': now,
+            'updated_at': now,
+        }
+        self._put(order)
+        return order
+
+    def record_cancel(
+        self,
+        client_order_index: Optional[int] = None,
+        order_index: Optional[int] = None,
+        market_id: Optional[int] = None,
+    ) -> int:
+        """
+        Xoá order đã huỷ: theo client_order_index / order_index, hoặc cả market (cancel-all),
+        không truyền gì = xoá hết. Return số order bị xoá.
+        """
+        if client_order_index is None and order_index is not None:
+            # Lệnh không có client index được lưu với key = order_index
+            client_order_index = self._client_by_order_index.get(int(order_index), int(order_index))
+        if client_order_index is not None:
+            return 1 if self._remove(int(client_order_index)) is not None else 0
+
+        if market_id is not None:
+            targets = list(self._by_market.get(int(market_id), {}))
+        else:
+            targets = list(self._by_client)
+        for client_index in targets:
+            self._remove(client_index)
+        return len(targets)
+
+    def apply_exchange_order(self, order) -> Optional[dict]:
+        """
+        Áp 1 order từ sàn (lighter.models.Order hoặc dict cùng field).
+        Order đã kết thúc (filled / canceled ...) hoặc remaining = 0 bị xoá khỏi book.
+        """
+        get = order.get if isinstance(order, dict) else lambda key, default=None: getattr(order, key, default)
+
+        client_index = get('client_order_index')
+        order_index = get('order_index')
+        if client_index is None or int(client_index) == 0:
+            # Lệnh không có client index (VD: đặt từ UI) -> dùng order_index làm key
+            client_index = order_index
+        if client_index is None:
+            return None
+        client_index = int(client_index)
+
+        status = str(get('status') or 'open').lower()
+        remaining = _float(get('remaining_base_amount'))
+        finished = remaining is not None and remaining <= 0 and status != 'pending'
+        if status.startswith(TERMINAL_STATUS_PREFIXES) or finished:
+            self._remove(client_index)
+            return None
+
+        size = _float(get('initial_base_amount'))
+        trigger_price = _float(get('trigger_price'))
+        previous = self._by_client.get(client_index) or {}
+        updated = {
+            'client_order_index': client_index,
+            'order_index': int(order_index) if order_index is not None else previous.get('order_index'),
+            'market_id': int(get('market_index', get('market_id', previous.get('market_id')))),
+            'side': 'short' if get('is_ask') else 'long',
+            'order_type': str(get('type') or previous.get('order_type') or 'limit').lower(),
+            'price': _float(get('price')),
+            'trigger_price': trigger_price or None,
+            'size': size,
+            'filled': _float(get('filled_base_amount')) or 0.0,
+            'remaining': remaining,
+            'reduce_only': bool(get('reduce_only')),
+            'status': status,
+            'source': 'exchange',
+            'tx_hash': previous.get('tx_hash'),
+            'created_at': previous.get('created_at') or time.time(),
+            'updated_at': previous.get('updated_at'),
+        }
+        if updated == previous:
+            return previous
+        updated['updated_at'] = time.time()
+        self._put(updated)
+        return updated
+
+    def sync(self, orders: Iterable, market_id: Optional[int] = None) -> dict:
+        """
+        Full snapshot active orders từ sàn (toàn account, hoặc 1 market nếu truyền market_id).
+
+        Order trong book không có trong snapshot bị xoá, trừ lệnh local vừa đặt
+        (< PENDING_GRACE_SECONDS) mà sàn chưa kịp trả về.
+
+        Output:
+            dict: {'added', 'updated', 'removed'}
+        """
+        now = time.time()
+        seen = set()
+        added = updated = 0
+        for order in orders:
+            get = order.get if isinstance(order, dict) else lambda key, default=None, o=order: getattr(o, key, default)
+            key = get('client_order_index') or get('order_index')
+            existed = key is not None and int(key) in self._by_client
+            before = self._by_client.get(int(key)) if existed else None
+            result = self.apply_exchange_order(order)
+            if result is None:
+                continue
+            seen.add(result['client_order_index'])
+            if not existed:
+                added += 1
+            elif result is not before:
+                updated += 1
+
+        scope = self._by_market.get(int(market_id), {}) if market_id is not None else self._by_client
+        stale = [
+            client_index for client_index, order in scope.items()
+            if client_index not in seen
+            and not (order['source'] == 'local' and now - order['created_at'] < PENDING_GRACE_SECONDS)
+        ]
+        for client_index in stale:
+            self._remove(client_index)
+
+        self.synced_at = now
+        return {'added': added, 'updated': updated, 'removed': len(stale)}
+
+    # ------------------------------------------------------------------ reads
+
+    def orders(self, market_id: Optional[int] = None) -> List[dict]:
+        if market_id is not None:
+            return list(self._by_market.get(int(market_id), {}).values())
+        return list(self._by_client.values())
+
+    def get(self, client_order_index: int) -> Optional[dict]:
+        return self._by_client.get(int(client_order_index))
+
+    def get_by_order_index(self, order_index: int) -> Optional[dict]:
+        client_index = self._client_by_order_index.get(int(order_index))
+        return self._by_client.get(client_index) if client_index is not None else None
+
+    def age_seconds(self) -> Optional[float]:
+        return time.time() - self.synced_at if self.synced_at is not None else None
+
+    def to_dict(self) -> dict:
+        return {
+            'account_index': self.account_index,
+            'count': len(self._by_client),
+            'markets': {market_id: len(orders) for market_id, orders in self._by_market.items()},
+            'synced_at': self.synced_at,
+            'age_seconds': self.age_seconds(),
+            'version': self.version,
+        }
+
+
+_books: Dict[int, OpenOrderBook] = {}
+
+
+def get_open_order_book(account_index: int) -> OpenOrderBook:
+    """Lấy OpenOrderBook của account (tạo mới nếu chưa có)"""
+    account_index = int(account_index)
+    book = _books.get(account_index)
+    if book is None:
+        book = _books[account_index] = OpenOrderBook(account_index)
+    return book
@@ -0,0 +1,176 @@
+"""
+SignerWorker - Chạy SignerClient của Lighter trên 1 thread riêng (event loop riêng)
+
+Ký transaction (shared library của SDK trong create_order / cancel_all_orders /
+change_api_key ...) là call đồng bộ, chạy thẳng trên event loop chính sẽ chặn mọi request
+khác khi có nhiều lệnh cùng lúc. SignerClient được dựng và dùng hoàn toàn trên thread này:
+    - create_signer_client(): dựng SignerClient trên signer thread (aiohttp session của nó
+      thuộc signer loop) và trả về OffloadedSignerClient
+    - OffloadedSignerClient: method async (create_order, cancel_order, send_tx_batch, close ...)
+      được chuyển sang signer loop; method / hằng số đồng bộ đọc thẳng. Method đồng bộ có gọi
+      shared library (auth token, check_client ...) phải qua call_sync / create_auth_token
+      (shared library không được ghi là thread-safe)
+    - Hàng đợi có giới hạn: quá LIGHTER_SIGNER_QUEUE call đang chờ thì từ chối ngay
+
+ENV:
+    - LIGHTER_SIGNER_QUEUE (default: 64 call đang chờ / đang chạy)
+"""
+
+import asyncio
+import inspect
+import os
+import threading
+import time
+from typing import Optional
+
+
+class SignerQueueFull(RuntimeError):
+    """Signer thread đang có quá nhiều call chờ"""
+
+
+class SignerWorker:
+    """
+    1 daemon thread chạy asyncio loop riêng cho mọi SignerClient của process
+
+    Methods:
+        - run(coro_fn, *args, **kwargs): await coroutine trên signer loop
+        - call(fn, *args, **kwargs): chạy hàm đồng bộ trên signer thread
+        - stats(): pending / completed / rejected / thời gian chạy
+    """
+
+    def __init__(self, queue_limit: int):
+        self.queue_limit = queue_limit
+        self.pending = 0
+        self.max_pending = 0
+        self.completed = 0
+        self.rejected = 0
+        self.failed = 0
+        self.total_ms = 0.0
+        self.max_ms = 0.0
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._thread: Optional[threading.Thread] = None
+        self._start_lock = threading.Lock()
+
+    def _ensure_started(self) -> asyncio.AbstractEventLoop:
+        with self._start_lock:
+            if self._loop is None:
+                ready = threading.Event()
+
+                def _main():
+                    loop = asyncio.new_event_loop()
+                    asyncio.set_event_loop(loop)
+                    self._loop = loop
+                    ready.set()
+                    loop.run_forever()
+
+                self._thread = threading.Thread(target=_main, name="lighter-signer", daemon=True)
+                self._thread.start()
+                ready.wait()
+        return self._loop
+
+    def in_signer_thread(self) -> bool:
+        return self._thread is not None and threading.current_thread() is self._thread
+
+    async def run(self, coro_fn, *args, **kwargs):
+        """Chạy coro_fn(*args, **kwargs) trên signer loop và chờ kết quả"""
+        if self.in_signer_thread():
+            # Đã ở trên signer loop (VD: gọi lồng nhau) -> chạy thẳng
+            return await coro_fn(*args, **kwargs)
+        if self.pending >= self.queue_limit:
+            self.rejected += 1
+            raise SignerQueueFull(f"Lighter signer queue đầy ({self.pending}/{self.queue_limit})")
+
+        loop = self._ensure_started()
+        self.pending += 1
+        self.max_pending = max(self.max_pending, self.pending)
+        started = time.perf_counter()
+        try:
+            future = asyncio.run_coroutine_threadsafe(coro_fn(*args, **kwargs), loop)
+            return await asyncio.wrap_future(future)
+        except Exception:
+            self.failed += 1
+            raise
+        finally:
+            elapsed_ms = (time.perf_counter() - started) * 1000
+            self.pending -= 1
+            self.completed += 1
+            self.total_ms += elapsed_ms
+            self.max_ms = max(self.max_ms, elapsed_ms)
+
+    async def call(self, fn, *args, **kwargs):
+        """Chạy hàm đồng bộ (VD: check_client, create_client) trên signer thread"""
+        async def _call():
+            return fn(*args, **kwargs)
+        return await self.run(_call)
+
+    def stats(self) -> dict:
+        return {
+            "running": self._thread is not None and self._thread.is_alive(),
+            "queue_limit": self.queue_limit,
+            "pending": self.pending,
+            "max_pending": self.max_pending,
+            "completed": self.completed,
+            "failed": self.failed,
+            "rejected": self.rejected,
+            "avg_ms": round(self.total_ms / self.completed, 2) if self.completed else None,
+            "max_ms": round(self.max_ms, 2),
+        }
+
+
+class OffloadedSignerClient:
+    """
+    Proxy của SignerClient: method async chạy trên signer thread, còn lại đọc thẳng
+
+    Code gọi giữ nguyên: `await signer.create_order(...)`, `signer.ORDER_TYPE_LIMIT` ...
+    """
+
+    def __init__(self, signer_client, worker: SignerWorker):
+        self._signer_client = signer_client
+        self._worker = worker
+
+    @property
+    def raw(self):
+        """SignerClient gốc (chỉ dùng trên signer thread)"""
+        return self._signer_client
+
+    async def run_on_signer(self, coro_fn, *args, **kwargs):
+        """Chạy 1 đoạn async tuỳ ý (VD: ký + gửi batch giữ nonce lock) trên signer loop"""
+        return await self._worker.run(coro_fn, *args, **kwargs)
+
+    async def call_sync(self, fn, *args, **kwargs):
+        return await self._worker.call(fn, *args, **kwargs)
+
+    async def create_auth_token(self, api_key_index: int):
+        """create_auth_token_with_expiry trên signer thread -> (auth, error)"""
+        return await self._worker.call(
+            self._signer_client.create_auth_token_with_expiry, api_key_index=api_key_index
+        )
+
+    def __getattr__(self, name):
+        attr = getattr(self._signer_client, name)
+        if inspect.iscoroutinefunction(attr):
+            async def _offloaded(*args, **kwargs):
+                return await self._worker.run(attr, *args, **kwargs)
+            _offloaded.__name__ = name
+            return _offloaded
+        return attr
+
+
+_worker: Optional[SignerWorker] = None
+
+
+def get_signer_worker() -> SignerWorker:
+    global _worker
+    if _worker is None:
+        _worker = SignerWorker(int(os.getenv("LIGHTER_SIGNER_QUEUE", 64)))
+    return _worker
+
+
+async def create_signer_client(signer_cls, **kwargs) -> OffloadedSignerClient:
+    """Dựng signer_cls(**kwargs) trên signer thread (load shared library + tạo client key ở đó)"""
+    worker = get_signer_worker()
+
+    async def _build():
+        return signer_cls(**kwargs)
+
+    return OffloadedSignerClient(await worker.run(_build), worker)
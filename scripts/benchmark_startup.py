@@ -0,0 +1,143 @@
+#!/usr/bin/env python3
+"""
+Startup benchmark cho api_server.py
+
+Đo time-to-first-healthy-response: spawn `python api_server.py`, poll /api/status
+tới khi trả 200, rồi kill process. Chạy N lần cho mỗi mode (lazy / eager).
+
+Sử dụng:
+    python scripts/benchmark_startup.py
+    python scripts/benchmark_startup.py --runs 5 --mode lazy --max-ms 3000
+
+--max-ms: exit code 1 nếu median của mode lazy vượt ngưỡng (dùng cho CI / trước khi deploy).
+"""
+
+import argparse
+import json
+import os
+import socket
+import statistics
+import subprocess
+import sys
+import time
+import urllib.request
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def _free_port() -> int:
+    with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+
+def measure_once(lazy: bool, timeout: float) -> dict:
+    """
+    Boot server 1 lần và đo thời gian tới response healthy đầu tiên
+
+    Output:
+        dict: {'success': bool, 'healthy_ms': float, 'ready_ms': float, 'imports': list, 'error': str}
+    """
+    port = _free_port()
+    env = dict(os.environ, PORT=str(port), API_LAZY_IMPORTS='1' if lazy else '0', PYTHONUNBUFFERED='1')
+
+    started = time.perf_counter()
+    proc = subprocess.Popen(
+        [sys.executable, 'api_server.py'],
+        cwd=ROOT_DIR,
+        env=env,
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.DEVNULL,
+    )
+
+    try:
+        url = f'http://127.0.0.1:{port}/api/status'
+        while time.perf_counter() - started < timeout:
+            if proc.poll() is not None:
+                return {'success': False, 'error': f'Server exited with code {proc.returncode}'}
+            try:
+                with urllib.request.urlopen(url, timeout=1) as resp:
+                    if resp.status == 200:
+                        healthy_ms = (time.perf_counter() - started) * 1000
+                        startup = json.loads(resp.read().decode('utf-8')).get('startup', {})
+                        return {
+                            'success': True,
+                            'healthy_ms': healthy_ms,
+                            'ready_ms': startup.get('ready_ms'),
+                            'imports': startup.get('imports', []),
+                        }
+            except Exception:
+                pass
+            time.sleep(0.02)
+
+        return {'success': False, 'error': f'Không healthy sau {timeout}s'}
+
+    finally:
+        proc.terminate()
+        try:
+            proc.wait(timeout=5)
+        except subprocess.TimeoutExpired:
+            proc.kill()
+
+
+def run_mode(lazy: bool, runs: int, timeout: float) -> list:
+    mode = 'lazy' if lazy else 'eager'
+    print(f"\n🚀 Mode: {mode} ({runs} runs)")
+
+    samples = []
+    last = None
+    for i in range(runs):
+        result = measure_once(lazy, timeout)
+        if not result['success']:
+            print(f"   ❌ Run {i + 1}: {result['error']}")
+            continue
+        samples.append(result['healthy_ms'])
+        last = result
+        print(f"   Run {i + 1}: healthy sau {result['healthy_ms']:.0f}ms (server ready_ms={result['ready_ms']})")
+
+    if samples:
+        print(
+            f"   → median={statistics.median(samples):.0f}ms "
+            f"min={min(samples):.0f}ms max={max(samples):.0f}ms"
+        )
+    if last and last['imports']:
+        print("   Import profile (run cuối):")
+        for entry in sorted(last['imports'], key=lambda e: e['ms'], reverse=True):
+            print(f"     {entry['ms']:>8.1f}ms  {entry['module']:<20} [{entry['phase']}]")
+
+    return samples
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark time-to-first-healthy-response của api_server.py')
+    parser.add_argument('--runs', type=int, default=3, help='Số lần boot cho mỗi mode (default: 3)')
+    parser.add_argument('--mode', choices=['lazy', 'eager', 'both'], default='both')
+    parser.add_argument('--timeout', type=float, default=60.0, help='Timeout mỗi lần boot (giây)')
+    parser.add_argument('--max-ms', type=float, default=None, help='Fail nếu median (lazy) > ngưỡng')
+    args = parser.parse_args()
+
+    results = {}
+    if args.mode in ('lazy', 'both'):
+        results['lazy'] = run_mode(True, args.runs, args.timeout)
+    if args.mode in ('eager', 'both'):
+        results['eager'] = run_mode(False, args.runs, args.timeout)
+
+    if 'lazy' in results and 'eager' in results and results['lazy'] and results['eager']:
+        lazy_ms = statistics.median(results['lazy'])
+        eager_ms = statistics.median(results['eager'])
+        print(f"\n📊 Lazy vs eager: {lazy_ms:.0f}ms vs {eager_ms:.0f}ms ({eager_ms - lazy_ms:+.0f}ms)")
+
+    if args.max_ms is not None:
+        samples = results.get('lazy') or results.get('eager') or []
+        if not samples:
+            print("❌ Không có run nào thành công")
+            sys.exit(1)
+        median = statistics.median(samples)
+        if median > args.max_ms:
+            print(f"❌ Startup median {median:.0f}ms > budget {args.max_ms:.0f}ms")
+            sys.exit(1)
+        print(f"✅ Startup median {median:.0f}ms <= budget {args.max_ms:.0f}ms")
+
+
+if __name__ == '__main__':
+    main()